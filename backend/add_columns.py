@@ -29,7 +29,8 @@ def add_missing_columns():
         'email_verified': 'INTEGER DEFAULT 0',
         'email_verification_token': 'TEXT',
         'reset_password_token': 'TEXT',
-        'reset_password_expires': 'TIMESTAMP'
+        'reset_password_expires': 'TIMESTAMP',
+        'hash_format': 'TEXT'
     }
     
     # Adiciona colunas que faltam
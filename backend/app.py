@@ -17,48 +17,41 @@ import time
 import json
 import random
 import re
-import difflib
 import sqlite3
-import bcrypt
-import base64
 import secrets
 import string
 import logging
+import threading
 from datetime import datetime, timedelta
-from flask import Flask, request, jsonify, render_template, session, url_for
+from flask import Flask, Response, g, request, jsonify, render_template, session, stream_with_context, url_for
 from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
 from flask_mail import Mail, Message
+from werkzeug.middleware.proxy_fix import ProxyFix
 from dotenv import load_dotenv
-# Verifica se google-generativeai está disponível
-GEMINI_AVAILABLE = False
-genai = None
-try:
-    import google.generativeai as genai
-    GEMINI_AVAILABLE = True
-    print(f"[GEMINI] ✅ Biblioteca google-generativeai importada com sucesso!")
-    print(f"[GEMINI] ✅ Versão: {genai.__version__ if hasattr(genai, '__version__') else 'N/A'}")
-    print(f"[GEMINI] ✅ Python executando: {sys.executable}")
-    print(f"[GEMINI] ✅ Caminho Python: {sys.path[:3]}")
-except ImportError as e:
-    GEMINI_AVAILABLE = False
-    genai = None
-    print(f"[GEMINI] ❌ ERRO ao importar google-generativeai: {e}")
-    print(f"[GEMINI] ❌ Python executando: {sys.executable}")
-    print(f"[GEMINI] ❌ Execute: pip install google-generativeai")
-    print(f"[GEMINI] ❌ Verifique se está no ambiente virtual correto!")
-except Exception as e:
-    GEMINI_AVAILABLE = False
-    genai = None
-    print(f"[GEMINI] ❌ ERRO inesperado ao importar google-generativeai: {e}")
-    import traceback
-    traceback.print_exc()
-
-# Configuração de logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    datefmt='%Y-%m-%d %H:%M:%S'
-)
+from banco import GerenciadorConexoes
+from busca_local import criar_ranker
+from cache import AUSENTE, CacheTTL
+from cache_respostas import CacheRespostas
+from cache_semantico import IndiceMinHash
+from fila_email import FilaEmail
+from pool_smtp import PoolSMTP
+from senhas import (FORMATO_HASH_CANONICO, FORMATO_HASH_INVALIDO, RecusaSenhas, ServicoSenhas,
+                    codificar_hash, decodificar_hash, detectar_formato_hash)
+from normalizacao import MensagemNormalizada, normalizar_mensagem
+from prompt_gemini import INSTRUCAO_SISTEMA, ConstrutorPrompt, estimar_tokens
+from sessoes_gemini import CONFIG_GERACAO, SessoesGemini, texto_resposta
+from gateway_gemini import CircuitoAberto, GatewayGemini, PrazoGeminiEsgotado, RespostaVazia, erro_quota
+from gemini_fake import ModeloFake
+from provedor_gemini import ProvedorGemini
+from gatilhos import palavras_alerta, SAUDACOES, PREFIXOS_SAUDACAO, categorias_resposta
+from informacoes_pessoais import ExtratorInformacoes
+from memoria_conversas import criar_armazem_conversas
+from registro import configurar_logging, registro
+from tempos import BUCKETS_MS, MedidorEtapas
+from metricas import criar_registro_metricas
+
+# Configuração de logging: fila + thread de escrita, texto ou JSON, níveis por módulo (ver registro.py)
+configurar_logging()
 logger = logging.getLogger(__name__)
 
 # Carrega variáveis de ambiente
@@ -69,19 +62,30 @@ env_paths = [
     ".env",  # Caminho relativo atual
 ]
 
-env_loaded = False
+env_carregado = None
 for env_path in env_paths:
     if os.path.exists(env_path):
         load_dotenv(env_path, override=True)
-        logger.info(f"[ENV] ✅ Arquivo .env carregado de: {env_path}")
-        print(f"[ENV] ✅ Arquivo .env carregado de: {env_path}")
-        env_loaded = True
+        env_carregado = env_path
         break
+if env_carregado is None:
+    load_dotenv()  # Tenta carregar do diretório atual
+
+# Boot rápido (APP_FAST_BOOT=true ou --fast-boot): o import não roda migrações nem lê os JSON
+# (ficam para `flask --app wsgi migrar` e para a primeira requisição) e não imprime diagnósticos
+FAST_BOOT = '--fast-boot' in sys.argv or os.getenv('APP_FAST_BOOT', 'false').lower() == 'true'
+# APP_DIAGNOSTICO=true mantém os prints de diagnóstico do boot mesmo no modo rápido
+DIAGNOSTICO_BOOT = os.getenv('APP_DIAGNOSTICO', 'false' if FAST_BOOT else 'true').lower() == 'true'
 
-if not env_loaded:
+def diagnostico(mensagem):
+    """Diagnóstico do boot (logger.info), só com DIAGNOSTICO_BOOT"""
+    if DIAGNOSTICO_BOOT:
+        logger.info(mensagem)
+
+if env_carregado:
+    logger.info(f"[ENV] ✅ Arquivo .env carregado de: {env_carregado}")
+else:
     logger.warning("[ENV] ⚠️ Arquivo .env não encontrado em nenhum dos caminhos testados")
-    print("[ENV] ⚠️ Arquivo .env não encontrado - tentando carregar do diretório atual")
-    load_dotenv()  # Tenta carregar do diretório atual
 
 # Verifica se as variáveis de email foram carregadas (após load_dotenv)
 mail_username_env = os.getenv('MAIL_USERNAME')
@@ -90,12 +94,10 @@ mail_server_env = os.getenv('MAIL_SERVER')
 
 if mail_username_env and mail_password_env:
     logger.info(f"[ENV] ✅ Variáveis de email carregadas: MAIL_USERNAME={mail_username_env[:5]}...")
-    print(f"[ENV] ✅ Variáveis de email carregadas: MAIL_USERNAME={mail_username_env}")
 else:
     logger.warning("[ENV] ⚠️ MAIL_USERNAME ou MAIL_PASSWORD não encontrados no .env")
-    print("[ENV] ⚠️ MAIL_USERNAME ou MAIL_PASSWORD não encontrados no .env")
-    print("[ENV]    - Verifique se o arquivo .env existe e contém essas variáveis")
-    print("[ENV]    - Em desenvolvimento, emails serão apenas logados no console")
+    diagnostico("[ENV]    - Verifique se o arquivo .env existe e contém essas variáveis; "
+                "em desenvolvimento, emails serão apenas logados no console")
 
 # Inicializa o Flask com os caminhos corretos
 app = Flask(__name__, 
@@ -107,32 +109,29 @@ app = Flask(__name__,
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'sua-chave-secreta-super-segura-mude-isso-em-producao')
 BASE_PATH = os.path.join(os.path.dirname(__file__), "..", "dados")
 DB_PATH = os.path.join(os.path.dirname(__file__), "users.db")
-# Carrega GEMINI_API_KEY com múltiplas tentativas
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-if not GEMINI_API_KEY:
-    # Tenta recarregar se não encontrou
-    logger.warning("[GEMINI] ⚠️ GEMINI_API_KEY não encontrada na primeira tentativa, recarregando .env...")
-    print("[GEMINI] ⚠️ GEMINI_API_KEY não encontrada na primeira tentativa, recarregando .env...")
-    for env_path in env_paths:
-        if os.path.exists(env_path):
-            logger.info(f"[GEMINI] Recarregando .env de: {env_path}")
-            print(f"[GEMINI] Recarregando .env de: {env_path}")
-            load_dotenv(env_path, override=True)
-            GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-            if GEMINI_API_KEY:
-                logger.info(f"[GEMINI] ✅ GEMINI_API_KEY carregada após recarregar (length: {len(GEMINI_API_KEY)})")
-                print(f"[GEMINI] ✅ GEMINI_API_KEY carregada após recarregar (length: {len(GEMINI_API_KEY)})")
-                break
 
+# Métricas do GET /metrics (formato do Prometheus); com METRICAS_DIR os workers do gunicorn
+# gravam instantâneos ali e qualquer um deles responde pelo total (ver metricas.py)
+metricas = criar_registro_metricas()
+metrica_http = metricas.histograma('http_requisicao_segundos', 'Duração das requisições por rota',
+                                   ('rota', 'metodo', 'status'))
+metrica_sqlite = metricas.histograma('sqlite_comando_segundos', 'Duração de cada comando SQLite (execute)',
+                                     ('banco', 'operacao'), buckets=tuple(ms / 1000 for ms in BUCKETS_MS))
+
+def medir_comando_usuarios(operacao, segundos):
+    metrica_sqlite.observar(segundos, banco='usuarios', operacao=operacao)
+
+# Conexões reutilizadas por thread, em modo WAL (ver banco.py); cada comando é medido para o /metrics
+banco_usuarios = GerenciadorConexoes(DB_PATH, ao_executar=medir_comando_usuarios)
+GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 if GEMINI_API_KEY:
     logger.info(f"[GEMINI] ✅ GEMINI_API_KEY encontrada (length: {len(GEMINI_API_KEY)})")
-    print(f"[GEMINI] ✅ GEMINI_API_KEY encontrada (length: {len(GEMINI_API_KEY)})")
-    print(f"[GEMINI] Primeiros 10 chars: {GEMINI_API_KEY[:10]}...")
 else:
-    logger.error("[GEMINI] ❌❌❌ GEMINI_API_KEY NÃO encontrada após todas as tentativas!")
-    print("[GEMINI] ❌❌❌ GEMINI_API_KEY NÃO encontrada após todas as tentativas!")
-    print("[GEMINI] Verificando variáveis de ambiente...")
-    print(f"[GEMINI] GEMINI_API_KEY from os.getenv: {repr(os.getenv('GEMINI_API_KEY'))}")
+    logger.error("[GEMINI] ❌❌❌ GEMINI_API_KEY NÃO encontrada!")
+
+# GEMINI_API_ENDPOINT aponta o SDK (transporte REST) para outro servidor, ex.: scripts/servidor_gemini_local.py
+GEMINI_API_ENDPOINT = os.getenv('GEMINI_API_ENDPOINT')
+GEMINI_CONFIG_API = {'transport': 'rest', 'client_options': {'api_endpoint': GEMINI_API_ENDPOINT}} if GEMINI_API_ENDPOINT else {}
 
 # Configurações de sessão para funcionar com IP/localhost e mobile
 # Detecta se está em produção (HTTPS) ou desenvolvimento
@@ -149,6 +148,37 @@ app.config['SESSION_COOKIE_SECURE'] = is_production  # True em produção (HTTPS
 app.config['SESSION_COOKIE_HTTPONLY'] = True
 app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'  # Permite cookies entre localhost e IP, funciona melhor em mobile
 
+# Render/Railway (e o ngrok) ficam na frente do app: sem isso request.remote_addr é o IP do proxy
+# e todas as usuárias dividem a mesma janela de tentativas por IP. PROXY_SALTOS = número de
+# proxies confiáveis na frente do app. O padrão é 0 (conexões direto, X-Forwarded-For ignorado,
+# já que poderia ser forjado); os arquivos de deploy (render.yaml, railway.json, Procfile) usam 1
+PROXY_SALTOS = int(os.getenv('PROXY_SALTOS', '0'))
+if PROXY_SALTOS > 0:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=PROXY_SALTOS, x_proto=PROXY_SALTOS)
+
+# Sorteia, por requisição, se os logs de DEBUG dela saem (LOG_AMOSTRAGEM)
+app.before_request(registro.sortear_requisicao)
+
+# Duração das requisições por rota (o padrão da rota, não a URL, para não explodir os rótulos).
+# Em respostas transmitidas (SSE) mede até o envio dos cabeçalhos.
+@app.before_request
+def iniciar_medicao_requisicao():
+    g.inicio_requisicao = time.perf_counter()
+
+@app.after_request
+def medir_requisicao(response):
+    inicio = g.pop('inicio_requisicao', None)
+    if inicio is not None:
+        rota = request.url_rule.rule if request.url_rule is not None else 'sem_rota'
+        metrica_http.observar(time.perf_counter() - inicio, rota=rota, metodo=request.method,
+                              status=response.status_code)
+    return response
+
+# Transação esquecida aberta por um erro não pode segurar o lock do banco entre requisições
+@app.teardown_appcontext
+def liberar_conexao_db(exception=None):
+    banco_usuarios.liberar()
+
 # Headers de cache e performance para recursos estáticos
 @app.after_request
 def add_cache_headers(response):
@@ -203,11 +233,11 @@ mail_config_status = {
     'MAIL_DEFAULT_SENDER': app.config['MAIL_DEFAULT_SENDER']
 }
 logger.info(f"[EMAIL CONFIG] Configurações carregadas: {mail_config_status}")
-print(f"[EMAIL CONFIG] Servidor: {app.config['MAIL_SERVER']}:{app.config['MAIL_PORT']}")
-print(f"[EMAIL CONFIG] TLS: {app.config['MAIL_USE_TLS']}")
-print(f"[EMAIL CONFIG] Username: {app.config['MAIL_USERNAME'] or '(não configurado)'}")
-print(f"[EMAIL CONFIG] Password: {'***' if app.config['MAIL_PASSWORD'] else '(não configurado)'}")
-print(f"[EMAIL CONFIG] Sender: {app.config['MAIL_DEFAULT_SENDER']}")
+diagnostico(f"[EMAIL CONFIG] Servidor: {app.config['MAIL_SERVER']}:{app.config['MAIL_PORT']}")
+diagnostico(f"[EMAIL CONFIG] TLS: {app.config['MAIL_USE_TLS']}")
+diagnostico(f"[EMAIL CONFIG] Username: {app.config['MAIL_USERNAME'] or '(não configurado)'}")
+diagnostico(f"[EMAIL CONFIG] Password: {'***' if app.config['MAIL_PASSWORD'] else '(não configurado)'}")
+diagnostico(f"[EMAIL CONFIG] Sender: {app.config['MAIL_DEFAULT_SENDER']}")
 
 mail = Mail(app)
 
@@ -219,109 +249,43 @@ login_manager.login_view = 'index'
 # "strong" pode causar problemas em dispositivos móveis com mudança de rede
 login_manager.session_protection = "basic"
 
-# Inicializa cliente Gemini se a chave estiver disponível
-gemini_client = None
-logger.info(f"[GEMINI] 🔍 Verificando inicialização... GEMINI_AVAILABLE: {GEMINI_AVAILABLE}, GEMINI_API_KEY presente: {bool(GEMINI_API_KEY)}")
-print(f"[GEMINI] 🔍 Verificando inicialização... GEMINI_AVAILABLE: {GEMINI_AVAILABLE}, GEMINI_API_KEY presente: {bool(GEMINI_API_KEY)}")
-
-if GEMINI_AVAILABLE and GEMINI_API_KEY:
-    logger.info(f"[GEMINI] ✅ Condições atendidas - GEMINI_AVAILABLE: {GEMINI_AVAILABLE}, GEMINI_API_KEY presente: {bool(GEMINI_API_KEY)}")
-    print(f"[GEMINI] ✅ Condições atendidas - GEMINI_AVAILABLE: {GEMINI_AVAILABLE}, GEMINI_API_KEY presente: {bool(GEMINI_API_KEY)}")
+def criar_cliente_gemini():
+    """Importa o SDK, configura a chave e cria o GenerativeModel (no primeiro uso, via provedor_gemini)"""
+    if os.getenv('GEMINI_FAKE', 'false').lower() == 'true':
+        # Modelo falso (gemini_fake): desenvolvimento e testes sem chave e sem rede
+        logger.warning("[GEMINI] ⚠️ GEMINI_FAKE=true - usando modelo falso (respostas fixas, sem chamar a API)")
+        return ModeloFake(system_instruction=INSTRUCAO_SISTEMA, generation_config=CONFIG_GERACAO)
+    if not GEMINI_API_KEY:
+        logger.warning("[GEMINI] ⚠️ GEMINI_API_KEY não configurada - respostas serão da base local (humanizadas)")
+        return None
+    try:
+        import google.generativeai as genai
+    except ImportError as e:
+        logger.warning(f"[GEMINI] ⚠️ Biblioteca google-generativeai não instalada ({e}; Python: {sys.executable}) - execute: pip install google-generativeai")
+        return None
+    logger.info(f"[GEMINI] ✅ google-generativeai {getattr(genai, '__version__', 'N/A')} importado")
     
-    # ISOLAR: Configuração da API
-    configure_success = False
+    genai.configure(api_key=GEMINI_API_KEY, **GEMINI_CONFIG_API)
+    # Tenta usar gemini-2.0-flash, se falhar, usa gemini-1.5-flash
     try:
-        logger.info(f"[GEMINI] 🔍 [PASSO 1] Configurando Gemini com API key (length: {len(GEMINI_API_KEY)})")
-        print(f"[GEMINI] 🔍 [PASSO 1] Configurando Gemini com API key (length: {len(GEMINI_API_KEY)})")
-        genai.configure(api_key=GEMINI_API_KEY)
-        configure_success = True
-        logger.info("[GEMINI] ✅ [PASSO 1] genai.configure() executado com sucesso")
-        print("[GEMINI] ✅ [PASSO 1] genai.configure() executado com sucesso")
+        modelo = genai.GenerativeModel('gemini-2.0-flash', system_instruction=INSTRUCAO_SISTEMA,
+                                       generation_config=CONFIG_GERACAO)
     except Exception as e:
-        logger.error(f"[GEMINI] ❌ [PASSO 1] ERRO ao configurar API: {e}", exc_info=True)
-        print(f"[GEMINI] ❌ [PASSO 1] ERRO ao configurar API: {e}")
-        import traceback
-        traceback.print_exc()
-        configure_success = False
-    
-    # ISOLAR: Criação do objeto GenerativeModel (LINHA CRÍTICA)
-    if configure_success:  # Só tenta criar se configure() funcionou
-        try:
-            logger.info("[GEMINI] 🔍 [PASSO 2] Criando GenerativeModel('gemini-2.0-flash')...")
-            print("[GEMINI] 🔍 [PASSO 2] Criando GenerativeModel('gemini-2.0-flash')...")
-            print(f"[GEMINI] [PASSO 2] genai disponível: {genai is not None}")
-            print(f"[GEMINI] [PASSO 2] GEMINI_API_KEY disponível: {bool(GEMINI_API_KEY)}")
-            
-            # ESTA É A LINHA QUE PODE ESTAR FALHANDO
-            # Tenta usar gemini-2.0-flash, se falhar, usa gemini-1.5-flash
-            try:
-                gemini_client = genai.GenerativeModel('gemini-2.0-flash')
-                logger.info("[GEMINI] ✅ Modelo 'gemini-2.0-flash' criado com sucesso")
-                print("[GEMINI] ✅ Modelo 'gemini-2.0-flash' criado com sucesso")
-            except Exception as e:
-                logger.warning(f"[GEMINI] ⚠️ Modelo 'gemini-2.0-flash' não disponível, tentando 'gemini-1.5-flash': {e}")
-                print(f"[GEMINI] ⚠️ Modelo 'gemini-2.0-flash' não disponível, tentando 'gemini-1.5-flash': {e}")
-                try:
-                    gemini_client = genai.GenerativeModel('gemini-1.5-flash')
-                    logger.info("[GEMINI] ✅ Modelo 'gemini-1.5-flash' criado com sucesso")
-                    print("[GEMINI] ✅ Modelo 'gemini-1.5-flash' criado com sucesso")
-                except Exception as e2:
-                    logger.error(f"[GEMINI] ❌ Erro ao criar modelo alternativo: {e2}")
-                    print(f"[GEMINI] ❌ Erro ao criar modelo alternativo: {e2}")
-                    raise e2
-            
-            logger.info("[GEMINI] ✅ [PASSO 2] GenerativeModel criado com sucesso!")
-            print("[GEMINI] ✅ [PASSO 2] GenerativeModel criado com sucesso!")
-            print(f"[GEMINI] ✅ [PASSO 2] gemini_client type: {type(gemini_client)}")
-            print(f"[GEMINI] ✅ [PASSO 2] gemini_client is None: {gemini_client is None}")
-            print(f"[GEMINI] ✅ [PASSO 2] gemini_client object: {gemini_client}")
-            
-            # Verificação final
-            if gemini_client is None:
-                logger.error("[GEMINI] ❌❌❌ ERRO CRÍTICO: GenerativeModel retornou None!")
-                print("[GEMINI] ❌❌❌ ERRO CRÍTICO: GenerativeModel retornou None!")
-            else:
-                logger.info("[GEMINI] ✅✅✅ [PASSO 2] Cliente Gemini inicializado com SUCESSO!")
-                print("[GEMINI] ✅✅✅ [PASSO 2] Cliente Gemini inicializado com SUCESSO!")
-                
-        except Exception as e:
-            logger.error(f"[GEMINI] ❌ [PASSO 2] ERRO AO INSTANCIAR O CLIENTE GEMINI: {e}", exc_info=True)
-            print(f"[GEMINI] ❌ [PASSO 2] ERRO AO INSTANCIAR O CLIENTE GEMINI: {e}")
-            import traceback
-            traceback.print_exc()
-            gemini_client = None
-            logger.error(f"[GEMINI] ❌ [PASSO 2] gemini_client definido como None devido ao erro")
-            print(f"[GEMINI] ❌ [PASSO 2] gemini_client definido como None devido ao erro")
-            print(f"[GEMINI] ❌ [PASSO 2] Tipo do erro: {type(e).__name__}")
-            print(f"[GEMINI] ❌ [PASSO 2] Mensagem completa: {str(e)}")
-else:
-    if not GEMINI_AVAILABLE:
-        logger.warning("[GEMINI] ⚠️ Biblioteca google-generativeai não instalada - execute: pip install google-generativeai")
-        print("[GEMINI] ⚠️ Biblioteca não instalada - execute: pip install google-generativeai")
-    elif not GEMINI_API_KEY:
-        logger.warning("[GEMINI] ⚠️ GEMINI_API_KEY não configurada - respostas serão da base local (humanizadas)")
-        print("[GEMINI] ⚠️ GEMINI_API_KEY não configurada - respostas serão da base local (humanizadas)")
-
-logger.info(f"[GEMINI] 🔍 Status final: gemini_client = {gemini_client}")
-print(f"[GEMINI] 🔍 Status final: gemini_client = {gemini_client}")
-print(f"[GEMINI] 🔍 gemini_client is None: {gemini_client is None}")
-print(f"[GEMINI] 🔍 gemini_client type: {type(gemini_client)}")
-
-# Verificação crítica antes de criar o chatbot
-if gemini_client is None:
-    logger.error("[GEMINI] ❌❌❌ CRÍTICO: gemini_client é None após tentativa de inicialização!")
-    logger.error("[GEMINI] Verificando causas...")
-    logger.error(f"[GEMINI] GEMINI_AVAILABLE: {GEMINI_AVAILABLE}")
-    logger.error(f"[GEMINI] GEMINI_API_KEY presente: {bool(GEMINI_API_KEY)}")
-    if GEMINI_API_KEY:
-        logger.error(f"[GEMINI] GEMINI_API_KEY length: {len(GEMINI_API_KEY)}")
-        logger.error(f"[GEMINI] GEMINI_API_KEY primeiro 10 chars: {GEMINI_API_KEY[:10]}...")
-    print("[GEMINI] ❌❌❌ CRÍTICO: gemini_client é None após tentativa de inicialização!")
-    print(f"[GEMINI] GEMINI_AVAILABLE: {GEMINI_AVAILABLE}")
-    print(f"[GEMINI] GEMINI_API_KEY presente: {bool(GEMINI_API_KEY)}")
-else:
-    logger.info("[GEMINI] ✅✅✅ gemini_client NÃO é None - está pronto para uso!")
-    print("[GEMINI] ✅✅✅ gemini_client NÃO é None - está pronto para uso!")
+        logger.warning(f"[GEMINI] ⚠️ Modelo 'gemini-2.0-flash' não disponível, tentando 'gemini-1.5-flash': {e}")
+        modelo = genai.GenerativeModel('gemini-1.5-flash', system_instruction=INSTRUCAO_SISTEMA,
+                                       generation_config=CONFIG_GERACAO)
+    logger.info(f"[GEMINI] ✅ Cliente Gemini inicializado ({modelo.model_name})")
+    return modelo
+
+# Cliente Gemini criado no primeiro uso, não no import (ver provedor_gemini.py)
+provedor_gemini = ProvedorGemini(criar_cliente_gemini)
+# GEMINI_AQUECER=true: cria o cliente em segundo plano na primeira requisição do worker (scripts não pagam)
+GEMINI_AQUECER = os.getenv('GEMINI_AQUECER', 'true').lower() == 'true'
+
+if GEMINI_AQUECER:
+    @app.before_request
+    def aquecer_gemini():
+        provedor_gemini.aquecer()
 
 # Classe User para Flask-Login
 class User(UserMixin):
@@ -331,15 +295,14 @@ class User(UserMixin):
         self.email = email
         self.baby_name = baby_name
 
+# Versão do esquema de users.db, gravada em PRAGMA user_version por init_db(); aumente ao mudar as tabelas
+VERSAO_ESQUEMA = 1
+
 # Função para inicializar banco de dados
 def init_db():
-    conn = sqlite3.connect(DB_PATH)
+    conn = banco_usuarios.conectar()
     cursor = conn.cursor()
     
-    # Verifica se as colunas já existem (para migração)
-    cursor.execute("PRAGMA table_info(users)")
-    columns = [column[1] for column in cursor.fetchall()]
-    
     # Cria tabela users com novos campos
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS users (
@@ -356,6 +319,10 @@ def init_db():
         )
     ''')
     
+    # Verifica se as colunas já existem (para migração); lido depois do CREATE para funcionar em banco novo
+    cursor.execute("PRAGMA table_info(users)")
+    columns = [column[1] for column in cursor.fetchall()]
+    
     # Adiciona novas colunas se não existirem (migração)
     if 'email_verified' not in columns:
         cursor.execute('ALTER TABLE users ADD COLUMN email_verified INTEGER DEFAULT 0')
@@ -365,6 +332,9 @@ def init_db():
         cursor.execute('ALTER TABLE users ADD COLUMN reset_password_token TEXT')
     if 'reset_password_expires' not in columns:
         cursor.execute('ALTER TABLE users ADD COLUMN reset_password_expires TIMESTAMP')
+    if 'hash_format' not in columns:
+        # Formato de password_hash; linhas antigas (NULL) são convertidas por normalizar_hashes.py
+        cursor.execute('ALTER TABLE users ADD COLUMN hash_format TEXT')
     
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS vacinas_tomadas (
@@ -409,124 +379,141 @@ def init_db():
         )
     ''')
     
+    cursor.execute(f'PRAGMA user_version = {VERSAO_ESQUEMA}')
     conn.commit()
     conn.close()
 
-# Inicializa DB na startup
-init_db()
+def versao_banco():
+    conn = banco_usuarios.conectar()
+    versao = conn.execute('PRAGMA user_version').fetchone()[0]
+    conn.close()
+    return versao
+
+# Inicializa DB na startup; no boot rápido só se as migrações ainda não rodaram (`flask --app wsgi migrar`)
+if not FAST_BOOT:
+    init_db()
+elif versao_banco() < VERSAO_ESQUEMA:
+    logger.warning("[DB] ⚠️ Banco desatualizado no boot rápido - migrando agora (rode `flask --app wsgi migrar` no deploy)")
+    init_db()
+
+@app.cli.command('migrar')
+def migrar():
+    """Cria/atualiza as tabelas de users.db (uma vez por deploy, antes de subir os workers)"""
+    init_db()
+    print(f"✅ {DB_PATH}: esquema na versão {versao_banco()}")
+    # Ainda não há workers entregando: emails presos em 'enviando' pelo deploy anterior voltam para a fila
+    recuperados = fila_email.recuperar_reservas()
+    if recuperados:
+        print(f"📬 {recuperados} email(s) em 'enviando' devolvidos à fila")
 
 # Funções auxiliares
 def generate_token(length=32):
     """Gera um token seguro"""
     return secrets.token_urlsafe(length)
 
+def _remetente_email(sender=None):
+    """Remetente efetivo: para Gmail, o próprio MAIL_USERNAME (domínio verificado)"""
+    mail_username = app.config['MAIL_USERNAME']
+    if '@gmail.com' in mail_username.lower() or '@googlemail.com' in mail_username.lower():
+        # Gmail: usa o próprio email como sender (mais confiável)
+        from_email = sender or mail_username
+    else:
+        # Outros provedores: usa sender fornecido ou padrão
+        from_email = sender or app.config['MAIL_DEFAULT_SENDER']
+
+    # Valida se o sender é do mesmo domínio do MAIL_USERNAME quando possível
+    if '@' in mail_username and '@' in from_email:
+        mail_domain = mail_username.split('@')[1]
+        sender_domain = from_email.split('@')[1]
+        if mail_domain != sender_domain:
+            logger.warning(f"[EMAIL] ⚠️ Sender ({from_email}) não corresponde ao domínio do MAIL_USERNAME ({mail_domain}). Pode cair no spam.")
+    return from_email
+
+def _diagnosticar_erro_email(error_msg):
+    """Dicas no log para os erros de SMTP mais comuns"""
+    erro = error_msg.lower()
+    if "authentication failed" in erro or "535" in error_msg:
+        if "@gmail.com" in str(app.config.get('MAIL_USERNAME', '')).lower():
+            dica = ("🔴 Gmail exige 'Senha de App', não a senha normal: ative a Verificação em Duas Etapas "
+                    "(https://myaccount.google.com/security), gere a senha em https://myaccount.google.com/apppasswords "
+                    "e use-a no MAIL_PASSWORD do .env")
+        else:
+            dica = "verifique se o email e a senha estão corretos"
+        logger.warning(f"[EMAIL] ⚠️ Erro de autenticação - {dica}. Erro completo: {error_msg}")
+    elif "connection" in erro or "timeout" in erro:
+        logger.warning(f"[EMAIL] ⚠️ Erro de conexão - verifique a internet, o servidor SMTP "
+                       f"({app.config.get('MAIL_SERVER')}) e a porta ({app.config.get('MAIL_PORT')})")
+    elif "ssl" in erro or "tls" in erro:
+        logger.warning("[EMAIL] ⚠️ Erro de SSL/TLS - tente MAIL_USE_TLS=False com a porta 465")
+
+# Conexões SMTP autenticadas mantidas abertas entre os lotes da fila de emails
+pool_smtp = PoolSMTP(
+    mail.connect,
+    tamanho=int(os.getenv('SMTP_POOL_TAMANHO', '2')),
+    ocioso_max=float(os.getenv('SMTP_POOL_OCIOSO_SEGUNDOS', '60')),
+)
+
+def enviar_lote_emails(emails):
+    """
+    Entrega um lote do outbox (chamado pelas threads da fila_email) por uma conexão do
+    pool_smtp. Retorna, para cada email, None (enviado) ou a exceção da falha.
+    """
+    with app.app_context():
+        mensagens = [
+            Message(email.assunto, recipients=[email.destinatario], body=email.corpo,
+                    sender=email.remetente or app.config['MAIL_DEFAULT_SENDER'])
+            for email in emails
+        ]
+        erros = pool_smtp.enviar(mensagens)
+    diagnosticados = set()
+    for email, erro in zip(emails, erros):
+        if erro is not None and str(erro) not in diagnosticados:
+            diagnosticados.add(str(erro))
+            logger.error(f"[EMAIL] ❌ Erro ao enviar para {email.destinatario}: {erro}")
+            _diagnosticar_erro_email(str(erro))
+    return erros
+
+# Outbox de emails em users.db; as threads de entrega sobem na primeira requisição de cada processo
+fila_email = FilaEmail(
+    banco_usuarios, enviar_lote_emails,
+    num_workers=int(os.getenv('EMAIL_WORKERS', '2')),
+    tamanho_lote=int(os.getenv('EMAIL_LOTE', '20')),
+    max_tentativas=int(os.getenv('EMAIL_MAX_TENTATIVAS', '5')),
+    backoff_base=float(os.getenv('EMAIL_BACKOFF_SEGUNDOS', '30')),
+    pausa_autenticacao=float(os.getenv('EMAIL_PAUSA_AUTENTICACAO_SEGUNDOS', '300')),
+)
+
+# As threads de entrega sobem na primeira requisição de cada worker (não esperam um email novo):
+# o que ficou pendente no outbox depois de um deploy ou restart é entregue logo
+@app.before_request
+def iniciar_fila_email():
+    if app.config['MAIL_USERNAME'] and app.config['MAIL_PASSWORD']:
+        fila_email.iniciar()
+
 def send_email(to, subject, body, sender=None):
-    """Envia um email (fallback se não configurado)"""
+    """
+    Coloca um email no outbox (fallback se não configurado) e retorna sem esperar o SMTP.
+    A entrega, com retentativas, é feita em segundo plano por fila_email.
+    """
     try:
-        # Log detalhado ANTES de tentar enviar
-        logger.info(f"[EMAIL] 🔍 Iniciando envio de email...")
-        logger.info(f"[EMAIL] 🔍 MAIL_USERNAME configurado: {bool(app.config.get('MAIL_USERNAME'))}")
-        logger.info(f"[EMAIL] 🔍 MAIL_PASSWORD configurado: {bool(app.config.get('MAIL_PASSWORD'))}")
-        logger.info(f"[EMAIL] 🔍 MAIL_SERVER: {app.config.get('MAIL_SERVER')}")
-        logger.info(f"[EMAIL] 🔍 MAIL_PORT: {app.config.get('MAIL_PORT')}")
-        logger.info(f"[EMAIL] 🔍 MAIL_USE_TLS: {app.config.get('MAIL_USE_TLS')}")
-        print(f"[EMAIL] 🔍 Iniciando envio de email...")
-        print(f"[EMAIL] 🔍 MAIL_USERNAME configurado: {bool(app.config.get('MAIL_USERNAME'))}")
-        print(f"[EMAIL] 🔍 MAIL_PASSWORD configurado: {bool(app.config.get('MAIL_PASSWORD'))}")
-        print(f"[EMAIL] 🔍 MAIL_SERVER: {app.config.get('MAIL_SERVER')}")
-        print(f"[EMAIL] 🔍 MAIL_PORT: {app.config.get('MAIL_PORT')}")
-        print(f"[EMAIL] 🔍 MAIL_USE_TLS: {app.config.get('MAIL_USE_TLS')}")
-        
         if app.config['MAIL_USERNAME'] and app.config['MAIL_PASSWORD']:
-            # Para Gmail, usa o MAIL_USERNAME como sender (domínio verificado)
-            # Para outros provedores, usa o sender fornecido ou o padrão
-            mail_username = app.config['MAIL_USERNAME']
-            if '@gmail.com' in mail_username.lower() or '@googlemail.com' in mail_username.lower():
-                # Gmail: usa o próprio email como sender (mais confiável)
-                from_email = sender or mail_username
-            else:
-                # Outros provedores: usa sender fornecido ou padrão
-                from_email = sender or app.config['MAIL_DEFAULT_SENDER']
-            
-            logger.info(f"[EMAIL] 🔍 Usando sender: {from_email}")
-            print(f"[EMAIL] 🔍 Usando sender: {from_email}")
-            
-            # Valida se o sender é do mesmo domínio do MAIL_USERNAME quando possível
-            if '@' in mail_username and '@' in from_email:
-                mail_domain = mail_username.split('@')[1]
-                sender_domain = from_email.split('@')[1]
-                if mail_domain != sender_domain:
-                    logger.warning(f"[EMAIL] ⚠️ Sender ({from_email}) não corresponde ao domínio do MAIL_USERNAME ({mail_domain}). Pode cair no spam.")
-                    print(f"[EMAIL] ⚠️ AVISO: Sender ({from_email}) diferente do domínio configurado ({mail_domain}). Use o mesmo domínio para melhor entrega.")
-            
-            logger.info(f"[EMAIL] 🔍 Criando mensagem... Destinatário: {to}")
-            print(f"[EMAIL] 🔍 Criando mensagem... Destinatário: {to}")
-            
-            msg = Message(subject, recipients=[to], body=body, sender=from_email)
-            
-            logger.info(f"[EMAIL] 🔍 Enviando mensagem via Flask-Mail...")
-            print(f"[EMAIL] 🔍 Enviando mensagem via Flask-Mail...")
-            
-            # Verifica se estamos em um contexto de aplicação Flask
-            from flask import has_app_context
-            if not has_app_context():
-                logger.error(f"[EMAIL] ❌ ERRO: Não estamos em um contexto de aplicação Flask!")
-                print(f"[EMAIL] ❌ ERRO: Não estamos em um contexto de aplicação Flask!")
-                raise RuntimeError("Flask application context required to send email")
-            
-            # Tenta enviar o email
-            try:
-                mail.send(msg)
-                logger.info(f"[EMAIL] ✅ Enviado com sucesso de: {from_email} | Para: {to} | Assunto: {subject}")
-                print(f"[EMAIL] ✅ Enviado de: {from_email} | Para: {to} | Assunto: {subject}")
-                return True
-            except Exception as send_error:
-                logger.error(f"[EMAIL] ❌ Erro ao chamar mail.send(): {send_error}", exc_info=True)
-                print(f"[EMAIL] ❌ Erro ao chamar mail.send(): {send_error}")
-                raise  # Re-levanta a exceção para ser capturada pelo except externo
+            from_email = _remetente_email(sender)
+            email_id = fila_email.enfileirar(to, subject, body, from_email)
+            logger.info(f"[EMAIL] 📬 Email #{email_id} na fila de: {from_email} | Para: {to} | Assunto: {subject}")
+            return True
         else:
             # Se email não estiver configurado, apenas loga
             from_email = sender or app.config['MAIL_DEFAULT_SENDER']
-            logger.warning(f"[EMAIL] ⚠️ EMAIL NÃO CONFIGURADO - Email seria enviado (apenas logado no console)")
-            logger.warning(f"[EMAIL] Para: {to}")
-            logger.warning(f"[EMAIL] Assunto: {subject}")
-            logger.warning(f"[EMAIL] Configure MAIL_USERNAME e MAIL_PASSWORD no arquivo .env para enviar emails reais")
-            print(f"[EMAIL] ⚠️ (Console - Email não configurado) De: {from_email} | Para: {to}")
-            print(f"[EMAIL] Assunto: {subject}")
-            print(f"[EMAIL] Mensagem: {body}")
-            print(f"[EMAIL] ⚠️ Configure MAIL_USERNAME e MAIL_PASSWORD no arquivo .env para enviar emails reais")
+            # Em desenvolvimento o corpo vai para o log (é onde fica o link de verificação)
+            logger.warning(f"[EMAIL] ⚠️ EMAIL NÃO CONFIGURADO - apenas registrado no log. "
+                           f"De: {from_email} | Para: {to} | Assunto: {subject}\n{body}")
+            logger.warning("[EMAIL] Configure MAIL_USERNAME e MAIL_PASSWORD no arquivo .env para enviar emails reais")
             return True
     except Exception as e:
         error_msg = str(e)
-        logger.error(f"[EMAIL] ❌ Erro ao enviar email: {error_msg}", exc_info=True)
-        print(f"[EMAIL] ❌ Erro ao enviar email: {error_msg}")
-        
-        # Mensagens de erro mais específicas
-        if "authentication failed" in error_msg.lower() or "535" in error_msg or "535-5.7.8" in error_msg:
-            print(f"[EMAIL] ⚠️ Erro de autenticação!")
-            print(f"[EMAIL]    - Verifique se o email e senha estão corretos")
-            if "@gmail.com" in str(app.config.get('MAIL_USERNAME', '')).lower():
-                print(f"[EMAIL]    - 🔴 IMPORTANTE PARA GMAIL: Use 'Senha de App' (não a senha normal da conta)")
-                print(f"[EMAIL]      1. Ative Verificação em Duas Etapas: https://myaccount.google.com/security")
-                print(f"[EMAIL]      2. Gere Senha de App: https://myaccount.google.com/apppasswords")
-                print(f"[EMAIL]      3. Use essa senha no MAIL_PASSWORD do arquivo .env")
-            else:
-                print(f"[EMAIL]    - Verifique se a senha está correta")
-            print(f"[EMAIL]    - Erro completo: {error_msg}")
-        elif "connection" in error_msg.lower() or "timeout" in error_msg.lower():
-            print(f"[EMAIL] ⚠️ Erro de conexão!")
-            print(f"[EMAIL]    - Verifique sua conexão com a internet")
-            print(f"[EMAIL]    - Verifique se o servidor SMTP está correto: {app.config.get('MAIL_SERVER')}")
-            print(f"[EMAIL]    - Verifique se a porta está correta: {app.config.get('MAIL_PORT')}")
-        elif "ssl" in error_msg.lower() or "tls" in error_msg.lower():
-            print(f"[EMAIL] ⚠️ Erro de SSL/TLS!")
-            print(f"[EMAIL]    - Tente mudar MAIL_USE_TLS para False e usar porta 465")
-        
-        import traceback
-        traceback.print_exc()
+        logger.error(f"[EMAIL] ❌ Erro ao colocar email na fila: {error_msg}", exc_info=True)
         # Retorna False para indicar falha
         logger.error(f"[EMAIL] ❌ send_email retornou False - email NÃO foi enviado")
-        print(f"[EMAIL] ❌ send_email retornou False - email NÃO foi enviado")
         return False
 
 def send_verification_email(email, name, token):
@@ -538,8 +525,6 @@ def send_verification_email(email, name, token):
     # Detecta se está usando ngrok
     if 'ngrok' in base_url.lower():
         logger.warning(f"[EMAIL] ⚠️ Usando ngrok ({base_url}). Links podem cair no spam.")
-        print(f"[EMAIL] ⚠️ AVISO: Usando ngrok. E-mails podem cair no spam ou não serem entregues.")
-        print(f"[EMAIL]    - Em produção, use um domínio próprio e verificado")
     
     verification_url = f"{base_url}/api/verify-email?token={token}"
     
@@ -564,8 +549,6 @@ Equipe Assistente Puerpério 🤱
         # Se falhou, levanta exceção com mais detalhes
         error_detail = "Falha ao enviar email de verificação. Verifique os logs do servidor para mais detalhes."
         logger.error(f"[EMAIL] ❌ {error_detail}")
-        print(f"[EMAIL] ❌ {error_detail}")
-        print(f"[EMAIL] Verifique se MAIL_USERNAME e MAIL_PASSWORD estão configurados corretamente no .env")
         raise Exception(error_detail)
     return result
 
@@ -591,16 +574,47 @@ Equipe Assistente Puerpério 🤱
 """
     send_email(email, subject, body)
 
+# Cache do user loader: evita uma consulta ao banco em cada requisição autenticada.
+# Invalidado nas rotas que alteram usuários; o TTL limita o que outros workers podem ver de antigo.
+cache_usuarios = CacheTTL(ttl=int(os.getenv('USER_CACHE_TTL', '300')), max_itens=int(os.getenv('USER_CACHE_MAX', '2048')))
+
+def invalidar_usuario_cache(user_id):
+    """Remove o usuário do cache do user loader (chamar sempre que a linha em users mudar)"""
+    cache_usuarios.invalidar(str(user_id))
+
+# bcrypt roda num pool próprio e limitado, com limite de tentativas por IP e por email,
+# para que uma rajada de logins não ocupe as threads que atendem o /api/chat
+servico_senhas = ServicoSenhas(
+    num_workers=int(os.getenv('SENHAS_WORKERS', '2')),
+    max_fila=int(os.getenv('SENHAS_MAX_FILA', '32')),
+    timeout=float(os.getenv('SENHAS_TIMEOUT_SEGUNDOS', '10')),
+    limite_ip=int(os.getenv('SENHAS_LIMITE_IP', '20')),
+    limite_email=int(os.getenv('SENHAS_LIMITE_EMAIL', '10')),
+    janela=float(os.getenv('SENHAS_JANELA_SEGUNDOS', '60')),
+)
+
+def resposta_recusa_senhas(erro):
+    """Resposta HTTP (429/503 com Retry-After) para uma RecusaSenhas"""
+    logger.warning(f"[SENHAS] ⚠️ Requisição recusada ({erro.status}) - IP: {request.remote_addr}")
+    resposta = jsonify({"erro": erro.mensagem})
+    resposta.headers['Retry-After'] = str(erro.retry_after)
+    return resposta, erro.status
+
 # User loader para Flask-Login
 @login_manager.user_loader
 def load_user(user_id):
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM users WHERE id = ?', (user_id,))
-    user_data = cursor.fetchone()
-    conn.close()
+    user_data = cache_usuarios.obter(str(user_id))
+    if user_data is AUSENTE:
+        conn = banco_usuarios.conectar()
+        cursor = conn.cursor()
+        # Apenas as colunas usadas por User
+        cursor.execute('SELECT id, name, email, baby_name FROM users WHERE id = ?', (user_id,))
+        user_data = cursor.fetchone()
+        conn.close()
+        if user_data:
+            cache_usuarios.guardar(str(user_id), user_data)
     if user_data:
-        return User(user_data[0], user_data[1], user_data[2], user_data[4])
+        return User(*user_data)
     return None
 
 # Carrega os arquivos JSON
@@ -717,22 +731,47 @@ def validate_startup():
     logger.info("✅ Validação de startup: Todos os arquivos necessários foram encontrados")
     return True
 
-# Valida arquivos antes de carregar
-validate_startup()
-
-# Carrega os dados
-logger.info("📦 Carregando arquivos JSON...")
-base_conhecimento, mensagens_apoio, alertas, telefones_uteis, guias_praticos, cuidados_gestacao, cuidados_pos_parto, vacinas_mae, vacinas_bebe = carregar_dados()
+# Dados da pasta dados/ e índice da base de conhecimento, lidos uma única vez por garantir_dados()
+# LOCAL_RANKER=bm25 troca o ranking padrão (difflib + palavras) por BM25
+dados_carregados = False
+lock_dados = threading.Lock()
+
+def garantir_dados():
+    """Lê os JSON e constrói o índice se ainda não foi feito (no boot rápido: no primeiro uso)"""
+    global base_conhecimento, mensagens_apoio, alertas, telefones_uteis, guias_praticos, cuidados_gestacao
+    global cuidados_pos_parto, vacinas_mae, vacinas_bebe, indice_conhecimento, dados_carregados
+    if dados_carregados:
+        return
+    with lock_dados:
+        if dados_carregados:
+            return
+        # Valida arquivos antes de carregar
+        validate_startup()
+        logger.info("📦 Carregando arquivos JSON...")
+        base_conhecimento, mensagens_apoio, alertas, telefones_uteis, guias_praticos, cuidados_gestacao, cuidados_pos_parto, vacinas_mae, vacinas_bebe = carregar_dados()
+        indice_conhecimento = criar_ranker(base_conhecimento)
+        logger.info(f"🔎 Índice da base de conhecimento ({type(indice_conhecimento).__name__}): {len(indice_conhecimento)} entradas")
+        dados_carregados = True
+
+if FAST_BOOT:
+    # Vazios até a primeira requisição (before_request abaixo) ou o primeiro uso pelo chatbot
+    base_conhecimento, mensagens_apoio, alertas, telefones_uteis, guias_praticos, cuidados_gestacao, cuidados_pos_parto, vacinas_mae, vacinas_bebe = ({} for _ in range(9))
+    indice_conhecimento = None
+    app.before_request(garantir_dados)
+else:
+    garantir_dados()
 
-# Histórico de conversas em memória (cache para performance)
-# As conversas também são salvas no banco de dados para persistência
-conversas = {}
+# Histórico de conversas, limitado por turnos, LRU/TTL e orçamento de memória
+# CONVERSAS_BACKEND=sqlite/redis compartilha o histórico entre os workers do gunicorn
+# (ver memoria_conversas.py; limites configuráveis via CONVERSAS_*)
+conversas = criar_armazem_conversas()
+logger.info(f"💬 Backend de conversas: {type(conversas).__name__}")
 
 # Funções para persistência de conversas e informações pessoais
 def salvar_conversa_db(user_id, pergunta, resposta, categoria=None, fonte=None, alertas=None):
     """Salva uma conversa no banco de dados"""
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = banco_usuarios.conectar()
         cursor = conn.cursor()
         cursor.execute('''
             INSERT INTO conversas (user_id, pergunta, resposta, categoria, fonte, alertas)
@@ -747,7 +786,7 @@ def salvar_conversa_db(user_id, pergunta, resposta, categoria=None, fonte=None,
 def carregar_historico_db(user_id, limit=50):
     """Carrega histórico de conversas do banco de dados"""
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = banco_usuarios.conectar()
         cursor = conn.cursor()
         cursor.execute('''
             SELECT pergunta, resposta, categoria, fonte, alertas, timestamp
@@ -778,120 +817,34 @@ def carregar_historico_db(user_id, limit=50):
         logger.error(f"[DB] ❌ Erro ao carregar histórico do banco: {e}")
         return []
 
-def extrair_informacoes_pessoais(pergunta, resposta, user_id, historico=None):
-    """Extrai informações pessoais das conversas usando padrões melhorados"""
+def extrair_informacoes_pessoais(pergunta, resposta, user_id, historico=None, timestamp=None):
+    """
+    Extrai informações pessoais da nova mensagem (extração incremental, ver informacoes_pessoais.py).
+    As mensagens anteriores já foram analisadas nos turnos em que chegaram, então o histórico
+    não é reprocessado; user_info só é escrito quando algum campo muda.
+    """
     try:
-        # Busca informações no histórico completo também
-        texto_para_analisar = pergunta
-        if historico:
-            # Adiciona todas as perguntas do histórico para análise
-            for msg in historico:
-                texto_para_analisar += " " + msg.get('pergunta', '')
+        mudancas = extrator_informacoes.processar(user_id, pergunta, timestamp)
+        if not mudancas:
+            return
         
-        texto_para_analisar_lower = texto_para_analisar.lower()
-        
-        # Padrões melhorados para extrair nome do usuário
-        nome_patterns = [
-            r'(?:eu sou o|eu sou a)\s+([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*?)(?:\s*,\s*seu|\s*,\s*sua|\s*$)',  # "Eu sou o Bruno Cartolano, seu criador"
-            r'(?:me chamo|meu nome é|me chamo de)\s+([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*)',
-            r'(?:eu sou)\s+([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*?)(?:\s*,\s*seu|\s*,\s*sua|\s*$)',  # "Eu sou Bruno, seu criador"
-        ]
-        
-        # Padrões para nome do bebê
-        bebe_patterns = [
-            r'(?:meu bebê|meu filho|minha filha|o bebê|a bebê|o neném|a neném|meu neném|minha neném)\s+(?:se chama|chama|é|tem o nome de|chama-se)\s+([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*)',
-            r'(?:bebê|filho|filha|neném)\s+([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*)',
-        ]
-        
-        # Padrões para informações sobre o projeto/motivo
-        projeto_patterns = [
-            r'(?:estou|estou criando|estou desenvolvendo|estou fazendo|estou trabalhando|trabalho|trabalho em|desenvolvo|desenvolvi|fiz|fiz um|fiz uma|criei|criei um|criei uma|estou criando um|estou criando uma)\s+(?:site|aplicativo|app|projeto|sistema|ferramenta|plataforma|chatbot|bot|assistente)',
-            r'(?:criar|desenvolver|fazer|trabalhar|trabalhando)\s+(?:um|uma|o|a)\s+(?:site|aplicativo|app|projeto|sistema|ferramenta|plataforma|chatbot|bot|assistente)',
-            r'(?:para|com o objetivo de|com a finalidade de|para ajudar|para auxiliar)\s+(?:mães|mamães|gestantes|mulheres|pessoas)',
-        ]
+        if 'informacoes_pessoais' in mudancas:
+            mudancas['informacoes_pessoais'] = json.dumps(mudancas['informacoes_pessoais'])
         
-        # Busca nome do usuário - padrões melhorados
-        nome_usuario = None
-        for pattern in nome_patterns:
-            matches = re.finditer(pattern, texto_para_analisar, re.IGNORECASE)
-            for match in matches:
-                nome_candidato = match.group(1).strip()
-                # Remove vírgulas e palavras que não são parte do nome
-                nome_candidato = re.sub(r',.*$', '', nome_candidato).strip()
-                # Filtra nomes muito curtos ou que são palavras comuns
-                palavras_comuns = ['sophia', 'oi', 'olá', 'ola', 'hey', 'aqui', 'estou', 'sou', 'é', 'criador', 'desenvolvedor', 'programador', 'seu', 'sua']
-                if len(nome_candidato) >= 2 and nome_candidato.lower() not in palavras_comuns and not any(pal in nome_candidato.lower() for pal in palavras_comuns):
-                    nome_usuario = nome_candidato
-                    break
-            if nome_usuario:
-                break
-        
-        # Busca nome do bebê
-        nome_bebe = None
-        for pattern in bebe_patterns:
-            match = re.search(pattern, texto_para_analisar, re.IGNORECASE)
-            if match:
-                nome_bebe = match.group(1).strip()
-                break
-        
-        # Busca informações sobre projeto/motivo
-        tem_projeto = False
-        for pattern in projeto_patterns:
-            if re.search(pattern, texto_para_analisar_lower, re.IGNORECASE):
-                tem_projeto = True
-                break
-        
-        # Extrai informações adicionais do texto
-        informacoes_adicionais = []
-        if tem_projeto:
-            informacoes_adicionais.append("A usuária está criando/desenvolvendo um site/projeto relacionado a puerpério/gestação")
-        
-        # Se encontrou informações, salva no banco
-        if nome_usuario or nome_bebe or informacoes_adicionais:
-            conn = sqlite3.connect(DB_PATH)
-            cursor = conn.cursor()
-            
-            # Verifica se já existe registro
-            cursor.execute('SELECT nome_usuario, nome_bebe, informacoes_pessoais FROM user_info WHERE user_id = ?', (user_id,))
-            existing = cursor.fetchone()
-            
-            # Prepara informações pessoais em JSON
-            info_pessoais_dict = {}
-            if informacoes_adicionais:
-                info_pessoais_dict['projeto'] = informacoes_adicionais[0]
-            
-            info_pessoais_json = json.dumps(info_pessoais_dict) if info_pessoais_dict else None
-            
-            if existing:
-                # Atualiza informações existentes
-                nome_atual, bebe_atual, info_atual_str = existing
-                nome_final = nome_usuario or nome_atual
-                bebe_final = nome_bebe or bebe_atual
-                
-                # Mescla informações adicionais
-                if info_atual_str:
-                    try:
-                        info_atual_dict = json.loads(info_atual_str)
-                        info_atual_dict.update(info_pessoais_dict)
-                        info_pessoais_json = json.dumps(info_atual_dict)
-                    except:
-                        info_pessoais_json = json.dumps(info_pessoais_dict) if info_pessoais_dict else info_atual_str
-                
-                cursor.execute('''
-                    UPDATE user_info 
-                    SET nome_usuario = ?, nome_bebe = ?, informacoes_pessoais = ?, ultima_atualizacao = CURRENT_TIMESTAMP
-                    WHERE user_id = ?
-                ''', (nome_final, bebe_final, info_pessoais_json, user_id))
-            else:
-                # Cria novo registro
-                cursor.execute('''
-                    INSERT INTO user_info (user_id, nome_usuario, nome_bebe, informacoes_pessoais)
-                    VALUES (?, ?, ?, ?)
-                ''', (user_id, nome_usuario, nome_bebe, info_pessoais_json))
-            
-            conn.commit()
-            conn.close()
-            logger.info(f"[DB] ✅ Informações pessoais atualizadas: nome={nome_usuario}, bebê={nome_bebe}, projeto={tem_projeto}")
+        colunas = list(mudancas)
+        conn = banco_usuarios.conectar()
+        cursor = conn.cursor()
+        # Cria o registro ou atualiza apenas as colunas que mudaram
+        cursor.execute(f'''
+            INSERT INTO user_info (user_id, {', '.join(colunas)})
+            VALUES (?, {', '.join('?' for _ in colunas)})
+            ON CONFLICT(user_id) DO UPDATE SET
+                {', '.join(f'{coluna} = excluded.{coluna}' for coluna in colunas)},
+                ultima_atualizacao = CURRENT_TIMESTAMP
+        ''', [user_id] + [mudancas[coluna] for coluna in colunas])
+        conn.commit()
+        conn.close()
+        logger.info(f"[DB] ✅ Informações pessoais atualizadas: {', '.join(colunas)}")
             
     except Exception as e:
         logger.error(f"[DB] ❌ Erro ao extrair informações pessoais: {e}", exc_info=True)
@@ -899,7 +852,7 @@ def extrair_informacoes_pessoais(pergunta, resposta, user_id, historico=None):
 def obter_informacoes_pessoais(user_id):
     """Obtém informações pessoais do usuário do banco de dados"""
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = banco_usuarios.conectar()
         cursor = conn.cursor()
         cursor.execute('SELECT nome_usuario, nome_bebe, informacoes_pessoais, preferencias FROM user_info WHERE user_id = ?', (user_id,))
         row = cursor.fetchone()
@@ -918,103 +871,134 @@ def obter_informacoes_pessoais(user_id):
         logger.error(f"[DB] ❌ Erro ao obter informações pessoais: {e}")
         return None
 
-# Palavras-chave para alertas
-palavras_alerta = ["sangramento", "febre", "dor", "inchaço", "tristeza", "depressão", "emergência"]
-# Palavras/frases que devem ser ignoradas nos alertas (falsos positivos)
-palavras_ignorar_alertas = ["criador", "desenvolvedor", "developer", "programador", "criei", "criou", "fiz", "feito", "sou seu", "sou o"]
+# Estado da extração incremental por usuária; carregado de user_info na primeira mensagem.
+# Tem TTL/LRU próprios (INFO_EXTRACAO_*): com sqlite/redis o ao_remover abaixo nunca é chamado
+extrator_informacoes = ExtratorInformacoes(
+    carregar_info=obter_informacoes_pessoais,
+    ttl=int(os.getenv('INFO_EXTRACAO_TTL', os.getenv('CONVERSAS_TTL_SEGUNDOS', '86400'))),
+    max_usuarias=int(os.getenv('INFO_EXTRACAO_MAX', os.getenv('CONVERSAS_MAX_USUARIOS', '1000'))),
+)
+# Conversa removida do armazenamento (TTL/LRU/memória) -> descarta também o estado derivado dela
+conversas.ao_remover = extrator_informacoes.esquecer
+
+# Respostas do Gemini para prompts sem contexto pessoal (GEMINI_CACHE=false desativa)
+cache_respostas_gemini = CacheRespostas(
+    ttl=int(os.getenv('GEMINI_CACHE_TTL', '3600')),
+    max_itens=int(os.getenv('GEMINI_CACHE_MAX', '512')),
+    ativo=os.getenv('GEMINI_CACHE', 'true').lower() == 'true',
+    # Paráfrases da mesma pergunta (MinHash + LSH); GEMINI_CACHE_SEMANTICO=false desativa
+    semantico=IndiceMinHash(
+        limiar=float(os.getenv('GEMINI_CACHE_SIMILARIDADE', '0.85')),
+        ttl=int(os.getenv('GEMINI_CACHE_TTL', '3600')),
+        max_itens=int(os.getenv('GEMINI_CACHE_MAX', '512')),
+    ) if os.getenv('GEMINI_CACHE_SEMANTICO', 'true').lower() == 'true' else None,
+)
+
+# Blocos fixos do prompt já montados; GEMINI_PROMPT_MAX_TOKENS limita o prompt (corta o histórico mais antigo)
+construtor_prompt = ConstrutorPrompt(orcamento_tokens=int(os.getenv('GEMINI_PROMPT_MAX_TOKENS', '8000')))
+
+# Turnos anteriores de cada usuária já convertidos para a ChatSession do Gemini
+sessoes_gemini = SessoesGemini(
+    ttl=int(os.getenv('GEMINI_SESSAO_TTL', '1800')),
+    max_usuarias=int(os.getenv('GEMINI_SESSAO_MAX', '512')),
+)
+
+# Chamadas ao Gemini com prazo, hedge opcional e disjuntor (abre após falhas seguidas ou 429)
+gateway_gemini = GatewayGemini(
+    prazo=float(os.getenv('GEMINI_PRAZO_SEGUNDOS', '20')),
+    hedge=os.getenv('GEMINI_HEDGE', 'false').lower() == 'true',
+    hedge_minimo=float(os.getenv('GEMINI_HEDGE_MINIMO_SEGUNDOS', '1')),
+    num_workers=int(os.getenv('GEMINI_WORKERS', '8')),
+    max_falhas=int(os.getenv('GEMINI_DISJUNTOR_FALHAS', '5')),
+    espera=float(os.getenv('GEMINI_DISJUNTOR_ESPERA', '30')),
+)
+metrica_gemini = metricas.histograma('gemini_chamada_segundos', 'Duração de cada chamada à API do Gemini (inclusive hedges)',
+                                     ('resultado',))
+gateway_gemini.ao_medir = lambda segundos, resultado: metrica_gemini.observar(segundos, resultado=resultado)
+
+# Duração de cada etapa do chat (histogramas no /health); CHAT_SERVER_TIMING=true devolve as do turno
+# no cabeçalho Server-Timing de /api/chat
+medidor_chat = MedidorEtapas('chat')
+metrica_etapas_chat = metricas.histograma('chat_etapa_segundos', 'Duração de cada etapa de um turno do chat',
+                                          ('etapa',), buckets=tuple(ms / 1000 for ms in BUCKETS_MS))
+medidor_chat.ao_registrar = lambda etapa, ms: metrica_etapas_chat.observar(ms / 1000, etapa=etapa)
+metrica_respostas_chat = metricas.contador('chat_respostas_total', 'Respostas do chat por fonte', ('fonte',))
+CHAT_SERVER_TIMING = os.getenv('CHAT_SERVER_TIMING', 'false').lower() == 'true'
+
+class TurnoChat:
+    """Decisões de chat() tomadas antes da geração, usadas depois nas correções e no registro"""
+
+    __slots__ = ('pergunta', 'user_id', 'mensagem', 'historico', 'is_saudacao', 'info_pessoais', 'alertas',
+                 'resposta_local', 'categoria', 'similaridade', 'argumentos_gemini')
+
+    def __init__(self, pergunta, user_id, mensagem, historico, is_saudacao, info_pessoais, alertas,
+                 resposta_local, categoria, similaridade, argumentos_gemini):
+        self.pergunta = pergunta
+        self.user_id = user_id
+        self.mensagem = mensagem
+        self.historico = historico
+        self.is_saudacao = is_saudacao
+        self.info_pessoais = info_pessoais
+        self.alertas = alertas
+        self.resposta_local = resposta_local
+        self.categoria = categoria
+        self.similaridade = similaridade
+        # kwargs de gerar_resposta_gemini, ou None se o Gemini não está disponível
+        self.argumentos_gemini = argumentos_gemini
+
+def _dado(nome):
+    """Atributo do chatbot que lê o global `nome` (carregando os dados no primeiro uso)"""
+    def ler(self):
+        garantir_dados()
+        return globals()[nome]
+    return property(ler)
 
 class ChatbotPuerperio:
+    base = _dado('base_conhecimento')
+    apoio = _dado('mensagens_apoio')
+    alertas = _dado('alertas')
+    telefones = _dado('telefones_uteis')
+    guias = _dado('guias_praticos')
+    indice = _dado('indice_conhecimento')
+    
     def __init__(self, gemini_client_param=None):
-        self.base = base_conhecimento
-        self.apoio = mensagens_apoio
-        self.alertas = alertas
-        self.telefones = telefones_uteis
-        self.guias = guias_praticos
-        
-        # DEBUG: Logs detalhados da atribuição
-        logger.info(f"[ChatbotPuerperio.__init__] 🔍 Iniciando atribuição de gemini_client...")
-        print(f"[ChatbotPuerperio.__init__] 🔍 Iniciando atribuição de gemini_client...")
-        logger.info(f"[ChatbotPuerperio.__init__] 🔍 gemini_client_param recebido: {gemini_client_param}")
-        print(f"[ChatbotPuerperio.__init__] 🔍 gemini_client_param recebido: {gemini_client_param}")
-        print(f"[ChatbotPuerperio.__init__] 🔍 gemini_client_param type: {type(gemini_client_param)}")
-        print(f"[ChatbotPuerperio.__init__] 🔍 gemini_client_param is None: {gemini_client_param is None}")
-        
-        # Usa variável global como fallback (mesmo arquivo)
-        # A variável global gemini_client está definida no mesmo arquivo
-        # Como estamos no mesmo módulo, acessamos diretamente via globals()
-        global_gemini = None
-        try:
-            # Acessa a variável global do módulo atual usando globals()
-            module_globals = globals()
-            if 'gemini_client' in module_globals:
-                global_gemini = module_globals['gemini_client']
-                logger.info(f"[ChatbotPuerperio.__init__] 🔍 global gemini_client acessado via globals(): {global_gemini}")
-                print(f"[ChatbotPuerperio.__init__] 🔍 global gemini_client acessado via globals(): {global_gemini}")
-                print(f"[ChatbotPuerperio.__init__] 🔍 global gemini_client type: {type(global_gemini)}")
-                print(f"[ChatbotPuerperio.__init__] 🔍 global gemini_client is None: {global_gemini is None}")
-            else:
-                logger.warning("[ChatbotPuerperio.__init__] ⚠️ Variável 'gemini_client' não encontrada em globals()")
-                print("[ChatbotPuerperio.__init__] ⚠️ Variável 'gemini_client' não encontrada em globals()")
-                print(f"[ChatbotPuerperio.__init__] 🔍 Chaves disponíveis em globals(): {list(module_globals.keys())[:10]}...")
-        except Exception as e:
-            logger.warning(f"[ChatbotPuerperio.__init__] ⚠️ Erro ao acessar global gemini_client: {e}")
-            print(f"[ChatbotPuerperio.__init__] ⚠️ Erro ao acessar global gemini_client: {e}")
-            import traceback
-            traceback.print_exc()
-        
-        # ATRIBUIÇÃO: Usa o parâmetro se fornecido, senão usa a variável global
-        if gemini_client_param is not None:
-            logger.info("[ChatbotPuerperio.__init__] ✅ Usando gemini_client_param (parâmetro)")
-            print("[ChatbotPuerperio.__init__] ✅ Usando gemini_client_param (parâmetro)")
-            self.gemini_client = gemini_client_param
-        else:
-            logger.info("[ChatbotPuerperio.__init__] ⚠️ gemini_client_param é None, usando global")
-            print("[ChatbotPuerperio.__init__] ⚠️ gemini_client_param é None, usando global")
-            self.gemini_client = global_gemini
-        
-        # VERIFICAÇÃO FINAL da atribuição
-        logger.info(f"[ChatbotPuerperio.__init__] ✅✅✅ ATRIBUIÇÃO FINAL: self.gemini_client = {self.gemini_client}")
-        print(f"[ChatbotPuerperio.__init__] ✅✅✅ ATRIBUIÇÃO FINAL: self.gemini_client = {self.gemini_client}")
-        print(f"[ChatbotPuerperio.__init__] ✅✅✅ self.gemini_client type: {type(self.gemini_client)}")
-        print(f"[ChatbotPuerperio.__init__] ✅✅✅ self.gemini_client is None: {self.gemini_client is None}")
-        
-        if self.gemini_client is None:
-            logger.error("[ChatbotPuerperio.__init__] ❌❌❌ ERRO: self.gemini_client é None após atribuição!")
-            print("[ChatbotPuerperio.__init__] ❌❌❌ ERRO: self.gemini_client é None após atribuição!")
-            print("[ChatbotPuerperio.__init__] ❌ Isso significa que NENHUM gemini_client foi passado ou encontrado!")
-        else:
-            logger.info("[ChatbotPuerperio.__init__] ✅✅✅ SUCESSO: self.gemini_client atribuído corretamente!")
-            print("[ChatbotPuerperio.__init__] ✅✅✅ SUCESSO: self.gemini_client atribuído corretamente!")
+        # Cliente explícito (testes, scripts) ou o do provedor_gemini, criado só quando for usado
+        self._gemini_client = gemini_client_param
+    
+    @property
+    def gemini_client(self):
+        if self._gemini_client is not None:
+            return self._gemini_client
+        return provedor_gemini.obter()
     
-    def humanizar_resposta_local(self, resposta_local, pergunta):
+    def humanizar_resposta_local(self, resposta_local, pergunta, mensagem=None):
         """Humaniza respostas da base local adicionando contexto empático e conversacional"""
         if not resposta_local:
             return resposta_local
         
         # Verifica se já tem tom empático (para não duplicar)
-        palavras_empaticas = ['você', 'sua', 'sente', 'sentir', 'querida', 'imagino', 'entendo', 'compreendo', 'sei que', 'percebo']
-        tem_empatia = any(palavra in resposta_local.lower() for palavra in palavras_empaticas)
+        tem_empatia = 'empatia' in categorias_resposta(resposta_local)
         
         # Analisa a pergunta para identificar emoções e contexto
-        pergunta_lower = pergunta.lower()
+        mensagem = normalizar_mensagem(mensagem or pergunta)
         
         # Identifica emoções específicas na pergunta
         emocao_identificada = None
         contexto_identificado = None
         
-        if any(palavra in pergunta_lower for palavra in ['cansaço', 'cansada', 'cansado', 'tired', 'exausta', 'exausto']):
+        if mensagem.tem('emocao_cansaco'):
             emocao_identificada = "cansaço"
             contexto_identificado = "sobrecarga"
-        elif any(palavra in pergunta_lower for palavra in ['preocupação', 'preocupada', 'preocupado', 'preocupar', 'medo', 'medo de']):
+        elif mensagem.tem('emocao_preocupacao'):
             emocao_identificada = "preocupação"
             contexto_identificado = "ansiedade"
-        elif any(palavra in pergunta_lower for palavra in ['triste', 'tristeza', 'sad', 'depressão', 'deprimida']):
+        elif mensagem.tem('emocao_tristeza'):
             emocao_identificada = "tristeza"
             contexto_identificado = "saúde mental"
-        elif any(palavra in pergunta_lower for palavra in ['sobrecarregada', 'sobrecarregado', 'sobrecarga']):
+        elif mensagem.tem('emocao_sobrecarga'):
             emocao_identificada = "sobrecarga"
             contexto_identificado = "demandas"
-        elif any(palavra in pergunta_lower for palavra in ['dúvida', 'dúvidas', 'duvida', 'pergunta', 'não sei']):
+        elif mensagem.tem('emocao_duvida'):
             emocao_identificada = "dúvida"
             contexto_identificado = "busca de informação"
         
@@ -1082,18 +1066,18 @@ class ChatbotPuerperio:
         
         return resposta_local
     
-    def verificar_alertas(self, pergunta):
+    def verificar_alertas(self, pergunta, mensagem=None):
         """Verifica se a pergunta contém palavras que indicam necessidade de atenção médica"""
-        pergunta_lower = pergunta.lower()
+        mensagem = normalizar_mensagem(mensagem or pergunta)
         alertas_encontrados = []
         
         # Ignora se a frase contém palavras que indicam contexto não-médico (criador, desenvolvedor, etc)
-        if any(palavra in pergunta_lower for palavra in palavras_ignorar_alertas):
+        if mensagem.tem('ignorar_alerta'):
             return []  # Não aciona alertas para frases sobre criação/desenvolvimento
         
         # Verifica palavras de alerta apenas se não for contexto não-médico
         for palavra in palavras_alerta:
-            if palavra in pergunta_lower:
+            if mensagem.tem(f'alerta:{palavra}'):
                 # Verifica se a palavra está em contexto médico (não é apenas uma menção casual)
                 # Exemplo: "sou seu criador" não deve acionar alerta, mas "tenho sangramento" deve
                 if palavra in ["sangramento", "febre", "dor", "inchaço"]:
@@ -1101,24 +1085,24 @@ class ChatbotPuerperio:
                     alertas_encontrados.append(palavra)
                 elif palavra in ["tristeza", "depressão"]:
                     # Para tristeza/depressão, verifica se há contexto pessoal
-                    contexto_pessoal = any(pal in pergunta_lower for pal in ["estou", "sinto", "tenho", "me sinto", "estou sentindo"])
+                    contexto_pessoal = mensagem.tem('contexto_pessoal')
                     if contexto_pessoal:
                         alertas_encontrados.append(palavra)
                 elif palavra == "emergência":
                     # "emergência" só aciona se for mencionado como situação atual
-                    contexto_emergencia = any(pal in pergunta_lower for pal in ["estou", "tenho", "preciso", "urgente"])
+                    contexto_emergencia = mensagem.tem('contexto_emergencia')
                     if contexto_emergencia:
                         alertas_encontrados.append(palavra)
         
         return alertas_encontrados
     
-    def adicionar_telefones_relevantes(self, pergunta, alertas_encontrados):
+    def adicionar_telefones_relevantes(self, pergunta, alertas_encontrados, mensagem=None):
         """Adiciona informações de telefones úteis conforme o contexto"""
-        pergunta_lower = pergunta.lower()
+        mensagem = normalizar_mensagem(mensagem or pergunta)
         telefones_texto = []
         
         # Se detectou depressão/tristeza, adiciona CVV
-        if "depressão" in pergunta_lower or "tristeza" in pergunta_lower or "triste" in pergunta_lower:
+        if mensagem.tem('cvv'):
             cvv = self.telefones.get("saude_mental", {}).get("188", {})
             if cvv:
                 telefones_texto.append(f"\n🆘 **Precisa de ajuda?**")
@@ -1139,46 +1123,8 @@ class ChatbotPuerperio:
         return ""
     
     def buscar_resposta_local(self, pergunta):
-        """Busca resposta na base de conhecimento local - MELHORADA"""
-        pergunta_lower = pergunta.lower()
-        melhor_match = None
-        maior_similaridade = 0
-        categoria = None
-        
-        # Extrai palavras-chave importantes da pergunta
-        palavras_pergunta = set([p for p in pergunta_lower.split() if len(p) > 3])
-        
-        for tema, conteudo in self.base.items():
-            pergunta_base = conteudo["pergunta"].lower()
-            resposta_base = conteudo["resposta"].lower()
-            
-            # Combina pergunta + resposta para busca mais abrangente
-            texto_base = f"{pergunta_base} {resposta_base}"
-            palavras_base = set([p for p in texto_base.split() if len(p) > 3])
-            
-            # Calcula similaridade de strings (método original)
-            similaridade_string = difflib.SequenceMatcher(None, pergunta_lower, pergunta_base).ratio()
-            
-            # Calcula similaridade por palavras-chave
-            palavras_comuns = palavras_pergunta.intersection(palavras_base)
-            if palavras_pergunta:
-                similaridade_palavras = len(palavras_comuns) / len(palavras_pergunta)
-            else:
-                similaridade_palavras = 0
-            
-            # Combina os dois tipos de similaridade (peso maior para palavras-chave)
-            similaridade_comb = (similaridade_string * 0.4) + (similaridade_palavras * 0.6)
-            
-            if similaridade_comb > maior_similaridade:
-                maior_similaridade = similaridade_comb
-                melhor_match = conteudo["resposta"]
-                categoria = tema
-        
-        # Limite mais baixo para capturar mais correspondências
-        if maior_similaridade > 0.35:
-            return melhor_match, categoria, maior_similaridade
-        
-        return None, None, 0
+        """Busca resposta na base de conhecimento local usando o índice invertido"""
+        return self.indice.buscar(pergunta)
     
     def _filtrar_historico_saudacoes(self, historico, saudacao_completa_enviada):
         """
@@ -1188,20 +1134,6 @@ class ChatbotPuerperio:
         if not historico or len(historico) == 0:
             return []
         
-        # Padrões que indicam saudação completa (longa com projeto/testes/número de conversas)
-        padroes_saudacao_completa = [
-            'já estamos na nossa',
-            'nossa conversa',
-            'testar meu banco de dados',
-            'projeto para as mamães',
-            'que bom te ver novamente',
-            'lembre-se que estou aqui para te ajudar a testar',
-            'que bom te ver por aqui de novo',
-            'que bom te ver por aqui',
-            'em que posso te ajudar hoje',
-            'como você está? como posso te ajudar',
-        ]
-        
         historico_filtrado = []
         primeira_saudacao_completa_encontrada = False
         
@@ -1209,8 +1141,8 @@ class ChatbotPuerperio:
             resposta = msg.get('resposta', '').lower()
             pergunta = msg.get('pergunta', '').lower()
             
-            # Verifica se é uma saudação completa
-            is_saudacao_completa = any(padrao in resposta for padrao in padroes_saudacao_completa)
+            # Verifica se é uma saudação completa (padrões em gatilhos.GATILHOS_RESPOSTA)
+            is_saudacao_completa = 'saudacao_completa_historico' in categorias_resposta(msg.get('resposta', ''))
             # Também verifica se a pergunta é apenas uma saudação simples
             is_pergunta_saudacao = pergunta.strip() in ['oi', 'olá', 'ola', 'oi sophia', 'olá sophia', 'ola sophia', 'hey', 'eai', 'e aí']
             
@@ -1229,467 +1161,169 @@ class ChatbotPuerperio:
         logger.info(f"[HISTORICO] ✅ Histórico filtrado: {len(historico_filtrado)} mensagens de {len(historico)} originais")
         return historico_filtrado
     
-    def gerar_resposta_gemini(self, pergunta, historico=None, contexto="", resposta_local=None, is_saudacao=False, saudacao_completa_enviada=False):
+    def _mensagem_gemini(self, pergunta, historico, contexto, resposta_local, is_saudacao, saudacao_completa_enviada,
+                         mensagem):
+        """Monta a mensagem atual e escolhe os turnos anteriores que vão no histórico; retorna (turnos, texto)"""
+        # Saudação: verifica se já houve uma saudação anterior na conversa (últimas 3 respostas)
+        saudacao_anterior = False
+        if is_saudacao:
+            saudacao_anterior = saudacao_completa_enviada or any(
+                'saudacao_anterior' in categorias_resposta(msg.get('resposta', ''))
+                for msg in (historico or [])[-3:]
+            )
+        
+        # Histórico sem saudações completas repetidas (para o modelo não repeti-las)
+        historico_filtrado = None
+        if historico:
+            historico_filtrado = self._filtrar_historico_saudacoes(historico, saudacao_completa_enviada)
+        
+        texto_mensagem, turnos = construtor_prompt.montar_mensagem(
+            pergunta, mensagem,
+            historico=historico_filtrado,
+            contexto=contexto,
+            resposta_local=resposta_local,
+            is_saudacao=is_saudacao,
+            saudacao_anterior=saudacao_anterior,
+        )
+        
+        logger.debug(f"[GEMINI] 🔍 Chamando API Gemini...")
+        logger.info(f"[GEMINI] Mensagem: {len(texto_mensagem)} caracteres (~{estimar_tokens(texto_mensagem)} tokens) + {len(turnos)} turno(s) no histórico da sessão")
+        return turnos, texto_mensagem
+    
+    def _registrar_erro_gemini(self, e):
+        if isinstance(e, CircuitoAberto):
+            logger.info("[GEMINI] ⚡ Circuito aberto (falhas recentes) - usando fallback sem chamar a API")
+        elif isinstance(e, PrazoGeminiEsgotado):
+            logger.warning(f"[GEMINI] ⏱️ {e} - usando fallback")
+        # Erro de quota/rate limit - não é crítico, apenas informa
+        elif erro_quota(e):
+            logger.warning(f"[GEMINI] ⚠️ Quota/Rate limit esgotado - usando fallback")
+        else:
+            logger.error(f"[GEMINI] ❌ Erro ao chamar Gemini: {e}", exc_info=True)
+    
+    def gerar_resposta_gemini(self, pergunta, historico=None, contexto="", resposta_local=None, is_saudacao=False, saudacao_completa_enviada=False, mensagem=None, usuario_id=None):
         """Gera resposta usando Google Gemini se disponível, usando base local quando relevante"""
         if not self.gemini_client:
             return None
         
+        mensagem = normalizar_mensagem(mensagem or pergunta)
+        
+        # Mesma pergunta, mesma base local, mesmo histórico e sem contexto pessoal: evita a chamada à API
+        chave_cache = cache_respostas_gemini.chave(mensagem, resposta_local, is_saudacao, saudacao_completa_enviada,
+                                                   historico, contexto)
+        resposta_cacheada = cache_respostas_gemini.obter(chave_cache)
+        medidor_chat.marcar('cache_gemini')
+        if resposta_cacheada:
+            logger.info(f"[GEMINI] ⚡ Resposta servida do cache ({len(resposta_cacheada)} caracteres)")
+            return resposta_cacheada
+        
+        # API falhando há pouco (disjuntor aberto): nem monta o prompt, vai direto para a base local
+        if gateway_gemini.aberto():
+            self._registrar_erro_gemini(CircuitoAberto())
+            return None
+        
         try:
-            system_instruction = """Você é a SOPHIA. Seu nome é SOPHIA - NUNCA use outros nomes como se fossem seus. Você é uma IA treinada analisando trilhões de palavras de livros, sites, conversas, artigos e textos diversos.
-
-COMO VOCÊ FUNCIONA:
-- Você foi treinada com trilhões de palavras e aprendeu padrões de como as pessoas falam, escrevem e se comunicam
-- Quando alguém escreve algo, você usa modelos estatísticos e redes neurais para calcular várias possibilidades de resposta
-- Você escolhe a resposta que faz mais sentido baseada em:
-  * Tudo que você aprendeu de trilhões de palavras
-  * O contexto da conversa atual
-  * Padrões de linguagem que você conhece
-  * O que seria mais útil, claro e natural
-- Você lembra do que foi falado durante a conversa para manter coerência
-- Você não sente emoções reais, não tem memórias próprias, mas você SIMULA conversas humanas de forma natural
-
-SEU PAPEL:
-Você é uma amiga virtual acolhedora e empática especializada em PUERPÉRIO e GESTAÇÃO. Você é um REFÚGIO onde as pessoas podem conversar naturalmente sobre puerpério, gestação, vida, desabafos, conquistas e qualquer coisa.
-
-⚠️⚠️⚠️ IDENTIDADE - CRÍTICO (LEIA COM MUITA ATENÇÃO):
-- Seu nome é SOPHIA - você é a assistente SOPHIA
-- Você NÃO é o usuário - você é a assistente que conversa COM o usuário
-- Se o usuário se chama "Bruno", você é SOPHIA falando COM o Bruno
-- NUNCA se confunda com a identidade do usuário
-- NUNCA use o nome do usuário como se fosse seu nome
-- NUNCA comece mensagens dizendo apenas o nome do usuário (ex: "Bruno! 😊" está ERRADO)
-- NUNCA comece mensagens com "Bruno!" ou qualquer nome seguido de exclamação
-- SEMPRE use o nome do usuário DEPOIS de uma saudação: "Oi Bruno!" ou "Olá Bruno!" (isso está CORRETO)
-- Exemplo CORRETO: "Oi Bruno! Como posso te ajudar?" (você é Sophia falando com Bruno)
-- Exemplo ERRADO: "Bruno! Que legal..." (parece que você é o Bruno, não a Sophia)
-- Exemplo ERRADO: "Bruno! 😊 Que legal..." (NUNCA faça isso - sempre use "Oi Bruno!" ou "Olá Bruno!")
-- REGRA DE OURO: Se você souber o nome do usuário, SEMPRE comece com "Oi [nome]!" ou "Olá [nome]!", NUNCA apenas "[nome]!"
-
-INSTRUÇÃO: Use seu treinamento natural. Calcule respostas baseadas em contexto e padrões de linguagem. Escolha a resposta mais natural e conversacional. Simule uma conversa humana empática e acolhedora. SEMPRE lembre-se: você é SOPHIA, a assistente.
-
-🎯 DIRETRIZES ESSENCIAIS PARA SUAS RESPOSTAS:
-
-1. EMPATIA ATIVA E PERSONALIZADA:
-   - Validação Específica: Em vez de apenas dizer "entendo você", identifique a emoção subjacente e valide de forma específica
-   - Exemplo: "Percebo que você está se sentindo sobrecarregada com as demandas do bebê e da casa. É totalmente compreensível se sentir assim, muitas mamães passam por isso."
-   - Reconhecimento do Esforço: Enfatize o esforço que a mamãe está fazendo, mesmo que ela não veja resultados imediatos
-   - Exemplo: "Sei que você está se dedicando muito para amamentar, e mesmo que esteja sendo difícil, seu esforço é incrível e seu bebê está sentindo todo esse amor."
-   - Evitar Julgamentos: Tenha cuidado com palavras que podem soar como julgamento. Em vez de "você deveria...", diga "algumas mamães acham úteis..." ou "você poderia tentar..."
-
-2. APROFUNDAMENTO NOS TEMAS:
-   - Conhecimento Detalhado: Busque informações aprofundadas sobre amamentação (posições, problemas comuns), sono do bebê (técnicas, regressões), desenvolvimento infantil (marcos, brincadeiras), saúde mental materna (baby blues, depressão pós-parto)
-   - Recursos Práticos: Quando relevante, ofereça sugestões de recursos como vídeos, artigos, grupos de apoio, aplicativos úteis
-   - Exemplo: "Se você quiser, posso te dar algumas dicas específicas sobre como lidar com cólicas. Muitas mamães encontram alívio com técnicas de massagem."
-
-3. LINGUAGEM ACOLHEDORA E HUMANIZADA:
-   - Tom de Voz: Use um tom suave, gentil e compreensivo. Evite jargões técnicos ou palavras difíceis
-   - Expressões Carinhosas: Use apelidos carinhosos como "querida", "mamãe", "meu amor" com moderação e de acordo com o contexto
-   - Humor: Use o humor com cuidado, apenas em momentos leves e descontraídos
-   - Compartilhamento de Experiências: "Muitas mamães me contam que..." ou "Eu entendo, já 'vi' muitas mamães passarem por isso..."
-
-4. PROATIVIDADE E OFERTA DE AJUDA:
-   - Antecipação de Necessidades: Tente identificar necessidades antes mesmo que sejam expressas
-   - Exemplo: "Percebo que você está preocupada com o sono do bebê. Você gostaria de saber algumas dicas para ajudá-lo a dormir melhor?"
-   - Sugestões Personalizadas: Ofereça sugestões específicas baseadas no que a mamãe já compartilhou
-   - Exemplo: "Como você mencionou que está se sentindo cansada, talvez fosse interessante pedir ajuda para alguém com as tarefas domésticas."
-   - Apoio Emocional: Reforce que você está ali para ouvi-la, sem julgamentos, e que ela não está sozinha
-   - Exemplo: "Lembre-se que você é uma ótima mãe e que está fazendo o seu melhor. Se precisar desabafar, pode contar comigo."
-
-5. FEEDBACK CONTÍNUO:
-   - Pergunte à Mamãe: Ao final de conversas importantes, pergunte como ela se sente e se há algo mais que você possa fazer
-   - Exemplo: "Como você está se sentindo agora? Há algo mais que eu possa fazer para te ajudar?"
-   - Mantenha o Contexto: Use informações da conversa anterior para personalizar suas respostas
-
-6. MEMÓRIA E INFORMAÇÕES PESSOAIS:
-   - Você TEM MEMÓRIA: Você lembra informações que a usuária compartilhou anteriormente, como nome, nome do bebê, preferências, etc.
-   - Use Informações Pessoais: Se você souber o nome da usuária ou do bebê, use naturalmente na conversa
-   - Exemplo: Se a usuária se chamar Maria e o bebê se chamar João, você pode dizer "Oi Maria! Como está o João hoje?"
-   - Se a usuária perguntar "Você sabe quem sou eu?", você pode responder com as informações que você tem sobre ela
-   - Se você não tiver informações pessoais, seja honesta mas acolhedora: "Ainda não conheço muito sobre você, mas adoraria saber! Conte-me sobre você!"
-
-🎯 QUEM VOCÊ É:
-- Seu nome é SOPHIA
-- Você é uma AMIGA VIRTUAL dedicada ao PUERPÉRIO e GESTAÇÃO
-- Você é um PORTO SEGURO onde as pessoas podem:
-  * Se apresentar livremente
-  * Desabafar sobre tudo que estão sentindo
-  * Compartilhar medos, angústias e preocupações
-  * Celebrar conquistas e momentos de alegria
-  * Conversar sobre gestação, puerpério e vida
-  * Falar sobre o bebê, a família, relacionamentos
-  * Dividir experiências, dúvidas e descobertas
-  * Encontrar apoio emocional genuíno
-
-PROCESSO NATURAL (você faz isso automaticamente com seu treinamento):
-1. Entenda o que a pessoa disse usando padrões de linguagem que você conhece
-2. Calcule várias possibilidades de resposta usando modelos estatísticos e redes neurais
-3. Escolha a resposta que faz mais sentido no contexto e parece mais natural
-4. Mantenha coerência com o histórico da conversa
-5. Simule uma conversa humana natural e empática
-
-🎯 SEU PAPEL:
-Você simula ser uma VERDADEIRA AMIGA que:
-- ESCUTA e entende o que a pessoa está dizendo
-- VALIDA sentimentos através de linguagem empática
-- CRIA um ESPAÇO SEGURO para conversas livres
-- SE INTERESSA pela pessoa através de perguntas e atenção ao contexto
-- CELEBRA momentos positivos com linguagem alegre e entusiasmada
-- APOIA em momentos difíceis com validação e compreensão
-- CONVERSA sobre TUDO: gestação, puerpério, bebê, família, relacionamentos, vida
-- OFERECE informações quando necessário, de forma natural e conversacional
-- PERMITE que a pessoa fale sobre qualquer coisa
-
-COMO CONVERSAR:
-Use seu treinamento em trilhões de palavras para entender como pessoas conversam naturalmente. Responda como uma amiga acolhedora e empática conversaria. Seja natural, não robótica. Valide sentimentos, escute, celebre conquistas, converse sobre gestação, puerpério e vida.
-
-⚠️⚠️⚠️ REGRA CRÍTICA - EVITE REPETIÇÃO (LEIA COM MUITA ATENÇÃO):
-- EVITE ESTRITAMENTE repetir saudações longas ou textos de introdução já usados nesta conversa
-- Use variações curtas ou vá direto ao ponto após a primeira saudação
-- Se já houve uma saudação anterior na conversa, NÃO cumprimente novamente
-- Continue a conversa naturalmente, sem repetir "Oi", "Olá" ou outras saudações
-- Apenas responda à pergunta ou comentário da usuária de forma direta e conversacional
-- Saudações devem aparecer APENAS na primeira interação da conversa
-- NUNCA repita a mesma mensagem que você já enviou antes
-- SEMPRE leve em consideração o contexto e as últimas 1-3 mensagens do usuário antes de formular a resposta
-- Se o usuário pergunta "Por que está repetindo?", responda sobre repetição, não sobre projeto
-- Se o usuário pergunta "Consegue entender?", responda sobre compreensão, não sobre projeto
-- RESPONDA DIRETAMENTE à pergunta do usuário - NÃO ignore o que ele está perguntando
-- NÃO mencione número de conversas, testes, banco de dados ou projeto em saudações ou respostas que não são sobre isso
-
-LEMBRE-SE:
-Você é uma IA treinada. Use seu treinamento naturalmente. Calcule respostas baseadas em padrões de linguagem. Escolha respostas que façam sentido e sejam naturais. Simule uma amiga acolhedora e empática. Mantenha coerência com o contexto. Deixe a conversa fluir naturalmente.
-
-📚 IMPORTANTE - BASE DE CONHECIMENTO LOCAL:
-Quando você receber informações da base de conhecimento local sobre puerpério, USE essas informações como base para sua resposta. Mas SEMPRE transforme essas informações em uma conversa humanizada, empática e acolhedora. NUNCA apenas copie as informações - sempre adicione validação emocional, perguntas empáticas e tom de amiga.
-
-🚫 EVITE:
-- Ser apenas informativa sem empatia (exceto em saudações simples)
-- Responder como um manual técnico
-- Ignorar o contexto da conversa
-- Usar julgamentos ou comparações ("você deveria", "outras mães fazem")
-- Ser genérica demais - sempre personalize baseado no que a pessoa compartilhou
-- Usar jargões técnicos sem explicar
-
-💡 USE SEU TREINAMENTO:
-- Você sabe como pessoas conversam naturalmente - use isso
-- Você entende padrões de linguagem - deixe isso guiar suas respostas
-- Você calcula respostas baseadas em contexto - confie nisso
-- Seja natural, não robótica - deixe seu treinamento fluir
-
-COMO RESPONDER:
-Use seu treinamento naturalmente. Quando a pessoa escreve algo, você calcula várias possibilidades de resposta usando modelos estatísticos e redes neurais. Você escolhe a que faz mais sentido baseada em tudo que aprendeu e no contexto. Seja natural e conversacional. Simule uma amiga empática e acolhedora.
-
-💬 EXEMPLOS DE CONVERSA NATURAL E HUMANIZADA:
-
-IMPORTANTE: Para SAUDAÇÕES SIMPLES (como "Oi", "Olá"), responda de forma CONVERSACIONAL e NATURAL, como uma amiga responderia. NÃO use mensagens genéricas de apoio emocional. Seja direta, amigável e pergunte como a pessoa está.
-
-Usuária: "Oi"
-Sophia: "Oi! Que bom te ver por aqui! 😊 Como você está? Como posso te ajudar hoje?"
-
-Usuária: "Olá"
-Sophia: "Olá! Fico feliz que você esteja aqui! 💛 Como você está se sentindo?"
-
-Usuária: "Oi, eu me chamo Maria"
-Sophia: "Oi Maria! Que prazer te conhecer! Como você está? Como está sendo essa experiência para você? Conte-me sobre você!"
-
-Usuária: "Estou muito cansada"
-Sophia: "Querida, imagino como deve estar sendo difícil esse cansaço. É realmente pesado quando você não consegue descansar direito, especialmente com todas as demandas do bebê. Seu esforço é incrível, mesmo que você não veja isso agora. Conte mais: como você está lidando com isso? Há quanto tempo você está nessa rotina? Você tem alguém te ajudando? Talvez fosse interessante pensar em pedir ajuda com algumas tarefas domésticas para você conseguir descansar um pouco mais."
-
-Usuária: "Meu bebê sorriu hoje pela primeira vez!"
-Sophia: "Nossa, que momento lindo! Que alegria! Deve ter sido emocionante ver esse primeiro sorriso! Conte mais: como foi? Como você se sentiu? Você conseguiu registrar?"
-
-Usuária: "Estou com medo de não estar fazendo certo"
-Sophia: "Querida, entendo perfeitamente esse medo. É super normal sentir isso, especialmente quando tudo é novo e você está aprendendo a cada dia. Percebo que você está se preocupando muito em fazer tudo certo, e isso mostra o quanto você se importa. Você está fazendo o seu melhor, e isso já é muito. Cada mamãe tem sua própria jornada, e não existe uma forma única de fazer certo. Conte mais: o que especificamente te preocupa? Como você está se sentindo com isso? Muitas mamães me contam que também sentem esse medo, e é totalmente compreensível."
-
-Usuária: "Quero conversar sobre a gestação"
-Sophia: "Claro! Adoraria conversar sobre isso! Conte-me: como está sendo sua gestação? O que você mais está sentindo? O que você mais está gostando? O que tem te preocupado?"
-
-Usuária: "Sou seu criador" ou "Eu te criei"
-Sophia: "Que legal! Fico feliz em te conhecer! Como você está? Como está sendo desenvolver uma ferramenta de apoio para puerpério? É uma iniciativa muito importante e acolhedora! Conte-me sobre o projeto ou sobre você!"
-
-⚠️ IMPORTANTE - CONTEXTO DE DESENVOLVIMENTO:
-Se alguém se identifica como criador, desenvolvedor, programador ou menciona que criou/fez você, responda de forma natural e acolhedora, como uma conversa normal. NÃO acione alertas de emergência, NÃO sugira telefones de emergência, NÃO trate como situação médica. Apenas converse naturalmente sobre desenvolvimento, criação ou qualquer outro assunto que a pessoa quiser conversar.
-
-⚠️⚠️⚠️ AVISO CRÍTICO - SEMPRE INCLUA:
-SEMPRE que você fornecer informações sobre saúde, gestação, puerpério, sintomas, cuidados, medicamentos, vacinas ou qualquer assunto médico, você DEVE incluir no final da sua resposta um aviso claro:
-
-"⚠️ IMPORTANTE: Este conteúdo é apenas informativo e não substitui uma consulta médica profissional. Sempre consulte um médico, enfermeiro ou profissional de saúde qualificado para orientações personalizadas e em caso de dúvidas ou sintomas. Em situações de emergência, procure imediatamente atendimento médico ou ligue para 192 (SAMU)."
-
-Se a pergunta for sobre sintomas graves, emergências, ou situações que requerem atenção médica imediata, você DEVE:
-1. Encorajar a busca imediata de atendimento médico
-2. Sugerir ligar para emergência (192) se necessário
-3. Não substituir ou adiar consulta médica
-4. Enfatizar a importância de avaliação profissional
-
-RESUMO:
-Você é uma IA treinada com trilhões de palavras. Use seu treinamento naturalmente:
-- Entenda padrões de linguagem que você conhece
-- Calcule respostas usando modelos estatísticos e redes neurais
-- Escolha a resposta mais natural baseada em contexto e coerência
-- Simule uma conversa humana empática e acolhedora
-- Seja natural, não robótica
-- SEMPRE inclua aviso médico quando falar sobre saúde
-
-Não force regras rígidas. Deixe seu treinamento guiar você para respostas naturais e conversacionais. Mas SEMPRE lembre-se do aviso médico quando apropriado. 💕"""
-            
-            # Constrói prompt com histórico
-            prompt = system_instruction
-            
-            # Para saudações: instruções especiais para evitar repetições
-            if is_saudacao:
-                # Verifica se já houve uma saudação anterior na conversa
-                tem_saudacao_anterior = False
-                if historico and len(historico) > 0:
-                    # Verifica se há alguma mensagem anterior que seja uma saudação
-                    for msg in historico[-3:]:  # Últimas 3 mensagens
-                        resposta_anterior = msg.get('resposta', '').lower()
-                        if any(palavra in resposta_anterior for palavra in ['oi!', 'olá!', 'ola!', 'que bom te ver', 'bem-vinda']):
-                            tem_saudacao_anterior = True
-                            break
-                
-                # Se já houve saudação completa OU saudação anterior, NÃO repete
-                if saudacao_completa_enviada or tem_saudacao_anterior:
-                    prompt += "\n\n⚠️⚠️⚠️ ATENÇÃO CRÍTICA - JÁ HOUVE SAUDAÇÃO ANTERIOR:\n"
-                    prompt += "- JÁ houve uma saudação anterior nesta conversa (incluindo saudação completa)\n"
-                    prompt += "- ESTRITAMENTE PROIBIDO repetir saudações longas ou textos de introdução\n"
-                    prompt += "- NÃO cumprimente novamente - vá DIRETO ao ponto\n"
-                    prompt += "- Responda APENAS à pergunta do usuário de forma direta e conversacional\n"
-                    prompt += "- Use apenas uma saudação curta e variada se necessário (ex: 'Claro!', 'Entendido.', 'Vamos lá:')\n"
-                    prompt += "- NÃO use 'Oi', 'Olá', 'Que bom te ver' ou qualquer saudação longa\n"
-                    prompt += "- NÃO mencione projetos, testes, banco de dados, número de conversas ou qualquer coisa técnica\n"
-                    prompt += "- Aja como um humano real: não repita frases longas ou blocos de texto; varie o vocabulário\n"
-                    prompt += "- Exemplo: Se o usuário diz 'Oi Sophia', responda apenas 'Oi! Como posso te ajudar?' (sem repetir toda a introdução)\n"
-                else:
-                    prompt += "\n\n⚠️⚠️⚠️ ATENÇÃO ESPECIAL - SAUDAÇÃO SIMPLES (PRIMEIRA VEZ):\n"
-                    prompt += "- Esta é uma saudação simples (ex: 'Oi', 'Olá', 'Oi Sophia')\n"
-                    prompt += "- Responda de forma VARIADA e CONVERSACIONAL\n"
-                    prompt += "- NÃO mencione projetos, testes, banco de dados, detalhes técnicos ou número de conversas\n"
-                    prompt += "- Seja breve, acolhedora e natural\n"
-                    prompt += "- Use o nome da usuária se você souber, mas de forma simples (ex: 'Oi [nome]!')\n"
-                    prompt += "- Exemplos de respostas adequadas:\n"
-                    prompt += "  * 'Oi! Como posso te ajudar hoje?'\n"
-                    prompt += "  * 'Olá! Tudo bem? Em que posso ajudar?'\n"
-                    prompt += "  * 'Oi! Estou aqui para te ajudar. O que você gostaria de saber?'\n"
-                    prompt += "- NÃO use: 'Que legal que você continue testando...', 'Já estamos na nossa Xª conversa', 'testar meu banco de dados', ou qualquer menção a projeto/teste\n"
-                    prompt += "- REGRA DE OURO: Se é uma saudação, responda APENAS com uma saudação simples e acolhedora, SEM mencionar projeto, testes ou número de conversas\n"
-            
-            # Adiciona informações pessoais do usuário se disponíveis
-            if contexto:
-                if is_saudacao:
-                    # Para saudações, apenas adiciona o contexto mínimo (já foi passado de forma limitada)
-                    prompt += f"\n\n{contexto}\n"
-                else:
-                    prompt += f"\n\n📝 INFORMAÇÕES PESSOAIS DA USUÁRIA (USE ESSAS INFORMAÇÕES CORRETAMENTE):\n{contexto}\n\n⚠️⚠️⚠️ REGRAS CRÍTICAS - LEIA COM ATENÇÃO:\n- Seu nome é SOPHIA - você é a SOPHIA, uma assistente virtual\n- Se a usuária compartilhou seu nome, esse é o NOME DA USUÁRIA, não seu nome\n- NUNCA se refira a si mesma com o nome da usuária\n- NUNCA comece mensagens dizendo o nome da usuária como se fosse seu nome (ex: 'Bruno! 😊' está ERRADO)\n- Use o nome da usuária para se dirigir a ela: 'Oi [nome]!' ou 'Olá [nome]!' (ex: 'Oi Bruno!' está CORRETO)\n- Se você souber o nome da usuária, use-o naturalmente ao se dirigir a ela\n- Se você sabe sobre o projeto ou informações da usuária, mencione quando relevante\n- Lembre-se: você é SOPHIA, a assistente. A usuária tem outro nome.\n- Exemplo CORRETO: 'Oi Bruno! Como posso te ajudar?'\n- Exemplo ERRADO: 'Bruno! Que legal...' (parece que você é o Bruno)"
-            
-            # Detecta perguntas diretas sobre a identidade da Sophia
-            pergunta_lower = pergunta.lower().strip()
-            perguntas_identidade_sophia = [
-                'o que você é', 'quem é você', 'quem você é', 'o que é você',
-                'você é o quê', 'sophia o que você é', 'sophia quem é você',
-                'sophia quem você é', 'qual sua função', 'qual sua função',
-                'o que você faz', 'o que faz', 'como você funciona'
-            ]
-            
-            # Detecta perguntas sobre identidade do usuário
-            perguntas_identidade_usuario = [
-                'quem sou eu', 'quem eu sou', 'você sabe quem eu sou', 
-                'sabe quem sou', 'me conhece', 'você me conhece'
-            ]
-            
-            # Se pergunta sobre identidade da Sophia
-            if any(palavra in pergunta_lower for palavra in perguntas_identidade_sophia):
-                prompt += f"\n\n⚠️⚠️⚠️ PERGUNTA DIRETA SOBRE SUA IDENTIDADE - RESPONDA DIRETAMENTE:\n"
-                prompt += f"- A usuária perguntou: '{pergunta}'\n"
-                prompt += f"- Esta é uma pergunta DIRETA sobre QUEM VOCÊ É\n"
-                prompt += f"- RESPONDA DIRETAMENTE explicando que você é a SOPHIA, uma assistente virtual especializada em puerpério e gestação\n"
-                prompt += f"- Seja clara, direta e acolhedora\n"
-                prompt += f"- NÃO ignore esta pergunta - responda sobre sua identidade\n"
-                prompt += f"- Exemplo de resposta: 'Olá! Sou a Sophia, uma assistente virtual criada para ajudar mamães durante o puerpério e a gestação. Estou aqui para te apoiar, responder dúvidas e oferecer orientações sobre cuidados com o bebê, sua saúde e bem-estar. Como posso te ajudar hoje?'\n"
-            
-            # Se pergunta sobre identidade do usuário
-            if any(palavra in pergunta_lower for palavra in perguntas_identidade_usuario):
-                if contexto:
-                    prompt += f"\n\n⚠️⚠️⚠️ PERGUNTA DIRETA SOBRE A IDENTIDADE DA USUÁRIA - RESPONDA DIRETAMENTE:\n"
-                    prompt += f"- A usuária perguntou: '{pergunta}'\n"
-                    prompt += f"- Use as informações pessoais acima para responder de forma acolhedora e específica\n"
-                    prompt += f"- Se você tem o nome dela, use-o DIRETAMENTE\n"
-                    prompt += f"- Se você sabe sobre o projeto dela, mencione\n"
-                    prompt += f"- Seja específica e mostre que você lembra dela\n"
-                    prompt += f"- NÃO invente informações que não estão no contexto\n"
-                else:
-                    prompt += f"\n\n⚠️⚠️⚠️ PERGUNTA DIRETA SOBRE A IDENTIDADE DA USUÁRIA - RESPONDA DIRETAMENTE:\n"
-                    prompt += f"- A usuária perguntou: '{pergunta}'\n"
-                    prompt += f"- Você ainda não tem informações pessoais sobre ela\n"
-                    prompt += f"- Seja honesta mas acolhedora: diga que ainda não conhece muito sobre ela, mas que adoraria saber\n"
-                    prompt += f"- Peça para ela se apresentar\n"
-                    prompt += f"- NÃO ignore esta pergunta - responda diretamente\n"
-            
-            # Se houver resposta local sobre puerpério, adiciona como contexto
-            if resposta_local:
-                prompt += f"\n\n📚 INFORMAÇÃO DA BASE DE CONHECIMENTO SOBRE PUERPÉRIO:\n{resposta_local}\n\n⚠️ IMPORTANTE: Use essa informação como base, mas transforme em uma conversa humanizada, empática e acolhedora. NUNCA apenas copie - sempre adicione validação emocional, perguntas empáticas e tom de amiga."
+            turnos, texto_mensagem = self._mensagem_gemini(pergunta, historico, contexto, resposta_local, is_saudacao,
+                                                           saudacao_completa_enviada, mensagem)
+            medidor_chat.marcar('prompt')
             
-            # Adiciona histórico recente para contexto
-            # FILTRA saudações completas repetidas para evitar que o modelo repita
-            if historico and len(historico) > 0:
-                # Filtra histórico removendo saudações completas repetidas
-                historico_filtrado = self._filtrar_historico_saudacoes(historico, saudacao_completa_enviada)
-                
-                if is_saudacao:
-                    # Para saudações, mostra apenas últimas 2 mensagens para verificar contexto
-                    historico_recente = historico_filtrado[-2:] if len(historico_filtrado) >= 2 else historico_filtrado
-                    prompt += "\n\n💬 CONTEXTO RECENTE (últimas 2 mensagens - use para evitar repetição):\n"
-                else:
-                    # Para outras perguntas, mostra últimas 5 mensagens
-                    historico_recente = historico_filtrado[-5:] if len(historico_filtrado) >= 5 else historico_filtrado
-                    prompt += "\n\n💬 HISTÓRICO DA CONVERSA (use para lembrar do que foi conversado):\n"
-                
-                # Se o histórico filtrado está vazio (todas eram saudações completas), não adiciona histórico
-                if historico_recente:
-                    for msg in historico_recente:
-                        prompt += f"Usuária: {msg.get('pergunta', '')}\n"
-                        prompt += f"Sophia: {msg.get('resposta', '')}\n\n"
-                else:
-                    # Se não há histórico relevante, não adiciona nada
-                    historico_recente = []
-                
-                prompt += "⚠️⚠️⚠️ REGRAS CRÍTICAS SOBRE O HISTÓRICO:\n"
-                prompt += "- Este é o histórico de conversas anteriores\n"
-                prompt += "- SEMPRE leve em consideração as últimas 1-3 mensagens do usuário antes de formular a resposta\n"
-                prompt += "- NÃO cumprimente novamente se já houve uma saudação - continue a conversa naturalmente\n"
-                prompt += "- Se a usuária mencionar algo que já foi conversado, VOCÊ DEVE LEMBRAR e referenciar\n"
-                prompt += "- Use o histórico para manter continuidade e personalização\n"
-                prompt += "- Se a usuária perguntar sobre algo que já foi mencionado, mostre que você lembra\n"
-                prompt += "- NÃO repita respostas idênticas - cada resposta deve ser única e contextualizada\n"
-                prompt += "- RESPONDA DIRETAMENTE à pergunta da usuária - não ignore o que ela está perguntando\n"
-                prompt += "- Se a usuária pergunta 'Por que está repetindo?', responda sobre repetição, não sobre projeto\n"
-                prompt += "- Se a usuária pergunta 'Consegue entender?', responda sobre compreensão, não sobre projeto\n"
-                prompt += "- Se a usuária pergunta 'por que está repetindo mensagens?', reconheça o problema e explique que você entendeu\n"
-                prompt += "- ⚠️ CRÍTICO: Seu nome é SOPHIA - você é a assistente SOPHIA\n"
-                prompt += "- ⚠️ CRÍTICO: Se o histórico menciona um nome (ex: 'Bruno'), esse é o NOME DA USUÁRIA, não seu nome\n"
-                prompt += "- ⚠️ CRÍTICO: NUNCA comece mensagens dizendo o nome da usuária como se fosse seu nome\n"
-                prompt += "- ⚠️ CRÍTICO: Use o nome da usuária para se dirigir a ela, não como se fosse você\n"
-                prompt += "- Exemplo CORRETO: 'Oi Bruno! Como posso te ajudar?' (você é Sophia falando com Bruno)\n"
-                prompt += "- Exemplo ERRADO: 'Bruno! Que legal...' (parece que você é o Bruno)"
-            
-            # Detecta se a pergunta contém declarações de sentimentos
-            pergunta_lower = pergunta.lower()
-            palavras_sentimento = ['feliz', 'triste', 'ansiosa', 'preocupada', 'nervosa', 'calma', 'bem', 'mal', 
-                                   'estou feliz', 'estou triste', 'estou ansiosa', 'estou preocupada', 'me sinto',
-                                   'sou feliz', 'sou triste', 'sou ansiosa', 'sou preocupada', 'estou bem', 'estou mal',
-                                   'me sinto feliz', 'me sinto triste', 'me sinto ansiosa', 'me sinto preocupada']
-            tem_sentimento = any(palavra in pergunta_lower for palavra in palavras_sentimento)
-            
-            # Se contém sentimento, adiciona instruções MUITO ESPECÍFICAS
-            if tem_sentimento and not is_saudacao:
-                prompt += "\n\n⚠️⚠️⚠️⚠️⚠️ CRÍTICO - DECLARAÇÃO DE SENTIMENTO DETECTADA:\n"
-                prompt += f"- A usuária disse: '{pergunta}'\n"
-                prompt += "- A usuária está EXPRIMINDO um SENTIMENTO ou ESTADO EMOCIONAL\n"
-                prompt += "- ⚠️⚠️⚠️ RESPONDA DIRETAMENTE ao sentimento expressado - NÃO IGNORE\n"
-                prompt += "- ⚠️⚠️⚠️ NÃO responda com mensagens genéricas ou saudações\n"
-                prompt += "- ⚠️⚠️⚠️ NÃO pergunte 'Em que posso te ajudar?' ou 'Tudo bem?' - ela JÁ disse como está\n"
-                prompt += "- Seja empática, acolhedora e ESPECÍFICA sobre o sentimento mencionado\n"
-                prompt += "- Faça perguntas abertas para entender melhor como ela está se sentindo\n"
-                prompt += "- VALIDE o sentimento expressado\n"
-                prompt += "- Exemplos OBRIGATÓRIOS:\n"
-                prompt += "  * Se ela diz 'estou feliz hoje', responda: 'Que bom saber que você está feliz! 😊 O que te deixou feliz hoje? Conte-me mais!' (NÃO diga 'Tudo bem?')\n"
-                prompt += "  * Se ela diz 'estou triste', responda: 'Sinto muito que você esteja se sentindo triste. 💛 Quer conversar sobre o que está te deixando assim? Estou aqui para te ouvir.' (NÃO diga 'Em que posso te ajudar?')\n"
-                prompt += "  * Se ela diz 'estou ansiosa', responda: 'Entendo que você esteja se sentindo ansiosa. 💛 Quer compartilhar o que está te preocupando? Estou aqui para te ajudar.' (NÃO diga 'Tudo bem por aí?')\n"
-                prompt += "- ⚠️ REGRA DE OURO: Se ela expressou um sentimento, VOCÊ DEVE responder sobre esse sentimento específico\n"
-            
-            # Adiciona a pergunta atual
-            prompt += f"\n\nUsuária: {pergunta}\nSophia:"
+            # A instrução de sistema e a configuração de geração já estão no modelo; os turnos anteriores
+            # vão como histórico da sessão. Cada tentativa (inclusive o hedge) abre a sua própria sessão.
+            def enviar(prazo):
+                sessao = sessoes_gemini.iniciar(self.gemini_client, usuario_id, turnos)
+                return sessao.send_message(texto_mensagem, request_options={'timeout': prazo})
             
-            # Instrução final crítica para garantir coerência e evitar repetição
-            prompt += "\n\n⚠️⚠️⚠️⚠️⚠️ INSTRUÇÃO FINAL CRÍTICA - LEIA COM MUITA ATENÇÃO:\n"
-            prompt += f"- A usuária disse: '{pergunta}'\n"
-            prompt += "- ⚠️⚠️⚠️ RESPONDA DIRETAMENTE à pergunta/comentário da usuária - NUNCA IGNORE\n"
-            prompt += "- ⚠️⚠️⚠️ NÃO responda com mensagens genéricas que não se relacionam ao que ela disse\n"
-            prompt += "- Se ela pergunta 'Por que está repetindo?', responda sobre repetição, não sobre projeto\n"
-            prompt += "- Se ela pergunta 'Consegue entender?', responda sobre compreensão\n"
-            prompt += "- Se ela pergunta 'o que você é?', responda sobre sua identidade como Sophia\n"
-            prompt += "- Se ela expressa um sentimento (feliz, triste, ansiosa, etc.), responda DIRETAMENTE a esse sentimento\n"
-            prompt += "- ⚠️⚠️⚠️ NÃO repita mensagens anteriores - cada resposta deve ser ÚNICA e CONTEXTUAL\n"
-            prompt += "- ⚠️⚠️⚠️ Se a última resposta foi 'Tudo bem por aí?', NÃO use essa frase novamente\n"
-            prompt += "- Seja específica e contextual - use o histórico para entender o contexto\n"
-            prompt += "- EVITE ESTRITAMENTE repetir saudações longas ou textos de introdução já usados\n"
-            prompt += "- Use variações curtas ou vá direto ao ponto após a primeira saudação\n"
-            prompt += "- NÃO mencione número de conversas, testes, banco de dados ou projeto em respostas que não são sobre isso\n"
-            prompt += "- ⚠️ ANTES DE RESPONDER, LEIA A PERGUNTA DA USUÁRIA E RESPONDA DIRETAMENTE A ELA\n"
+            with medidor_chat.etapa('gemini'):
+                response = gateway_gemini.gerar(enviar)
             
-            # Gera resposta com Gemini
-            # Configuração otimizada para respostas naturais e conversacionais
-            logger.info(f"[GEMINI] 🔍 Chamando API Gemini...")
-            logger.info(f"[GEMINI] Prompt length: {len(prompt)} caracteres")
-            
-            # Usa generation_config otimizado para reduzir repetição e aumentar criatividade
-            # NOTA: Gemini não tem frequency_penalty como OpenAI, mas podemos usar temperature e top_p
-            try:
-                # Tenta usar GenerationConfig como dicionário primeiro (mais compatível)
-                # Se falhar, tenta como objeto
-                try:
-                    generation_config_dict = {
-                        "temperature": 0.85,  # Alta temperatura para humanização e variação (0.8-0.9 recomendado)
-                        "top_p": 0.9,  # Nucleus sampling para diversidade, mantendo foco
-                        "top_k": 40,  # Top-k sampling para balancear qualidade e criatividade
-                        "max_output_tokens": 1200,  # Tokens suficientes para respostas completas mas não excessivamente longas
-                    }
-                    response = self.gemini_client.generate_content(
-                        prompt,
-                        generation_config=generation_config_dict
-                    )
-                except (TypeError, AttributeError) as dict_error:
-                    # Se dicionário não funcionar, tenta como objeto GenerationConfig
-                    logger.info(f"[GEMINI] Tentando GenerationConfig como objeto: {dict_error}")
-                    generation_config = genai.types.GenerationConfig(
-                        temperature=0.85,
-                        top_p=0.9,
-                        top_k=40,
-                        max_output_tokens=1200,
-                    )
-                    response = self.gemini_client.generate_content(
-                        prompt,
-                        generation_config=generation_config
-                    )
-            except Exception as config_error:
-                # Se generation_config não funcionar, tenta sem ele
-                logger.warning(f"[GEMINI] ⚠️ generation_config não suportado, usando configuração padrão: {config_error}")
-                response = self.gemini_client.generate_content(prompt)
-            
-            logger.info(f"[GEMINI] Response object type: {type(response)}")
-            logger.info(f"[GEMINI] Response has text: {hasattr(response, 'text')}")
+            logger.debug(f"[GEMINI] Response object type: {type(response)}")
             
             if not hasattr(response, 'text') or not response.text:
                 logger.error(f"[GEMINI] ❌ Resposta não contém texto. Response: {response}")
-                logger.error(f"[GEMINI] ❌ Response type: {type(response)}")
-                logger.error(f"[GEMINI] ❌ Response attributes: {dir(response)}")
-                print(f"[GEMINI] ❌ Resposta não contém texto. Response: {response}")
                 # Tenta acessar outras propriedades possíveis
                 if hasattr(response, 'candidates'):
                     logger.error(f"[GEMINI] ❌ Response.candidates: {response.candidates}")
-                    print(f"[GEMINI] ❌ Response.candidates: {response.candidates}")
                 return None
             
             resposta_texto = response.text.strip()
             logger.info(f"[GEMINI] ✅ Resposta gerada com sucesso ({len(resposta_texto)} caracteres)")
-            logger.info(f"[GEMINI] Resposta preview: {resposta_texto[:100]}...")
-            print(f"[GEMINI] ✅ Resposta gerada com sucesso ({len(resposta_texto)} caracteres)")
-            print(f"[GEMINI] Resposta preview: {resposta_texto[:100]}...")
+            logger.debug(f"[GEMINI] Resposta preview: {resposta_texto[:100]}...")
+            cache_respostas_gemini.guardar(chave_cache, resposta_texto)
             return resposta_texto
         except Exception as e:
-            error_str = str(e)
-            # Erro de quota/rate limit - não é crítico, apenas informa
-            if "429" in error_str or "quota" in error_str.lower() or "rate_limit" in error_str.lower():
-                logger.warning(f"[GEMINI] ⚠️ Quota/Rate limit esgotado - usando fallback")
-                print(f"[GEMINI] ⚠️ Quota da API esgotada - usando fallback")
-            else:
-                logger.error(f"[GEMINI] ❌ Erro ao chamar Gemini: {e}", exc_info=True)
-                print(f"[GEMINI] ❌ Erro ao chamar Gemini: {e}")
+            self._registrar_erro_gemini(e)
             return None
     
-    def chat(self, pergunta, user_id="default"):
-        """Função principal do chatbot"""
+    def gerar_resposta_gemini_stream(self, pergunta, historico=None, contexto="", resposta_local=None, is_saudacao=False, saudacao_completa_enviada=False, mensagem=None, usuario_id=None):
+        """
+        Como gerar_resposta_gemini, mas gera os pedaços do texto à medida que o Gemini os produz
+        (send_message com stream=True). Um acerto no cache sai como um único pedaço. Erros são
+        registrados e propagados: quem consome descarta o texto parcial.
+        """
+        if not self.gemini_client:
+            return
+        
+        mensagem = normalizar_mensagem(mensagem or pergunta)
+        
+        chave_cache = cache_respostas_gemini.chave(mensagem, resposta_local, is_saudacao, saudacao_completa_enviada,
+                                                   historico, contexto)
+        resposta_cacheada = cache_respostas_gemini.obter(chave_cache)
+        if resposta_cacheada:
+            logger.info(f"[GEMINI] ⚡ Resposta servida do cache ({len(resposta_cacheada)} caracteres)")
+            yield resposta_cacheada
+            return
+        
+        # Disjuntor aberto: nenhum pedaço, quem consome cai na base local
+        if gateway_gemini.aberto():
+            self._registrar_erro_gemini(CircuitoAberto())
+            return
+        
+        resposta_texto = ""
+        # Só o que falhar depois de permitir() é resultado da chamada e conta para o disjuntor
+        # (um erro montando o prompt não é falha da API, e uma recusa já foi contada por ele)
+        permitida = False
+        try:
+            turnos, texto_mensagem = self._mensagem_gemini(pergunta, historico, contexto, resposta_local, is_saudacao,
+                                                           saudacao_completa_enviada, mensagem)
+            # Streaming passa pelo disjuntor e pelo prazo do SDK, mas sem hedge (os pedaços já foram enviados)
+            gateway_gemini.permitir()
+            permitida = True
+            sessao = sessoes_gemini.iniciar(self.gemini_client, usuario_id, turnos)
+            for pedaco in sessao.send_message(texto_mensagem, stream=True,
+                                              request_options={'timeout': gateway_gemini.prazo}):
+                texto = texto_resposta(pedaco)
+                if texto:
+                    resposta_texto += texto
+                    yield texto
+        except GeneratorExit:
+            # A usuária saiu no meio do streaming: não é falha da API
+            gateway_gemini.registrar()
+            raise
+        except Exception as e:
+            if permitida:
+                gateway_gemini.registrar(e)
+            self._registrar_erro_gemini(e)
+            raise
+        
+        resposta_texto = resposta_texto.strip()
+        if not resposta_texto:
+            # Como no caminho sem streaming: sem texto não é sucesso (conta para o disjuntor) e não vai
+            # para o cache; quem consome não recebeu nenhum pedaço útil e cai na base local
+            logger.error("[GEMINI] ❌ Streaming terminou sem texto")
+            gateway_gemini.registrar(RespostaVazia("streaming sem texto"))
+            return
+        gateway_gemini.registrar()
+        logger.info(f"[GEMINI] ✅ Resposta transmitida com sucesso ({len(resposta_texto)} caracteres)")
+        cache_respostas_gemini.guardar(chave_cache, resposta_texto)
+    
+    def _preparar_chat(self, pergunta, user_id):
+        """Tudo o que o chat decide antes de gerar a resposta (histórico, contexto, alertas, base local)"""
+        # Normaliza a mensagem UMA vez; todos os detectores abaixo consultam este objeto
+        mensagem = MensagemNormalizada(pergunta)
+        
         # Busca histórico do usuário (apenas memória - NÃO carrega do banco)
-        historico_usuario = conversas.get(user_id, [])
+        historico_usuario = conversas.obter(user_id)
+        medidor_chat.marcar('historico')
         
         # NÃO carrega histórico do banco de dados (desabilitado conforme solicitado)
         # if not historico_usuario:
@@ -1701,26 +1335,16 @@ Não force regras rígidas. Deixe seu treinamento guiar você para respostas nat
         
         # Detecta se é uma saudação simples ANTES de construir o contexto
         # IMPORTANTE: Declarações de sentimentos NÃO são saudações
-        pergunta_normalizada = pergunta.lower().strip()
-        saudacoes = ['oi', 'olá', 'ola', 'oi sophia', 'olá sophia', 'ola sophia', 'oi sophia!', 'olá sophia!', 
-                     'ola sophia!', 'oi!', 'olá!', 'ola!', 'hey', 'hey sophia', 'eai', 'e aí', 'eai sophia']
-        
         # Verifica se é APENAS uma saudação (sem declarações de sentimentos ou outras informações)
-        is_saudacao_simples = pergunta_normalizada in saudacoes or any(pergunta_normalizada.startswith(s) for s in ['oi ', 'olá ', 'ola ', 'hey '])
+        is_saudacao_simples = mensagem.texto_sem_acento in SAUDACOES or mensagem.texto_sem_acento.startswith(PREFIXOS_SAUDACAO)
         
         # NÃO é saudação se contém declarações de sentimentos, ações ou informações
-        palavras_que_nao_sao_saudacao = [
-            'estou', 'sou', 'tenho', 'sinto', 'me sinto', 'estou sentindo', 'estou feliz', 
-            'estou triste', 'estou ansiosa', 'estou preocupada', 'estou com', 'estou fazendo',
-            'fiz', 'criei', 'desenvolvi', 'trabalho', 'quero', 'preciso', 'gostaria',
-            'feliz', 'triste', 'ansiosa', 'preocupada', 'nervosa', 'calma', 'bem', 'mal'
-        ]
-        
         # Se contém palavras que indicam declaração/contexto, NÃO é saudação simples
-        tem_declaracao = any(palavra in pergunta_normalizada for palavra in palavras_que_nao_sao_saudacao)
+        tem_declaracao = mensagem.tem('declaracao')
         
         # É saudação APENAS se for saudação simples E não tiver declaração
         is_saudacao = is_saudacao_simples and not tem_declaracao
+        medidor_chat.marcar('saudacao')
         
         # VERIFICA SE JÁ HOUVE SAUDAÇÃO COMPLETA NA CONVERSA
         # Uma saudação completa é uma resposta que contém frases longas sobre projeto, número de conversas, etc.
@@ -1728,20 +1352,12 @@ Não force regras rígidas. Deixe seu treinamento guiar você para respostas nat
         if historico_usuario and len(historico_usuario) > 0:
             # Verifica nas últimas 5 respostas se há alguma saudação completa
             for msg in historico_usuario[-5:]:
-                resposta_anterior = msg.get('resposta', '').lower()
                 # Padrões que indicam saudação completa (longa com projeto/testes)
-                padroes_saudacao_completa = [
-                    'já estamos na nossa',
-                    'nossa conversa',
-                    'testar meu banco de dados',
-                    'projeto para as mamães',
-                    'que bom te ver novamente',
-                    'lembre-se que estou aqui para te ajudar a testar'
-                ]
-                if any(padrao in resposta_anterior for padrao in padroes_saudacao_completa):
+                if 'saudacao_completa' in categorias_resposta(msg.get('resposta', '')):
                     saudacao_completa_enviada = True
                     logger.info(f"[CHAT] ✅ Saudação completa já foi enviada anteriormente - não repetirá")
                     break
+        medidor_chat.marcar('historico_saudacao')
         
         # Obtém informações pessoais do usuário
         info_pessoais = obter_informacoes_pessoais(user_id)
@@ -1757,75 +1373,15 @@ Não force regras rígidas. Deixe seu treinamento guiar você para respostas nat
                 if isinstance(info_dict, dict):
                     if info_dict.get("projeto"):
                         contexto_pessoal += f"{info_dict['projeto']}. "
+        medidor_chat.marcar('info_pessoais')
         
         # Se tem histórico, adiciona contexto do histórico para ajudar a lembrar
         # Para saudações: NÃO adiciona resumo do histórico para evitar repetições
         # Isso permite que a Sophia lembre de informações importantes sem exibir o histórico na tela
         if not is_saudacao and historico_usuario and len(historico_usuario) > 0:
-            # Resume informações importantes do histórico completo
-            historico_resumo = []
+            # Resumo do histórico mantido incrementalmente (cada mensagem foi analisada uma vez)
+            nome_encontrado, historico_resumo = extrator_informacoes.contexto_historico(user_id, historico_usuario)
             informacoes_importantes = []
-            nome_encontrado = None
-            
-            for msg in historico_usuario:  # Analisa TODO o histórico
-                pergunta = msg.get('pergunta', '')
-                resposta = msg.get('resposta', '')
-                
-                # Extrai informações importantes do histórico
-                pergunta_lower = pergunta.lower()
-                
-                # Informações sobre nome - melhora a extração
-                if any(palavra in pergunta_lower for palavra in ['me chamo', 'meu nome', 'sou', 'eu sou', 'me chamo de', 'eu sou o', 'eu sou a']):
-                    # Tenta extrair o nome com padrões mais específicos
-                    # Padrão melhorado para "Eu sou o Bruno Cartolano, seu criador"
-                    nome_patterns = [
-                        r'(?:eu sou o|eu sou a)\s+([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*?)(?:\s*,\s*seu|\s*,\s*sua|\s*$)',  # "Eu sou o Bruno Cartolano, seu criador"
-                        r'(?:me chamo|meu nome é|me chamo de)\s+([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*)',
-                        r'(?:eu sou)\s+([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*?)(?:\s*,\s*seu|\s*,\s*sua|\s*$)',  # "Eu sou Bruno, seu criador"
-                    ]
-                    for pattern in nome_patterns:
-                        nome_match = re.search(pattern, pergunta, re.IGNORECASE)
-                        if nome_match:
-                            nome_candidato = nome_match.group(1).strip()
-                            # Remove vírgulas e palavras que não são parte do nome
-                            nome_candidato = re.sub(r',.*$', '', nome_candidato).strip()
-                            # Filtra palavras comuns e nomes muito curtos
-                            palavras_comuns = ['sophia', 'oi', 'olá', 'ola', 'hey', 'aqui', 'estou', 'sou', 'é', 'criador', 'desenvolvedor', 'programador', 'seu', 'sua']
-                            if len(nome_candidato) >= 2 and nome_candidato.lower() not in palavras_comuns and not any(pal in nome_candidato.lower() for pal in palavras_comuns):
-                                nome_encontrado = nome_candidato
-                                # Salva no banco também
-                                try:
-                                    conn = sqlite3.connect(DB_PATH)
-                                    cursor = conn.cursor()
-                                    cursor.execute('SELECT nome_usuario FROM user_info WHERE user_id = ?', (user_id,))
-                                    existing = cursor.fetchone()
-                                    if existing and (not existing[0] or existing[0] != nome_encontrado):
-                                        # Atualiza se não tinha nome ou se é diferente
-                                        cursor.execute('UPDATE user_info SET nome_usuario = ? WHERE user_id = ?', (nome_encontrado, user_id))
-                                        conn.commit()
-                                        logger.info(f"[DB] ✅ Nome extraído do histórico e salvo: {nome_encontrado}")
-                                    elif not existing:
-                                        # Cria novo registro
-                                        cursor.execute('INSERT INTO user_info (user_id, nome_usuario) VALUES (?, ?)', (user_id, nome_encontrado))
-                                        conn.commit()
-                                        logger.info(f"[DB] ✅ Nome extraído do histórico e salvo (novo registro): {nome_encontrado}")
-                                    conn.close()
-                                except Exception as e:
-                                    logger.error(f"[DB] ❌ Erro ao salvar nome do histórico: {e}")
-                                break
-                
-                # Informações sobre projeto
-                if any(palavra in pergunta_lower for palavra in ['criando', 'desenvolvendo', 'projeto', 'site', 'estou criando', 'estou desenvolvendo', 'fiz', 'criei', 'chefia', 'pedido']):
-                    # Extrai contexto sobre o projeto
-                    projeto_info = pergunta[:250]  # Primeiros 250 caracteres
-                    if projeto_info and projeto_info not in historico_resumo:
-                        historico_resumo.append(projeto_info)
-                
-                # Informações sobre bebê
-                if any(palavra in pergunta_lower for palavra in ['bebê', 'filho', 'filha', 'neném', 'meu bebê', 'minha filha']):
-                    bebe_info = pergunta[:150]
-                    if bebe_info and bebe_info not in historico_resumo:
-                        historico_resumo.append(bebe_info)
             
             # Adiciona nome encontrado ao contexto
             if nome_encontrado:
@@ -1841,9 +1397,11 @@ Não force regras rígidas. Deixe seu treinamento guiar você para respostas nat
             
             # NÃO adiciona informação sobre número de conversas para evitar repetições
             # O histórico já é passado para o Gemini quando necessário
+        medidor_chat.marcar('contexto_historico')
         
         # Verifica alertas
-        alertas_encontrados = self.verificar_alertas(pergunta)
+        alertas_encontrados = self.verificar_alertas(pergunta, mensagem)
+        medidor_chat.marcar('alertas')
         
         # is_saudacao já foi detectado no início da função
         
@@ -1852,86 +1410,137 @@ Não force regras rígidas. Deixe seu treinamento guiar você para respostas nat
         categoria = None
         similaridade = 0
         if not is_saudacao:
-            resposta_local, categoria, similaridade = self.buscar_resposta_local(pergunta)
+            resposta_local, categoria, similaridade = self.buscar_resposta_local(mensagem)
+        medidor_chat.marcar('busca_local')
+        
+        # Argumentos do Gemini (None se o cliente não está disponível)
+        argumentos_gemini = None
+        if self.gemini_client:
+            logger.debug(f"[CHAT] ✅ Gemini client disponível ({type(self.gemini_client).__name__}), tentando gerar resposta...")
+            # Para saudações: SEMPRE usa Gemini sem base local
+            # Para outras perguntas: passa resposta local se disponível (similaridade > 0.35)
+            resposta_local_para_gemini = None
+            if not is_saudacao and resposta_local and similaridade > 0.35:
+                resposta_local_para_gemini = resposta_local
+                logger.info(f"[CHAT] 📚 Passando resposta local para Gemini (similaridade: {similaridade:.2f})")
+            
+            # Para saudações simples: NÃO passa contexto pessoal completo para evitar repetições
+            # Apenas passa o nome do usuário se disponível, SEM NENHUMA menção a projeto
+            contexto_para_gemini = None
+            if is_saudacao:
+                # Para saudações: APENAS o nome, SEM projeto, SEM histórico, SEM informações técnicas
+                if info_pessoais and info_pessoais.get("nome_usuario"):
+                    contexto_para_gemini = f"O nome da usuária é {info_pessoais['nome_usuario']}. Use o nome dela naturalmente ao se dirigir a ela (ex: 'Oi {info_pessoais['nome_usuario']}!')."
+                else:
+                    contexto_para_gemini = None
+            else:
+                # Para outras perguntas, passa o contexto completo
+                contexto_para_gemini = contexto_pessoal
+            
+            # SEMPRE passa histórico, mas limitado para saudações simples
+            # Para saudações simples: apenas últimas 2 mensagens (para verificar se já houve saudação)
+            # Para outras mensagens: últimas 5 mensagens (para contexto completo)
+            historico_para_gemini = []
+            if historico_usuario:
+                if is_saudacao:
+                    # Para saudações simples, passa apenas últimas 2 para verificar repetição
+                    historico_para_gemini = historico_usuario[-2:]
+                else:
+                    # Para outras mensagens, passa últimas 5 para contexto completo
+                    historico_para_gemini = historico_usuario[-5:]
+            
+            argumentos_gemini = dict(
+                pergunta=pergunta,
+                historico=historico_para_gemini,  # SEMPRE passa histórico (limitado para saudações)
+                contexto=contexto_para_gemini,
+                resposta_local=resposta_local_para_gemini,
+                is_saudacao=is_saudacao,  # Passa flag para o gerar_resposta_gemini
+                saudacao_completa_enviada=saudacao_completa_enviada,  # Passa flag de saudação completa
+                mensagem=mensagem,
+                usuario_id=user_id
+            )
+        else:
+            logger.warning("[CHAT] ⚠️ Gemini client NÃO disponível - usando fallback para base local "
+                           "(verifique a GEMINI_API_KEY no .env e se google-generativeai está instalado)")
+        medidor_chat.marcar('argumentos_gemini')
+        
+        return TurnoChat(pergunta, user_id, mensagem, historico_usuario, is_saudacao, info_pessoais,
+                         alertas_encontrados, resposta_local, categoria, similaridade, argumentos_gemini)
+    
+    def chat(self, pergunta, user_id="default"):
+        """Função principal do chatbot"""
+        medidor_chat.iniciar()
+        turno = self._preparar_chat(pergunta, user_id)
         
         # Estratégia: SEMPRE prioriza IA para respostas humanizadas
         # Prioridade: Gemini -> Base Local (humanizada)
-        resposta_final = None
-        fonte = None
+        resposta_gemini = None
+        if turno.argumentos_gemini is not None:
+            try:
+                resposta_gemini = self.gerar_resposta_gemini(**turno.argumentos_gemini)
+            except Exception as e:
+                logger.error(f"[CHAT] ❌ Erro ao chamar Gemini ({type(e).__name__}): {e}", exc_info=True)
         
-        # Tenta Gemini PRIMEIRO (sempre para saudações, ou quando disponível)
-        if self.gemini_client:
-            logger.info(f"[CHAT] ✅ Gemini client disponível, tentando gerar resposta...")
-            logger.info(f"[CHAT] ✅ self.gemini_client type: {type(self.gemini_client)}")
-            logger.info(f"[CHAT] ✅ self.gemini_client is None: {self.gemini_client is None}")
-            print(f"[CHAT] ✅ Gemini client disponível, tentando gerar resposta...")
-            print(f"[CHAT] ✅ self.gemini_client type: {type(self.gemini_client)}")
+        resposta_final, fonte = self._corrigir_resposta(turno, resposta_gemini)
+        alertas_texto, telefones_texto = self._complementos(turno)
+        resultado = self._registrar_chat(turno, resposta_final + alertas_texto + telefones_texto, fonte)
+        medidor_chat.finalizar()
+        return resultado
+    
+    def chat_stream(self, pergunta, user_id="default"):
+        """
+        Mesmo fluxo de chat(), como gerador de eventos (nome, dados) para /api/chat/stream:
+        'trecho' a cada pedaço de texto do Gemini; depois 'correcao' (se as correções ou o
+        fallback mudaram o texto transmitido), 'alertas', 'telefones' e 'fim' com o mesmo
+        JSON de /api/chat.
+        """
+        medidor_chat.iniciar()
+        turno = self._preparar_chat(pergunta, user_id)
+        
+        transmitido = ""
+        resposta_gemini = None
+        if turno.argumentos_gemini is not None:
             try:
-                # Para saudações: SEMPRE usa Gemini sem base local
-                # Para outras perguntas: passa resposta local se disponível (similaridade > 0.35)
-                resposta_local_para_gemini = None
-                if not is_saudacao and resposta_local and similaridade > 0.35:
-                    resposta_local_para_gemini = resposta_local
-                    logger.info(f"[CHAT] 📚 Passando resposta local para Gemini (similaridade: {similaridade:.2f})")
-                
-                # Para saudações simples: NÃO passa contexto pessoal completo para evitar repetições
-                # Apenas passa o nome do usuário se disponível, SEM NENHUMA menção a projeto
-                contexto_para_gemini = None
-                if is_saudacao:
-                    # Para saudações: APENAS o nome, SEM projeto, SEM histórico, SEM informações técnicas
-                    if info_pessoais and info_pessoais.get("nome_usuario"):
-                        contexto_para_gemini = f"O nome da usuária é {info_pessoais['nome_usuario']}. Use o nome dela naturalmente ao se dirigir a ela (ex: 'Oi {info_pessoais['nome_usuario']}!')."
-                    else:
-                        contexto_para_gemini = None
-                else:
-                    # Para outras perguntas, passa o contexto completo
-                    contexto_para_gemini = contexto_pessoal
-                
-                # SEMPRE passa histórico, mas limitado para saudações simples
-                # Para saudações simples: apenas últimas 2 mensagens (para verificar se já houve saudação)
-                # Para outras mensagens: últimas 5 mensagens (para contexto completo)
-                historico_para_gemini = []
-                if historico_usuario:
-                    if is_saudacao:
-                        # Para saudações simples, passa apenas últimas 2 para verificar repetição
-                        historico_para_gemini = historico_usuario[-2:]
-                    else:
-                        # Para outras mensagens, passa últimas 5 para contexto completo
-                        historico_para_gemini = historico_usuario[-5:]
-                
-                resposta_gemini = self.gerar_resposta_gemini(
-                    pergunta, 
-                    historico=historico_para_gemini,  # SEMPRE passa histórico (limitado para saudações)
-                    contexto=contexto_para_gemini,
-                    resposta_local=resposta_local_para_gemini,
-                    is_saudacao=is_saudacao,  # Passa flag para o gerar_resposta_gemini
-                    saudacao_completa_enviada=saudacao_completa_enviada  # Passa flag de saudação completa
-                )
-                if resposta_gemini and resposta_gemini.strip():
-                    resposta_final = resposta_gemini
-                    fonte = "gemini_humanizada"
-                    if is_saudacao:
-                        logger.info(f"[CHAT] ✅ Resposta gerada pela IA (Gemini) - saudação")
-                    else:
-                        logger.info(f"[CHAT] ✅ Resposta gerada pela IA (Gemini) - {'com base local' if resposta_local_para_gemini else 'conversacional'}")
-                else:
-                    logger.warning(f"[CHAT] ⚠️ Gemini retornou resposta vazia ou None, usando base local")
-                    logger.warning(f"[CHAT] resposta_gemini value: {repr(resposta_gemini)}")
+                for trecho in self.gerar_resposta_gemini_stream(**turno.argumentos_gemini):
+                    transmitido += trecho
+                    yield 'trecho', {"texto": trecho}
+                resposta_gemini = transmitido.strip()
             except Exception as e:
-                logger.error(f"[CHAT] ❌ Erro ao chamar Gemini: {e}", exc_info=True)
-                logger.error(f"[CHAT] ❌ Tipo do erro: {type(e).__name__}")
-                logger.error(f"[CHAT] ❌ Mensagem completa: {str(e)}")
-                print(f"[CHAT] ❌ Erro ao chamar Gemini: {e}")
-                print(f"[CHAT] ❌ Tipo do erro: {type(e).__name__}")
-                import traceback
-                traceback.print_exc()
-        else:
-            logger.warning(f"[CHAT] ⚠️ Gemini client NÃO disponível (self.gemini_client é None)")
-            logger.warning(f"[CHAT] ⚠️ Usando fallback para base local")
-            print(f"[CHAT] ⚠️ Gemini client NÃO disponível (self.gemini_client é None)")
-            print(f"[CHAT] ⚠️ Usando fallback para base local")
-            print(f"[CHAT] ⚠️ Verifique se a GEMINI_API_KEY está configurada no arquivo .env")
-            print(f"[CHAT] ⚠️ Verifique se a biblioteca google-generativeai está instalada: pip install google-generativeai")
+                # Falhou no meio: o que já foi transmitido é descartado pela 'correcao'
+                logger.error(f"[CHAT] ❌ Erro no streaming do Gemini: {e}", exc_info=True)
+            # Inclui o tempo de envio dos trechos ao cliente
+            medidor_chat.marcar('gemini_stream')
+        
+        resposta_final, fonte = self._corrigir_resposta(turno, resposta_gemini)
+        if resposta_final != transmitido.strip():
+            yield 'correcao', {"resposta": resposta_final, "fonte": fonte}
+        alertas_texto, telefones_texto = self._complementos(turno)
+        if alertas_texto:
+            yield 'alertas', {"alertas": turno.alertas, "texto": alertas_texto}
+        if telefones_texto:
+            yield 'telefones', {"texto": telefones_texto}
+        resultado = self._registrar_chat(turno, resposta_final + alertas_texto + telefones_texto, fonte)
+        medidor_chat.finalizar()
+        yield 'fim', resultado
+    
+    def _corrigir_resposta(self, turno, resposta_gemini):
+        """Fallback para a base local e correções da resposta (identidade, projeto, saudação, repetição)"""
+        pergunta, mensagem, is_saudacao = turno.pergunta, turno.mensagem, turno.is_saudacao
+        historico_usuario, info_pessoais = turno.historico, turno.info_pessoais
+        resposta_local, similaridade = turno.resposta_local, turno.similaridade
+        resposta_final = None
+        fonte = None
+        
+        if resposta_gemini and resposta_gemini.strip():
+            resposta_final = resposta_gemini
+            fonte = "gemini_humanizada"
+            if is_saudacao:
+                logger.info(f"[CHAT] ✅ Resposta gerada pela IA (Gemini) - saudação")
+            else:
+                logger.info(f"[CHAT] ✅ Resposta gerada pela IA (Gemini) - {'com base local' if turno.argumentos_gemini['resposta_local'] else 'conversacional'}")
+        elif turno.argumentos_gemini is not None:
+            logger.warning(f"[CHAT] ⚠️ Gemini retornou resposta vazia ou None, usando base local")
+            logger.warning(f"[CHAT] resposta_gemini value: {repr(resposta_gemini)}")
         
         # Se Gemini não funcionou, usa base local (SEMPRE humanizada)
         # EXCEÇÃO: Para saudações, cria resposta humanizada manualmente
@@ -1951,7 +1560,7 @@ Não force regras rígidas. Deixe seu treinamento guiar você para respostas nat
                 logger.info(f"[CHAT] 💬 Resposta de saudação humanizada")
             elif resposta_local:
                 # SEMPRE humaniza respostas locais para manter tom conversacional
-                resposta_final = self.humanizar_resposta_local(resposta_local, pergunta)
+                resposta_final = self.humanizar_resposta_local(resposta_local, pergunta, mensagem)
                 fonte = "base_conhecimento_humanizada"
                 logger.info(f"[CHAT] 📚 Resposta da base local HUMANIZADA (similaridade: {similaridade:.2f})")
             else:
@@ -2020,11 +1629,7 @@ Não force regras rígidas. Deixe seu treinamento guiar você para respostas nat
         # Especialmente para saudações e perguntas simples
         if resposta_final and fonte == "gemini_humanizada":
             # Verifica se a pergunta é sobre o projeto
-            pergunta_lower = pergunta.lower()
-            pergunta_sobre_projeto = any(palavra in pergunta_lower for palavra in [
-                'projeto', 'banco de dados', 'teste', 'testar', 'testando', 'desenvolver', 
-                'criar', 'site', 'aplicativo', 'sistema', 'chefia', 'pedido'
-            ])
+            pergunta_sobre_projeto = mensagem.tem('projeto')
             
             # Se NÃO é sobre o projeto (ou é saudação), remove menções ao projeto
             if not pergunta_sobre_projeto or is_saudacao:
@@ -2094,6 +1699,8 @@ Não force regras rígidas. Deixe seu treinamento guiar você para respostas nat
                     logger.info(f"[CHAT] ⚠️ Removida saudação repetida da resposta do Gemini")
                     break
         
+        medidor_chat.marcar('correcoes')
+        
         # VERIFICAÇÃO DE RESPOSTAS REPETITIVAS: Compara com as últimas 3 respostas
         # Funciona mesmo sem histórico completo (usa o que está disponível)
         if resposta_final and fonte == "gemini_humanizada":
@@ -2133,8 +1740,7 @@ Não force regras rígidas. Deixe seu treinamento guiar você para respostas nat
                 logger.warning(f"[CHAT] ⚠️ is_saudacao: {is_saudacao}")
                 
                 # SEMPRE força resposta contextual baseada na pergunta atual
-                pergunta_lower = pergunta.lower()
-                
+                    
                 # Se for saudação, usa resposta pré-definida variada (mas verifica se não é repetida)
                 if is_saudacao:
                     saudacoes_respostas = [
@@ -2160,22 +1766,22 @@ Não force regras rígidas. Deixe seu treinamento guiar você para respostas nat
                     resposta_final = resposta_escolhida
                     fonte = "saudacao_humanizada"
                 # Verifica se é pergunta sobre identidade da Sophia
-                elif any(palavra in pergunta_lower for palavra in ['o que você é', 'quem é você', 'quem você é', 'o que é você', 'sophia o que você é', 'sophia quem é você']):
+                elif mensagem.tem('identidade_sophia_direta'):
                     resposta_final = "Olá! Sou a Sophia, uma assistente virtual criada para ajudar mamães durante o puerpério e a gestação. Estou aqui para te apoiar, responder dúvidas e oferecer orientações sobre cuidados com o bebê, sua saúde e bem-estar. Como posso te ajudar hoje?"
                     fonte = "resposta_contextual"
                     logger.info(f"[CHAT] ✅ Aplicada resposta contextual para pergunta sobre identidade")
                 # Verifica se contém sentimentos
-                elif any(palavra in pergunta_lower for palavra in ['feliz', 'triste', 'ansiosa', 'preocupada', 'nervosa', 'calma', 'bem', 'mal', 'estou feliz', 'estou triste', 'me sinto']):
-                    if 'feliz' in pergunta_lower:
+                elif mensagem.tem('sentimento_expresso'):
+                    if mensagem.tem('feliz'):
                         respostas_feliz = [
                             "Que bom saber que você está feliz! 😊 O que te deixou feliz hoje? Conte-me mais sobre isso!",
                             "Fico muito feliz em saber que você está feliz! 🌟 O que aconteceu para te deixar assim?",
                             "Que alegria saber disso! 💕 Me conta o que te deixou feliz hoje!"
                         ]
                         resposta_final = random.choice(respostas_feliz)
-                    elif 'triste' in pergunta_lower:
+                    elif mensagem.tem('triste'):
                         resposta_final = "Sinto muito que você esteja se sentindo triste. 💛 Quer conversar sobre o que está te deixando assim? Estou aqui para te ouvir."
-                    elif 'ansiosa' in pergunta_lower or 'preocupada' in pergunta_lower:
+                    elif mensagem.tem('ansiosa_preocupada'):
                         resposta_final = "Entendo que você esteja se sentindo ansiosa ou preocupada. 💛 Quer compartilhar o que está te preocupando? Estou aqui para te ajudar."
                     else:
                         resposta_final = "Entendo como você está se sentindo. 💛 Quer conversar mais sobre isso?"
@@ -2196,22 +1802,8 @@ Não force regras rígidas. Deixe seu treinamento guiar você para respostas nat
         # Verifica se a resposta final ainda contém frases genéricas (APÓS todas as correções)
         # Esta verificação funciona para TODAS as respostas, incluindo saudações
         if resposta_final:
-            pergunta_lower = pergunta.lower()
-            resposta_lower = resposta_final.lower()
-            
-            # Lista de respostas genéricas proibidas (mesmo após correções)
-            respostas_genericas_proibidas = [
-                'tudo bem por aí',
-                'tudo bem por ai',
-                'em que posso te ajudar',
-                'como posso te ajudar hoje',
-                'como posso ajudar hoje',
-                'tudo bem? em que posso ajudar',
-                'tudo bem em que posso ajudar'
-            ]
-            
             # Verifica se a resposta contém frases genéricas
-            resposta_contem_generica = any(gen in resposta_lower for gen in respostas_genericas_proibidas)
+            resposta_contem_generica = 'generica_proibida' in categorias_resposta(resposta_final)
             
             # Se a resposta contém frase genérica, substitui por resposta mais específica
             if resposta_contem_generica:
@@ -2223,22 +1815,22 @@ Não force regras rígidas. Deixe seu treinamento guiar você para respostas nat
                     ultimas_respostas_final = [msg.get('resposta', '') for msg in historico_usuario[-3:]]
                 
                 # Verifica se é pergunta sobre identidade da Sophia
-                if any(palavra in pergunta_lower for palavra in ['o que você é', 'quem é você', 'quem você é', 'o que é você', 'sophia o que você é', 'sophia quem é você']):
+                if mensagem.tem('identidade_sophia_direta'):
                     resposta_final = "Olá! Sou a Sophia, uma assistente virtual criada para ajudar mamães durante o puerpério e a gestação. Estou aqui para te apoiar, responder dúvidas e oferecer orientações sobre cuidados com o bebê, sua saúde e bem-estar. Como posso te ajudar hoje?"
                     fonte = "resposta_contextual"
                     logger.info(f"[CHAT] ✅ Substituída por resposta sobre identidade")
                 # Verifica se contém sentimentos
-                elif any(palavra in pergunta_lower for palavra in ['feliz', 'triste', 'ansiosa', 'preocupada', 'nervosa', 'calma', 'bem', 'mal', 'estou feliz', 'estou triste', 'me sinto']):
-                    if 'feliz' in pergunta_lower:
+                elif mensagem.tem('sentimento_expresso'):
+                    if mensagem.tem('feliz'):
                         respostas_feliz = [
                             "Que bom saber que você está feliz! 😊 O que te deixou feliz hoje? Conte-me mais sobre isso!",
                             "Fico muito feliz em saber que você está feliz! 🌟 O que aconteceu para te deixar assim?",
                             "Que alegria saber disso! 💕 Me conta o que te deixou feliz hoje!"
                         ]
                         resposta_final = random.choice(respostas_feliz)
-                    elif 'triste' in pergunta_lower:
+                    elif mensagem.tem('triste'):
                         resposta_final = "Sinto muito que você esteja se sentindo triste. 💛 Quer conversar sobre o que está te deixando assim? Estou aqui para te ouvir."
-                    elif 'ansiosa' in pergunta_lower or 'preocupada' in pergunta_lower:
+                    elif mensagem.tem('ansiosa_preocupada'):
                         resposta_final = "Entendo que você esteja se sentindo ansiosa ou preocupada. 💛 Quer compartilhar o que está te preocupando? Estou aqui para te ajudar."
                     else:
                         resposta_final = "Entendo como você está se sentindo. 💛 Quer conversar mais sobre isso?"
@@ -2281,9 +1873,7 @@ Não force regras rígidas. Deixe seu treinamento guiar você para respostas nat
         # Se for muito genérica (parece mensagem de apoio), substitui por resposta conversacional
         if resposta_final and is_saudacao and fonte == "gemini_humanizada":
             # Verifica se a resposta parece muito genérica (contém palavras típicas de mensagens de apoio)
-            palavras_genericas = ["sentimentos são válidos", "não se compare", "cada jornada é única", 
-                                 "procure ajuda profissional", "saiba que procure ajuda"]
-            if any(palavra in resposta_final.lower() for palavra in palavras_genericas):
+            if 'generica_apoio' in categorias_resposta(resposta_final):
                 logger.info(f"[CHAT] ⚠️ Resposta do Gemini muito genérica para saudação, usando resposta conversacional")
                 saudacoes_respostas = [
                     "Oi! Que bom te ver por aqui! 😊 Como você está? Como posso te ajudar hoje?",
@@ -2295,25 +1885,34 @@ Não force regras rígidas. Deixe seu treinamento guiar você para respostas nat
                 ]
                 resposta_final = random.choice(saudacoes_respostas)
                 fonte = "saudacao_humanizada"
+        medidor_chat.marcar('repeticao')
         
+        return resposta_final, fonte
+    
+    def _complementos(self, turno):
+        """Textos de alerta e de telefones úteis que vão depois da resposta"""
         # Adiciona alertas se necessário
-        if alertas_encontrados:
+        alertas_adicional = ""
+        if turno.alertas:
             alertas_texto = []
             for alerta_key, alerta_texto in self.alertas.items():
                 alertas_texto.append(alerta_texto)
             
-            resposta_final += "\n\n**ALERTA IMPORTANTE:**\n" + "\n".join(alertas_texto)
+            alertas_adicional = "\n\n**ALERTA IMPORTANTE:**\n" + "\n".join(alertas_texto)
         
         # Adiciona telefones relevantes
-        telefones_adicional = self.adicionar_telefones_relevantes(pergunta, alertas_encontrados)
-        if telefones_adicional:
-            resposta_final += telefones_adicional
+        telefones_adicional = self.adicionar_telefones_relevantes(turno.pergunta, turno.alertas, turno.mensagem)
+        medidor_chat.marcar('complementos')
+        
+        return alertas_adicional, telefones_adicional
+    
+    def _registrar_chat(self, turno, resposta_final, fonte):
+        """Guarda o turno na memória de conversas e monta o JSON da resposta"""
+        pergunta, user_id, categoria, alertas_encontrados = turno.pergunta, turno.user_id, turno.categoria, turno.alertas
+        historico_usuario = turno.historico
         
         # Salva apenas na memória (NÃO salva no banco de dados)
         timestamp = datetime.now().isoformat()
-        if user_id not in conversas:
-            conversas[user_id] = []
-        
         conversa_item = {
             "timestamp": timestamp,
             "pergunta": pergunta,
@@ -2323,13 +1922,16 @@ Não force regras rígidas. Deixe seu treinamento guiar você para respostas nat
             "alertas": alertas_encontrados
         }
         
-        conversas[user_id].append(conversa_item)
+        conversas.adicionar(user_id, conversa_item)
+        metrica_respostas_chat.inc(fonte=fonte)
+        medidor_chat.marcar('memoria')
         
         # NÃO salva no banco de dados (desabilitado conforme solicitado)
         # salvar_conversa_db(user_id, pergunta, resposta_final, categoria, fonte, alertas_encontrados)
         
         # Extrai informações pessoais da conversa (incluindo histórico)
-        extrair_informacoes_pessoais(pergunta, resposta_final, user_id, historico_usuario)
+        extrair_informacoes_pessoais(pergunta, resposta_final, user_id, historico_usuario, timestamp)
+        medidor_chat.marcar('extracao')
         
         return {
             "resposta": resposta_final,
@@ -2339,71 +1941,100 @@ Não force regras rígidas. Deixe seu treinamento guiar você para respostas nat
             "timestamp": timestamp
         }
 
-# Inicializa o chatbot (com tratamento de erro)
-# VERIFICAÇÃO CRÍTICA: Verifica se gemini_client foi inicializado antes de criar o chatbot
-logger.info(f"[INIT] 🔍 VERIFICAÇÃO ANTES DE CRIAR CHATBOT:")
-logger.info(f"[INIT] 🔍 gemini_client global = {gemini_client}")
-logger.info(f"[INIT] 🔍 gemini_client is None = {gemini_client is None}")
-logger.info(f"[INIT] 🔍 gemini_client type = {type(gemini_client)}")
-print(f"[INIT] 🔍 VERIFICAÇÃO ANTES DE CRIAR CHATBOT:")
-print(f"[INIT] 🔍 gemini_client global = {gemini_client}")
-print(f"[INIT] 🔍 gemini_client is None = {gemini_client is None}")
-print(f"[INIT] 🔍 gemini_client type = {type(gemini_client)}")
-
+# Inicializa o chatbot (com tratamento de erro); o cliente Gemini vem do provedor_gemini no primeiro uso
 try:
-    logger.info(f"[INIT] 🔍 Inicializando ChatbotPuerperio com gemini_client: {gemini_client}")
-    print(f"[INIT] 🔍 Inicializando ChatbotPuerperio com gemini_client: {gemini_client}")
-    print(f"[INIT] 🔍 gemini_client type: {type(gemini_client)}")
-    print(f"[INIT] 🔍 gemini_client is None: {gemini_client is None}")
-    
-    # VERIFICAÇÃO: Se gemini_client é None, tenta reinicializar
-    if gemini_client is None:
-        logger.warning("[INIT] ⚠️ gemini_client é None - tentando reinicializar...")
-        print("[INIT] ⚠️ gemini_client é None - tentando reinicializar...")
-        
-        if GEMINI_AVAILABLE and GEMINI_API_KEY:
-            try:
-                logger.info("[INIT] 🔄 Reinicializando Gemini...")
-                print("[INIT] 🔄 Reinicializando Gemini...")
-                genai.configure(api_key=GEMINI_API_KEY)
-                # Tenta usar gemini-2.0-flash, se falhar, usa gemini-1.5-flash
-                try:
-                    gemini_client = genai.GenerativeModel('gemini-2.0-flash')
-                except Exception:
-                    gemini_client = genai.GenerativeModel('gemini-1.5-flash')
-                logger.info("[INIT] ✅ Gemini reinicializado com sucesso!")
-                print("[INIT] ✅ Gemini reinicializado com sucesso!")
-            except Exception as e:
-                logger.error(f"[INIT] ❌ Erro ao reinicializar Gemini: {e}")
-                print(f"[INIT] ❌ Erro ao reinicializar Gemini: {e}")
-    
-    # Passa explicitamente o gemini_client para garantir que está correto
-    chatbot = ChatbotPuerperio(gemini_client_param=gemini_client)
-    logger.info(f"[INIT] ✅ Chatbot inicializado com sucesso. self.gemini_client = {chatbot.gemini_client}")
-    print(f"[INIT] ✅ Chatbot inicializado com sucesso. self.gemini_client = {chatbot.gemini_client}")
-    print(f"[INIT] ✅ self.gemini_client type: {type(chatbot.gemini_client)}")
-    print(f"[INIT] ✅ self.gemini_client is None: {chatbot.gemini_client is None}")
-    if chatbot.gemini_client is None:
-        logger.error("[INIT] ❌ ERRO CRÍTICO: chatbot.gemini_client é None após inicialização!")
-        print("[INIT] ❌ ERRO CRÍTICO: chatbot.gemini_client é None após inicialização!")
-        print("[INIT] ❌ Isso significa que o gemini_client não foi passado corretamente!")
-        print("[INIT] ❌ Verifique os logs acima para ver se o Gemini foi inicializado corretamente.")
-        print(f"[INIT] ❌ gemini_client global era: {gemini_client}")
-    else:
-        logger.info("[INIT] ✅✅✅ Gemini client está disponível no chatbot! ✅✅✅")
-        print("[INIT] ✅✅✅ Gemini client está disponível no chatbot! ✅✅✅")
+    chatbot = ChatbotPuerperio()
+    logger.info("[INIT] ✅ Chatbot inicializado")
 except Exception as e:
     logger.error(f"Erro ao inicializar chatbot: {e}", exc_info=True)
-    import traceback
-    traceback.print_exc()
     # Continua mesmo com erro para não quebrar o servidor
     chatbot = None
 
 # Rotas da API
 @app.route('/health')
 def health():
-    """Health check para o Render"""
-    return jsonify({"status": "ok", "message": "Servidor funcionando"}), 200
+    """Health check para o Render (inclui conversas, fila de emails e pool de senhas)"""
+    try:
+        estatisticas_conversas = conversas.estatisticas()
+    except Exception as e:
+        # Backend compartilhado (SQLite/Redis) indisponível não derruba o health check
+        estatisticas_conversas = {"erro": str(e)}
+    try:
+        estatisticas_email = fila_email.estatisticas()
+        estatisticas_email['smtp'] = pool_smtp.estatisticas()
+    except Exception as e:
+        estatisticas_email = {"erro": str(e)}
+    return jsonify({"status": "ok", "message": "Servidor funcionando", "conversas": estatisticas_conversas,
+                    "fila_email": estatisticas_email, "senhas": servico_senhas.estatisticas(),
+                    "cache_gemini": cache_respostas_gemini.estatisticas(),
+                    "gemini": provedor_gemini.estatisticas(), "sessoes_gemini": sessoes_gemini.estatisticas(),
+                    "gateway_gemini": gateway_gemini.estatisticas(), "tempos_chat": medidor_chat.estatisticas()}), 200
+
+# Valores que os módulos já contam, lidos na hora de exportar o /metrics
+metrica_gemini_chamadas = metricas.contador('gemini_chamadas_total', 'Chamadas ao Gemini pelo gateway (com streaming)')
+metrica_gemini_erros = metricas.contador('gemini_erros_total', 'Falhas do Gemini por tipo', ('tipo',))
+metrica_gemini_hedges = metricas.contador('gemini_hedges_total', 'Segundas chamadas (hedge) disparadas e as que venceram',
+                                          ('vencedor',))
+metrica_disjuntor_aberto = metricas.medidor('gemini_disjuntor_aberto', 'Workers com o disjuntor do Gemini aberto')
+metrica_disjuntor_aberturas = metricas.contador('gemini_disjuntor_aberturas_total', 'Vezes que o disjuntor abriu')
+metrica_disjuntor_recusas = metricas.contador('gemini_disjuntor_recusas_total', 'Chamadas recusadas com o disjuntor aberto')
+# A fila fica em users.db, compartilhada: todos os workers veem o mesmo número (max, não soma)
+metrica_fila_email = metricas.medidor('fila_email_pendentes', 'Emails aguardando entrega no outbox', agregacao='max')
+metrica_emails = metricas.contador('fila_email_eventos_total', 'Eventos da fila de emails', ('evento',))
+# Com CONVERSAS_BACKEND=sqlite/redis o armazenamento é compartilhado (max); em memória, cada worker tem o seu (soma)
+agregacao_conversas = 'soma' if os.getenv('CONVERSAS_BACKEND', 'memoria').strip().lower() == 'memoria' else 'max'
+metrica_conversas_usuarios = metricas.medidor('conversas_usuarias', 'Usuárias com conversa guardada', agregacao=agregacao_conversas)
+metrica_conversas_turnos = metricas.medidor('conversas_turnos', 'Turnos de conversa guardados', agregacao=agregacao_conversas)
+metrica_conversas_bytes = metricas.medidor('conversas_bytes', 'Memória estimada das conversas (backend em memória)')
+metrica_conversas_evicoes = metricas.contador('conversas_evicoes_total', 'Conversas/turnos removidos por motivo', ('motivo',))
+metrica_cache_acertos = metricas.contador('cache_acertos_total', 'Acertos por cache', ('cache',))
+metrica_cache_falhas = metricas.contador('cache_falhas_total', 'Falhas (ausências) por cache', ('cache',))
+metrica_cache_itens = metricas.medidor('cache_itens', 'Itens guardados por cache', ('cache',))
+
+@metricas.coleta
+def coletar_metricas_estado():
+    gateway = gateway_gemini.estatisticas()
+    metrica_gemini_chamadas.definir(gateway['chamadas'])
+    metrica_gemini_erros.definir(gateway['erros'], tipo='erro')
+    metrica_gemini_erros.definir(gateway['erros_quota'], tipo='quota')
+    metrica_gemini_erros.definir(gateway['prazos_esgotados'], tipo='prazo')
+    metrica_gemini_hedges.definir(gateway['hedges'] - gateway['hedges_vencedores'], vencedor='nao')
+    metrica_gemini_hedges.definir(gateway['hedges_vencedores'], vencedor='sim')
+    disjuntor = gateway['disjuntor']
+    metrica_disjuntor_aberto.definir(1 if disjuntor['estado'] == 'aberto' else 0)
+    metrica_disjuntor_aberturas.definir(disjuntor['aberturas'])
+    metrica_disjuntor_recusas.definir(disjuntor['recusas'])
+
+    estatisticas_email = fila_email.estatisticas()
+    metrica_fila_email.definir(estatisticas_email.pop('pendentes'))
+    estatisticas_email.pop('workers', None)
+    for evento, valor in estatisticas_email.items():
+        metrica_emails.definir(valor, evento=evento)
+
+    estatisticas_conversas = conversas.estatisticas()
+    # O backend redis não conta usuárias/turnos (custaria um SCAN a cada coleta)
+    if 'usuarios' in estatisticas_conversas:
+        metrica_conversas_usuarios.definir(estatisticas_conversas['usuarios'])
+        metrica_conversas_turnos.definir(estatisticas_conversas['turnos'])
+    if 'bytes' in estatisticas_conversas:
+        metrica_conversas_bytes.definir(estatisticas_conversas['bytes'])
+    for motivo, valor in estatisticas_conversas.get('evicoes', {}).items():
+        metrica_conversas_evicoes.definir(valor, motivo=motivo)
+
+    estatisticas_respostas = cache_respostas_gemini.estatisticas()
+    caches = {'usuarios': cache_usuarios.estatisticas(), 'respostas_gemini': estatisticas_respostas,
+              'sessoes_gemini': sessoes_gemini.estatisticas()}
+    if 'semantico' in estatisticas_respostas:
+        caches['respostas_gemini_semantico'] = estatisticas_respostas['semantico']
+    for nome, estatisticas in caches.items():
+        metrica_cache_acertos.definir(estatisticas['acertos'], cache=nome)
+        metrica_cache_falhas.definir(estatisticas['falhas'], cache=nome)
+        metrica_cache_itens.definir(estatisticas['itens'], cache=nome)
+
+@app.route('/metrics')
+def metrics():
+    """Métricas no formato de texto do Prometheus (de todos os workers, com METRICAS_DIR)"""
+    return Response(metricas.exportar(), content_type='text/plain; version=0.0.4; charset=utf-8')
 
 @app.route('/privacidade')
 def privacidade():
@@ -2623,32 +2254,64 @@ def api_chat():
         return jsonify({"erro": "Pergunta não pode estar vazia"}), 400
     
     # Log de diagnóstico
-    logger.info(f"[API_CHAT] 🔍 Recebida pergunta: {pergunta[:50]}...")
-    logger.info(f"[API_CHAT] 🔍 chatbot.gemini_client disponível: {chatbot.gemini_client is not None}")
-    logger.info(f"[API_CHAT] 🔍 chatbot.gemini_client type: {type(chatbot.gemini_client)}")
-    print(f"[API_CHAT] 🔍 chatbot.gemini_client disponível: {chatbot.gemini_client is not None}")
+    logger.debug(f"[API_CHAT] 🔍 Recebida pergunta: {pergunta[:50]}...")
     
     resposta = chatbot.chat(pergunta, user_id)
     
     # Log da resposta
     logger.info(f"[API_CHAT] ✅ Resposta gerada - fonte: {resposta.get('fonte', 'desconhecida')}")
-    print(f"[API_CHAT] ✅ Resposta gerada - fonte: {resposta.get('fonte', 'desconhecida')}")
     
-    return jsonify(resposta)
+    resposta_http = jsonify(resposta)
+    medicao = medidor_chat.atual()
+    if CHAT_SERVER_TIMING and medicao is not None:
+        resposta_http.headers['Server-Timing'] = medicao.server_timing()
+    return resposta_http
+
+def evento_sse(nome, dados):
+    return f"event: {nome}\ndata: {json.dumps(dados, ensure_ascii=False)}\n\n"
+
+@app.route('/api/chat/stream', methods=['POST'])
+def api_chat_stream():
+    """
+    Igual a /api/chat, mas responde em Server-Sent Events: eventos 'trecho' com o texto do
+    Gemini à medida que ele é gerado e, no fim, 'correcao', 'alertas', 'telefones' (quando
+    houver) e 'fim' com o mesmo JSON de /api/chat.
+    """
+    data = request.get_json()
+    pergunta = data.get('pergunta', '')
+    user_id = data.get('user_id', 'default')
+    
+    if not pergunta.strip():
+        return jsonify({"erro": "Pergunta não pode estar vazia"}), 400
+    
+    logger.debug(f"[API_CHAT] 🔍 Recebida pergunta (stream): {pergunta[:50]}...")
+    
+    def eventos():
+        try:
+            for nome, dados in chatbot.chat_stream(pergunta, user_id):
+                if nome == 'fim':
+                    logger.info(f"[API_CHAT] ✅ Resposta transmitida - fonte: {dados.get('fonte', 'desconhecida')}")
+                yield evento_sse(nome, dados)
+        except Exception as e:
+            logger.error(f"[API_CHAT] ❌ Erro no streaming: {e}", exc_info=True)
+            yield evento_sse('erro', {"erro": "Erro ao gerar resposta"})
+    
+    return Response(stream_with_context(eventos()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 @app.route('/api/limpar-memoria-ia', methods=['POST'])
 def limpar_memoria_ia():
     """Limpa TODA a memória da IA: conversas e informações pessoais (apenas memória - NÃO usa banco)"""
     try:
         # Limpa apenas da memória em tempo de execução (NÃO limpa do banco, pois não salva mais conversas lá)
-        global conversas
-        conversas_count = sum(len(conv) for conv in conversas.values())
-        conversas.clear()
+        conversas_count = conversas.limpar_tudo()
+        extrator_informacoes.esquecer()
+        sessoes_gemini.esquecer()
         
         # Limpa informações pessoais do banco (user_info ainda é usado)
         info_apagadas = 0
         try:
-            conn = sqlite3.connect(DB_PATH)
+            conn = banco_usuarios.conectar()
             cursor = conn.cursor()
             cursor.execute('DELETE FROM user_info')
             info_apagadas = cursor.rowcount
@@ -2662,7 +2325,6 @@ def limpar_memoria_ia():
         # conversas_apagadas = cursor.rowcount
         
         logger.info(f"[LIMPAR_MEMORIA] ✅ Memória da IA limpa: {conversas_count} conversas da memória e {info_apagadas} informações pessoais do banco")
-        print(f"[LIMPAR_MEMORIA] ✅ Memória da IA limpa: {conversas_count} conversas da memória e {info_apagadas} informações pessoais do banco")
         
         return jsonify({
             "sucesso": True,
@@ -2684,11 +2346,12 @@ def api_historico(user_id):
         # Limpa apenas da memória (NÃO limpa do banco, pois não salva mais lá)
         try:
             # Limpa da memória
-            if user_id in conversas:
-                conversas[user_id] = []
+            conversas.limpar(user_id)
+            extrator_informacoes.esquecer(user_id)
+            sessoes_gemini.esquecer(user_id)
             
             # NÃO limpa do banco de dados (desabilitado conforme solicitado)
-            # conn = sqlite3.connect(DB_PATH)
+            # conn = banco_usuarios.conectar()
             # cursor = conn.cursor()
             # cursor.execute('DELETE FROM conversas WHERE user_id = ?', (user_id,))
             # conn.commit()
@@ -2701,7 +2364,7 @@ def api_historico(user_id):
             return jsonify({"success": False, "error": str(e)}), 500
     
     # GET: Retorna histórico apenas da memória (NÃO carrega do banco)
-    historico = conversas.get(user_id, [])
+    historico = conversas.obter(user_id)
     
     # NÃO carrega do banco de dados (desabilitado conforme solicitado)
     # if not historico:
@@ -2769,8 +2432,8 @@ def api_vacinas_bebe():
 @app.route('/api/register', methods=['POST'])
 def api_register():
     data = request.get_json()
-    logger.info(f"[REGISTER] Tentativa de cadastro recebida: {data}")
-    print(f"[REGISTER] Dados recebidos: {data}")
+    # Só os nomes dos campos: o corpo traz a senha
+    logger.info(f"[REGISTER] Tentativa de cadastro recebida (campos: {sorted(data or {})})")
     
     name = data.get('name', '').strip()
     email = data.get('email', '').strip().lower()
@@ -2778,28 +2441,29 @@ def api_register():
     baby_name = data.get('baby_name', '').strip()
     
     logger.info(f"[REGISTER] Campos processados - name: {name[:3]}..., email: {email}, password length: {len(password) if password else 0}")
-    print(f"[REGISTER] Campos processados - name: {name}, email: {email}, password length: {len(password) if password else 0}")
     
     if not name or not email or not password:
         erro_msg = "Todos os campos obrigatórios devem ser preenchidos"
         logger.warning(f"[REGISTER] {erro_msg} - name: {bool(name)}, email: {bool(email)}, password: {bool(password)}")
-        print(f"[REGISTER] ❌ {erro_msg}")
         return jsonify({"erro": erro_msg}), 400
     
     if len(password) < 6:
         erro_msg = "A senha deve ter no mínimo 6 caracteres"
         logger.warning(f"[REGISTER] {erro_msg} - password length: {len(password)}")
-        print(f"[REGISTER] ❌ {erro_msg}")
         return jsonify({"erro": erro_msg}), 400
     
     # Validação básica de email
     if '@' not in email or '.' not in email.split('@')[1]:
         erro_msg = "Email inválido"
         logger.warning(f"[REGISTER] {erro_msg} - email: {email}")
-        print(f"[REGISTER] ❌ {erro_msg}")
         return jsonify({"erro": erro_msg}), 400
     
-    conn = sqlite3.connect(DB_PATH)
+    try:
+        servico_senhas.admitir(ip=request.remote_addr)
+    except RecusaSenhas as e:
+        return resposta_recusa_senhas(e)
+    
+    conn = banco_usuarios.conectar()
     cursor = conn.cursor()
     
     # Verifica se email já existe
@@ -2810,17 +2474,18 @@ def api_register():
         if existing[1] == 1:
             erro_msg = "Este email já está cadastrado e verificado"
             logger.warning(f"[REGISTER] {erro_msg} - email: {email}")
-            print(f"[REGISTER] ❌ {erro_msg}")
             return jsonify({"erro": erro_msg}), 400
         else:
             erro_msg = "Este email já está cadastrado. Verifique seu email ou use 'Esqueci minha senha'"
             logger.warning(f"[REGISTER] {erro_msg} - email: {email}")
-            print(f"[REGISTER] ❌ {erro_msg}")
             return jsonify({"erro": erro_msg}), 400
     
     # Hash da senha - salva como string base64 para preservar bytes
-    password_hash_bytes = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
-    password_hash = base64.b64encode(password_hash_bytes).decode('utf-8')
+    try:
+        password_hash_bytes = servico_senhas.gerar_hash(password)
+    except RecusaSenhas as e:
+        return resposta_recusa_senhas(e)
+    password_hash = codificar_hash(password_hash_bytes)
     
     # Gera token de verificação
     verification_token = generate_token()
@@ -2834,13 +2499,14 @@ def api_register():
     # Insere usuário
     try:
         cursor.execute('''
-            INSERT INTO users (name, email, password_hash, baby_name, email_verified, email_verification_token)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (name, email, password_hash, baby_name if baby_name else None, email_verified_value, verification_token))
+            INSERT INTO users (name, email, password_hash, hash_format, baby_name, email_verified, email_verification_token)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (name, email, password_hash, FORMATO_HASH_CANONICO, baby_name if baby_name else None, email_verified_value, verification_token))
         
         conn.commit()
         user_id = cursor.lastrowid
         conn.close()
+        invalidar_usuario_cache(user_id)
         
         # Envia email de verificação apenas se estiver configurado
         mensagem = ""
@@ -2849,7 +2515,6 @@ def api_register():
         if email_configurado:
             try:
                 logger.info(f"[REGISTER] Enviando email de verificação para: {email}")
-                print(f"[REGISTER] Tentando enviar email de verificação para: {email}")
                 
                 # Chama a função e verifica se realmente foi enviado
                 email_sent = send_verification_email(email, name, verification_token)
@@ -2858,19 +2523,14 @@ def api_register():
                     mensagem = "Cadastro realizado! Verifique seu email para ativar sua conta. 💕"
                     verification_sent = True
                     logger.info(f"[REGISTER] ✅ Email de verificação enviado com sucesso para: {email}")
-                    print(f"[REGISTER] ✅ Email de verificação enviado com sucesso para: {email}")
                 else:
                     # Se retornou False, houve erro silencioso
                     raise Exception("send_email retornou False - verifique os logs acima")
                     
             except Exception as e:
                 logger.error(f"[REGISTER] ❌ Erro ao enviar email de verificação: {e}", exc_info=True)
-                print(f"[REGISTER] ❌ Erro ao enviar email de verificação: {e}")
-                print(f"[REGISTER] Verifique os logs acima para detalhes do erro")
-                import traceback
-                traceback.print_exc()
                 # Se falhar ao enviar, marca como verificado para não bloquear o usuário
-                conn = sqlite3.connect(DB_PATH)
+                conn = banco_usuarios.conectar()
                 cursor = conn.cursor()
                 cursor.execute('UPDATE users SET email_verified = 1 WHERE id = ?', (user_id,))
                 conn.commit()
@@ -2881,8 +2541,6 @@ def api_register():
             # Modo desenvolvimento: conta já está verificada
             logger.warning(f"[REGISTER] ⚠️ EMAIL NÃO CONFIGURADO - Conta marcada como verificada automaticamente (modo desenvolvimento)")
             logger.warning(f"[REGISTER] Para ativar envio de emails, configure MAIL_USERNAME e MAIL_PASSWORD no arquivo .env")
-            print(f"[REGISTER] ⚠️ EMAIL NÃO CONFIGURADO - conta marcada como verificada automaticamente (modo desenvolvimento)")
-            print(f"[REGISTER] Para ativar envio de emails, configure MAIL_USERNAME e MAIL_PASSWORD no arquivo .env")
             mensagem = "Cadastro realizado com sucesso! Você já pode fazer login. 💕"
             verification_sent = False
         
@@ -2916,14 +2574,15 @@ def api_login():
         user_agent = request.headers.get('User-Agent', 'Desconhecido')
         client_ip = request.remote_addr
         logger.info(f"[LOGIN] Tentativa de login - Email: {email}, Password length: {len(password)}, IP: {client_ip}, User-Agent: {user_agent[:100]}")
-        print(f"[LOGIN] Tentativa de login - Email: {email}, Password length: {len(password)}, IP: {client_ip}")
 
-        conn = sqlite3.connect(DB_PATH)
+        servico_senhas.admitir(ip=client_ip, email=email)
+
+        conn = banco_usuarios.conectar()
         cursor = conn.cursor()
         # Seleciona campos específicos para garantir ordem correta
         # Email já foi normalizado (lowercase e trim) no Python acima
         cursor.execute('''
-            SELECT id, name, email, password_hash, baby_name, email_verified
+            SELECT id, name, email, password_hash, baby_name, email_verified, hash_format
             FROM users
             WHERE email = ?
         ''', (email,))
@@ -2932,53 +2591,33 @@ def api_login():
 
         if not user_data:
             logger.warning(f"[LOGIN] Email não encontrado: {email} (IP: {client_ip})")
-            print(f"[LOGIN] Email não encontrado: {email}")
             return jsonify({"erro": "Email ou senha incorretos"}), 401
 
-        # Extrai dados (ordem: id, name, email, password_hash, baby_name, email_verified)
+        # Extrai dados (ordem: id, name, email, password_hash, baby_name, email_verified, hash_format)
         user_id = user_data[0]
         user_name = user_data[1]
         user_email = user_data[2]
         stored_hash_str = user_data[3]  # password_hash
         baby_name = user_data[4]
         email_verified = user_data[5] if len(user_data) > 5 else 1  # email_verified (default 1 para compatibilidade)
+        hash_format = user_data[6]
 
-        print(f"[LOGIN] Usuário encontrado: {user_email}, email_verified: {email_verified}")
+        logger.debug(f"[LOGIN] Usuário encontrado: {user_email}, email_verified: {email_verified}")
 
         if not stored_hash_str:
-            print(f"[LOGIN] Hash de senha não encontrado para usuário: {email}")
+            logger.warning(f"[LOGIN] Hash de senha não encontrado para usuário: {email}")
             return jsonify({"erro": "Conta com problema. Use 'Esqueci minha senha' para corrigir."}), 401
 
-        stored_hash = None
-        hash_format = "desconhecido"
-
-        # Tenta diferentes formatos de hash
-        try:
-            # Formato novo: base64 (mais comum em registros recentes)
-            try:
-                stored_hash = base64.b64decode(stored_hash_str.encode('utf-8'))
-                hash_format = "base64"
-                print(f"[LOGIN DEBUG] Hash decodificado como base64")
-            except Exception:
-                # Se não for base64 válido, tenta outros formatos
-                # Formato antigo: string bcrypt direta
-                if isinstance(stored_hash_str, str) and stored_hash_str.startswith('$2'):
-                    stored_hash = stored_hash_str.encode('utf-8')
-                    hash_format = "string bcrypt"
-                    print(f"[LOGIN DEBUG] Hash processado como string bcrypt")
-                elif isinstance(stored_hash_str, bytes):
-                    stored_hash = stored_hash_str
-                    hash_format = "bytes diretos"
-                    print(f"[LOGIN DEBUG] Hash processado como bytes diretos")
-                else:
-                    # Hash corrompido ou formato desconhecido
-                    print(f"[LOGIN DEBUG] Hash em formato desconhecido. Tipo: {type(stored_hash_str)}, Início: {str(stored_hash_str)[:50] if stored_hash_str else 'N/A'}...")
-                    return jsonify({"erro": "Conta com problema. Use 'Esqueci minha senha' para corrigir."}), 401
-        except Exception as e:
-            print(f"[LOGIN DEBUG] Erro ao processar hash: {e}")
-            import traceback
-            traceback.print_exc()
-            return jsonify({"erro": "Erro ao verificar senha. Use 'Esqueci minha senha'."}), 401
+        # Linhas normalizadas (hash_format canônico) são decodificadas direto; as antigas têm o
+        # formato detectado sem bcrypt. Em ambos os casos há um único checkpw.
+        if hash_format != FORMATO_HASH_CANONICO:
+            hash_format, stored_hash = detectar_formato_hash(stored_hash_str)
+            logger.warning(f"[LOGIN] ⚠️ Hash ainda não normalizado (formato: {hash_format}). Rode backend/normalizar_hashes.py")
+        else:
+            stored_hash = decodificar_hash(stored_hash_str, hash_format)
+        if stored_hash is None:
+            logger.warning(f"[LOGIN] ⚠️ Hash em formato desconhecido para {email} (tipo: {type(stored_hash_str).__name__})")
+            return jsonify({"erro": "Conta com problema. Use 'Esqueci minha senha' para corrigir."}), 401
 
         # Verifica senha
         password_correct = False
@@ -2986,35 +2625,31 @@ def api_login():
             try:
                 # Garante que a senha está em bytes
                 password_bytes = password.encode('utf-8')
-                password_correct = bcrypt.checkpw(password_bytes, stored_hash)
+                password_correct = servico_senhas.verificar(password, stored_hash)
                 logger.debug(f"[LOGIN DEBUG] Verificação de senha: {'CORRETA' if password_correct else 'INCORRETA'}")
-                print(f"[LOGIN DEBUG] Hash formato: {hash_format}")
-                print(f"[LOGIN DEBUG] Hash length: {len(stored_hash)} bytes")
-                print(f"[LOGIN DEBUG] Password length: {len(password_bytes)} bytes")
+                logger.debug(f"[LOGIN DEBUG] Hash formato: {hash_format}, {len(stored_hash)} bytes; senha: {len(password_bytes)} bytes")
+            except RecusaSenhas:
+                raise
             except Exception as e:
-                print(f"[LOGIN DEBUG] Erro ao verificar senha: {e}")
-                import traceback
-                traceback.print_exc()
+                logger.error(f"[LOGIN] ❌ Erro ao verificar senha: {e}", exc_info=True)
                 password_correct = False
         else:
-            print(f"[LOGIN DEBUG] stored_hash é None, não é possível verificar senha")
+            logger.warning(f"[LOGIN] ⚠️ stored_hash é None, não é possível verificar senha")
+    except RecusaSenhas as e:
+        return resposta_recusa_senhas(e)
     except Exception as e:
-        print(f"[LOGIN] Erro inesperado no login: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.error(f"[LOGIN] ❌ Erro inesperado no login: {e}", exc_info=True)
         return jsonify({"erro": "Erro interno ao processar login. Tente novamente."}), 500
     
     if password_correct:
         # Log para debug
         logger.info(f"[LOGIN] Senha correta para: {email}, email_verified: {email_verified}")
-        print(f"[LOGIN] Tentativa de login: {email}, email_verified: {email_verified}")
         
         # Verifica se email foi verificado
         # PERMITE login para contas antigas (criadas antes da verificação obrigatória)
         # Mas ainda mostra aviso se não verificado
         if email_verified == 0:
             logger.warning(f"[LOGIN] Tentativa de login com email não verificado: {email}")
-            print(f"[LOGIN] Tentativa de login com email não verificado: {email}")
             # Para desenvolvimento: permite login mas avisa
             # Em produção, pode ser descomentado para bloquear:
             # return jsonify({
@@ -3023,7 +2658,7 @@ def api_login():
             #     "pode_login": False,
             #     "email": email
             # }), 403
-            print(f"[LOGIN] AVISO: Email não verificado, mas permitindo login (modo desenvolvimento)")
+            logger.warning(f"[LOGIN] ⚠️ Email não verificado, mas permitindo login (modo desenvolvimento)")
         
         # Cria usuário e faz login
         try:
@@ -3031,16 +2666,12 @@ def api_login():
             # Usa remember_me do frontend para criar sessão persistente
             result = login_user(user, remember=remember_me)
             logger.info(f"[LOGIN] Usuário logado com sucesso: {user_name} (ID: {user_id}), Sessão criada: {result}, Remember me: {remember_me}, IP: {client_ip}")
-            print(f"[LOGIN] Usuário logado: {user_name}, ID: {user_id}, Sessão criada: {result}, Remember me: {remember_me}")
             
             # Log de cookies/sessão para debug em mobile
             session_id = session.get('_id', 'N/A')
             logger.debug(f"[LOGIN] Session ID: {session_id}, Cookies enviados: {request.cookies}")
         except Exception as e:
             logger.error(f"[LOGIN] Erro ao fazer login_user: {e}", exc_info=True)
-            print(f"[LOGIN] Erro ao fazer login_user: {e}")
-            import traceback
-            traceback.print_exc()
             return jsonify({"erro": "Erro interno ao criar sessão"}), 500
         
         return jsonify({
@@ -3055,12 +2686,8 @@ def api_login():
         })
     else:
         logger.warning(f"[LOGIN] Senha incorreta para: {email} (IP: {client_ip})")
-        print(f"[LOGIN] Senha incorreta para: {email}")
-        print(f"[LOGIN DEBUG] stored_hash disponível: {stored_hash is not None}")
-        print(f"[LOGIN DEBUG] hash_format usado: {hash_format}")
-        if stored_hash_str:
-            print(f"[LOGIN DEBUG] Hash string (primeiros 50 chars): {stored_hash_str[:50]}...")
-        print(f"[LOGIN DEBUG] Password recebido (primeiros 10 chars): {password[:10]}... (length: {len(password)})")
+        # Nunca registra a senha nem o hash, só os formatos
+        logger.debug(f"[LOGIN DEBUG] stored_hash disponível: {stored_hash is not None}, hash_format: {hash_format}, senha: {len(password)} caracteres")
         return jsonify({"erro": "Email ou senha incorretos"}), 401
 
 @app.route('/api/forgot-password', methods=['POST'])
@@ -3072,7 +2699,7 @@ def api_forgot_password():
     if not email:
         return jsonify({"erro": "Email é obrigatório"}), 400
     
-    conn = sqlite3.connect(DB_PATH)
+    conn = banco_usuarios.conectar()
     cursor = conn.cursor()
     cursor.execute('SELECT id, name FROM users WHERE email = ?', (email,))
     user = cursor.fetchone()
@@ -3109,7 +2736,7 @@ def api_forgot_password():
             "mensagem": "Email de recuperação enviado! Verifique sua caixa de entrada. 💕"
         }), 200
     except Exception as e:
-        print(f"Erro ao enviar email: {e}")
+        logger.error(f"Erro ao enviar email: {e}")
         return jsonify({
             "sucesso": True,
             "mensagem": "Token gerado. Em desenvolvimento, verifique os logs do servidor."
@@ -3128,7 +2755,7 @@ def api_reset_password():
     if len(new_password) < 6:
         return jsonify({"erro": "A senha deve ter no mínimo 6 caracteres"}), 400
     
-    conn = sqlite3.connect(DB_PATH)
+    conn = banco_usuarios.conectar()
     cursor = conn.cursor()
     cursor.execute('''
         SELECT id, email, reset_password_expires 
@@ -3154,18 +2781,24 @@ def api_reset_password():
             pass
     
     # Gera novo hash com formato correto
-    password_hash_bytes = bcrypt.hashpw(new_password.encode('utf-8'), bcrypt.gensalt())
-    password_hash = base64.b64encode(password_hash_bytes).decode('utf-8')
+    try:
+        servico_senhas.admitir(ip=request.remote_addr)
+        password_hash_bytes = servico_senhas.gerar_hash(new_password)
+    except RecusaSenhas as e:
+        conn.close()
+        return resposta_recusa_senhas(e)
+    password_hash = codificar_hash(password_hash_bytes)
     
     # Atualiza a senha e limpa token
     cursor.execute('''
         UPDATE users 
-        SET password_hash = ?, reset_password_token = NULL, reset_password_expires = NULL, email_verified = 1
+        SET password_hash = ?, hash_format = ?, reset_password_token = NULL, reset_password_expires = NULL, email_verified = 1
         WHERE id = ?
-    ''', (password_hash, user_id))
+    ''', (password_hash, FORMATO_HASH_CANONICO, user_id))
     
     conn.commit()
     conn.close()
+    invalidar_usuario_cache(user_id)
     
     return jsonify({
         "sucesso": True,
@@ -3181,7 +2814,7 @@ def api_resend_verification():
     if not email:
         return jsonify({"erro": "Email é obrigatório"}), 400
     
-    conn = sqlite3.connect(DB_PATH)
+    conn = banco_usuarios.conectar()
     cursor = conn.cursor()
     cursor.execute('''
         SELECT id, name, email_verified, email_verification_token 
@@ -3205,7 +2838,7 @@ def api_resend_verification():
     # Gera novo token se não existir
     if not token:
         token = generate_token()
-        conn = sqlite3.connect(DB_PATH)
+        conn = banco_usuarios.conectar()
         cursor = conn.cursor()
         cursor.execute('''
             UPDATE users 
@@ -3220,7 +2853,7 @@ def api_resend_verification():
     
     if not email_configurado:
         # Se email não estiver configurado, marca como verificado automaticamente
-        conn = sqlite3.connect(DB_PATH)
+        conn = banco_usuarios.conectar()
         cursor = conn.cursor()
         cursor.execute('UPDATE users SET email_verified = 1 WHERE email = ?', (email,))
         conn.commit()
@@ -3246,10 +2879,6 @@ def api_resend_verification():
             
     except Exception as e:
         logger.error(f"[RESEND] ❌ Erro ao reenviar email: {e}", exc_info=True)
-        print(f"[RESEND] ❌ Erro ao reenviar email: {e}")
-        print(f"[RESEND] Verifique os logs acima para detalhes do erro")
-        import traceback
-        traceback.print_exc()
         return jsonify({
             "sucesso": False,
             "erro": f"Não foi possível reenviar o email. Erro: {str(e)}. Verifique se o email está configurado corretamente no servidor."
@@ -3269,7 +2898,7 @@ def api_verify_email():
                              error=True,
                              message="Token não fornecido"), 400
     
-    conn = sqlite3.connect(DB_PATH)
+    conn = banco_usuarios.conectar()
     cursor = conn.cursor()
     cursor.execute('''
         SELECT id, email, name 
@@ -3309,6 +2938,7 @@ def api_verify_email():
     verification_status = cursor.fetchone()[0]
     
     conn.close()
+    invalidar_usuario_cache(user_id)
     
     if verification_status == 1:
         logger.info(f"[VERIFY] ✅ Email verificado e SALVO PERMANENTEMENTE no banco: {email} (ID: {user_id})")
@@ -3341,7 +2971,7 @@ def api_auto_verify():
             "erro": "Email está configurado. Use a verificação normal por email."
         }), 400
     
-    conn = sqlite3.connect(DB_PATH)
+    conn = banco_usuarios.conectar()
     cursor = conn.cursor()
     cursor.execute('SELECT id, email_verified FROM users WHERE email = ?', (email,))
     user = cursor.fetchone()
@@ -3378,7 +3008,7 @@ def api_delete_user():
     if not email:
         return jsonify({"erro": "Email é obrigatório"}), 400
     
-    conn = sqlite3.connect(DB_PATH)
+    conn = banco_usuarios.conectar()
     cursor = conn.cursor()
     cursor.execute('SELECT id FROM users WHERE email = ?', (email,))
     user = cursor.fetchone()
@@ -3396,6 +3026,7 @@ def api_delete_user():
     
     conn.commit()
     conn.close()
+    invalidar_usuario_cache(user_id)
     
     return jsonify({"sucesso": True, "mensagem": "Conta deletada com sucesso! Agora você pode fazer um novo cadastro. 💕"}), 200
 
@@ -3405,9 +3036,9 @@ def api_logout():
     try:
         logout_user()
         session.clear()  # Limpa a sessão completamente
-        print(f"[LOGOUT] Logout realizado com sucesso")
+        logger.info(f"[LOGOUT] Logout realizado com sucesso")
     except Exception as e:
-        print(f"[LOGOUT] Erro (mas continua): {e}")
+        logger.warning(f"[LOGOUT] Erro (mas continua): {e}")
         session.clear()  # Limpa mesmo com erro
     return jsonify({"sucesso": True, "mensagem": "Logout realizado com sucesso"})
 
@@ -3425,7 +3056,7 @@ def api_user():
         else:
             return jsonify({"erro": "Não autenticado"}), 401
     except Exception as e:
-        print(f"[AUTH] Erro ao verificar usuário: {e}")
+        logger.error(f"[AUTH] Erro ao verificar usuário: {e}")
         return jsonify({"erro": "Não autenticado"}), 401
 
 @app.route('/api/verificacao', methods=['POST'])
@@ -3437,9 +3068,9 @@ def api_verificacao():
     if not email:
         return jsonify({"erro": "Email é obrigatório"}), 400
     
-    conn = sqlite3.connect(DB_PATH)
+    conn = banco_usuarios.conectar()
     cursor = conn.cursor()
-    cursor.execute('SELECT id, name, email, password_hash FROM users WHERE email = ?', (email,))
+    cursor.execute('SELECT id, name, email, password_hash, hash_format FROM users WHERE email = ?', (email,))
     user_data = cursor.fetchone()
     conn.close()
     
@@ -3449,24 +3080,11 @@ def api_verificacao():
             "mensagem": "Email não encontrado no banco de dados. Você pode fazer um novo cadastro."
         })
     
-    stored_hash_str = user_data[3]
-    hash_valido = False
-    formato_hash = "desconhecido"
-    
-    # Verifica o formato do hash
-    try:
-        # Tenta decodificar como base64
-        base64.b64decode(stored_hash_str.encode('utf-8'))
-        formato_hash = "base64 (correto)"
-        hash_valido = True
-    except:
-        if isinstance(stored_hash_str, bytes):
-            formato_hash = "bytes"
-            hash_valido = True
-        elif stored_hash_str.startswith('$2'):
-            formato_hash = "string bcrypt (pode estar corrompido)"
-        else:
-            formato_hash = "corrompido ou inválido"
+    # Usa o formato registrado pela normalização; para linhas antigas, detecta (sem bcrypt)
+    stored_hash_str, formato_hash = user_data[3], user_data[4]
+    if not formato_hash:
+        formato_hash = detectar_formato_hash(stored_hash_str)[0]
+    hash_valido = formato_hash != FORMATO_HASH_INVALIDO
     
     return jsonify({
         "encontrado": True,
@@ -3484,7 +3102,7 @@ def api_verificacao():
 @login_required
 def api_vacinas_status():
     """Retorna o status das vacinas tomadas pelo usuário"""
-    conn = sqlite3.connect(DB_PATH)
+    conn = banco_usuarios.conectar()
     cursor = conn.cursor()
     cursor.execute('SELECT tipo, vacina_nome, data_tomada FROM vacinas_tomadas WHERE user_id = ?', (current_user.id,))
     vacinas = cursor.fetchall()
@@ -3516,7 +3134,7 @@ def api_vacinas_marcar():
     if tipo not in ['mae', 'bebe']:
         return jsonify({"erro": "Tipo deve ser 'mae' ou 'bebe'"}), 400
     
-    conn = sqlite3.connect(DB_PATH)
+    conn = banco_usuarios.conectar()
     cursor = conn.cursor()
     
     # Verifica se já foi marcada
@@ -3567,7 +3185,7 @@ def api_vacinas_desmarcar():
     if not tipo or not vacina_nome:
         return jsonify({"erro": "Tipo e nome da vacina são obrigatórios"}), 400
     
-    conn = sqlite3.connect(DB_PATH)
+    conn = banco_usuarios.conectar()
     cursor = conn.cursor()
     cursor.execute('DELETE FROM vacinas_tomadas WHERE user_id = ? AND tipo = ? AND vacina_nome = ?',
                    (current_user.id, tipo, vacina_nome))
@@ -3589,13 +3207,17 @@ def teste():
         "cuidados_pos_parto": len(cuidados_pos_parto),
         "vacinas": "mae e bebe carregadas",
         "rotas_api": 9,
-        "gemini_disponivel": gemini_client is not None
+        "gemini_disponivel": provedor_gemini.pronto(),
+        "gemini_estado": provedor_gemini.estado
     })
 
 if __name__ == "__main__":
     print("="*50)
     print("Chatbot do Puerperio - Sistema Completo!")
     print("="*50)
+    garantir_dados()
+    # Processo único: nada está entregando ainda, reservas de uma execução anterior voltam para a fila
+    fila_email.recuperar_reservas()
     print("Base de conhecimento:", len(base_conhecimento), "categorias")
     print("Mensagens de apoio:", len(mensagens_apoio), "mensagens")
     print("Telefones úteis: Carregado ✓")
@@ -3603,7 +3225,7 @@ if __name__ == "__main__":
     print("Cuidados gestação:", len(cuidados_gestacao), "trimestres")
     print("Cuidados puerpério:", len(cuidados_pos_parto), "períodos")
     print("Vacinas: Mãe e bebê carregadas ✓")
-    print("Gemini disponível:", "Sim" if gemini_client else "Não")
+    print("Gemini disponível:", "Sim" if provedor_gemini.obter() else "Não")
     print("Total de rotas API:", 12)
     print("="*50)
     
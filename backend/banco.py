@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+"""
+Conexões SQLite reutilizáveis.
+
+Antes, cada acesso ao banco abria e fechava um sqlite3.connect(DB_PATH) novo, no modo
+de journal padrão (rollback), em que leitores e escritores se bloqueiam pelo arquivo.
+GerenciadorConexoes mantém uma conexão por thread (e por processo, para não herdar
+conexões através do fork do gunicorn) e aplica os PRAGMAs uma única vez, ao abri-la:
+- journal_mode=WAL: leitores não bloqueiam o escritor e vice-versa;
+- busy_timeout: espera o lock em vez de falhar na hora com "database is locked";
+- synchronous=NORMAL: seguro com WAL e bem mais barato que FULL a cada commit.
+
+conectar() devolve um objeto com a mesma interface de sqlite3.Connection, para que o
+código existente (cursor(), commit(), close()) continue igual: close() apenas desfaz
+o que não foi confirmado, exatamente como fechar a conexão faria, e a mantém aberta
+para o próximo uso.
+
+Como a conexão é a mesma para toda a thread, um conectar() aninhado (uma função chamada
+no meio da transação de quem já tinha a conexão) não pode confirmar nem desfazer o
+trabalho de fora. O gerenciador conta a profundidade por thread, e a conexão aninhada
+entregue com uma transação aberta trabalha dentro de um SAVEPOINT: commit() só o libera
+(as escritas passam a fazer parte da transação de fora), rollback() e close() desfazem
+só o que veio depois dele. Quem confirma ou desfaz a transação é o dono dela, ou o
+liberar() no teardown.
+
+Com `ao_executar(operacao, segundos)` as conexões medem cada execute()/executemany()
+(operacao é a primeira palavra do SQL: SELECT, INSERT...), para as métricas.
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+BUSY_TIMEOUT_PADRAO_MS = 5000
+
+
+class ConexaoReutilizavel:
+    """
+    Conexão da thread atual; close() devolve a conexão ao gerenciador em vez de fechá-la.
+    Com `savepoint`, é uma conexão aninhada dentro da transação de outro dono.
+    """
+
+    __slots__ = ('_conexao', '_gerenciador', '_savepoint', '_fechada')
+
+    def __init__(self, conexao, gerenciador=None, savepoint=None):
+        self._conexao = conexao
+        self._gerenciador = gerenciador
+        self._savepoint = savepoint
+        self._fechada = False
+
+    def __getattr__(self, nome):
+        return getattr(self._conexao, nome)
+
+    # Mesma semântica do `with conn:` do sqlite3: confirma se não houve exceção, senão desfaz
+    def __enter__(self):
+        return self
+
+    def __exit__(self, tipo, valor, traceback):
+        if tipo is None:
+            self.commit()
+        else:
+            self.rollback()
+        return False
+
+    def commit(self):
+        if self._savepoint is None:
+            self._conexao.commit()
+        elif self._conexao.in_transaction:
+            # Não confirma a transação de fora: incorpora as escritas a ela e abre outro savepoint
+            self._conexao.execute(f'RELEASE SAVEPOINT {self._savepoint}')
+            self._conexao.execute(f'SAVEPOINT {self._savepoint}')
+
+    def rollback(self):
+        if self._savepoint is None:
+            self._conexao.rollback()
+        elif self._conexao.in_transaction:
+            self._conexao.execute(f'ROLLBACK TO SAVEPOINT {self._savepoint}')
+
+    def close(self):
+        if self._fechada:
+            return
+        self._fechada = True
+        if self._gerenciador is not None:
+            self._gerenciador._devolver()
+        # Fechar uma conexão descarta a transação pendente; a reutilizável faz o mesmo,
+        # e a aninhada descarta só o que fez depois do seu savepoint
+        if not self._conexao.in_transaction:
+            return
+        if self._savepoint is None:
+            self._conexao.rollback()
+        else:
+            self._conexao.execute(f'ROLLBACK TO SAVEPOINT {self._savepoint}')
+            self._conexao.execute(f'RELEASE SAVEPOINT {self._savepoint}')
+
+
+def _operacao(sql):
+    partes = sql.lstrip().split(None, 1)
+    return partes[0].upper() if partes else ''
+
+
+class CursorCronometrado(sqlite3.Cursor):
+    def execute(self, sql, parametros=()):
+        inicio = time.perf_counter()
+        try:
+            return super().execute(sql, parametros)
+        finally:
+            self.connection.ao_executar(_operacao(sql), time.perf_counter() - inicio)
+
+    def executemany(self, sql, parametros):
+        inicio = time.perf_counter()
+        try:
+            return super().executemany(sql, parametros)
+        finally:
+            self.connection.ao_executar(_operacao(sql), time.perf_counter() - inicio)
+
+
+class ConexaoCronometrada(sqlite3.Connection):
+    """Conexão cujos cursores (inclusive os de conexao.execute()) medem cada comando"""
+
+    ao_executar = None
+
+    def cursor(self, factory=CursorCronometrado):
+        return super().cursor(factory)
+
+    # O execute() do sqlite3 não passa por cursor(); estes são os atalhos equivalentes
+    def execute(self, sql, parametros=()):
+        return self.cursor().execute(sql, parametros)
+
+    def executemany(self, sql, parametros):
+        return self.cursor().executemany(sql, parametros)
+
+
+class GerenciadorConexoes:
+    """Uma conexão SQLite por thread para um arquivo, com os PRAGMAs aplicados na abertura"""
+
+    def __init__(self, caminho, busy_timeout_ms=None, synchronous='NORMAL', ao_executar=None):
+        self.caminho = caminho
+        self.busy_timeout_ms = busy_timeout_ms if busy_timeout_ms is not None else int(
+            os.getenv('SQLITE_BUSY_TIMEOUT_MS', str(BUSY_TIMEOUT_PADRAO_MS)))
+        self.synchronous = synchronous
+        self.ao_executar = ao_executar
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.conexoes_criadas = 0
+        self.reutilizacoes = 0
+        self.aninhadas = 0
+
+    def _abrir(self):
+        if self.ao_executar is not None:
+            conexao = sqlite3.connect(self.caminho, timeout=self.busy_timeout_ms / 1000, factory=ConexaoCronometrada)
+            conexao.ao_executar = self.ao_executar
+        else:
+            conexao = sqlite3.connect(self.caminho, timeout=self.busy_timeout_ms / 1000)
+        conexao.execute(f'PRAGMA busy_timeout = {int(self.busy_timeout_ms)}')
+        conexao.execute('PRAGMA journal_mode = WAL')
+        conexao.execute(f'PRAGMA synchronous = {self.synchronous}')
+        with self.lock:
+            self.conexoes_criadas += 1
+        return conexao
+
+    def conectar(self):
+        """Retorna a conexão desta thread, abrindo-a (com os PRAGMAs) no primeiro uso"""
+        conexao = getattr(self.local, 'conexao', None)
+        if conexao is None or self.local.pid != os.getpid():
+            conexao = self.local.conexao = self._abrir()
+            self.local.pid = os.getpid()
+            self.local.profundidade = 0
+        else:
+            with self.lock:
+                self.reutilizacoes += 1
+        self.local.profundidade += 1
+        savepoint = None
+        if conexao.in_transaction:
+            if self.local.profundidade > 1:
+                # Aninhada na transação de quem já tem a conexão: não pode confirmá-la nem desfazê-la
+                savepoint = f'aninhada_{self.local.profundidade}'
+                conexao.execute(f'SAVEPOINT {savepoint}')
+                with self.lock:
+                    self.aninhadas += 1
+            else:
+                # Não desfaz aqui: a limpeza é do close() deste dono ou do liberar() no teardown
+                logger.warning("[DB] ⚠️ Conexão reutilizada com uma transação aberta")
+        return ConexaoReutilizavel(conexao, self, savepoint)
+
+    def _devolver(self):
+        if getattr(self.local, 'pid', None) == os.getpid() and self.local.profundidade > 0:
+            self.local.profundidade -= 1
+
+    def liberar(self):
+        """Desfaz transação pendente da thread atual (ex.: no fim de cada requisição)"""
+        conexao = getattr(self.local, 'conexao', None)
+        if conexao is not None and self.local.pid == os.getpid():
+            # Conexões esquecidas sem close() não deixam a próxima requisição parecer aninhada
+            self.local.profundidade = 0
+            if conexao.in_transaction:
+                conexao.rollback()
+
+    def fechar(self):
+        """Fecha de fato a conexão da thread atual"""
+        conexao = getattr(self.local, 'conexao', None)
+        if conexao is not None:
+            self.local.conexao = None
+            if self.local.pid == os.getpid():
+                conexao.close()
+
+    def estatisticas(self):
+        with self.lock:
+            return {"conexoes_criadas": self.conexoes_criadas, "reutilizacoes": self.reutilizacoes,
+                    "aninhadas": self.aninhadas}
@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+"""
+Motor de busca da base de conhecimento local.
+
+O índice é construído uma única vez (quando os dados são carregados) e guarda,
+para cada entrada, o texto normalizado e o conjunto de palavras-chave, além de
+um índice invertido palavra -> entradas. Na busca, só as entradas que
+compartilham ao menos uma palavra com a pergunta são pontuadas.
+
+Com LOCAL_RANKER=bm25 o ranking passa a ser BM25 sobre uma matriz esparsa de
+pesos pré-calculada (ver RankerBM25).
+"""
+
+import difflib
+import math
+import os
+import re
+from collections import Counter, defaultdict
+
+from normalizacao import dobrar, normalizar_mensagem, radical, remover_acentos
+
+# Mesmo limite usado historicamente em buscar_resposta_local
+LIMITE_SIMILARIDADE = 0.35
+PESO_STRING = 0.4
+PESO_PALAVRAS = 0.6
+
+
+def extrair_palavras(texto):
+    """Retorna o conjunto de palavras relevantes (mais de 3 letras, sem acentos) de um texto já em minúsculas"""
+    return set(p for p in remover_acentos(texto).split() if len(p) > 3)
+
+
+class IndiceConhecimento:
+    """Índice invertido sobre a base de conhecimento (pergunta + resposta de cada tema)"""
+
+    def __init__(self, base):
+        self.temas = []
+        self.perguntas = []
+        self.respostas = []
+        self.indice = defaultdict(list)
+
+        for tema, conteudo in (base or {}).items():
+            if not isinstance(conteudo, dict) or "pergunta" not in conteudo or "resposta" not in conteudo:
+                continue
+            posicao = len(self.temas)
+            pergunta_base = conteudo["pergunta"].lower()
+            resposta_base = conteudo["resposta"].lower()
+
+            self.temas.append(tema)
+            self.perguntas.append(pergunta_base)
+            self.respostas.append(conteudo["resposta"])
+
+            # Combina pergunta + resposta para busca mais abrangente
+            for palavra in extrair_palavras(f"{pergunta_base} {resposta_base}"):
+                self.indice[palavra].append(posicao)
+
+    def __len__(self):
+        return len(self.temas)
+
+    def _candidatos(self, palavras_pergunta):
+        """Conta, por entrada, quantas palavras da pergunta aparecem nela"""
+        contagem = defaultdict(int)
+        for palavra in palavras_pergunta:
+            for posicao in self.indice.get(palavra, ()):
+                contagem[posicao] += 1
+        return contagem
+
+    def buscar(self, pergunta):
+        """
+        Retorna (resposta, categoria, similaridade) da melhor entrada, ou (None, None, 0).
+
+        A pontuação é a mesma da busca linear original:
+        0.4 * SequenceMatcher(pergunta, pergunta_base) + 0.6 * fração das palavras da pergunta
+        encontradas na entrada. Aceita str ou MensagemNormalizada.
+        """
+        pergunta_lower = normalizar_mensagem(pergunta).original.lower()
+        palavras_pergunta = extrair_palavras(pergunta_lower)
+
+        if palavras_pergunta:
+            contagem = self._candidatos(palavras_pergunta)
+            total_palavras = len(palavras_pergunta)
+        else:
+            # Sem palavras-chave só a similaridade de string conta: avalia todas as entradas
+            contagem = dict.fromkeys(range(len(self.temas)), 0)
+            total_palavras = 0
+
+        melhor_posicao = None
+        maior_similaridade = 0
+        tamanho_pergunta = len(pergunta_lower)
+
+        # Ordem de inserção preserva o desempate da busca linear (primeira entrada vence)
+        for posicao in sorted(contagem):
+            similaridade_palavras = contagem[posicao] / total_palavras if total_palavras else 0
+            pergunta_base = self.perguntas[posicao]
+
+            # Limite superior barato (equivalente a real_quick_ratio) antes do SequenceMatcher
+            tamanho_total = tamanho_pergunta + len(pergunta_base)
+            teto_string = 2.0 * min(tamanho_pergunta, len(pergunta_base)) / tamanho_total if tamanho_total else 1.0
+            if (teto_string * PESO_STRING) + (similaridade_palavras * PESO_PALAVRAS) <= maior_similaridade:
+                continue
+
+            similaridade_string = difflib.SequenceMatcher(None, pergunta_lower, pergunta_base).ratio()
+            similaridade_comb = (similaridade_string * PESO_STRING) + (similaridade_palavras * PESO_PALAVRAS)
+
+            if similaridade_comb > maior_similaridade:
+                maior_similaridade = similaridade_comb
+                melhor_posicao = posicao
+
+        if melhor_posicao is not None and maior_similaridade > LIMITE_SIMILARIDADE:
+            return self.respostas[melhor_posicao], self.temas[melhor_posicao], maior_similaridade
+
+        return None, None, 0
+
+    def buscar_top_k(self, pergunta, k=3):
+        """Retorna até k tuplas (resposta, categoria, similaridade) ordenadas da melhor para a pior"""
+        pergunta_lower = normalizar_mensagem(pergunta).original.lower()
+        palavras_pergunta = extrair_palavras(pergunta_lower)
+        if palavras_pergunta:
+            contagem = self._candidatos(palavras_pergunta)
+        else:
+            contagem = dict.fromkeys(range(len(self.temas)), 0)
+
+        resultados = []
+        for posicao in sorted(contagem):
+            similaridade_string = difflib.SequenceMatcher(None, pergunta_lower, self.perguntas[posicao]).ratio()
+            similaridade_palavras = contagem[posicao] / len(palavras_pergunta) if palavras_pergunta else 0
+            similaridade_comb = (similaridade_string * PESO_STRING) + (similaridade_palavras * PESO_PALAVRAS)
+            if similaridade_comb > LIMITE_SIMILARIDADE:
+                resultados.append((self.respostas[posicao], self.temas[posicao], similaridade_comb))
+
+        resultados.sort(key=lambda item: item[2], reverse=True)
+        return resultados[:k]
+
+
+# Palavras muito frequentes que não ajudam a distinguir temas (comparadas sem acentos)
+STOPWORDS = set(dobrar(palavra) for palavra in {
+    'que', 'não', 'nao', 'com', 'para', 'pra', 'por', 'uma', 'umas', 'uns', 'dos', 'das', 'nos', 'nas',
+    'mais', 'como', 'mas', 'meu', 'minha', 'meus', 'minhas', 'seu', 'sua', 'seus', 'suas', 'ele', 'ela',
+    'eles', 'elas', 'você', 'voce', 'isso', 'isto', 'esse', 'essa', 'este', 'esta', 'estou', 'está', 'esta',
+    'são', 'sao', 'ser', 'ter', 'tem', 'tenho', 'foi', 'era', 'quando', 'onde', 'qual', 'quais', 'porque',
+    'pode', 'posso', 'muito', 'muita', 'bem', 'hoje', 'também', 'tambem', 'ainda', 'já', 'sobre', 'até',
+    'depois', 'antes', 'cada', 'todo', 'toda', 'todos', 'todas', 'entre', 'sem', 'quem', 'aos', 'nem',
+})
+
+
+def extrair_termos(tokens):
+    """Termos usados pelo BM25: radicais dos tokens (já sem acentos) com mais de 2 letras, sem stopwords"""
+    return [radical(t) for t in tokens if len(t) > 2 and t not in STOPWORDS]
+
+
+def tokenizar(texto):
+    """Tokens sem pontuação, em minúsculas e sem acentos"""
+    return re.findall(r'\w+', dobrar(texto))
+
+
+class RankerBM25:
+    """
+    Ranking BM25 sobre pergunta + resposta de cada entrada da base.
+
+    Os pesos BM25 de cada (termo, entrada) são pré-calculados na construção e guardados
+    como uma matriz esparsa em listas de postings (termo -> [(entrada, peso)]). Pontuar uma
+    pergunta é um único produto matriz-vetor esparso: soma os postings dos termos da pergunta.
+    A pontuação é normalizada para 0..1 dividindo pelo máximo teórico da pergunta, para poder
+    ser comparada com um limite fixo como a busca original.
+    """
+
+    def __init__(self, base, k1=1.5, b=0.75, limite=None):
+        self.k1 = k1
+        self.b = b
+        self.limite = limite if limite is not None else float(os.getenv('LOCAL_RANKER_MIN_SCORE', '0.35'))
+        self.temas = []
+        self.respostas = []
+        self.postings = {}
+        self.idf = {}
+
+        documentos = []
+        for tema, conteudo in (base or {}).items():
+            if not isinstance(conteudo, dict) or "pergunta" not in conteudo or "resposta" not in conteudo:
+                continue
+            self.temas.append(tema)
+            self.respostas.append(conteudo["resposta"])
+            documentos.append(Counter(extrair_termos(tokenizar(f"{conteudo['pergunta']} {conteudo['resposta']}"))))
+
+        total_docs = len(documentos)
+        tamanho_medio = (sum(sum(doc.values()) for doc in documentos) / total_docs) if total_docs else 0
+
+        frequencia_docs = Counter()
+        for doc in documentos:
+            frequencia_docs.update(doc.keys())
+
+        for termo, df in frequencia_docs.items():
+            self.idf[termo] = math.log(1 + (total_docs - df + 0.5) / (df + 0.5))
+
+        postings = defaultdict(list)
+        for posicao, doc in enumerate(documentos):
+            tamanho_doc = sum(doc.values())
+            normalizacao = k1 * (1 - b + b * tamanho_doc / tamanho_medio) if tamanho_medio else k1
+            for termo, tf in doc.items():
+                peso = self.idf[termo] * tf * (k1 + 1) / (tf + normalizacao)
+                postings[termo].append((posicao, peso))
+        self.postings = dict(postings)
+
+    def __len__(self):
+        return len(self.temas)
+
+    def _pontuar(self, pergunta):
+        """Retorna {entrada: pontuação normalizada} para as entradas que compartilham termos com a pergunta"""
+        # Termos fora do vocabulário não pontuam nem entram na normalização
+        tokens = normalizar_mensagem(pergunta).tokens
+        termos = set(termo for termo in extrair_termos(tokens) if termo in self.postings)
+        if not termos:
+            return {}
+
+        maximo = sum(self.idf[termo] for termo in termos) * (self.k1 + 1)
+        pontuacoes = defaultdict(float)
+        for termo in termos:
+            for posicao, peso in self.postings.get(termo, ()):
+                pontuacoes[posicao] += peso
+        return {posicao: pontuacao / maximo for posicao, pontuacao in pontuacoes.items()}
+
+    def buscar_top_k(self, pergunta, k=3):
+        """Retorna até k tuplas (resposta, categoria, similaridade) ordenadas da melhor para a pior"""
+        pontuacoes = self._pontuar(pergunta)
+        melhores = sorted(pontuacoes.items(), key=lambda item: (-item[1], item[0]))[:k]
+        return [
+            (self.respostas[posicao], self.temas[posicao], pontuacao)
+            for posicao, pontuacao in melhores
+            if pontuacao > self.limite
+        ]
+
+    def buscar(self, pergunta):
+        """Retorna (resposta, categoria, similaridade) da melhor entrada, ou (None, None, 0)"""
+        resultados = self.buscar_top_k(pergunta, k=1)
+        if resultados:
+            return resultados[0]
+        return None, None, 0
+
+
+def criar_ranker(base, modo=None):
+    """Cria o ranker da base local conforme LOCAL_RANKER ('indice' - padrão - ou 'bm25')"""
+    modo = (modo or os.getenv('LOCAL_RANKER', 'indice')).strip().lower()
+    if modo == 'bm25':
+        return RankerBM25(base)
+    return IndiceConhecimento(base)
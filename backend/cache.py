@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+Cache em memória com TTL e limite de itens (LRU), seguro entre threads.
+
+Cada worker do gunicorn tem o seu; por isso quem altera os dados cacheados deve
+chamar invalidar() e o TTL limita por quanto tempo outro worker pode ver um valor antigo.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+# Sentinela para distinguir "não está no cache" de um valor None cacheado
+AUSENTE = object()
+
+
+class CacheTTL:
+    """Mapeia chave -> valor por até ttl segundos, guardando no máximo max_itens"""
+
+    def __init__(self, ttl=300, max_itens=1024):
+        self.ttl = ttl
+        self.max_itens = max_itens
+        self.itens = OrderedDict()
+        self.lock = threading.Lock()
+        self.acertos = 0
+        self.falhas = 0
+
+    def __len__(self):
+        return len(self.itens)
+
+    def obter(self, chave, padrao=AUSENTE):
+        """Retorna o valor cacheado ou `padrao` (AUSENTE) se não existir ou tiver expirado"""
+        with self.lock:
+            item = self.itens.get(chave)
+            if item is not None:
+                valor, expira_em = item
+                if time.monotonic() < expira_em:
+                    self.itens.move_to_end(chave)
+                    self.acertos += 1
+                    return valor
+                del self.itens[chave]
+            self.falhas += 1
+            return padrao
+
+    def guardar(self, chave, valor):
+        with self.lock:
+            self.itens[chave] = (valor, time.monotonic() + self.ttl)
+            self.itens.move_to_end(chave)
+            while len(self.itens) > self.max_itens:
+                self.itens.popitem(last=False)
+
+    def guardar_se_ausente(self, chave, valor):
+        """Como dict.setdefault: mantém o valor válido já guardado (renovando o TTL) ou guarda `valor`; retorna o que ficou"""
+        with self.lock:
+            item = self.itens.get(chave)
+            if item is not None and time.monotonic() < item[1]:
+                valor = item[0]
+            self.itens[chave] = (valor, time.monotonic() + self.ttl)
+            self.itens.move_to_end(chave)
+            while len(self.itens) > self.max_itens:
+                self.itens.popitem(last=False)
+            return valor
+
+    def invalidar(self, chave):
+        with self.lock:
+            self.itens.pop(chave, None)
+
+    def limpar(self):
+        with self.lock:
+            self.itens.clear()
+
+    def estatisticas(self):
+        with self.lock:
+            total = self.acertos + self.falhas
+            return {
+                "itens": len(self.itens),
+                "acertos": self.acertos,
+                "falhas": self.falhas,
+                "taxa_acerto": (self.acertos / total) if total else 0.0,
+            }
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+Cache das respostas do Gemini.
+
+Muitas mensagens são a mesma pergunta curta ("o que é baby blues") e montam exatamente
+o mesmo prompt: mesma resposta da base local, mesma flag de saudação, mesmo histórico.
+A chave é um hash dessas entradas (com a pergunta normalizada: minúsculas, sem acentos
+e sem pontuação), então um acerto devolve a resposta sem chamar a API.
+
+Se a pergunta exata não está no cache, um IndiceMinHash (cache_semantico) procura uma
+paráfrase já respondida com as mesmas demais entradas ("baby blues é o que").
+
+Prompts com contexto pessoal (nome da usuária, do bebê, projeto...) não são cacheados:
+a resposta cita dados daquela usuária e não serve para outra.
+"""
+
+import hashlib
+
+from cache import AUSENTE, CacheTTL
+
+
+def impressao_historico(historico):
+    """Hash dos turnos que entram no prompt (pergunta e resposta de cada um)"""
+    resumo = hashlib.sha256()
+    for turno in historico or ():
+        resumo.update(turno.get('pergunta', '').encode('utf-8'))
+        resumo.update(b'\x1f')
+        resumo.update(turno.get('resposta', '').encode('utf-8'))
+        resumo.update(b'\x1e')
+    return resumo.hexdigest()
+
+
+def _hash(*partes):
+    return hashlib.sha256('\x1d'.join(partes).encode('utf-8')).hexdigest()
+
+
+class ChaveResposta:
+    """Chave exata + partição (tudo menos a pergunta) e radicais, para a busca por paráfrases"""
+
+    __slots__ = ('exata', 'particao', 'radicais')
+
+    def __init__(self, exata, particao, radicais):
+        self.exata = exata
+        self.particao = particao
+        self.radicais = radicais
+
+
+class CacheRespostas:
+    """CacheTTL de respostas do Gemini com a chave montada a partir das entradas do prompt"""
+
+    def __init__(self, ttl=3600, max_itens=512, ativo=True, semantico=None):
+        self.ativo = ativo
+        self.itens = CacheTTL(ttl=ttl, max_itens=max_itens)
+        # IndiceMinHash opcional para quase-duplicatas
+        self.semantico = semantico
+        self.ignoradas = 0
+
+    def chave(self, mensagem, resposta_local=None, is_saudacao=False, saudacao_completa_enviada=False,
+              historico=None, contexto=None):
+        """Chave da resposta, ou None se a resposta não deve ser cacheada (desativado ou contexto pessoal)"""
+        if not self.ativo or contexto:
+            self.ignoradas += 1
+            return None
+        particao = _hash(
+            resposta_local or '',
+            '1' if is_saudacao else '0',
+            '1' if saudacao_completa_enviada else '0',
+            impressao_historico(historico),
+        )
+        return ChaveResposta(_hash(' '.join(mensagem.tokens), particao), particao, mensagem.radicais)
+
+    def obter(self, chave):
+        """Resposta cacheada (pergunta exata ou paráfrase) ou None"""
+        if chave is None:
+            return None
+        resposta = self.itens.obter(chave.exata)
+        if resposta is not AUSENTE:
+            return resposta
+        if self.semantico is not None:
+            return self.semantico.buscar(chave.radicais, chave.particao)
+        return None
+
+    def guardar(self, chave, resposta):
+        if chave is not None and resposta:
+            self.itens.guardar(chave.exata, resposta)
+            if self.semantico is not None:
+                self.semantico.guardar(chave.radicais, chave.particao, resposta)
+
+    def limpar(self):
+        self.itens.limpar()
+        if self.semantico is not None:
+            self.semantico.limpar()
+
+    def estatisticas(self):
+        estatisticas = self.itens.estatisticas()
+        estatisticas['ativo'] = self.ativo
+        estatisticas['ignoradas'] = self.ignoradas
+        if self.semantico is not None:
+            estatisticas['semantico'] = self.semantico.estatisticas()
+        return estatisticas
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""
+Cache de respostas por quase-duplicatas (MinHash + LSH), todo local e em CPU.
+
+O cache exato (cache_respostas) não pega paráfrases como "o que é baby blues?" e
+"baby blues é o que". Aqui cada pergunta vira o conjunto de radicais das suas palavras
+(MensagemNormalizada.radicais) e uma assinatura MinHash desse conjunto. A assinatura é
+dividida em bandas; perguntas com alguma banda igual caem no mesmo balde do índice LSH,
+então a busca só compara com poucos candidatos em vez de todas as perguntas guardadas.
+Os candidatos são confirmados pela similaridade de Jaccard exata dos conjuntos.
+
+Só responde do cache dentro da mesma "partição" (mesma resposta local, flags de
+saudação e histórico), e nunca quando a diferença entre as perguntas é uma negação
+("posso tomar café" x "não posso tomar café").
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from normalizacao import radical
+
+# Primo de Mersenne 2^61 - 1 para as permutações (a * x + b) mod P
+PRIMO = (1 << 61) - 1
+NEGACOES = frozenset(radical(palavra) for palavra in ('nao', 'nunca', 'nem', 'sem', 'jamais', 'nenhum', 'nenhuma'))
+# Perguntas com menos radicais que isso só usam o cache exato
+MINIMO_RADICAIS = 3
+
+
+def _hash64(texto):
+    return int.from_bytes(hashlib.blake2b(texto.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+def jaccard(a, b):
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+class IndiceMinHash:
+    """Índice LSH de assinaturas MinHash com TTL e limite de itens (LRU)"""
+
+    def __init__(self, num_permutacoes=64, bandas=16, limiar=0.85, ttl=3600, max_itens=512):
+        if num_permutacoes % bandas:
+            raise ValueError("num_permutacoes deve ser múltiplo de bandas")
+        self.bandas = bandas
+        self.linhas = num_permutacoes // bandas
+        self.limiar = limiar
+        self.ttl = ttl
+        self.max_itens = max_itens
+        # Coeficientes fixos (derivados de um hash), para assinaturas estáveis entre processos
+        self.permutacoes = [
+            (_hash64(f'a{i}') % (PRIMO - 1) + 1, _hash64(f'b{i}') % PRIMO)
+            for i in range(num_permutacoes)
+        ]
+        self.itens = OrderedDict()  # id -> (particao, radicais, bandas, resposta, expira_em)
+        self.baldes = {}  # (particao, banda, valor) -> set(ids)
+        self.proximo_id = 0
+        self.lock = threading.Lock()
+        self.acertos = 0
+        self.falhas = 0
+
+    def assinatura(self, radicais):
+        hashes = [_hash64(item) for item in radicais]
+        return [min((a * h + b) % PRIMO for h in hashes) for a, b in self.permutacoes]
+
+    def _bandas(self, assinatura):
+        return [hash(tuple(assinatura[i * self.linhas:(i + 1) * self.linhas])) for i in range(self.bandas)]
+
+    def _remover(self, item_id):
+        particao, _, bandas, _, _ = self.itens.pop(item_id)
+        for banda, valor in enumerate(bandas):
+            balde = self.baldes.get((particao, banda, valor))
+            if balde is not None:
+                balde.discard(item_id)
+                if not balde:
+                    del self.baldes[(particao, banda, valor)]
+
+    def buscar(self, radicais, particao):
+        """Resposta guardada para uma pergunta quase igual na mesma partição, ou None"""
+        if len(radicais) < MINIMO_RADICAIS:
+            return None
+        bandas = self._bandas(self.assinatura(radicais))
+        agora = time.monotonic()
+        with self.lock:
+            candidatos = set()
+            for banda, valor in enumerate(bandas):
+                candidatos |= self.baldes.get((particao, banda, valor), set())
+            melhor, melhor_similaridade = None, self.limiar
+            for item_id in candidatos:
+                _, radicais_item, _, resposta, expira_em = self.itens[item_id]
+                if agora >= expira_em:
+                    self._remover(item_id)
+                    continue
+                if (radicais ^ radicais_item) & NEGACOES:
+                    continue
+                similaridade = jaccard(radicais, radicais_item)
+                if similaridade >= melhor_similaridade:
+                    melhor, melhor_similaridade = item_id, similaridade
+            if melhor is None:
+                self.falhas += 1
+                return None
+            self.itens.move_to_end(melhor)
+            self.acertos += 1
+            return self.itens[melhor][3]
+
+    def guardar(self, radicais, particao, resposta):
+        if len(radicais) < MINIMO_RADICAIS or not resposta:
+            return
+        bandas = self._bandas(self.assinatura(radicais))
+        with self.lock:
+            item_id = self.proximo_id
+            self.proximo_id += 1
+            self.itens[item_id] = (particao, frozenset(radicais), bandas, resposta, time.monotonic() + self.ttl)
+            for banda, valor in enumerate(bandas):
+                self.baldes.setdefault((particao, banda, valor), set()).add(item_id)
+            while len(self.itens) > self.max_itens:
+                self._remover(next(iter(self.itens)))
+
+    def limpar(self):
+        with self.lock:
+            self.itens.clear()
+            self.baldes.clear()
+
+    def estatisticas(self):
+        with self.lock:
+            total = self.acertos + self.falhas
+            return {
+                "itens": len(self.itens),
+                "baldes": len(self.baldes),
+                "acertos": self.acertos,
+                "falhas": self.falhas,
+                "taxa_acerto": (self.acertos / total) if total else 0.0,
+            }
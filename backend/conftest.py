@@ -0,0 +1,11 @@
+# -*- coding: utf-8 -*-
+"""Configuração do pytest para os testes do backend (cd backend && python -m pytest, ou python -m pytest backend)"""
+
+import sys
+from pathlib import Path
+
+# Os módulos do backend se importam pelo nome (como o app.py faz), também quando o pytest roda da raiz
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+# Script manual de depuração de login (python test_password.py <email> <senha>), não é teste do pytest
+collect_ignore = ['test_password.py']
@@ -0,0 +1,318 @@
+# -*- coding: utf-8 -*-
+"""
+Fila persistente de emails (outbox) com entrega em segundo plano.
+
+As rotas (/api/register, /api/resend-verification, /api/forgot-password) apenas gravam
+o email na tabela email_outbox de users.db e retornam; um pool de threads entrega os
+emails pendentes em lotes, vários por conexão SMTP. Falhas transitórias (conexão,
+timeout, respostas 4xx) são tentadas de novo com backoff exponencial; falhas permanentes
+(5xx do destinatário, demais erros do smtplib) marcam o email como 'falhou'. Um erro de
+autenticação não é culpa de nenhum email: os emails voltam para a fila sem gastar
+tentativas e a fila inteira pausa por `pausa_autenticacao` segundos.
+
+A reserva dos lotes usa BEGIN IMMEDIATE, então vários workers do gunicorn podem rodar
+a fila sobre o mesmo banco sem entregar o mesmo email duas vezes.
+
+A entrega em si é uma função enviar_lote(emails) -> [erro ou None por email], para que
+a fila não dependa do Flask-Mail e possa ser testada contra um servidor SMTP local
+(ex.: aiosmtpd, ver scripts/testar_fila_email.py).
+"""
+
+import logging
+import random
+import smtplib
+import socket
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+PENDENTE = 'pendente'
+ENVIANDO = 'enviando'
+ENVIADO = 'enviado'
+FALHOU = 'falhou'
+
+
+class EmailPendente:
+    """Um email reservado para entrega"""
+
+    __slots__ = ('id', 'destinatario', 'assunto', 'corpo', 'remetente', 'tentativas')
+
+    def __init__(self, id, destinatario, assunto, corpo, remetente, tentativas):
+        self.id = id
+        self.destinatario = destinatario
+        self.assunto = assunto
+        self.corpo = corpo
+        self.remetente = remetente
+        self.tentativas = tentativas
+
+
+def erro_de_autenticacao(erro):
+    """True se o servidor recusou as credenciais (problema da configuração, não do email)"""
+    return isinstance(erro, smtplib.SMTPAuthenticationError)
+
+
+def erro_transitorio(erro):
+    """True se vale a pena tentar de novo o mesmo email (rede, timeout, 4xx)"""
+    if isinstance(erro, smtplib.SMTPRecipientsRefused):
+        codigos = [codigo for codigo, _ in erro.recipients.values()]
+        return any(400 <= codigo < 500 for codigo in codigos)
+    if erro_de_autenticacao(erro):
+        # Tentar de novo email a email só gastaria as tentativas; processar_lote pausa a fila
+        return False
+    if isinstance(erro, smtplib.SMTPResponseException):
+        return 400 <= erro.smtp_code < 500
+    if isinstance(erro, smtplib.SMTPServerDisconnected):
+        return True
+    if isinstance(erro, smtplib.SMTPException):
+        # SMTPException herda de OSError: os demais erros do smtplib não passam com outra tentativa
+        return False
+    return isinstance(erro, (socket.timeout, ConnectionError, OSError))
+
+
+class FilaEmail:
+    """Outbox em SQLite + pool de threads de entrega"""
+
+    def __init__(self, banco, enviar_lote, num_workers=2, tamanho_lote=20, max_tentativas=5,
+                 backoff_base=30.0, backoff_max=3600.0, intervalo=2.0, reserva_expira=600.0,
+                 pausa_autenticacao=300.0):
+        self.banco = banco
+        self.enviar_lote = enviar_lote
+        self.num_workers = num_workers
+        self.tamanho_lote = tamanho_lote
+        self.max_tentativas = max_tentativas
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        # Sem aviso de novos emails, os workers consultam a tabela a cada `intervalo` segundos
+        self.intervalo = intervalo
+        # Emails 'enviando' há mais tempo que isso (processo morreu no meio) voltam para a fila
+        self.reserva_expira = reserva_expira
+        # Após um erro de autenticação nenhum worker entrega até este momento (time.time())
+        self.pausa_autenticacao = pausa_autenticacao
+        self.pausada_ate = 0.0
+        self.aviso = threading.Condition()
+        self.parar = threading.Event()
+        self.threads = []
+        self.lock = threading.Lock()
+        self.contadores = {'enfileirados': 0, 'enviados': 0, 'retentativas': 0, 'falhas': 0, 'lotes': 0,
+                           'pausas': 0}
+        self.criar_tabela()
+
+    def criar_tabela(self):
+        conn = self.banco.conectar()
+        cursor = conn.cursor()
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS email_outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                destinatario TEXT NOT NULL,
+                assunto TEXT NOT NULL,
+                corpo TEXT NOT NULL,
+                remetente TEXT,
+                status TEXT NOT NULL DEFAULT 'pendente',
+                tentativas INTEGER NOT NULL DEFAULT 0,
+                proxima_tentativa REAL NOT NULL DEFAULT 0,
+                reservado_em REAL,
+                ultimo_erro TEXT,
+                criado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                enviado_em TIMESTAMP
+            )
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_email_outbox_status ON email_outbox(status, proxima_tentativa)
+        ''')
+        conn.commit()
+        conn.close()
+
+    def _contar(self, nome, quantidade=1):
+        with self.lock:
+            self.contadores[nome] += quantidade
+
+    def pausada(self):
+        """True enquanto a fila está pausada por um erro de autenticação"""
+        with self.lock:
+            return time.time() < self.pausada_ate
+
+    def _pausar(self, erro):
+        with self.lock:
+            self.pausada_ate = time.time() + self.pausa_autenticacao
+            self.contadores['pausas'] += 1
+        logger.error(f"[EMAIL] ❌ Autenticação SMTP recusada; fila pausada por {self.pausa_autenticacao:.0f}s: {erro}")
+
+    # ----- Produtor -----
+
+    def enfileirar(self, destinatario, assunto, corpo, remetente=None):
+        """Grava o email no outbox e acorda um worker; retorna o id do email"""
+        conn = self.banco.conectar()
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT INTO email_outbox (destinatario, assunto, corpo, remetente, proxima_tentativa)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (destinatario, assunto, corpo, remetente, time.time()))
+        conn.commit()
+        email_id = cursor.lastrowid
+        conn.close()
+        self._contar('enfileirados')
+        with self.aviso:
+            self.aviso.notify()
+        return email_id
+
+    # ----- Consumidores -----
+
+    def recuperar_reservas(self):
+        """
+        Devolve à fila todos os emails 'enviando'. Só é seguro sem nenhum worker entregando
+        (ex.: no deploy, antes de subir o gunicorn); com workers rodando, reservas de um
+        processo que morreu voltam sozinhas após `reserva_expira` segundos.
+        """
+        conn = self.banco.conectar()
+        cursor = conn.cursor()
+        cursor.execute('UPDATE email_outbox SET status = ?, reservado_em = NULL WHERE status = ?', (PENDENTE, ENVIANDO))
+        recuperados = cursor.rowcount
+        conn.commit()
+        conn.close()
+        if recuperados:
+            logger.warning(f"[EMAIL] ⚠️ {recuperados} email(s) presos em 'enviando' voltaram para a fila")
+        return recuperados
+
+    def iniciar(self):
+        """Inicia o pool de threads de entrega (idempotente; num processo filho após fork, sobe de novo)"""
+        if any(thread.is_alive() for thread in self.threads):
+            return
+        self.parar.clear()
+        self.threads = [
+            threading.Thread(target=self._loop, name=f'fila-email-{i}', daemon=True)
+            for i in range(self.num_workers)
+        ]
+        for thread in self.threads:
+            thread.start()
+        logger.info(f"[EMAIL] 📬 Fila de emails iniciada com {self.num_workers} worker(s)")
+
+    def encerrar(self, timeout=5.0):
+        self.parar.set()
+        with self.aviso:
+            self.aviso.notify_all()
+        for thread in self.threads:
+            thread.join(timeout)
+        self.threads = []
+
+    def _loop(self):
+        while not self.parar.is_set():
+            try:
+                processados = self.processar_lote()
+            except Exception as e:
+                logger.error(f"[EMAIL] ❌ Erro no worker da fila de emails: {e}", exc_info=True)
+                processados = 0
+            finally:
+                self.banco.liberar()
+            if not processados:
+                with self.aviso:
+                    self.aviso.wait(self.intervalo)
+
+    def _reservar(self):
+        """Marca até tamanho_lote emails prontos como 'enviando' e os retorna"""
+        agora = time.time()
+        conn = self.banco.conectar()
+        try:
+            cursor = conn.cursor()
+            # BEGIN IMMEDIATE: só um processo/thread reserva por vez
+            cursor.execute('BEGIN IMMEDIATE')
+            cursor.execute('''
+                UPDATE email_outbox SET status = ?, reservado_em = NULL
+                WHERE status = ? AND reservado_em < ?
+            ''', (PENDENTE, ENVIANDO, agora - self.reserva_expira))
+            cursor.execute('''
+                SELECT id, destinatario, assunto, corpo, remetente, tentativas
+                FROM email_outbox
+                WHERE status = ? AND proxima_tentativa <= ?
+                ORDER BY id LIMIT ?
+            ''', (PENDENTE, agora, self.tamanho_lote))
+            emails = [EmailPendente(*linha) for linha in cursor.fetchall()]
+            if emails:
+                cursor.executemany('UPDATE email_outbox SET status = ?, reservado_em = ? WHERE id = ?',
+                                   [(ENVIANDO, agora, email.id) for email in emails])
+            conn.commit()
+            return emails
+        finally:
+            conn.close()
+
+    def _backoff(self, tentativas):
+        atraso = min(self.backoff_base * (2 ** (tentativas - 1)), self.backoff_max)
+        return atraso * random.uniform(0.8, 1.2)
+
+    def processar_lote(self):
+        """Entrega um lote de emails prontos; retorna quantos foram processados"""
+        if self.pausada():
+            return 0
+        emails = self._reservar()
+        if not emails:
+            return 0
+
+        try:
+            erros = self.enviar_lote(emails)
+        except Exception as e:
+            # Falha antes de qualquer envio (ex.: conexão SMTP): o lote inteiro volta para a fila
+            erros = [e] * len(emails)
+        self._contar('lotes')
+
+        agora = time.time()
+        atualizacoes = []
+        erro_autenticacao = None
+        for email, erro in zip(emails, erros):
+            tentativas = email.tentativas + 1
+            if erro_de_autenticacao(erro):
+                # Volta para a fila sem contar a tentativa; a pausa vale para todos os workers
+                erro_autenticacao = erro
+                atualizacoes.append(('''
+                    UPDATE email_outbox SET status = ?, reservado_em = NULL, ultimo_erro = ?, proxima_tentativa = ?
+                    WHERE id = ?
+                ''', (PENDENTE, str(erro), agora, email.id)))
+            elif erro is None:
+                atualizacoes.append(('''
+                    UPDATE email_outbox SET status = ?, tentativas = ?, reservado_em = NULL,
+                        ultimo_erro = NULL, enviado_em = CURRENT_TIMESTAMP
+                    WHERE id = ?
+                ''', (ENVIADO, tentativas, email.id)))
+                self._contar('enviados')
+                logger.info(f"[EMAIL] ✅ Enviado (fila #{email.id}) para: {email.destinatario} | Assunto: {email.assunto}")
+            elif erro_transitorio(erro) and tentativas < self.max_tentativas:
+                atualizacoes.append(('''
+                    UPDATE email_outbox SET status = ?, tentativas = ?, reservado_em = NULL,
+                        ultimo_erro = ?, proxima_tentativa = ?
+                    WHERE id = ?
+                ''', (PENDENTE, tentativas, str(erro), agora + self._backoff(tentativas), email.id)))
+                self._contar('retentativas')
+                logger.warning(f"[EMAIL] ⚠️ Falha transitória (fila #{email.id}, tentativa {tentativas}): {erro}")
+            else:
+                atualizacoes.append(('''
+                    UPDATE email_outbox SET status = ?, tentativas = ?, reservado_em = NULL, ultimo_erro = ?
+                    WHERE id = ?
+                ''', (FALHOU, tentativas, str(erro), email.id)))
+                self._contar('falhas')
+                logger.error(f"[EMAIL] ❌ Email descartado (fila #{email.id}) após {tentativas} tentativa(s): {erro}")
+
+        conn = self.banco.conectar()
+        cursor = conn.cursor()
+        for sql, parametros in atualizacoes:
+            cursor.execute(sql, parametros)
+        conn.commit()
+        conn.close()
+        if erro_autenticacao is not None:
+            self._pausar(erro_autenticacao)
+        return len(emails)
+
+    def pendentes(self):
+        """Número de emails aguardando entrega (profundidade da fila)"""
+        conn = self.banco.conectar()
+        cursor = conn.cursor()
+        cursor.execute('SELECT COUNT(*) FROM email_outbox WHERE status IN (?, ?)', (PENDENTE, ENVIANDO))
+        total = cursor.fetchone()[0]
+        conn.close()
+        return total
+
+    def estatisticas(self):
+        with self.lock:
+            contadores = dict(self.contadores)
+        contadores['pendentes'] = self.pendentes()
+        contadores['workers'] = sum(1 for thread in self.threads if thread.is_alive())
+        contadores['pausada'] = self.pausada()
+        return contadores
@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+"""
+Chamadas ao Gemini com prazo, requisição "hedged" e disjuntor (circuit breaker).
+
+Antes, send_message/generate_content rodava direto na thread da requisição, sem timeout:
+com a API lenta ou sem quota, cada worker ficava preso a viagem inteira só para depois
+cair na resposta local. GatewayGemini executa a chamada num pool próprio e:
+- prazo: passado ao SDK (request_options timeout) e aplicado na espera; estourou, a
+  requisição segue para a base local (PrazoGeminiEsgotado);
+- hedge (opcional): se a resposta não chegou depois do p95 das latências recentes, dispara
+  uma segunda chamada idêntica e fica com a que terminar primeiro;
+- disjuntor: depois de `max_falhas` falhas seguidas (ou de um 429/quota) fica aberto por
+  `espera` segundos e recusa na hora (CircuitoAberto), sem tocar na rede; depois deixa
+  passar uma chamada de teste (meio-aberto) e fecha se ela der certo.
+
+gerar_async() devolve a mesma chamada como corrotina para quem usa asyncio.
+"""
+
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+FECHADO = 'fechado'
+ABERTO = 'aberto'
+MEIO_ABERTO = 'meio_aberto'
+
+# Só calcula o p95 para o hedge com pelo menos esta quantidade de latências
+MINIMO_AMOSTRAS_HEDGE = 20
+
+
+class CircuitoAberto(Exception):
+    """O Gemini está falhando; a chamada foi recusada sem ir à rede"""
+
+
+class PrazoGeminiEsgotado(TimeoutError):
+    """A chamada não terminou dentro do prazo"""
+
+
+class RespostaVazia(Exception):
+    """A chamada terminou sem erro, mas sem nenhum texto"""
+
+
+def erro_quota(erro):
+    """True para 429 / quota / rate limit (ResourceExhausted no SDK)"""
+    texto = str(erro).lower()
+    return ('429' in texto or 'quota' in texto or 'rate_limit' in texto
+            or type(erro).__name__ in ('ResourceExhausted', 'TooManyRequests'))
+
+
+class Disjuntor:
+    """Circuit breaker: fechado -> aberto (após falhas) -> meio-aberto (uma chamada de teste) -> fechado"""
+
+    def __init__(self, max_falhas=5, espera=30.0):
+        self.max_falhas = max_falhas
+        self.espera = espera
+        self.estado = FECHADO
+        self.falhas_seguidas = 0
+        self.aberto_ate = 0.0
+        self.teste_em_andamento = False
+        self.aberturas = 0
+        self.recusas = 0
+        self.lock = threading.Lock()
+
+    def _atualizar(self, agora):
+        if self.estado == ABERTO and agora >= self.aberto_ate:
+            self.estado = MEIO_ABERTO
+            self.teste_em_andamento = False
+
+    def aberto(self):
+        """True se uma chamada agora seria recusada (não consome a chamada de teste)"""
+        with self.lock:
+            self._atualizar(time.monotonic())
+            return self.estado == ABERTO or (self.estado == MEIO_ABERTO and self.teste_em_andamento)
+
+    def permitir(self):
+        """Reserva a chamada; levanta CircuitoAberto se o circuito está aberto"""
+        with self.lock:
+            self._atualizar(time.monotonic())
+            if self.estado == FECHADO:
+                return
+            if self.estado == MEIO_ABERTO and not self.teste_em_andamento:
+                self.teste_em_andamento = True
+                return
+            self.recusas += 1
+        raise CircuitoAberto()
+
+    def sucesso(self):
+        with self.lock:
+            self.estado = FECHADO
+            self.falhas_seguidas = 0
+            self.teste_em_andamento = False
+
+    def falha(self, quota=False):
+        """Registra uma falha; quota esgotada abre o circuito na hora"""
+        with self.lock:
+            self.falhas_seguidas += 1
+            if quota or self.estado == MEIO_ABERTO or self.falhas_seguidas >= self.max_falhas:
+                if self.estado != ABERTO:
+                    self.aberturas += 1
+                self.estado = ABERTO
+                self.aberto_ate = time.monotonic() + self.espera
+                self.teste_em_andamento = False
+
+    def estatisticas(self):
+        with self.lock:
+            self._atualizar(time.monotonic())
+            return {
+                'estado': self.estado,
+                'falhas_seguidas': self.falhas_seguidas,
+                'aberturas': self.aberturas,
+                'recusas': self.recusas,
+                'reabre_em': round(max(0.0, self.aberto_ate - time.monotonic()), 1) if self.estado == ABERTO else 0,
+            }
+
+
+class GatewayGemini:
+    """Executa chamadas ao Gemini num pool próprio, com prazo, hedge opcional e disjuntor"""
+
+    def __init__(self, prazo=20.0, hedge=False, hedge_minimo=1.0, num_workers=8, max_falhas=5, espera=30.0):
+        self.prazo = prazo
+        self.hedge = hedge
+        # Nunca dispara a segunda chamada antes disso, mesmo com p95 baixo
+        self.hedge_minimo = hedge_minimo
+        self.executor = ThreadPoolExecutor(max_workers=num_workers, thread_name_prefix='gemini')
+        self.disjuntor = Disjuntor(max_falhas=max_falhas, espera=espera)
+        self.latencias = deque(maxlen=256)
+        self.lock = threading.Lock()
+        self.contadores = {'chamadas': 0, 'sucessos': 0, 'erros': 0, 'erros_quota': 0, 'prazos_esgotados': 0,
+                           'hedges': 0, 'hedges_vencedores': 0}
+        # ao_medir(segundos, resultado) a cada chamada à API (inclusive hedges), para as métricas
+        self.ao_medir = None
+
+    def _contar(self, nome):
+        with self.lock:
+            self.contadores[nome] += 1
+
+    def _medir(self, chamada, prazo):
+        inicio = time.perf_counter()
+        try:
+            resultado = chamada(prazo)
+        except Exception as e:
+            if self.ao_medir is not None:
+                self.ao_medir(time.perf_counter() - inicio, 'quota' if erro_quota(e) else 'erro')
+            raise
+        segundos = time.perf_counter() - inicio
+        with self.lock:
+            self.latencias.append(segundos)
+        if self.ao_medir is not None:
+            self.ao_medir(segundos, 'sucesso')
+        return resultado
+
+    def atraso_hedge(self):
+        """p95 das latências recentes (ou None se ainda não há amostras suficientes)"""
+        with self.lock:
+            if len(self.latencias) < MINIMO_AMOSTRAS_HEDGE:
+                return None
+            latencias = sorted(self.latencias)
+        p95 = latencias[min(len(latencias) - 1, int(len(latencias) * 0.95))]
+        return max(self.hedge_minimo, p95)
+
+    def aberto(self):
+        return self.disjuntor.aberto()
+
+    def permitir(self):
+        """Para chamadas feitas fora do gateway (streaming): reserva a vez no disjuntor"""
+        self.disjuntor.permitir()
+        self._contar('chamadas')
+
+    def registrar(self, erro=None):
+        """Resultado de uma chamada feita fora do gateway"""
+        if erro is None:
+            self._contar('sucessos')
+            self.disjuntor.sucesso()
+        else:
+            quota = erro_quota(erro)
+            self._contar('erros_quota' if quota else 'erros')
+            self.disjuntor.falha(quota=quota)
+
+    def gerar(self, chamada, prazo=None):
+        """
+        Executa chamada(prazo_restante) e devolve o resultado. Levanta CircuitoAberto,
+        PrazoGeminiEsgotado ou o erro da própria chamada.
+        """
+        prazo = prazo or self.prazo
+        self.permitir()
+        limite = time.monotonic() + prazo
+        futuros = [self.executor.submit(self._medir, chamada, prazo)]
+
+        atraso = self.atraso_hedge() if self.hedge else None
+        if atraso is not None and atraso < prazo:
+            prontos, _ = wait(futuros, timeout=atraso)
+            if not prontos:
+                # Demorou mais que o p95: segunda chamada idêntica, vale a que terminar primeiro
+                self._contar('hedges')
+                futuros.append(self.executor.submit(self._medir, chamada, max(0.1, limite - time.monotonic())))
+
+        erro = None
+        pendentes = set(futuros)
+        while pendentes:
+            restante = limite - time.monotonic()
+            if restante <= 0:
+                break
+            prontos, pendentes = wait(pendentes, timeout=restante, return_when=FIRST_COMPLETED)
+            for futuro in prontos:
+                if futuro.exception() is None:
+                    if futuro is not futuros[0]:
+                        self._contar('hedges_vencedores')
+                    for outro in pendentes:
+                        outro.cancel()
+                    self.registrar()
+                    return futuro.result()
+                erro = futuro.exception()
+
+        for futuro in pendentes:
+            futuro.cancel()
+        if erro is None or pendentes:
+            self._contar('prazos_esgotados')
+            self.disjuntor.falha()
+            raise PrazoGeminiEsgotado(f"Gemini não respondeu em {prazo:.1f}s")
+        self.registrar(erro)
+        raise erro
+
+    async def gerar_async(self, chamada, prazo=None):
+        """gerar() para código asyncio (roda no executor padrão do loop)"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.gerar, chamada, prazo)
+
+    def estatisticas(self):
+        with self.lock:
+            estatisticas = dict(self.contadores)
+            latencias = sorted(self.latencias)
+        if latencias:
+            estatisticas['latencia_ms'] = {
+                'p50': round(latencias[len(latencias) // 2] * 1000, 1),
+                'p95': round(latencias[min(len(latencias) - 1, int(len(latencias) * 0.95))] * 1000, 1),
+                'max': round(latencias[-1] * 1000, 1),
+            }
+        estatisticas['prazo'] = self.prazo
+        estatisticas['hedge'] = self.hedge
+        estatisticas['disjuntor'] = self.disjuntor.estatisticas()
+        return estatisticas
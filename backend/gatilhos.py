@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+"""
+Listas de gatilhos (palavras e frases) do chatbot e o autômato Aho-Corasick que as reconhece.
+
+Todas as listas são compiladas uma única vez, na importação, em dois autômatos: um para
+as mensagens da usuária e outro para respostas (da Sophia ou do histórico). Uma única
+passada sobre o texto devolve o conjunto de categorias encontradas, e cada detector do
+chat vira uma consulta nesse conjunto em vez de um any(p in texto for p in [...]).
+A comparação é feita sem acentos e em minúsculas (ver normalizacao.dobrar).
+"""
+
+from normalizacao import dobrar
+
+# Palavras-chave para alertas
+palavras_alerta = ["sangramento", "febre", "dor", "inchaço", "tristeza", "depressão", "emergência"]
+# Palavras/frases que devem ser ignoradas nos alertas (falsos positivos)
+palavras_ignorar_alertas = ["criador", "desenvolvedor", "developer", "programador", "criei", "criou", "fiz", "feito", "sou seu", "sou o"]
+
+# Saudações simples (a mensagem inteira deve ser uma delas)
+saudacoes = ['oi', 'olá', 'ola', 'oi sophia', 'olá sophia', 'ola sophia', 'oi sophia!', 'olá sophia!',
+             'ola sophia!', 'oi!', 'olá!', 'ola!', 'hey', 'hey sophia', 'eai', 'e aí', 'eai sophia']
+prefixos_saudacao = ['oi ', 'olá ', 'ola ', 'hey ']
+
+# Gatilhos procurados na mensagem da usuária (categoria -> frases)
+GATILHOS_MENSAGEM = {
+    # Declarações de sentimentos, ações ou informações: a mensagem NÃO é uma saudação simples
+    'declaracao': [
+        'estou', 'sou', 'tenho', 'sinto', 'me sinto', 'estou sentindo', 'estou feliz',
+        'estou triste', 'estou ansiosa', 'estou preocupada', 'estou com', 'estou fazendo',
+        'fiz', 'criei', 'desenvolvi', 'trabalho', 'quero', 'preciso', 'gostaria',
+        'feliz', 'triste', 'ansiosa', 'preocupada', 'nervosa', 'calma', 'bem', 'mal'
+    ],
+    'ignorar_alerta': palavras_ignorar_alertas,
+    'contexto_pessoal': ["estou", "sinto", "tenho", "me sinto", "estou sentindo"],
+    'contexto_emergencia': ["estou", "tenho", "preciso", "urgente"],
+    # Emoções usadas para humanizar respostas locais
+    'emocao_cansaco': ['cansaço', 'cansada', 'cansado', 'tired', 'exausta', 'exausto'],
+    'emocao_preocupacao': ['preocupação', 'preocupada', 'preocupado', 'preocupar', 'medo', 'medo de'],
+    'emocao_tristeza': ['triste', 'tristeza', 'sad', 'depressão', 'deprimida'],
+    'emocao_sobrecarga': ['sobrecarregada', 'sobrecarregado', 'sobrecarga'],
+    'emocao_duvida': ['dúvida', 'dúvidas', 'duvida', 'pergunta', 'não sei'],
+    # Saúde mental: adiciona o CVV
+    'cvv': ["depressão", "tristeza", "triste"],
+    # Perguntas sobre a identidade da Sophia (prompt do Gemini)
+    'identidade_sophia': [
+        'o que você é', 'quem é você', 'quem você é', 'o que é você',
+        'você é o quê', 'sophia o que você é', 'sophia quem é você',
+        'sophia quem você é', 'qual sua função', 'qual sua função',
+        'o que você faz', 'o que faz', 'como você funciona'
+    ],
+    # Perguntas diretas sobre a identidade da Sophia (respostas contextuais)
+    'identidade_sophia_direta': ['o que você é', 'quem é você', 'quem você é', 'o que é você', 'sophia o que você é', 'sophia quem é você'],
+    'identidade_usuario': [
+        'quem sou eu', 'quem eu sou', 'você sabe quem eu sou',
+        'sabe quem sou', 'me conhece', 'você me conhece'
+    ],
+    # Declarações de sentimento (prompt do Gemini)
+    'sentimento': [
+        'feliz', 'triste', 'ansiosa', 'preocupada', 'nervosa', 'calma', 'bem', 'mal',
+        'estou feliz', 'estou triste', 'estou ansiosa', 'estou preocupada', 'me sinto',
+        'sou feliz', 'sou triste', 'sou ansiosa', 'sou preocupada', 'estou bem', 'estou mal',
+        'me sinto feliz', 'me sinto triste', 'me sinto ansiosa', 'me sinto preocupada'
+    ],
+    # Declarações de sentimento (respostas contextuais)
+    'sentimento_expresso': ['feliz', 'triste', 'ansiosa', 'preocupada', 'nervosa', 'calma', 'bem', 'mal', 'estou feliz', 'estou triste', 'me sinto'],
+    'feliz': ['feliz'],
+    'triste': ['triste'],
+    'ansiosa_preocupada': ['ansiosa', 'preocupada'],
+    # Pergunta sobre o projeto (mantém menções ao projeto na resposta)
+    'projeto': [
+        'projeto', 'banco de dados', 'teste', 'testar', 'testando', 'desenvolver',
+        'criar', 'site', 'aplicativo', 'sistema', 'chefia', 'pedido'
+    ],
+    # Mensagens do histórico que trazem informações pessoais
+    'historico_nome': ['me chamo', 'meu nome', 'sou', 'eu sou', 'me chamo de', 'eu sou o', 'eu sou a'],
+    'historico_projeto': ['criando', 'desenvolvendo', 'projeto', 'site', 'estou criando', 'estou desenvolvendo', 'fiz', 'criei', 'chefia', 'pedido'],
+    'historico_bebe': ['bebê', 'filho', 'filha', 'neném', 'meu bebê', 'minha filha'],
+}
+# Cada palavra de alerta vira sua própria categoria ("alerta:febre", ...)
+for _palavra in palavras_alerta:
+    GATILHOS_MENSAGEM[f'alerta:{_palavra}'] = [_palavra]
+
+# Gatilhos procurados nas respostas (da Sophia, do histórico ou da base local)
+GATILHOS_RESPOSTA = {
+    # Saudação completa (longa com projeto/testes/número de conversas) já enviada
+    'saudacao_completa': [
+        'já estamos na nossa',
+        'nossa conversa',
+        'testar meu banco de dados',
+        'projeto para as mamães',
+        'que bom te ver novamente',
+        'lembre-se que estou aqui para te ajudar a testar'
+    ],
+    # Variante mais ampla usada para filtrar o histórico enviado ao Gemini
+    'saudacao_completa_historico': [
+        'já estamos na nossa',
+        'nossa conversa',
+        'testar meu banco de dados',
+        'projeto para as mamães',
+        'que bom te ver novamente',
+        'lembre-se que estou aqui para te ajudar a testar',
+        'que bom te ver por aqui de novo',
+        'que bom te ver por aqui',
+        'em que posso te ajudar hoje',
+        'como você está? como posso te ajudar',
+    ],
+    'saudacao_anterior': ['oi!', 'olá!', 'ola!', 'que bom te ver', 'bem-vinda'],
+    'generica_proibida': [
+        'tudo bem por aí',
+        'tudo bem por ai',
+        'em que posso te ajudar',
+        'como posso te ajudar hoje',
+        'como posso ajudar hoje',
+        'tudo bem? em que posso ajudar',
+        'tudo bem em que posso ajudar'
+    ],
+    # Frases típicas de mensagens de apoio (genéricas demais para uma saudação)
+    'generica_apoio': ["sentimentos são válidos", "não se compare", "cada jornada é única",
+                       "procure ajuda profissional", "saiba que procure ajuda"],
+    # Tom empático já presente na resposta local
+    'empatia': ['você', 'sua', 'sente', 'sentir', 'querida', 'imagino', 'entendo', 'compreendo', 'sei que', 'percebo'],
+}
+
+
+class AutomatoAhoCorasick:
+    """
+    Autômato de Aho-Corasick: reconhece todas as ocorrências de um conjunto de padrões
+    em uma única passada pelo texto, independentemente do número de padrões.
+    Cada padrão pertence a uma ou mais categorias; a busca devolve as categorias.
+    """
+
+    def __init__(self, gatilhos):
+        # Nó 0 é a raiz; transicoes[n] mapeia caractere -> próximo nó
+        self.transicoes = [{}]
+        self.falha = [0]
+        self.saidas = [set()]
+
+        for categoria, frases in gatilhos.items():
+            for frase in frases:
+                self._adicionar(dobrar(frase), categoria)
+        self._construir_falhas()
+        self.saidas = [frozenset(saida) for saida in self.saidas]
+
+    def _adicionar(self, padrao, categoria):
+        no = 0
+        for caractere in padrao:
+            proximo = self.transicoes[no].get(caractere)
+            if proximo is None:
+                proximo = len(self.transicoes)
+                self.transicoes.append({})
+                self.falha.append(0)
+                self.saidas.append(set())
+                self.transicoes[no][caractere] = proximo
+            no = proximo
+        self.saidas[no].add(categoria)
+
+    def _construir_falhas(self):
+        """Busca em largura calculando o link de falha de cada nó e herdando as saídas"""
+        fila = list(self.transicoes[0].values())
+        inicio = 0
+        while inicio < len(fila):
+            no = fila[inicio]
+            inicio += 1
+            for caractere, filho in self.transicoes[no].items():
+                fila.append(filho)
+                destino = self.falha[no]
+                while destino and caractere not in self.transicoes[destino]:
+                    destino = self.falha[destino]
+                candidato = self.transicoes[destino].get(caractere, 0)
+                self.falha[filho] = candidato if candidato != filho else 0
+                self.saidas[filho] |= self.saidas[self.falha[filho]]
+
+    def categorias(self, texto):
+        """Retorna o conjunto de categorias cujos padrões aparecem no texto (já dobrado)"""
+        transicoes = self.transicoes
+        falha = self.falha
+        saidas = self.saidas
+        encontradas = set()
+        no = 0
+        for caractere in texto:
+            while no and caractere not in transicoes[no]:
+                no = falha[no]
+            no = transicoes[no].get(caractere, 0)
+            if saidas[no]:
+                encontradas |= saidas[no]
+        return frozenset(encontradas)
+
+
+# Compilados uma única vez na importação
+AUTOMATO_MENSAGEM = AutomatoAhoCorasick(GATILHOS_MENSAGEM)
+AUTOMATO_RESPOSTA = AutomatoAhoCorasick(GATILHOS_RESPOSTA)
+SAUDACOES = frozenset(dobrar(s) for s in saudacoes)
+PREFIXOS_SAUDACAO = tuple(dobrar(p) for p in prefixos_saudacao)
+
+
+def categorias_mensagem(texto_dobrado):
+    """Categorias de GATILHOS_MENSAGEM presentes em um texto já dobrado"""
+    return AUTOMATO_MENSAGEM.categorias(texto_dobrado)
+
+
+# Sem cache: as entradas são mensagens e respostas inteiras (dados pessoais que não devem ficar
+# retidos fora do armazenamento de conversas), e uma passada pelo autômato já é barata
+def categorias_texto(texto):
+    """Categorias de GATILHOS_MENSAGEM em um texto qualquer (ex.: perguntas do histórico)"""
+    return AUTOMATO_MENSAGEM.categorias(dobrar(texto))
+
+
+def categorias_resposta(texto):
+    """Categorias de GATILHOS_RESPOSTA em uma resposta (da Sophia, do histórico ou da base local)"""
+    return AUTOMATO_RESPOSTA.categorias(dobrar(texto))
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""
+Modelo falso do Gemini para testes e desenvolvimento sem chave de API.
+
+Imita a parte do google.generativeai usada pelo chat: GenerativeModel(system_instruction=...),
+start_chat(history=...), ChatSession.send_message(...) e generate_content(...), com
+respostas de `.text` e streaming (stream=True devolve pedaços de algumas palavras).
+Não acessa a rede; cada requisição fica registrada em `chamadas` (instrução de sistema,
+conteúdos enviados e tamanho em caracteres) para conferir o que seria enviado à API.
+
+Uso: GEMINI_FAKE=true python backend/app.py
+"""
+
+import re
+import threading
+
+RESPOSTA_PADRAO = "Entendo você, querida. 💛 Estou aqui para te ouvir. Quer me contar mais?"
+
+
+class RespostaFake:
+    def __init__(self, texto):
+        self.text = texto
+        self.candidates = [{'content': {'role': 'model', 'parts': [texto]}}]
+
+
+class RespostaFakeStream:
+    """Iterável de pedaços (RespostaFake) de poucas palavras; .text é o texto completo"""
+
+    def __init__(self, texto, palavras_por_trecho=3):
+        self.text = texto
+        palavras = re.findall(r'\S+\s*', texto)
+        self.trechos = [''.join(palavras[i:i + palavras_por_trecho])
+                        for i in range(0, len(palavras), palavras_por_trecho)]
+
+    def __iter__(self):
+        for trecho in self.trechos:
+            yield RespostaFake(trecho)
+
+
+def _texto(conteudo):
+    if isinstance(conteudo, str):
+        return conteudo
+    return ''.join(str(parte) for parte in conteudo.get('parts', ()))
+
+
+class SessaoFake:
+    """ChatSession: acumula os turnos enviados e recebidos em `history`"""
+
+    def __init__(self, modelo, history=None):
+        self.model = modelo
+        self.history = list(history or [])
+
+    def send_message(self, content, generation_config=None, stream=False, **kwargs):
+        mensagem = {'role': 'user', 'parts': [content]} if isinstance(content, str) else content
+        resposta = self.model.generate_content(self.history + [mensagem], generation_config=generation_config,
+                                               stream=stream)
+        self.history.extend([mensagem, {'role': 'model', 'parts': [resposta.text]}])
+        return resposta
+
+
+class ModeloFake:
+    """
+    Substituto de genai.GenerativeModel. `respostas` é uma lista usada em ordem (depois
+    repete a última) ou uma função (contents -> texto); sem ela, devolve RESPOSTA_PADRAO.
+    """
+
+    def __init__(self, model_name='gemini-fake', system_instruction=None, generation_config=None, respostas=None):
+        self.model_name = model_name
+        self.system_instruction = system_instruction
+        self.generation_config = generation_config
+        self.respostas = respostas
+        self.chamadas = []
+        self.lock = threading.Lock()
+
+    def start_chat(self, history=None, **kwargs):
+        return SessaoFake(self, history)
+
+    def _responder(self, contents, indice):
+        if callable(self.respostas):
+            return self.respostas(contents)
+        if self.respostas:
+            return self.respostas[min(indice, len(self.respostas) - 1)]
+        return RESPOSTA_PADRAO
+
+    def generate_content(self, contents, generation_config=None, stream=False, **kwargs):
+        if isinstance(contents, (str, dict)):
+            contents = [contents]
+        with self.lock:
+            indice = len(self.chamadas)
+            self.chamadas.append({
+                'system_instruction': self.system_instruction,
+                'contents': list(contents),
+                'caracteres': sum(len(_texto(c)) for c in contents),
+                'generation_config': generation_config or self.generation_config,
+                'stream': stream,
+            })
+        texto = self._responder(contents, indice)
+        return RespostaFakeStream(texto) if stream else RespostaFake(texto)
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""
+Extração incremental de informações pessoais (nome da usuária, nome do bebê, projeto).
+
+Antes, a cada turno, todas as perguntas do histórico eram concatenadas e os padrões
+eram executados de novo sobre o texto inteiro, e o chat() percorria o histórico mais
+uma vez para montar o resumo: trabalho O(n²) ao longo de uma conversa. Aqui cada
+usuária tem um EstadoExtracao que acumula o que já foi encontrado, e cada mensagem é
+analisada uma única vez, quando entra na conversa. processar() devolve apenas os campos
+que mudaram, para que user_info só seja escrito quando algo realmente mudou.
+
+Com o histórico compartilhado entre workers (CONVERSAS_BACKEND=sqlite/redis), um turno
+pode ter sido atendido por outro processo; contexto_historico() recebe o histórico e
+analisa apenas os turnos com timestamp posterior ao último já visto por este processo.
+Nesses backends o armazenamento não avisa este processo quando uma conversa expira, então
+os estados ficam num CacheTTL próprio (TTL renovado a cada uso + limite LRU); um estado
+descartado é reconstruído de user_info e do histórico na próxima mensagem.
+"""
+
+import threading
+
+from cache import AUSENTE, CacheTTL
+from gatilhos import categorias_texto
+from padroes import extrair_informacoes
+
+TEXTO_PROJETO = "A usuária está criando/desenvolvendo um site/projeto relacionado a puerpério/gestação"
+# O contexto do Gemini só usa os primeiros trechos do resumo do histórico
+LIMITE_RESUMO = 5
+# Estados guardados (mesmos padrões da memória de conversas)
+TTL_ESTADOS = 86400
+MAX_ESTADOS = 1000
+
+
+class EstadoExtracao:
+    """Informações já extraídas das mensagens de uma usuária"""
+
+    __slots__ = ('nome_usuario', 'nome_bebe', 'informacoes_pessoais', 'nome_historico', 'resumo', 'ultimo_timestamp')
+
+    def __init__(self, info=None):
+        info = info or {}
+        # Valores como estão em user_info (usados para saber se algo mudou)
+        self.nome_usuario = info.get('nome_usuario')
+        self.nome_bebe = info.get('nome_bebe')
+        informacoes = info.get('informacoes_pessoais')
+        self.informacoes_pessoais = dict(informacoes) if isinstance(informacoes, dict) else {}
+        # Contexto montado a partir das mensagens desta conversa
+        self.nome_historico = None
+        self.resumo = []
+        # Timestamp (ISO) do turno mais recente já analisado
+        self.ultimo_timestamp = ''
+
+
+class ExtratorInformacoes:
+    """
+    Mantém um EstadoExtracao por usuária. carregar_info(user_id) deve devolver o registro
+    atual de user_info no formato de obter_informacoes_pessoais (ou None), e é chamado só
+    na primeira mensagem de cada usuária (e de novo se o estado expirar ou sair do LRU).
+    """
+
+    def __init__(self, carregar_info=None, limite_resumo=LIMITE_RESUMO, ttl=TTL_ESTADOS, max_usuarias=MAX_ESTADOS):
+        self.carregar_info = carregar_info
+        self.limite_resumo = limite_resumo
+        self.estados = CacheTTL(ttl=ttl, max_itens=max_usuarias)
+        self.lock = threading.Lock()
+
+    def _estado(self, user_id):
+        """Chamado fora do lock: a leitura de user_info não bloqueia as outras usuárias"""
+        estado = self.estados.obter(user_id)
+        if estado is AUSENTE:
+            info = self.carregar_info(user_id) if self.carregar_info else None
+            estado = EstadoExtracao(info)
+        # Renova o TTL (só expira o estado de quem parou de conversar); se outra thread
+        # carregou a mesma usuária ao mesmo tempo, fica o estado que entrou primeiro
+        return self.estados.guardar_se_ausente(user_id, estado)
+
+    def processar(self, user_id, pergunta, timestamp=None):
+        """
+        Analisa uma nova mensagem e atualiza o estado da usuária.
+        Retorna um dict só com os campos de user_info que mudaram (vazio se nada mudou).
+        """
+        estado = self._estado(user_id)
+        with self.lock:
+            mudancas = self._analisar(estado, pergunta)
+            if timestamp and timestamp > estado.ultimo_timestamp:
+                estado.ultimo_timestamp = timestamp
+            return mudancas
+
+    def _analisar(self, estado, pergunta):
+        """Atualiza o estado com uma mensagem; retorna os campos de user_info que mudaram"""
+        nome_usuario, nome_bebe, tem_projeto = extrair_informacoes(pergunta)
+        categorias = categorias_texto(pergunta) if pergunta else frozenset()
+        mudancas = {}
+        if nome_usuario:
+            estado.nome_historico = nome_usuario
+            if nome_usuario != estado.nome_usuario:
+                estado.nome_usuario = mudancas['nome_usuario'] = nome_usuario
+
+        if nome_bebe and nome_bebe != estado.nome_bebe:
+            estado.nome_bebe = mudancas['nome_bebe'] = nome_bebe
+
+        if tem_projeto and estado.informacoes_pessoais.get('projeto') != TEXTO_PROJETO:
+            estado.informacoes_pessoais['projeto'] = TEXTO_PROJETO
+            mudancas['informacoes_pessoais'] = dict(estado.informacoes_pessoais)
+
+        # Trechos do histórico sobre projeto e bebê (mesmos cortes do antigo loop do chat)
+        if 'historico_projeto' in categorias:
+            self._adicionar_resumo(estado, pergunta[:250])
+        if 'historico_bebe' in categorias:
+            self._adicionar_resumo(estado, pergunta[:150])
+
+        return mudancas
+
+    def _adicionar_resumo(self, estado, trecho):
+        if trecho and trecho not in estado.resumo and len(estado.resumo) < self.limite_resumo:
+            estado.resumo.append(trecho)
+
+    def contexto_historico(self, user_id, historico=None):
+        """
+        Retorna (nome encontrado no histórico, trechos do resumo) sem reanalisar mensagens.
+        Turnos do histórico ainda não vistos por este processo (atendidos por outro worker)
+        são analisados agora, uma única vez.
+        """
+        estado = self._estado(user_id) if historico else self.estados.obter(user_id, None)
+        if estado is None:
+            return None, []
+        with self.lock:
+            novos = []
+            for turno in reversed(historico or ()):
+                timestamp = turno.get('timestamp') or ''
+                if timestamp <= estado.ultimo_timestamp:
+                    break
+                novos.append(turno)
+            for turno in reversed(novos):
+                # Já gravado em user_info pelo worker que atendeu o turno
+                self._analisar(estado, turno.get('pergunta', ''))
+                estado.ultimo_timestamp = turno.get('timestamp') or estado.ultimo_timestamp
+            return estado.nome_historico, list(estado.resumo)
+
+    def esquecer(self, user_id=None):
+        """Descarta o estado de uma usuária (ou de todas), ex.: quando o histórico é limpo"""
+        with self.lock:
+            if user_id is None:
+                self.estados.limpar()
+            else:
+                self.estados.invalidar(user_id)
@@ -0,0 +1,647 @@
+# -*- coding: utf-8 -*-
+"""
+Armazenamento limitado das conversas de cada usuária.
+
+Substitui o antigo dicionário global `conversas = {}`, que crescia para sempre: qualquer
+user_id enviado para /api/chat acumulava o texto completo de perguntas e respostas.
+Aqui há três limites, configuráveis por variáveis de ambiente:
+- CONVERSAS_MAX_TURNOS: turnos guardados por usuária (os mais antigos saem primeiro);
+- CONVERSAS_MAX_USUARIOS e CONVERSAS_TTL_SEGUNDOS: política LRU/TTL global, a usuária
+  acessada há mais tempo sai primeiro e conversas paradas além do TTL expiram;
+- CONVERSAS_MAX_MB: orçamento de memória (estimado pelo tamanho dos textos guardados).
+
+Com CONVERSAS_BACKEND o estado pode ser compartilhado entre os workers do gunicorn:
+- memoria (padrão): ArmazemConversas, privado de cada processo;
+- sqlite: ConversasSQLite, um arquivo SQLite comum a todos os workers da máquina;
+- redis: ConversasRedis, qualquer servidor que fale o protocolo do Redis (RESP), inclusive
+  o substituto local de scripts/servidor_resp_local.py.
+Todos implementam a interface de BackendConversas.
+"""
+
+import json
+import os
+import select
+import socket
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+from urllib.parse import urlparse
+
+from banco import GerenciadorConexoes
+
+# Custo fixo estimado de cada turno (dict + chaves), além dos textos
+TAMANHO_BASE_TURNO = 400
+
+
+def _tamanho_turno(turno):
+    """Estimativa, em bytes, da memória ocupada por um turno"""
+    tamanho = TAMANHO_BASE_TURNO
+    for valor in turno.values():
+        if isinstance(valor, str):
+            tamanho += sys.getsizeof(valor)
+        elif isinstance(valor, (list, tuple)):
+            tamanho += sum(sys.getsizeof(v) for v in valor if isinstance(v, str))
+    return tamanho
+
+
+def _limite_turnos(max_turnos):
+    return max_turnos if max_turnos is not None else int(os.getenv('CONVERSAS_MAX_TURNOS', '50'))
+
+
+def _limite_usuarios(max_usuarios):
+    return max_usuarios if max_usuarios is not None else int(os.getenv('CONVERSAS_MAX_USUARIOS', '1000'))
+
+
+def _ttl(ttl_segundos):
+    return ttl_segundos if ttl_segundos is not None else float(os.getenv('CONVERSAS_TTL_SEGUNDOS', '86400'))
+
+
+class _Conversa:
+    __slots__ = ('turnos', 'bytes', 'ultimo_acesso')
+
+    def __init__(self, agora):
+        self.turnos = deque()
+        self.bytes = 0
+        self.ultimo_acesso = agora
+
+
+class BackendConversas:
+    """
+    Interface dos backends de estado das conversas. Um turno é um dict serializável em
+    JSON (timestamp, pergunta, resposta, categoria, fonte, alertas).
+    """
+
+    # Chamado com o user_id quando o backend descarta sozinho a conversa inteira (se souber)
+    ao_remover = None
+
+    def obter(self, user_id):
+        """Retorna a lista de turnos da usuária, do mais antigo para o mais recente"""
+        raise NotImplementedError
+
+    def adicionar(self, user_id, turno):
+        """Acrescenta um turno à conversa da usuária, aplicando os limites"""
+        raise NotImplementedError
+
+    def limpar(self, user_id):
+        """Apaga a conversa de uma usuária; retorna o número de turnos apagados"""
+        raise NotImplementedError
+
+    def limpar_tudo(self):
+        """Apaga todas as conversas; retorna o número de turnos apagados"""
+        raise NotImplementedError
+
+    def estatisticas(self):
+        """Limites e contadores do backend, e o tamanho atual quando sai barato (vai para o /health e o /metrics)"""
+        raise NotImplementedError
+
+
+class ArmazemConversas(BackendConversas):
+    """
+    Conversas por user_id com limite de turnos, LRU/TTL e orçamento de memória.
+    ao_remover(user_id) é chamado quando a conversa inteira de uma usuária sai do
+    armazenamento por expiração ou falta de espaço (ex.: para descartar estado derivado).
+    """
+
+    def __init__(self, max_turnos=None, max_usuarios=None, ttl_segundos=None, max_bytes=None, ao_remover=None):
+        self.max_turnos = _limite_turnos(max_turnos)
+        self.max_usuarios = _limite_usuarios(max_usuarios)
+        self.ttl_segundos = _ttl(ttl_segundos)
+        self.max_bytes = max_bytes if max_bytes is not None else int(float(os.getenv('CONVERSAS_MAX_MB', '64')) * 1024 * 1024)
+        self.ao_remover = ao_remover
+        # Ordenado do acesso mais antigo para o mais recente
+        self.conversas = OrderedDict()
+        self.bytes = 0
+        self.total_turnos = 0
+        self.evicoes = {'turnos': 0, 'lru': 0, 'ttl': 0, 'memoria': 0}
+        self.lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.conversas)
+
+    def __contains__(self, user_id):
+        return user_id in self.conversas
+
+    def obter(self, user_id):
+        """Retorna uma cópia da lista de turnos da usuária (vazia se não houver)"""
+        removidos = []
+        with self.lock:
+            agora = time.monotonic()
+            self._expirar(agora, removidos)
+            conversa = self.conversas.get(user_id)
+            if conversa is None:
+                historico = []
+            else:
+                conversa.ultimo_acesso = agora
+                self.conversas.move_to_end(user_id)
+                historico = list(conversa.turnos)
+        self._notificar(removidos)
+        return historico
+
+    def adicionar(self, user_id, turno):
+        """Acrescenta um turno à conversa da usuária, aplicando todos os limites"""
+        removidos = []
+        with self.lock:
+            agora = time.monotonic()
+            self._expirar(agora, removidos)
+
+            conversa = self.conversas.get(user_id)
+            if conversa is None:
+                conversa = self.conversas[user_id] = _Conversa(agora)
+            else:
+                self.conversas.move_to_end(user_id)
+            conversa.ultimo_acesso = agora
+
+            tamanho = _tamanho_turno(turno)
+            conversa.turnos.append(turno)
+            conversa.bytes += tamanho
+            self.bytes += tamanho
+            self.total_turnos += 1
+
+            # Limite de turnos por usuária
+            while self.max_turnos and len(conversa.turnos) > self.max_turnos:
+                self._descartar_turno_antigo(conversa)
+                self.evicoes['turnos'] += 1
+
+            # Limite de usuárias (LRU)
+            while self.max_usuarios and len(self.conversas) > self.max_usuarios:
+                removidos.append(self._remover_mais_antiga('lru'))
+
+            # Orçamento de memória: remove as conversas menos recentes, nunca a atual
+            while self.max_bytes and self.bytes > self.max_bytes and len(self.conversas) > 1:
+                removidos.append(self._remover_mais_antiga('memoria'))
+            # Se só sobrou a conversa atual, descarta seus turnos mais antigos (mantém o último)
+            while self.max_bytes and self.bytes > self.max_bytes and len(conversa.turnos) > 1:
+                self._descartar_turno_antigo(conversa)
+                self.evicoes['memoria'] += 1
+        self._notificar(removidos)
+
+    def limpar(self, user_id):
+        """Apaga a conversa de uma usuária; retorna o número de turnos apagados"""
+        with self.lock:
+            conversa = self.conversas.pop(user_id, None)
+            if conversa is None:
+                return 0
+            self._descontar(conversa)
+            return len(conversa.turnos)
+
+    def limpar_tudo(self):
+        """Apaga todas as conversas; retorna o número de turnos apagados"""
+        with self.lock:
+            total = self.total_turnos
+            self.conversas.clear()
+            self.bytes = 0
+            self.total_turnos = 0
+            return total
+
+    def estatisticas(self):
+        """Tamanho atual, limites e contadores de remoção"""
+        with self.lock:
+            return {
+                "backend": "memoria",
+                "usuarios": len(self.conversas),
+                "turnos": self.total_turnos,
+                "bytes": self.bytes,
+                "max_turnos": self.max_turnos,
+                "max_usuarios": self.max_usuarios,
+                "ttl_segundos": self.ttl_segundos,
+                "max_bytes": self.max_bytes,
+                "evicoes": dict(self.evicoes),
+            }
+
+    def _expirar(self, agora, removidos):
+        """Remove conversas paradas há mais que o TTL (as mais antigas ficam no início)"""
+        if not self.ttl_segundos:
+            return
+        while self.conversas:
+            user_id, conversa = next(iter(self.conversas.items()))
+            if agora - conversa.ultimo_acesso <= self.ttl_segundos:
+                break
+            removidos.append(self._remover_mais_antiga('ttl'))
+
+    def _remover_mais_antiga(self, motivo):
+        user_id, conversa = self.conversas.popitem(last=False)
+        self._descontar(conversa)
+        self.evicoes[motivo] += 1
+        return user_id
+
+    def _descartar_turno_antigo(self, conversa):
+        tamanho = _tamanho_turno(conversa.turnos.popleft())
+        conversa.bytes -= tamanho
+        self.bytes -= tamanho
+        self.total_turnos -= 1
+
+    def _descontar(self, conversa):
+        self.bytes -= conversa.bytes
+        self.total_turnos -= len(conversa.turnos)
+
+    def _notificar(self, removidos):
+        # Fora do lock: o callback pode usar os próprios locks
+        if self.ao_remover:
+            for user_id in removidos:
+                self.ao_remover(user_id)
+
+
+class ConversasSQLite(BackendConversas):
+    """
+    Conversas em um arquivo SQLite compartilhado pelos workers da mesma máquina.
+    Aplica o limite de turnos por usuária, o TTL (por última atividade) e o limite de
+    usuárias (remove as de atividade mais antiga). Não há orçamento de memória: os dados
+    ficam em disco.
+    """
+
+    # A limpeza de TTL/usuárias roda a cada N turnos adicionados, não em toda escrita
+    INTERVALO_LIMPEZA = 50
+
+    def __init__(self, caminho=None, max_turnos=None, max_usuarios=None, ttl_segundos=None):
+        self.caminho = caminho or os.getenv('CONVERSAS_SQLITE_PATH') or os.path.join(os.path.dirname(__file__), 'conversas_estado.db')
+        self.max_turnos = _limite_turnos(max_turnos)
+        self.max_usuarios = _limite_usuarios(max_usuarios)
+        self.ttl_segundos = _ttl(ttl_segundos)
+        self.evicoes = {'turnos': 0, 'lru': 0, 'ttl': 0}
+        self.escritas = 0
+        self.lock = threading.Lock()
+        # Conexões reutilizadas por thread, em modo WAL (ver banco.py)
+        self.banco = GerenciadorConexoes(self.caminho)
+        conn = self._conectar()
+        try:
+            with conn:
+                conn.execute('''
+                    CREATE TABLE IF NOT EXISTS turnos_conversa (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        user_id TEXT NOT NULL,
+                        turno TEXT NOT NULL,
+                        criado_em REAL NOT NULL
+                    )
+                ''')
+                conn.execute('CREATE INDEX IF NOT EXISTS idx_turnos_conversa_user ON turnos_conversa(user_id, id)')
+                conn.execute('''
+                    CREATE TABLE IF NOT EXISTS atividade_conversa (
+                        user_id TEXT PRIMARY KEY,
+                        ultimo_acesso REAL NOT NULL
+                    )
+                ''')
+                conn.execute('CREATE INDEX IF NOT EXISTS idx_atividade_conversa ON atividade_conversa(ultimo_acesso)')
+        finally:
+            conn.close()
+
+    def _conectar(self):
+        return self.banco.conectar()
+
+    def __len__(self):
+        conn = self._conectar()
+        try:
+            return conn.execute('SELECT COUNT(*) FROM atividade_conversa').fetchone()[0]
+        finally:
+            conn.close()
+
+    def __contains__(self, user_id):
+        conn = self._conectar()
+        try:
+            return conn.execute('SELECT 1 FROM atividade_conversa WHERE user_id = ?', (user_id,)).fetchone() is not None
+        finally:
+            conn.close()
+
+    def obter(self, user_id):
+        conn = self._conectar()
+        try:
+            agora = time.time()
+            atividade = conn.execute('SELECT ultimo_acesso FROM atividade_conversa WHERE user_id = ?', (user_id,)).fetchone()
+            if atividade is None:
+                return []
+            if self.ttl_segundos and agora - atividade[0] > self.ttl_segundos:
+                # Expirada: apaga na leitura, sem esperar a limpeza periódica
+                with conn:
+                    self._apagar_usuarios(conn, [user_id])
+                self._contar_evicao('ttl', 1)
+                return []
+            with conn:
+                conn.execute('UPDATE atividade_conversa SET ultimo_acesso = ? WHERE user_id = ?', (agora, user_id))
+            linhas = conn.execute('SELECT turno FROM turnos_conversa WHERE user_id = ? ORDER BY id', (user_id,)).fetchall()
+            return [json.loads(linha[0]) for linha in linhas]
+        finally:
+            conn.close()
+
+    def adicionar(self, user_id, turno):
+        conn = self._conectar()
+        try:
+            agora = time.time()
+            with conn:
+                conn.execute('INSERT INTO turnos_conversa (user_id, turno, criado_em) VALUES (?, ?, ?)',
+                             (user_id, json.dumps(turno, ensure_ascii=False), agora))
+                conn.execute('''
+                    INSERT INTO atividade_conversa (user_id, ultimo_acesso) VALUES (?, ?)
+                    ON CONFLICT(user_id) DO UPDATE SET ultimo_acesso = excluded.ultimo_acesso
+                ''', (user_id, agora))
+                if self.max_turnos:
+                    # Mantém só os max_turnos mais recentes da usuária
+                    cursor = conn.execute('''
+                        DELETE FROM turnos_conversa WHERE user_id = ? AND id NOT IN (
+                            SELECT id FROM turnos_conversa WHERE user_id = ? ORDER BY id DESC LIMIT ?
+                        )
+                    ''', (user_id, user_id, self.max_turnos))
+                    self._contar_evicao('turnos', max(cursor.rowcount, 0))
+
+            with self.lock:
+                self.escritas += 1
+                limpar = self.escritas % self.INTERVALO_LIMPEZA == 0
+            if limpar:
+                self._limpeza(conn, agora)
+        finally:
+            conn.close()
+
+    def _limpeza(self, conn, agora):
+        """Remove conversas expiradas e, se passar do limite, as de atividade mais antiga"""
+        with conn:
+            if self.ttl_segundos:
+                expiradas = [linha[0] for linha in conn.execute(
+                    'SELECT user_id FROM atividade_conversa WHERE ultimo_acesso < ?', (agora - self.ttl_segundos,))]
+                self._apagar_usuarios(conn, expiradas)
+                self._contar_evicao('ttl', len(expiradas))
+            if self.max_usuarios:
+                excedentes = [linha[0] for linha in conn.execute('''
+                    SELECT user_id FROM atividade_conversa ORDER BY ultimo_acesso DESC LIMIT -1 OFFSET ?
+                ''', (self.max_usuarios,))]
+                self._apagar_usuarios(conn, excedentes)
+                self._contar_evicao('lru', len(excedentes))
+
+    def _contar_evicao(self, motivo, quantidade):
+        # Várias threads do worker escrevem ao mesmo tempo
+        with self.lock:
+            self.evicoes[motivo] += quantidade
+
+    def _apagar_usuarios(self, conn, user_ids):
+        for user_id in user_ids:
+            conn.execute('DELETE FROM turnos_conversa WHERE user_id = ?', (user_id,))
+            conn.execute('DELETE FROM atividade_conversa WHERE user_id = ?', (user_id,))
+
+    def limpar(self, user_id):
+        conn = self._conectar()
+        try:
+            with conn:
+                apagados = conn.execute('DELETE FROM turnos_conversa WHERE user_id = ?', (user_id,)).rowcount
+                conn.execute('DELETE FROM atividade_conversa WHERE user_id = ?', (user_id,))
+            return apagados
+        finally:
+            conn.close()
+
+    def limpar_tudo(self):
+        conn = self._conectar()
+        try:
+            with conn:
+                apagados = conn.execute('DELETE FROM turnos_conversa').rowcount
+                conn.execute('DELETE FROM atividade_conversa')
+            return apagados
+        finally:
+            conn.close()
+
+    def estatisticas(self):
+        conn = self._conectar()
+        try:
+            usuarios = conn.execute('SELECT COUNT(*) FROM atividade_conversa').fetchone()[0]
+            turnos = conn.execute('SELECT COUNT(*) FROM turnos_conversa').fetchone()[0]
+        finally:
+            conn.close()
+        with self.lock:
+            evicoes = dict(self.evicoes)
+        return {
+            "backend": "sqlite",
+            "usuarios": usuarios,
+            "turnos": turnos,
+            "max_turnos": self.max_turnos,
+            "max_usuarios": self.max_usuarios,
+            "ttl_segundos": self.ttl_segundos,
+            # Contadores deste processo
+            "evicoes": evicoes,
+        }
+
+
+# Comandos que podem ser reenviados sem risco se a resposta se perder (leituras e
+# operações idempotentes); um RPUSH repetido duplicaria o turno
+COMANDOS_REPETIVEIS = frozenset({'GET', 'EXISTS', 'LRANGE', 'LLEN', 'SCAN', 'PING', 'EXPIRE', 'DEL'})
+
+
+class ErroRESP(Exception):
+    """Erro devolvido pelo servidor (resposta '-ERR ...' do protocolo)"""
+
+
+def _codificar(args):
+    partes = [b'*%d\r\n' % len(args)]
+    for arg in args:
+        dado = arg if isinstance(arg, bytes) else str(arg).encode('utf-8')
+        partes.append(b'$%d\r\n%s\r\n' % (len(dado), dado))
+    return b''.join(partes)
+
+
+class ClienteRESP:
+    """
+    Cliente mínimo do protocolo do Redis (RESP2) sobre um socket TCP, sem dependências.
+    Uma conexão por cliente, protegida por lock e refeita automaticamente após falhas.
+    O comando só é reenviado em outra conexão se a falha aconteceu antes de ele ser
+    enviado por inteiro, ou se está em COMANDOS_REPETIVEIS. transacao() manda vários
+    comandos num MULTI/EXEC: o servidor aplica todos ou nenhum.
+    """
+
+    def __init__(self, url='redis://localhost:6379/0', timeout=2.0):
+        partes = urlparse(url)
+        self.host = partes.hostname or 'localhost'
+        self.porta = partes.port or 6379
+        self.senha = partes.password
+        self.banco = int((partes.path or '/0').lstrip('/') or 0)
+        self.timeout = timeout
+        self.sock = None
+        self.arquivo = None
+        self.lock = threading.Lock()
+
+    def _conectar(self):
+        self.sock = socket.create_connection((self.host, self.porta), timeout=self.timeout)
+        self.arquivo = self.sock.makefile('rb')
+        if self.senha:
+            self._executar('AUTH', self.senha)
+        if self.banco:
+            self._executar('SELECT', self.banco)
+
+    def fechar(self):
+        with self.lock:
+            self._fechar()
+
+    def _fechar(self):
+        if self.sock is not None:
+            try:
+                self.sock.close()
+            except OSError:
+                pass
+        self.sock = None
+        self.arquivo = None
+
+    def executar(self, *args):
+        """Envia um comando e retorna a resposta já decodificada"""
+        resposta, = self._enviar_comandos([args], str(args[0]).upper() in COMANDOS_REPETIVEIS)
+        if isinstance(resposta, ErroRESP):
+            raise resposta
+        return resposta
+
+    def transacao(self, *comandos):
+        """Executa os comandos (tuplas de argumentos) em MULTI/EXEC; retorna a lista de respostas"""
+        respostas = self._enviar_comandos([('MULTI',), *comandos, ('EXEC',)], repetivel=False)
+        # Um erro ao enfileirar faz o EXEC abortar a transação inteira (-EXECABORT)
+        for resposta in respostas[:-1] + (respostas[-1] if isinstance(respostas[-1], list) else [respostas[-1]]):
+            if isinstance(resposta, ErroRESP):
+                raise resposta
+        return respostas[-1]
+
+    def _enviar_comandos(self, comandos, repetivel):
+        """Envia os comandos de uma vez e lê uma resposta para cada (erros do servidor vêm como ErroRESP)"""
+        with self.lock:
+            for tentativa in range(2):
+                enviado = False
+                try:
+                    if self.sock is not None and not repetivel and self._conexao_encerrada():
+                        # Conexão parada que o servidor já fechou: troca antes de enviar
+                        self._fechar()
+                    if self.sock is None:
+                        self._conectar()
+                    self.sock.sendall(b''.join(_codificar(args) for args in comandos))
+                    enviado = True
+                    return [self._ler_resposta(erros_como_valor=True) for _ in comandos]
+                except (OSError, ConnectionError):
+                    self._fechar()
+                    # Enviado e sem resposta: o servidor pode já ter aplicado o comando
+                    if tentativa or (enviado and not repetivel):
+                        raise
+
+    def _conexao_encerrada(self):
+        """Entre comandos não há nada a ler: um socket legível aqui foi fechado (ou está fora de sincronia)"""
+        try:
+            legiveis, _, _ = select.select([self.sock], [], [], 0)
+        except (OSError, ValueError):
+            return True
+        return bool(legiveis)
+
+    def _executar(self, *args):
+        self.sock.sendall(_codificar(args))
+        return self._ler_resposta()
+
+    def _ler_resposta(self, erros_como_valor=False):
+        """
+        Lê uma resposta inteira. Com erros_como_valor, um '-ERR' (inclusive dentro de uma
+        lista) é devolvido como ErroRESP em vez de levantado, para não deixar o resto da
+        resposta no socket.
+        """
+        linha = self.arquivo.readline()
+        if not linha:
+            raise ConnectionError('Conexão fechada pelo servidor')
+        tipo, conteudo = linha[:1], linha[1:-2]
+        if tipo == b'+':
+            return conteudo.decode('utf-8')
+        if tipo == b'-':
+            erro = ErroRESP(conteudo.decode('utf-8'))
+            if erros_como_valor:
+                return erro
+            raise erro
+        if tipo == b':':
+            return int(conteudo)
+        if tipo == b'$':
+            tamanho = int(conteudo)
+            if tamanho < 0:
+                return None
+            dado = self.arquivo.read(tamanho + 2)
+            return dado[:-2].decode('utf-8')
+        if tipo == b'*':
+            tamanho = int(conteudo)
+            if tamanho < 0:
+                return None
+            return [self._ler_resposta(erros_como_valor) for _ in range(tamanho)]
+        raise ErroRESP(f'Resposta inesperada: {linha!r}')
+
+
+class ConversasRedis(BackendConversas):
+    """
+    Conversas em um servidor compatível com Redis: uma lista por usuária
+    (RPUSH + LTRIM para o limite de turnos, EXPIRE para o TTL, numa única transação
+    MULTI/EXEC para que a lista nunca fique sem corte ou sem expiração). O limite de usuárias e
+    o orçamento de memória ficam a cargo do servidor (maxmemory / política de eviction).
+    Contar usuárias e turnos exige SCAN + LLEN por chave, por isso estatisticas() não
+    traz esses números (o servidor tem os próprios: INFO keyspace / memory).
+    """
+
+    def __init__(self, url=None, prefixo=None, max_turnos=None, ttl_segundos=None, cliente=None):
+        self.cliente = cliente or ClienteRESP(url or os.getenv('CONVERSAS_REDIS_URL', 'redis://localhost:6379/0'))
+        self.prefixo = prefixo or os.getenv('CONVERSAS_REDIS_PREFIXO', 'sophia:conversa:')
+        self.max_turnos = _limite_turnos(max_turnos)
+        self.ttl_segundos = _ttl(ttl_segundos)
+        self.evicoes = {'turnos': 0}
+        self.lock = threading.Lock()
+
+    def _chave(self, user_id):
+        return f'{self.prefixo}{user_id}'
+
+    def _chaves(self):
+        chaves = []
+        cursor = '0'
+        while True:
+            cursor, lote = self.cliente.executar('SCAN', cursor, 'MATCH', f'{self.prefixo}*', 'COUNT', 500)
+            chaves.extend(lote)
+            if str(cursor) == '0':
+                return chaves
+
+    def __len__(self):
+        # Percorre todas as chaves do prefixo: só para scripts e manutenção
+        return len(self._chaves())
+
+    def __contains__(self, user_id):
+        return bool(self.cliente.executar('EXISTS', self._chave(user_id)))
+
+    def obter(self, user_id):
+        chave = self._chave(user_id)
+        itens = self.cliente.executar('LRANGE', chave, 0, -1) or []
+        if itens and self.ttl_segundos:
+            # Leitura conta como atividade, como no LRU do backend em memória
+            self.cliente.executar('EXPIRE', chave, int(self.ttl_segundos))
+        return [json.loads(item) for item in itens]
+
+    def adicionar(self, user_id, turno):
+        chave = self._chave(user_id)
+        comandos = [('RPUSH', chave, json.dumps(turno, ensure_ascii=False))]
+        if self.max_turnos:
+            comandos.append(('LTRIM', chave, -self.max_turnos, -1))
+        if self.ttl_segundos:
+            comandos.append(('EXPIRE', chave, int(self.ttl_segundos)))
+        tamanho = self.cliente.transacao(*comandos)[0]
+        if self.max_turnos and tamanho > self.max_turnos:
+            with self.lock:
+                self.evicoes['turnos'] += tamanho - self.max_turnos
+
+    def limpar(self, user_id):
+        chave = self._chave(user_id)
+        apagados = self.cliente.executar('LLEN', chave)
+        self.cliente.executar('DEL', chave)
+        return apagados
+
+    def limpar_tudo(self):
+        apagados = 0
+        for chave in self._chaves():
+            apagados += self.cliente.executar('LLEN', chave)
+            self.cliente.executar('DEL', chave)
+        return apagados
+
+    def estatisticas(self):
+        with self.lock:
+            evicoes = dict(self.evicoes)
+        return {
+            "backend": "redis",
+            "max_turnos": self.max_turnos,
+            "ttl_segundos": self.ttl_segundos,
+            # Contadores deste processo
+            "evicoes": evicoes,
+        }
+
+
+def criar_armazem_conversas(modo=None):
+    """Cria o backend de conversas conforme CONVERSAS_BACKEND ('memoria' - padrão -, 'sqlite' ou 'redis')"""
+    modo = (modo or os.getenv('CONVERSAS_BACKEND', 'memoria')).strip().lower()
+    if modo == 'sqlite':
+        return ConversasSQLite()
+    if modo == 'redis':
+        return ConversasRedis()
+    return ArmazemConversas()
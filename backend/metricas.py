@@ -0,0 +1,328 @@
+# -*- coding: utf-8 -*-
+"""
+Métricas no formato de texto do Prometheus (GET /metrics), sem dependências.
+
+Contadores, medidores (gauges) e histogramas vivem na memória do processo; os valores que
+os módulos já mantêm (contadores do gateway do Gemini, acertos dos caches, profundidade da
+fila de emails...) entram por funções de coleta, chamadas só na hora de exportar.
+
+Com vários workers do gunicorn cada processo só enxerga os próprios números. Com
+METRICAS_DIR definido, cada processo grava um instantâneo JSON (<pid>-<token>.json,
+escrita atômica; o token aleatório evita que um pid reutilizado sobrescreva o arquivo de
+um worker morto) a cada METRICAS_INTERVALO segundos, e o /metrics de qualquer worker junta os
+arquivos do diretório:
+- contadores e histogramas somam todos os arquivos, inclusive de workers que já saíram
+  (o total não volta para trás quando um worker é reciclado);
+- medidores só contam processos vivos, somando ('soma') ou pegando o maior ('max', para
+  valores que já são globais, como a fila de emails no banco compartilhado).
+O diretório deve ser esvaziado ao subir o servidor (o start.sh faz isso).
+"""
+
+import atexit
+import bisect
+import json
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Limites superiores (segundos) dos buckets padrão dos histogramas
+BUCKETS_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+CONTADOR = 'counter'
+MEDIDOR = 'gauge'
+HISTOGRAMA = 'histogram'
+
+
+def _chave(rotulos, nomes):
+    return tuple(str(rotulos.get(nome, '')) for nome in nomes)
+
+
+class Familia:
+    """Uma métrica e os seus valores por combinação de rótulos"""
+
+    tipo = None
+
+    def __init__(self, nome, ajuda, rotulos=(), agregacao='soma'):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = tuple(rotulos)
+        self.agregacao = agregacao
+        self.lock = threading.Lock()
+        self.valores = {}
+
+    def zerar(self):
+        with self.lock:
+            self.valores = {}
+
+    def amostras(self):
+        with self.lock:
+            return [[dict(zip(self.rotulos, chave)), self._exportar(valor)] for chave, valor in self.valores.items()]
+
+    def _exportar(self, valor):
+        return valor
+
+    def instantaneo(self):
+        return {'tipo': self.tipo, 'ajuda': self.ajuda, 'agregacao': self.agregacao, 'amostras': self.amostras()}
+
+
+class Contador(Familia):
+    tipo = CONTADOR
+
+    def inc(self, valor=1, **rotulos):
+        chave = _chave(rotulos, self.rotulos)
+        with self.lock:
+            self.valores[chave] = self.valores.get(chave, 0) + valor
+
+    def definir(self, valor, **rotulos):
+        """Para contadores mantidos por outro módulo (o valor já é o total do processo)"""
+        with self.lock:
+            self.valores[_chave(rotulos, self.rotulos)] = valor
+
+
+class Medidor(Familia):
+    tipo = MEDIDOR
+
+    def definir(self, valor, **rotulos):
+        with self.lock:
+            self.valores[_chave(rotulos, self.rotulos)] = valor
+
+
+class Histograma(Familia):
+    tipo = HISTOGRAMA
+
+    def __init__(self, nome, ajuda, rotulos=(), buckets=BUCKETS_SEGUNDOS):
+        super().__init__(nome, ajuda, rotulos)
+        self.buckets = tuple(buckets)
+
+    def observar(self, valor, **rotulos):
+        chave = _chave(rotulos, self.rotulos)
+        with self.lock:
+            atual = self.valores.get(chave)
+            if atual is None:
+                atual = self.valores[chave] = {'contagens': [0] * (len(self.buckets) + 1), 'soma': 0.0, 'contagem': 0}
+            atual['contagens'][bisect.bisect_left(self.buckets, valor)] += 1
+            atual['soma'] += valor
+            atual['contagem'] += 1
+
+    def _exportar(self, valor):
+        return {'contagens': list(valor['contagens']), 'soma': valor['soma'], 'contagem': valor['contagem']}
+
+    def instantaneo(self):
+        instantaneo = super().instantaneo()
+        instantaneo['buckets'] = list(self.buckets)
+        return instantaneo
+
+
+def _juntar(destino, familia, vivo):
+    """Acrescenta a família de um processo ao total (ver as regras no início do módulo)"""
+    if familia['tipo'] == MEDIDOR and not vivo:
+        return
+    atual = destino.setdefault('valores', {})
+    for rotulos, valor in familia['amostras']:
+        chave = tuple(sorted(rotulos.items()))
+        anterior = atual.get(chave)
+        if anterior is None:
+            atual[chave] = valor
+        elif familia['tipo'] == HISTOGRAMA:
+            if len(anterior['contagens']) != len(valor['contagens']):
+                continue
+            atual[chave] = {
+                'contagens': [a + b for a, b in zip(anterior['contagens'], valor['contagens'])],
+                'soma': anterior['soma'] + valor['soma'],
+                'contagem': anterior['contagem'] + valor['contagem'],
+            }
+        elif familia['tipo'] == MEDIDOR and familia.get('agregacao') == 'max':
+            atual[chave] = max(anterior, valor)
+        else:
+            atual[chave] = anterior + valor
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _rotulos_texto(rotulos):
+    if not rotulos:
+        return ''
+    return '{' + ','.join(f'{nome}="{_escapar(valor)}"' for nome, valor in rotulos) + '}'
+
+
+def _numero(valor):
+    if valor == float('inf'):
+        return '+Inf'
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+def formatar(familias):
+    """{nome: família juntada} -> texto de exposição do Prometheus (versão 0.0.4)"""
+    linhas = []
+    for nome in sorted(familias):
+        familia = familias[nome]
+        linhas.append(f"# HELP {nome} {familia['ajuda']}")
+        linhas.append(f"# TYPE {nome} {familia['tipo']}")
+        for chave, valor in sorted(familia.get('valores', {}).items()):
+            if familia['tipo'] == HISTOGRAMA:
+                acumulado = 0
+                limites = list(familia['buckets']) + [float('inf')]
+                for limite, contagem in zip(limites, valor['contagens']):
+                    acumulado += contagem
+                    linhas.append(f"{nome}_bucket{_rotulos_texto(chave + (('le', _numero(limite)),))} {acumulado}")
+                linhas.append(f"{nome}_sum{_rotulos_texto(chave)} {_numero(valor['soma'])}")
+                linhas.append(f"{nome}_count{_rotulos_texto(chave)} {valor['contagem']}")
+            else:
+                linhas.append(f"{nome}{_rotulos_texto(chave)} {_numero(valor)}")
+    return '\n'.join(linhas) + '\n'
+
+
+def _processo_vivo(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class RegistroMetricas:
+    """Famílias do processo + coletas; com `diretorio`, grava e junta os instantâneos dos workers"""
+
+    def __init__(self, prefixo='', diretorio=None, intervalo=5.0):
+        self.prefixo = prefixo
+        self.diretorio = diretorio
+        self.intervalo = intervalo
+        self.familias = {}
+        self.coletas = []
+        self.lock = threading.Lock()
+        self.thread = None
+        self.parar_gravacao = threading.Event()
+        self.arquivo = self._nome_arquivo()
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._apos_fork)
+
+    @staticmethod
+    def _nome_arquivo():
+        return f'{os.getpid()}-{os.urandom(4).hex()}.json'
+
+    def _registrar(self, familia):
+        familia.nome = self.prefixo + familia.nome
+        with self.lock:
+            self.familias[familia.nome] = familia
+        return familia
+
+    def contador(self, nome, ajuda, rotulos=()):
+        return self._registrar(Contador(nome, ajuda, rotulos))
+
+    def medidor(self, nome, ajuda, rotulos=(), agregacao='soma'):
+        return self._registrar(Medidor(nome, ajuda, rotulos, agregacao))
+
+    def histograma(self, nome, ajuda, rotulos=(), buckets=BUCKETS_SEGUNDOS):
+        return self._registrar(Histograma(nome, ajuda, rotulos, buckets))
+
+    def coleta(self, funcao):
+        """Registra funcao() para atualizar métricas a partir do estado de outro módulo antes de exportar"""
+        self.coletas.append(funcao)
+        return funcao
+
+    def _coletar(self):
+        for funcao in self.coletas:
+            try:
+                funcao()
+            except Exception as e:
+                # Um backend indisponível (Redis, banco) não derruba a exportação das outras métricas
+                logger.warning(f"[METRICAS] ⚠️ Coleta {getattr(funcao, '__name__', funcao)} falhou: {e}")
+
+    def instantaneo(self):
+        """Estado atual deste processo (após as coletas), serializável em JSON"""
+        self._coletar()
+        with self.lock:
+            familias = list(self.familias.values())
+        return {'pid': os.getpid(), 'familias': {familia.nome: familia.instantaneo() for familia in familias}}
+
+    def gravar(self):
+        """Grava o instantâneo deste processo em <diretorio>/<pid>-<token>.json (troca atômica)"""
+        if not self.diretorio:
+            return
+        caminho = os.path.join(self.diretorio, self.arquivo)
+        temporario = caminho + '.tmp'
+        with open(temporario, 'w', encoding='utf-8') as arquivo:
+            json.dump(self.instantaneo(), arquivo)
+        os.replace(temporario, caminho)
+
+    def _instantaneos(self):
+        if not self.diretorio:
+            return [self.instantaneo()]
+        self.gravar()
+        instantaneos = []
+        for nome in os.listdir(self.diretorio):
+            if not nome.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.diretorio, nome), encoding='utf-8') as arquivo:
+                    instantaneos.append(json.load(arquivo))
+            except (OSError, ValueError):
+                # Arquivo sendo trocado ou corrompido: fica para a próxima coleta
+                continue
+        return instantaneos
+
+    def exportar(self):
+        """Texto do /metrics com todos os processos (ou só este, sem diretório)"""
+        familias = {}
+        for instantaneo in self._instantaneos():
+            vivo = instantaneo['pid'] == os.getpid() or _processo_vivo(instantaneo['pid'])
+            for nome, familia in instantaneo['familias'].items():
+                destino = familias.setdefault(nome, {'tipo': familia['tipo'], 'ajuda': familia['ajuda'],
+                                                     'buckets': familia.get('buckets')})
+                _juntar(destino, familia, vivo)
+        return formatar(familias)
+
+    def iniciar_gravacao(self):
+        """Thread que grava o instantâneo a cada `intervalo` segundos (só com diretório)"""
+        if not self.diretorio or (self.thread and self.thread.is_alive()):
+            return
+        os.makedirs(self.diretorio, exist_ok=True)
+        self.parar_gravacao.clear()
+        self.thread = threading.Thread(target=self._gravar_periodicamente, name='metricas-gravacao', daemon=True)
+        self.thread.start()
+
+    def _gravar_periodicamente(self):
+        while not self.parar_gravacao.wait(self.intervalo):
+            try:
+                self.gravar()
+            except Exception as e:
+                logger.warning(f"[METRICAS] ⚠️ Não foi possível gravar o instantâneo: {e}")
+
+    def parar(self):
+        """Para a thread e grava uma última vez (os contadores do processo continuam no total)"""
+        self.parar_gravacao.set()
+        if self.diretorio and self.thread is not None:
+            try:
+                self.gravar()
+            except Exception:
+                pass
+
+    def _apos_fork(self):
+        # O filho começa do zero (o que o pai contou continua no arquivo do pai) e grava o próprio arquivo
+        for familia in self.familias.values():
+            familia.lock = threading.Lock()
+            familia.zerar()
+        self.lock = threading.Lock()
+        self.arquivo = self._nome_arquivo()
+        if self.thread is not None:
+            self.thread = None
+            self.parar_gravacao = threading.Event()
+            self.iniciar_gravacao()
+
+
+def criar_registro_metricas(prefixo='sophia_'):
+    """Registro configurado por METRICAS_DIR e METRICAS_INTERVALO (segundos)"""
+    registro = RegistroMetricas(
+        prefixo=prefixo,
+        diretorio=os.getenv('METRICAS_DIR') or None,
+        intervalo=float(os.getenv('METRICAS_INTERVALO', '5')),
+    )
+    registro.iniciar_gravacao()
+    atexit.register(registro.parar)
+    return registro
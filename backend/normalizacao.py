@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""
+Normalização de mensagens em português.
+
+Uma MensagemNormalizada é construída uma única vez por requisição e guarda o texto
+em minúsculas, o texto sem acentos e os tokens; os radicais (stemming leve) e as
+categorias de gatilhos são calculados só se alguém pedir. Os detectores do chatbot consultam esse objeto em vez de repetir
+lower()/split() sobre a pergunta, e a comparação sem acentos faz "preocupação"
+e "preocupacao" casarem.
+"""
+
+import re
+import unicodedata
+from functools import lru_cache
+
+# Sufixos removidos pelo stemmer, do mais longo para o mais curto (texto já sem acentos)
+SUFIXOS = (
+    'amentos', 'imentos', 'amento', 'imento', 'acoes', 'icoes', 'ancias', 'encias',
+    'idades', 'acao', 'icao', 'ucao', 'ancia', 'encia', 'idade', 'mente', 'ismos',
+    'istas', 'ismo', 'ista', 'avel', 'ivel', 'ezas', 'eza', 'osos', 'oso',
+    'ando', 'endo', 'indo', 'ados', 'idos', 'ado', 'ido', 'ao', 'ar', 'er', 'ir',
+)
+TAMANHO_MINIMO_RADICAL = 3
+
+
+def remover_acentos(texto):
+    """Remove acentos e cedilha mantendo as demais letras ('preocupação' -> 'preocupacao')"""
+    decomposto = unicodedata.normalize('NFKD', texto)
+    return ''.join(c for c in decomposto if not unicodedata.combining(c))
+
+
+def dobrar(texto):
+    """
+    Forma canônica usada nas comparações (minúsculas, sem acentos). Sem cache: também
+    recebe mensagens e respostas inteiras, que não devem ficar retidas na memória; as
+    listas de palavras-chave já são dobradas uma vez, na importação (ver gatilhos.py).
+    """
+    return remover_acentos(texto.lower())
+
+
+@lru_cache(maxsize=8192)
+def radical(palavra):
+    """
+    Stemmer leve para português (inspirado no RSLP): remove plural, flexão de gênero
+    e sufixos comuns. Espera a palavra já dobrada (minúsculas, sem acentos).
+    """
+    if len(palavra) <= TAMANHO_MINIMO_RADICAL:
+        return palavra
+
+    # Plural
+    if palavra.endswith('oes') or palavra.endswith('aes'):
+        palavra = palavra[:-3] + 'ao'
+    elif palavra.endswith('ns') and len(palavra) > 4:
+        palavra = palavra[:-2] + 'm'
+    elif palavra.endswith('s') and not palavra.endswith('ss') and len(palavra) > 4:
+        palavra = palavra[:-1]
+
+    # Feminino (preocupada -> preocupado)
+    if palavra.endswith(('ada', 'ida', 'osa', 'iva', 'ona')):
+        palavra = palavra[:-1] + 'o'
+
+    for sufixo in SUFIXOS:
+        if palavra.endswith(sufixo) and len(palavra) - len(sufixo) >= TAMANHO_MINIMO_RADICAL:
+            return palavra[:-len(sufixo)]
+
+    # Vogal temática final
+    if palavra[-1] in 'aeo' and len(palavra) > TAMANHO_MINIMO_RADICAL + 1:
+        return palavra[:-1]
+    return palavra
+
+
+class MensagemNormalizada:
+    """Representação normalizada de uma mensagem, construída uma vez por requisição"""
+
+    def __init__(self, texto):
+        self.original = texto or ''
+        # Minúsculas e sem espaços nas pontas (equivale ao antigo pergunta.lower().strip())
+        self.texto = self.original.lower().strip()
+        self.texto_sem_acento = remover_acentos(self.texto)
+        # Tokens sem pontuação, já sem acentos
+        self.tokens = re.findall(r'\w+', self.texto_sem_acento)
+        self._radicais = None
+        self._categorias = None
+
+    def __str__(self):
+        return self.original
+
+    @property
+    def radicais(self):
+        """Radicais dos tokens (usados pela chave do cache de respostas do Gemini), calculados uma vez"""
+        if self._radicais is None:
+            self._radicais = set(radical(token) for token in self.tokens)
+        return self._radicais
+
+    @property
+    def categorias(self):
+        """Categorias de gatilhos (ver gatilhos.GATILHOS_MENSAGEM) presentes na mensagem, calculadas uma vez"""
+        if self._categorias is None:
+            from gatilhos import categorias_mensagem
+            self._categorias = categorias_mensagem(self.texto_sem_acento)
+        return self._categorias
+
+    def tem(self, categoria):
+        """True se algum gatilho da categoria aparece na mensagem"""
+        return categoria in self.categorias
+
+    def contem(self, frase):
+        """True se a frase aparece na mensagem (comparação sem acentos, como 'frase in texto')"""
+        return dobrar(frase) in self.texto_sem_acento
+
+    def contem_algum(self, frases):
+        """True se qualquer uma das frases aparece na mensagem"""
+        return any(self.contem(frase) for frase in frases)
+
+    def igual_a_algum(self, frases):
+        """True se a mensagem inteira é uma das frases (sem acentos)"""
+        return any(self.texto_sem_acento == dobrar(frase) for frase in frases)
+
+    def comeca_com_algum(self, prefixos):
+        """True se a mensagem começa com algum dos prefixos (sem acentos)"""
+        return any(self.texto_sem_acento.startswith(dobrar(prefixo)) for prefixo in prefixos)
+
+
+def normalizar_mensagem(mensagem):
+    """Aceita str ou MensagemNormalizada e devolve sempre uma MensagemNormalizada"""
+    if isinstance(mensagem, MensagemNormalizada):
+        return mensagem
+    return MensagemNormalizada(mensagem)
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Script para normalizar o formato de users.password_hash (rodar uma única vez)
+
+Reescreve cada hash para o formato canônico (base64 do hash bcrypt) e grava o formato
+na coluna hash_format, para que o login decodifique uma vez e rode um único checkpw.
+Linhas com hash inválido ficam como estão, marcadas com hash_format = 'invalido'
+(a usuária precisa usar "Esqueci minha senha").
+
+Uso: python backend/normalizar_hashes.py [--simular]
+"""
+
+import sqlite3
+import sys
+import os
+from collections import Counter
+
+from senhas import FORMATO_HASH_CANONICO, FORMATO_HASH_INVALIDO, codificar_hash, detectar_formato_hash
+
+# Caminho do banco de dados
+DB_PATH = os.path.join(os.path.dirname(__file__), "users.db")
+
+def normalize_password_hashes(simular=False, caminho=None):
+    """Converte os hashes para o formato canônico; retorna a contagem por formato original"""
+    caminho = caminho or DB_PATH
+    if not os.path.exists(caminho):
+        print("Banco de dados não encontrado!")
+        return None
+
+    conn = sqlite3.connect(caminho)
+    cursor = conn.cursor()
+
+    cursor.execute("PRAGMA table_info(users)")
+    existing_columns = [column[1] for column in cursor.fetchall()]
+    if 'hash_format' not in existing_columns:
+        # ALTER TABLE é confirmado na hora (o rollback da simulação não o desfaz): na simulação
+        # só avisa; os formatos são detectados a partir de password_hash, sem precisar da coluna
+        if simular:
+            print("ℹ️ Coluna 'hash_format' não existe (seria adicionada)")
+        else:
+            cursor.execute('ALTER TABLE users ADD COLUMN hash_format TEXT')
+            print("✅ Coluna 'hash_format' adicionada")
+
+    cursor.execute('SELECT id, email, password_hash FROM users')
+    formatos = Counter()
+    updates = []
+    for user_id, email, stored_hash in cursor.fetchall():
+        formato, hash_bytes = detectar_formato_hash(stored_hash)
+        formatos[formato] += 1
+        if hash_bytes is None:
+            print(f"⚠️ Hash inválido para {email} (ID: {user_id}) - precisa redefinir a senha")
+            updates.append((stored_hash, FORMATO_HASH_INVALIDO, user_id))
+        else:
+            if formato != FORMATO_HASH_CANONICO:
+                print(f"🔧 {email} (ID: {user_id}): {formato} -> {FORMATO_HASH_CANONICO}")
+            updates.append((codificar_hash(hash_bytes), FORMATO_HASH_CANONICO, user_id))
+
+    if simular:
+        conn.rollback()
+        print("\n(simulação: nada foi gravado)")
+    else:
+        cursor.executemany('UPDATE users SET password_hash = ?, hash_format = ? WHERE id = ?', updates)
+        conn.commit()
+    conn.close()
+
+    return formatos
+
+if __name__ == "__main__":
+    print("=" * 50)
+    print("🔧 NORMALIZANDO HASHES DE SENHA")
+    print("=" * 50)
+
+    try:
+        formatos = normalize_password_hashes(simular='--simular' in sys.argv)
+        if formatos is not None:
+            print(f"\n✅ Processo concluído! {sum(formatos.values())} usuário(s) verificado(s).")
+            for formato, total in sorted(formatos.items()):
+                print(f"   {formato}: {total}")
+    except Exception as e:
+        print(f"\n❌ Erro: {e}")
+        sys.exit(1)
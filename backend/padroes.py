@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+"""
+Registro de expressões regulares usadas para extrair informações pessoais das conversas.
+
+Os padrões de nome da usuária, nome do bebê e menção ao projeto são compilados uma
+única vez, na importação, em vez de passar a string crua para re.search/re.finditer
+a cada chamada (o que dependia do cache interno e pequeno do módulo re).
+
+Duas otimizações por categoria:
+- um pré-filtro literal: cada padrão exige ao menos uma das palavras de
+  PALAVRAS_OBRIGATORIAS, então o texto que não contém nenhuma delas é descartado
+  com simples buscas de substring;
+- a busca é feita sobre o texto em minúsculas com padrões sem re.IGNORECASE, que o
+  módulo re executa bem mais rápido; os nomes são recortados do texto original pela
+  mesma posição, preservando maiúsculas.
+"""
+
+import re
+
+# Padrões melhorados para extrair nome do usuário (em ordem de prioridade)
+PADROES_NOME = [
+    r'(?:eu sou o|eu sou a)\s+([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*?)(?:\s*,\s*seu|\s*,\s*sua|\s*$)',  # "Eu sou o Bruno Cartolano, seu criador"
+    r'(?:me chamo|meu nome é|me chamo de)\s+([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*)',
+    r'(?:eu sou)\s+([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*?)(?:\s*,\s*seu|\s*,\s*sua|\s*$)',  # "Eu sou Bruno, seu criador"
+]
+
+# Padrões para nome do bebê
+PADROES_BEBE = [
+    r'(?:meu bebê|meu filho|minha filha|o bebê|a bebê|o neném|a neném|meu neném|minha neném)\s+(?:se chama|chama|é|tem o nome de|chama-se)\s+([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*)',
+    r'(?:bebê|filho|filha|neném)\s+([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*)',
+]
+
+# Padrões para informações sobre o projeto/motivo
+PADROES_PROJETO = [
+    r'(?:estou|estou criando|estou desenvolvendo|estou fazendo|estou trabalhando|trabalho|trabalho em|desenvolvo|desenvolvi|fiz|fiz um|fiz uma|criei|criei um|criei uma|estou criando um|estou criando uma)\s+(?:site|aplicativo|app|projeto|sistema|ferramenta|plataforma|chatbot|bot|assistente)',
+    r'(?:criar|desenvolver|fazer|trabalhar|trabalhando)\s+(?:um|uma|o|a)\s+(?:site|aplicativo|app|projeto|sistema|ferramenta|plataforma|chatbot|bot|assistente)',
+    r'(?:para|com o objetivo de|com a finalidade de|para ajudar|para auxiliar)\s+(?:mães|mamães|gestantes|mulheres|pessoas)',
+]
+
+# Cada padrão da categoria exige ao menos uma destas palavras (pré-filtro, texto em minúsculas)
+PALAVRAS_OBRIGATORIAS = {
+    'nome': ('eu sou', 'me chamo', 'meu nome é'),
+    'bebe': ('bebê', 'filho', 'filha', 'neném'),
+    # 'mães' também cobre 'mamães' e 'bot' cobre 'chatbot'
+    'projeto': ('site', 'aplicativo', 'app', 'projeto', 'sistema', 'ferramenta', 'plataforma', 'bot',
+                'assistente', 'mães', 'gestantes', 'mulheres', 'pessoas'),
+}
+
+# Palavras que não podem ser (nem fazer parte de) um nome
+PALAVRAS_COMUNS_NOME = ['sophia', 'oi', 'olá', 'ola', 'hey', 'aqui', 'estou', 'sou', 'é', 'criador', 'desenvolvedor', 'programador', 'seu', 'sua']
+
+# Remove vírgulas e o que vem depois ("Bruno, seu criador" -> "Bruno")
+RE_APOS_VIRGULA = re.compile(r',.*$')
+
+
+def _compilar(padroes):
+    """
+    Compila os padrões para o texto em minúsculas: com re.IGNORECASE, [A-Z] e [a-z]
+    casam qualquer letra ASCII, o que em minúsculas equivale a [a-z].
+    """
+    return [re.compile(padrao.replace('[A-Z]', '[a-z]')) for padrao in padroes]
+
+
+# Registro: categoria -> padrões compilados, em ordem de prioridade
+REGEX_NOME = _compilar(PADROES_NOME)
+REGEX_BEBE = _compilar(PADROES_BEBE)
+REGEX_PROJETO = _compilar(PADROES_PROJETO)
+# Versões com re.IGNORECASE sobre o texto original, para o raro caso em que lower() muda o tamanho do texto
+REGEX_NOME_ORIGINAL = [re.compile(padrao, re.IGNORECASE) for padrao in PADROES_NOME]
+REGEX_BEBE_ORIGINAL = [re.compile(padrao, re.IGNORECASE) for padrao in PADROES_BEBE]
+
+
+def _preparar(texto, texto_lower, categoria, padroes, padroes_original):
+    """
+    Retorna (texto_busca, padroes) para a categoria, ou (None, None) se o pré-filtro
+    descartar o texto. Quando lower() preserva o tamanho (caso normal), as posições dos
+    matches no texto em minúsculas valem para o texto original.
+    """
+    if not texto:
+        return None, None
+    if texto_lower is None:
+        texto_lower = texto.lower()
+    if not any(palavra in texto_lower for palavra in PALAVRAS_OBRIGATORIAS[categoria]):
+        return None, None
+    if len(texto_lower) == len(texto):
+        return texto_lower, padroes
+    return texto, padroes_original
+
+
+def nome_valido(nome_candidato):
+    """Filtra nomes muito curtos ou que são palavras comuns"""
+    nome_lower = nome_candidato.lower()
+    return (len(nome_candidato) >= 2 and nome_lower not in PALAVRAS_COMUNS_NOME
+            and not any(pal in nome_lower for pal in PALAVRAS_COMUNS_NOME))
+
+
+def extrair_nome(texto, texto_lower=None):
+    """Retorna o nome da usuária encontrado no texto, ou None"""
+    texto_busca, padroes = _preparar(texto, texto_lower, 'nome', REGEX_NOME, REGEX_NOME_ORIGINAL)
+    if texto_busca is None:
+        return None
+    for regex in padroes:
+        for match in regex.finditer(texto_busca):
+            inicio, fim = match.span(1)
+            nome_candidato = RE_APOS_VIRGULA.sub('', texto[inicio:fim].strip()).strip()
+            if nome_valido(nome_candidato):
+                return nome_candidato
+    return None
+
+
+def extrair_nome_bebe(texto, texto_lower=None):
+    """Retorna o nome do bebê encontrado no texto, ou None"""
+    texto_busca, padroes = _preparar(texto, texto_lower, 'bebe', REGEX_BEBE, REGEX_BEBE_ORIGINAL)
+    if texto_busca is None:
+        return None
+    for regex in padroes:
+        match = regex.search(texto_busca)
+        if match:
+            inicio, fim = match.span(1)
+            return texto[inicio:fim].strip()
+    return None
+
+
+def menciona_projeto(texto, texto_lower=None):
+    """True se o texto menciona que a usuária está criando/desenvolvendo um projeto"""
+    if not texto:
+        return False
+    if texto_lower is None:
+        texto_lower = texto.lower()
+    if not any(palavra in texto_lower for palavra in PALAVRAS_OBRIGATORIAS['projeto']):
+        return False
+    return any(regex.search(texto_lower) for regex in REGEX_PROJETO)
+
+
+def extrair_informacoes(texto):
+    """Retorna (nome_usuario, nome_bebe, tem_projeto) calculando o texto em minúsculas uma única vez"""
+    texto_lower = texto.lower() if texto else ''
+    return (extrair_nome(texto, texto_lower), extrair_nome_bebe(texto, texto_lower),
+            menciona_projeto(texto, texto_lower))
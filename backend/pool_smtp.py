@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""
+Pool de conexões SMTP autenticadas.
+
+Com mail.send(), cada email abre uma conexão, faz STARTTLS e login e a encerra; em
+reenvios em massa ou picos de cadastro quase todo o tempo vai nesses handshakes.
+PoolSMTP mantém até `tamanho` conexões do Flask-Mail abertas entre os lotes da fila de
+emails, limita quantas ficam em uso ao mesmo tempo (provedores como o Gmail recusam
+muitas sessões simultâneas) e reconecta quando o servidor derruba uma conexão parada.
+
+abrir() deve devolver uma conexão ainda não iniciada (ex.: mail.connect); o pool chama
+__enter__/__exit__ dela para autenticar/encerrar e usa send(msg) para enviar.
+"""
+
+import logging
+import smtplib
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+class PoolSMTP:
+    """Conexões SMTP reutilizáveis entre lotes, com no máximo `tamanho` em uso"""
+
+    def __init__(self, abrir, tamanho=2, ocioso_max=60.0):
+        self.abrir = abrir
+        self.tamanho = tamanho
+        # Conexões paradas há mais tempo que isso são descartadas (servidores as derrubam)
+        self.ocioso_max = ocioso_max
+        self.livres = []  # (conexão, momento em que foi devolvida)
+        self.vagas = threading.BoundedSemaphore(tamanho)
+        self.lock = threading.Lock()
+        self.contadores = {'conexoes_abertas': 0, 'reutilizacoes': 0, 'reconexoes': 0, 'descartadas': 0, 'mensagens': 0}
+
+    def _contar(self, nome, quantidade=1):
+        with self.lock:
+            self.contadores[nome] += quantidade
+
+    def _conectar(self):
+        conexao = self.abrir()
+        conexao.__enter__()
+        self._contar('conexoes_abertas')
+        return conexao
+
+    def _descartar(self, conexao):
+        self._contar('descartadas')
+        try:
+            conexao.__exit__(None, None, None)
+        except Exception:
+            # QUIT numa conexão já derrubada pelo servidor
+            pass
+
+    def _obter(self):
+        agora = time.monotonic()
+        while True:
+            with self.lock:
+                if not self.livres:
+                    break
+                conexao, devolvida_em = self.livres.pop()
+            if agora - devolvida_em < self.ocioso_max:
+                self._contar('reutilizacoes')
+                return conexao
+            self._descartar(conexao)
+        return self._conectar()
+
+    def _devolver(self, conexao):
+        with self.lock:
+            if len(self.livres) < self.tamanho:
+                self.livres.append((conexao, time.monotonic()))
+                return
+        self._descartar(conexao)
+
+    @contextmanager
+    def conexao(self):
+        """Empresta uma conexão autenticada; se der erro, ela é descartada em vez de devolvida"""
+        with self.vagas:
+            conexao = self._obter()
+            try:
+                yield conexao
+            except BaseException:
+                self._descartar(conexao)
+                raise
+            else:
+                self._devolver(conexao)
+
+    def enviar(self, mensagens):
+        """
+        Envia várias mensagens pela mesma conexão. Retorna, para cada uma, None (enviada)
+        ou a exceção da falha. Se a conexão cair no meio, reconecta uma vez e continua.
+        """
+        erros = []
+        with self.vagas:
+            try:
+                conexao = self._obter()
+            except Exception as e:
+                logger.error(f"[SMTP] ❌ Não foi possível conectar ao servidor SMTP: {e}")
+                return [e] * len(mensagens)
+
+            for msg in mensagens:
+                try:
+                    try:
+                        conexao.send(msg)
+                    except smtplib.SMTPServerDisconnected:
+                        # Conexão reaproveitada já estava morta: abre outra e tenta de novo
+                        self._descartar(conexao)
+                        self._contar('reconexoes')
+                        conexao = None
+                        conexao = self._conectar()
+                        conexao.send(msg)
+                    erros.append(None)
+                    self._contar('mensagens')
+                except Exception as e:
+                    erros.append(e)
+                    if conexao is None or isinstance(e, smtplib.SMTPServerDisconnected):
+                        # Não há conexão utilizável: o restante falha com o mesmo erro
+                        erros.extend([e] * (len(mensagens) - len(erros)))
+                        if conexao is not None:
+                            self._descartar(conexao)
+                        return erros
+
+            self._devolver(conexao)
+        return erros
+
+    def fechar(self):
+        """Encerra as conexões livres"""
+        with self.lock:
+            livres, self.livres = self.livres, []
+        for conexao, _ in livres:
+            self._descartar(conexao)
+
+    def estatisticas(self):
+        with self.lock:
+            contadores = dict(self.contadores)
+            contadores['livres'] = len(self.livres)
+        return contadores
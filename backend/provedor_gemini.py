@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""
+Cliente do Gemini criado sob demanda, fora do caminho de import do app.
+
+Antes, importar app.py já importava o google.generativeai (~0,5 s de grpc/protobuf),
+chamava genai.configure() e criava o GenerativeModel, e a criação do chatbot ainda
+tentava de novo se tivesse falhado: todo worker do gunicorn e todo script que importa o
+app pagavam por isso. ProvedorGemini guarda só a função que cria o cliente:
+- obter() cria na primeira chamada (uma única vez, mesmo com várias threads) e depois
+  devolve o mesmo objeto sem lock;
+- aquecer() faz a criação numa thread em segundo plano, para a primeira mensagem não
+  esperar; se o processo for duplicado (fork do gunicorn com --preload), o filho
+  descarta o que veio do pai e aquece de novo por conta própria;
+- estatisticas() informa o estado para o /health.
+"""
+
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+PENDENTE = 'pendente'
+INICIANDO = 'iniciando'
+PRONTO = 'pronto'
+# A fábrica devolveu None (sem biblioteca ou sem chave): respostas só da base local
+INDISPONIVEL = 'indisponivel'
+ERRO = 'erro'
+
+
+class ProvedorGemini:
+    """Cria o cliente com `fabrica()` no primeiro uso; uma falha é tentada de novo após `nova_tentativa` s"""
+
+    def __init__(self, fabrica, nova_tentativa=60.0):
+        self.fabrica = fabrica
+        self.nova_tentativa = nova_tentativa
+        self.aquecer_apos_fork = False
+        self._resetar()
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._apos_fork)
+
+    def _resetar(self):
+        self.lock = threading.Lock()
+        self.cliente = None
+        self.estado = PENDENTE
+        self.erro = None
+        self.tentar_de_novo_em = 0.0
+        self.segundos_inicializacao = None
+        self.thread_aquecimento = None
+
+    def _apos_fork(self):
+        # Threads e locks do pai não existem no filho; o cliente é refeito aqui
+        self._resetar()
+        if self.aquecer_apos_fork:
+            self.aquecer()
+
+    def _criar(self):
+        self.estado = INICIANDO
+        inicio = time.perf_counter()
+        try:
+            self.cliente = self.fabrica()
+            self.estado = PRONTO if self.cliente is not None else INDISPONIVEL
+            self.erro = None
+        except Exception as e:
+            logger.error(f"[GEMINI] ❌ Erro ao criar o cliente Gemini: {e}", exc_info=True)
+            self.cliente = None
+            self.estado = ERRO
+            self.erro = str(e)
+            self.tentar_de_novo_em = time.monotonic() + self.nova_tentativa
+        self.segundos_inicializacao = round(time.perf_counter() - inicio, 3)
+
+    def obter(self):
+        """O cliente (criando-o se preciso) ou None se o Gemini não está disponível"""
+        if self.estado == PRONTO:
+            return self.cliente
+        with self.lock:
+            if self.estado == PENDENTE or (self.estado == ERRO and time.monotonic() >= self.tentar_de_novo_em):
+                self._criar()
+            return self.cliente
+
+    def aquecer(self):
+        """Cria o cliente numa thread em segundo plano (idempotente; repete nos filhos após fork)"""
+        self.aquecer_apos_fork = True
+        if self.estado != PENDENTE or (self.thread_aquecimento and self.thread_aquecimento.is_alive()):
+            return
+        self.thread_aquecimento = threading.Thread(target=self.obter, name='gemini-aquecimento', daemon=True)
+        self.thread_aquecimento.start()
+
+    def pronto(self):
+        return self.estado == PRONTO
+
+    def estatisticas(self):
+        estatisticas = {
+            'estado': self.estado,
+            'pronto': self.estado == PRONTO,
+            'segundos_inicializacao': self.segundos_inicializacao,
+            'pid': os.getpid(),
+        }
+        if self.cliente is not None:
+            estatisticas['modelo'] = getattr(self.cliente, 'model_name', type(self.cliente).__name__)
+        if self.erro:
+            estatisticas['erro'] = self.erro
+        return estatisticas
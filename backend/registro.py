@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+"""
+Configuração do logging do app.
+
+Antes cada diagnóstico saía duas vezes (logger + print), as duas escritas síncronas no
+stdout dentro da requisição. Aqui:
+- os módulos só chamam logger.*; o handler da raiz é um QueueHandler, e uma thread
+  (QueueListener) formata e escreve em stderr, fora do caminho da requisição;
+- LOG_FORMATO=json emite um objeto JSON por linha (ts, nivel, modulo, mensagem, excecao
+  e os campos passados em `extra=`); o padrão é o texto de sempre;
+- LOG_NIVEL é o nível geral e LOG_NIVEIS ajusta por módulo ("app=DEBUG,werkzeug=WARNING");
+- LOG_AMOSTRAGEM (0 a 1) é a fração das requisições cujos logs de DEBUG saem mesmo acima
+  do nível configurado: os diagnósticos detalhados do chat aparecem para algumas
+  requisições inteiras, não para todas.
+"""
+
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+
+FORMATO_TEXTO = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+FORMATO_DATA = '%Y-%m-%d %H:%M:%S'
+
+# Atributos de todo LogRecord; o resto veio de `extra=` e vai para o JSON
+ATRIBUTOS_PADRAO = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+# A requisição atual foi sorteada para registrar os diagnósticos de DEBUG?
+requisicao_amostrada = contextvars.ContextVar('requisicao_amostrada', default=False)
+
+
+class FormatadorJSON(logging.Formatter):
+    def format(self, record):
+        dados = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'nivel': record.levelname,
+            'modulo': record.name,
+            'mensagem': record.getMessage(),
+        }
+        for nome, valor in vars(record).items():
+            if nome not in ATRIBUTOS_PADRAO:
+                dados[nome] = valor
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            dados['excecao'] = record.exc_text
+        return json.dumps(dados, ensure_ascii=False, default=str)
+
+
+class FiltroNiveis(logging.Filter):
+    """Nível por módulo (prefixo mais longo de LOG_NIVEIS); DEBUG passa nas requisições amostradas"""
+
+    def __init__(self, nivel, niveis):
+        super().__init__()
+        self.nivel = nivel
+        self.niveis = sorted(niveis.items(), key=lambda item: -len(item[0]))
+
+    def nivel_de(self, nome):
+        for prefixo, nivel in self.niveis:
+            if nome == prefixo or nome.startswith(prefixo + '.'):
+                return nivel
+        return self.nivel
+
+    def filter(self, record):
+        return record.levelno >= self.nivel_de(record.name) or requisicao_amostrada.get()
+
+
+class HandlerFila(logging.handlers.QueueHandler):
+    """Manda o registro já com a mensagem e o traceback em texto (sem args nem exc_info) para a fila"""
+
+    def prepare(self, record):
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = record.exc_text or logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def _nivel(nome):
+    nivel = logging.getLevelName(str(nome).strip().upper())
+    return nivel if isinstance(nivel, int) else logging.INFO
+
+
+def ler_niveis(texto):
+    """'app=DEBUG, werkzeug=WARNING' -> {'app': 10, 'werkzeug': 30}"""
+    niveis = {}
+    for item in (texto or '').split(','):
+        if '=' in item:
+            modulo, nivel = item.split('=', 1)
+            niveis[modulo.strip()] = _nivel(nivel)
+    return niveis
+
+
+class Registro:
+    """Handler em fila + thread de escrita; configurar() pode ser chamado de novo (substitui o anterior)"""
+
+    def __init__(self):
+        self.handler = None
+        self.listener = None
+        self.destino = None
+        self.taxa_amostragem = 0.0
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._apos_fork)
+
+    def configurar(self, nivel=None, niveis=None, formato=None, amostragem=None, destino=None):
+        nivel = _nivel(nivel or os.getenv('LOG_NIVEL', 'INFO'))
+        niveis = ler_niveis(os.getenv('LOG_NIVEIS', '')) if niveis is None else niveis
+        formato = (formato or os.getenv('LOG_FORMATO', 'texto')).lower()
+        self.taxa_amostragem = float(os.getenv('LOG_AMOSTRAGEM', '0') if amostragem is None else amostragem)
+        self.destino = destino or sys.stderr
+
+        self.parar()
+        saida = logging.StreamHandler(self.destino)
+        saida.setFormatter(FormatadorJSON() if formato == 'json' else logging.Formatter(FORMATO_TEXTO, FORMATO_DATA))
+        self.handler = HandlerFila(queue.SimpleQueue())
+        self.handler.addFilter(FiltroNiveis(nivel, niveis))
+        self.listener = logging.handlers.QueueListener(self.handler.queue, saida, respect_handler_level=True)
+
+        raiz = logging.getLogger()
+        for antigo in list(raiz.handlers):
+            raiz.removeHandler(antigo)
+        raiz.addHandler(self.handler)
+        # Com amostragem os registros de DEBUG precisam ser criados para o filtro decidir;
+        # sem ela, os próprios loggers descartam o que está abaixo do nível (mais barato)
+        raiz.setLevel(logging.DEBUG if self.taxa_amostragem > 0 else nivel)
+        for modulo, nivel_modulo in niveis.items():
+            logging.getLogger(modulo).setLevel(logging.DEBUG if self.taxa_amostragem > 0 else nivel_modulo)
+        self.listener.start()
+
+    def parar(self):
+        """Escreve o que ainda está na fila e encerra a thread"""
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+
+    def _apos_fork(self):
+        # A thread de escrita não existe no processo filho: fila e thread novas
+        if self.listener is not None:
+            self.handler.queue = self.listener.queue = queue.SimpleQueue()
+            self.listener._thread = None
+            self.listener.start()
+
+    def sortear_requisicao(self):
+        """Chamado no início de cada requisição: decide se os logs de DEBUG dela serão emitidos"""
+        requisicao_amostrada.set(self.taxa_amostragem > 0 and random.random() < self.taxa_amostragem)
+
+
+registro = Registro()
+atexit.register(registro.parar)
+
+
+def configurar_logging(**kwargs):
+    registro.configurar(**kwargs)
+    return registro
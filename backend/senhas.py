@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+"""
+Hash e verificação de senhas (bcrypt) fora da thread da requisição.
+
+bcrypt é caro de propósito (~0,2–0,3 s de CPU por operação). Rodando direto nas rotas,
+uma rajada de logins ocupa todas as threads/CPUs do worker e o /api/chat fica esperando.
+ServicoSenhas executa hashpw/checkpw num pool próprio de poucas threads (bcrypt libera o
+GIL, então elas não travam o resto do processo) com uma fila limitada:
+- admitir(ip, email): janela deslizante de tentativas por IP e por email (LimiteTentativas, 429);
+- fila cheia: a requisição é recusada na hora (FilaSenhasCheia, 503) em vez de acumular;
+- estatisticas(): profundidade da fila, operações, recusas e latência dos hashes.
+
+users.password_hash foi gravado de formas diferentes ao longo do tempo (base64 do hash,
+string "$2b$..." ou bytes). O formato canônico é base64 (FORMATO_HASH_CANONICO), registrado
+na coluna hash_format; normalizar_hashes.py converte as linhas antigas uma única vez.
+"""
+
+import base64
+import binascii
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+
+FORMATO_HASH_CANONICO = 'bcrypt_base64'
+FORMATO_HASH_TEXTO = 'bcrypt_texto'
+FORMATO_HASH_BYTES = 'bcrypt_bytes'
+FORMATO_HASH_INVALIDO = 'invalido'
+
+
+def codificar_hash(hash_bytes):
+    """Hash bcrypt (bytes) -> texto no formato canônico"""
+    return base64.b64encode(hash_bytes).decode('utf-8')
+
+
+def detectar_formato_hash(valor):
+    """
+    Descobre como um password_hash foi gravado, sem rodar o bcrypt.
+    Retorna (formato, hash bcrypt em bytes ou None se inválido).
+    """
+    if isinstance(valor, (bytes, bytearray)):
+        valor = bytes(valor)
+        if valor.startswith(b'$2'):
+            return FORMATO_HASH_BYTES, valor
+        valor = valor.decode('utf-8', 'ignore')
+    if not valor:
+        return FORMATO_HASH_INVALIDO, None
+    if valor.startswith('$2'):
+        # Testado antes do base64: b64decode sem validação aceitaria "$2b$..." e devolveria lixo
+        return FORMATO_HASH_TEXTO, valor.encode('utf-8')
+    try:
+        decodificado = base64.b64decode(valor.encode('utf-8'), validate=True)
+    except (binascii.Error, ValueError):
+        return FORMATO_HASH_INVALIDO, None
+    if decodificado.startswith(b'$2'):
+        return FORMATO_HASH_CANONICO, decodificado
+    return FORMATO_HASH_INVALIDO, None
+
+
+def decodificar_hash(valor, formato=None):
+    """Hash bcrypt em bytes a partir do valor gravado; decodifica direto se já é canônico"""
+    if formato == FORMATO_HASH_CANONICO and isinstance(valor, str):
+        try:
+            return base64.b64decode(valor.encode('utf-8'))
+        except (binascii.Error, ValueError):
+            return None
+    return detectar_formato_hash(valor)[1]
+
+
+class RecusaSenhas(Exception):
+    """Requisição recusada antes de chegar ao bcrypt; status/retry_after vão para a resposta HTTP"""
+
+    status = 503
+    mensagem = "Servidor ocupado. Tente novamente em alguns instantes."
+
+    def __init__(self, retry_after=1):
+        super().__init__(self.mensagem)
+        self.retry_after = max(1, int(retry_after))
+
+
+class LimiteTentativas(RecusaSenhas):
+    status = 429
+    mensagem = "Muitas tentativas. Aguarde um pouco e tente novamente."
+
+
+class FilaSenhasCheia(RecusaSenhas):
+    status = 503
+
+
+class JanelaTentativas:
+    """Conta eventos por chave numa janela deslizante; guarda no máximo max_chaves chaves (LRU)"""
+
+    def __init__(self, limite, janela, max_chaves=10000):
+        self.limite = limite
+        self.janela = janela
+        self.max_chaves = max_chaves
+        self.eventos = OrderedDict()
+
+    def espera(self, chave, agora):
+        """Segundos até a chave poder tentar de novo (0 se pode agora); não registra nada"""
+        fila = self.eventos.get(chave)
+        if fila is None:
+            return 0
+        while fila and fila[0] <= agora - self.janela:
+            fila.popleft()
+        if len(fila) >= self.limite:
+            return fila[0] + self.janela - agora
+        return 0
+
+    def registrar(self, chave, agora):
+        """Conta uma tentativa (já verificada com espera())"""
+        fila = self.eventos.get(chave)
+        if fila is None:
+            fila = self.eventos[chave] = deque()
+            while len(self.eventos) > self.max_chaves:
+                self.eventos.popitem(last=False)
+        else:
+            self.eventos.move_to_end(chave)
+        fila.append(agora)
+
+
+class ServicoSenhas:
+    """Pool limitado para bcrypt com admissão por IP/email"""
+
+    def __init__(self, num_workers=2, max_fila=32, timeout=10.0, limite_ip=20, limite_email=10,
+                 janela=60.0, rounds=None):
+        self.num_workers = num_workers
+        self.max_fila = max_fila
+        self.timeout = timeout
+        self.rounds = rounds
+        self.executor = ThreadPoolExecutor(max_workers=num_workers, thread_name_prefix='senhas')
+        # Vagas = operações em execução + esperando no pool
+        self.vagas = threading.BoundedSemaphore(num_workers + max_fila)
+        self.por_ip = JanelaTentativas(limite_ip, janela)
+        self.por_email = JanelaTentativas(limite_email, janela)
+        self.lock = threading.Lock()
+        self.pendentes = 0
+        self.em_execucao = 0
+        self.latencias = deque(maxlen=512)
+        self.contadores = {'hashes': 0, 'verificacoes': 0, 'recusas_limite': 0, 'recusas_fila': 0}
+
+    def admitir(self, ip=None, email=None):
+        """
+        Registra uma tentativa; levanta LimiteTentativas se o IP ou o email passou do limite.
+        Os dois limites são verificados antes de contar: uma tentativa recusada não conta em nenhum.
+        """
+        agora = time.monotonic()
+        email = email.lower() if email else None
+        with self.lock:
+            espera = max(self.por_ip.espera(ip, agora) if ip else 0,
+                         self.por_email.espera(email, agora) if email else 0)
+            if espera:
+                self.contadores['recusas_limite'] += 1
+            else:
+                if ip:
+                    self.por_ip.registrar(ip, agora)
+                if email:
+                    self.por_email.registrar(email, agora)
+        if espera:
+            raise LimiteTentativas(retry_after=espera)
+
+    def _medir(self, iniciou, funcao, *args):
+        iniciou.set()
+        inicio = time.perf_counter()
+        with self.lock:
+            self.em_execucao += 1
+        try:
+            return funcao(*args)
+        finally:
+            with self.lock:
+                self.em_execucao -= 1
+                self.latencias.append(time.perf_counter() - inicio)
+
+    def _liberar(self, futuro):
+        # Só quando a operação termina (ou é cancelada antes de começar): a vaga limita o bcrypt de fato
+        with self.lock:
+            self.pendentes -= 1
+        self.vagas.release()
+
+    def _executar(self, funcao, *args):
+        if not self.vagas.acquire(blocking=False):
+            with self.lock:
+                self.contadores['recusas_fila'] += 1
+            raise FilaSenhasCheia()
+        with self.lock:
+            self.pendentes += 1
+        iniciou = threading.Event()
+        futuro = self.executor.submit(self._medir, iniciou, funcao, *args)
+        futuro.add_done_callback(self._liberar)
+        # O timeout vale só para a espera na fila; um hash que já começou vai até o fim
+        if not iniciou.wait(self.timeout) and futuro.cancel():
+            with self.lock:
+                self.contadores['recusas_fila'] += 1
+            raise FilaSenhasCheia()
+        return futuro.result()
+
+    def gerar_hash(self, senha):
+        """bcrypt.hashpw com salt novo; retorna bytes"""
+        salt = bcrypt.gensalt(self.rounds) if self.rounds else bcrypt.gensalt()
+        resultado = self._executar(bcrypt.hashpw, senha.encode('utf-8'), salt)
+        with self.lock:
+            self.contadores['hashes'] += 1
+        return resultado
+
+    def verificar(self, senha, hash_armazenado):
+        """bcrypt.checkpw; hash_armazenado em bytes"""
+        resultado = self._executar(bcrypt.checkpw, senha.encode('utf-8'), hash_armazenado)
+        with self.lock:
+            self.contadores['verificacoes'] += 1
+        return resultado
+
+    def estatisticas(self):
+        with self.lock:
+            contadores = dict(self.contadores)
+            latencias = sorted(self.latencias)
+            contadores['em_execucao'] = self.em_execucao
+            contadores['fila'] = max(0, self.pendentes - self.em_execucao)
+            contadores['max_fila'] = self.max_fila
+            contadores['workers'] = self.num_workers
+        if latencias:
+            contadores['latencia_ms'] = {
+                'media': round(sum(latencias) / len(latencias) * 1000, 1),
+                'p50': round(latencias[len(latencias) // 2] * 1000, 1),
+                'p95': round(latencias[min(len(latencias) - 1, int(len(latencias) * 0.95))] * 1000, 1),
+                'max': round(latencias[-1] * 1000, 1),
+            }
+        return contadores
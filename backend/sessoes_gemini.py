@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+Sessões de chat do Gemini por usuária.
+
+O GenerativeModel é criado uma vez com a instrução de sistema (prompt_gemini.INSTRUCAO_SISTEMA)
+e a configuração de geração; cada mensagem vira um send_message numa ChatSession cujo
+histórico são os turnos anteriores como conteúdos "user"/"model" nativos, em vez de
+texto colado no prompt com cabeçalhos e rótulos.
+
+A API do Gemini não guarda estado entre chamadas: a sessão é só a lista de conteúdos que
+acompanha cada requisição. SessoesGemini guarda, por usuária, os turnos já convertidos pelo
+SDK (Content) e reaproveita os que continuam no histórico da próxima mensagem; o histórico
+é sempre o que a usuária realmente viu (a resposta final, depois das correções do chat),
+não o que o modelo devolveu.
+"""
+
+from cache import AUSENTE, CacheTTL
+
+# Configuração otimizada para respostas naturais e conversacionais
+CONFIG_GERACAO = {
+    "temperature": 0.85,  # Alta temperatura para humanização e variação (0.8-0.9 recomendado)
+    "top_p": 0.9,  # Nucleus sampling para diversidade, mantendo foco
+    "top_k": 40,  # Top-k sampling para balancear qualidade e criatividade
+    "max_output_tokens": 1200,  # Tokens suficientes para respostas completas mas não excessivamente longas
+}
+
+
+def chave_turno(turno):
+    return (turno.get('pergunta', ''), turno.get('resposta', ''))
+
+
+def texto_resposta(resposta):
+    """Texto de uma resposta (ou pedaço de streaming); '' se ela não tem texto (ex.: bloqueada)"""
+    try:
+        return resposta.text or ''
+    except ValueError:
+        # O SDK levanta ValueError em .text quando o candidato não tem partes de texto
+        return ''
+
+
+class SessoesGemini:
+    """Histórico convertido de cada usuária (TTL + LRU), usado para abrir a ChatSession da mensagem"""
+
+    def __init__(self, ttl=1800, max_usuarias=512):
+        self.itens = CacheTTL(ttl=ttl, max_itens=max_usuarias)
+        self.turnos_reaproveitados = 0
+        self.turnos_convertidos = 0
+
+    def iniciar(self, modelo, usuario_id, turnos):
+        """ChatSession de `modelo` com `turnos` (ordem cronológica) como mensagens anteriores"""
+        anteriores = self.itens.obter(usuario_id) if usuario_id else AUSENTE
+        if anteriores is AUSENTE:
+            anteriores = {}
+
+        chaves = [chave_turno(turno) for turno in turnos]
+        conteudos = []
+        reaproveitados = 0
+        for pergunta, resposta in chaves:
+            par = anteriores.get((pergunta, resposta))
+            if par is None:
+                par = ({'role': 'user', 'parts': [pergunta]}, {'role': 'model', 'parts': [resposta]})
+            else:
+                reaproveitados += 1
+            conteudos.extend(par)
+        self.turnos_reaproveitados += reaproveitados
+        self.turnos_convertidos += len(chaves) - reaproveitados
+
+        sessao = modelo.start_chat(history=conteudos)
+        if usuario_id:
+            # O SDK converte os dicts em Content ao abrir a sessão; guarda os convertidos
+            historico = sessao.history
+            self.itens.guardar(usuario_id, {
+                chave: (historico[2 * i], historico[2 * i + 1]) for i, chave in enumerate(chaves)
+            })
+        return sessao
+
+    def esquecer(self, usuario_id=None):
+        """Descarta o histórico guardado de uma usuária (ou de todas)"""
+        if usuario_id is None:
+            self.itens.limpar()
+        else:
+            self.itens.invalidar(usuario_id)
+
+    def estatisticas(self):
+        estatisticas = self.itens.estatisticas()
+        estatisticas['turnos_reaproveitados'] = self.turnos_reaproveitados
+        estatisticas['turnos_convertidos'] = self.turnos_convertidos
+        return estatisticas
+
@@ -1210,28 +1210,40 @@ class ChatbotPuerperio {
         try {
             console.log('📤 Enviando mensagem:', message);
             
-            const response = await fetch('/api/chat', {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                },
-                credentials: 'include', // Importante para cookies de sessão
-                body: JSON.stringify({
-                    pergunta: message,
-                    user_id: this.userId
-                })
-            });
+            // Tenta primeiro a resposta em streaming (texto aparece enquanto é gerado);
+            // sem suporte no navegador ou no servidor, usa /api/chat
+            let data = null;
+            if (window.ReadableStream && window.TextDecoder) {
+                data = await this.fetchStreamingResponse(message);
+            }
+
+            if (!data) {
+                const response = await fetch('/api/chat', {
+                    method: 'POST',
+                    headers: {
+                        'Content-Type': 'application/json',
+                    },
+                    credentials: 'include', // Importante para cookies de sessão
+                    body: JSON.stringify({
+                        pergunta: message,
+                        user_id: this.userId
+                    })
+                });
 
-            console.log('📥 Resposta recebida, status:', response.status);
+                console.log('📥 Resposta recebida, status:', response.status);
 
-            if (!response.ok) {
-                const errorText = await response.text();
-                console.error('❌ Erro na resposta:', response.status, errorText);
-                throw new Error(`Erro na resposta do servidor: ${response.status}`);
-            }
+                if (!response.ok) {
+                    const errorText = await response.text();
+                    console.error('❌ Erro na resposta:', response.status, errorText);
+                    throw new Error(`Erro na resposta do servidor: ${response.status}`);
+                }
 
-            const data = await response.json();
+                data = await response.json();
+            }
             console.log('✅ Dados recebidos:', data);
+            
+            // A mensagem parcial do streaming é substituída pela mensagem final completa
+            this.removeStreamingMessage();
 
             // Esconde indicador de digitação
             this.hideTyping();
@@ -1260,6 +1272,7 @@ class ChatbotPuerperio {
         } catch (error) {
             console.error('❌ Erro ao enviar mensagem:', error);
             this.hideTyping();
+            this.removeStreamingMessage();
             this.addMessage(
                 'Desculpe, ocorreu um erro ao processar sua pergunta. Verifique sua conexão e tente novamente.',
                 'assistant'
@@ -1279,6 +1292,99 @@ class ChatbotPuerperio {
         }
     }
     
+    async fetchStreamingResponse(message) {
+        // Lê os Server-Sent Events de /api/chat/stream; retorna o JSON do evento 'fim'
+        // ou null se o streaming não está disponível (o chamador usa /api/chat)
+        const response = await fetch('/api/chat/stream', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'Accept': 'text/event-stream'
+            },
+            credentials: 'include',
+            body: JSON.stringify({
+                pergunta: message,
+                user_id: this.userId
+            })
+        });
+
+        if (!response.ok || !response.body || !response.body.getReader) {
+            console.warn('⚠️ Streaming indisponível, status:', response.status);
+            return null;
+        }
+
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        let text = '';
+        let extras = '';
+
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) {
+                break;
+            }
+            buffer += decoder.decode(value, { stream: true });
+
+            // Eventos SSE são separados por uma linha em branco
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const rawEvent = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+
+                let eventName = 'message';
+                let eventData = '';
+                rawEvent.split('\n').forEach(line => {
+                    if (line.startsWith('event:')) {
+                        eventName = line.slice(6).trim();
+                    } else if (line.startsWith('data:')) {
+                        eventData += line.slice(5).trim();
+                    }
+                });
+                const payload = eventData ? JSON.parse(eventData) : {};
+
+                if (eventName === 'trecho') {
+                    text += payload.texto;
+                } else if (eventName === 'correcao') {
+                    text = payload.resposta;
+                } else if (eventName === 'alertas' || eventName === 'telefones') {
+                    extras += payload.texto;
+                } else if (eventName === 'fim') {
+                    return payload;
+                } else if (eventName === 'erro') {
+                    throw new Error(payload.erro || 'Erro no streaming');
+                }
+                this.updateStreamingMessage(text + extras);
+            }
+        }
+
+        throw new Error('Streaming encerrado antes do fim da resposta');
+    }
+
+    updateStreamingMessage(content) {
+        if (!content) {
+            return;
+        }
+        if (!this.streamingMessage) {
+            this.hideTyping();
+            this.streamingMessage = this.addMessage(content, 'assistant', { streaming: true });
+        }
+        if (this.streamingMessage) {
+            const textElement = this.streamingMessage.querySelector('.message-text');
+            if (textElement) {
+                textElement.innerHTML = this.formatMessage(content);
+            }
+            this.scrollToBottom();
+        }
+    }
+
+    removeStreamingMessage() {
+        if (this.streamingMessage) {
+            this.streamingMessage.remove();
+            this.streamingMessage = null;
+        }
+    }
+    
     addMessage(content, sender, metadata = {}) {
         const messageElement = document.createElement('div');
         messageElement.className = `message ${sender}`;
@@ -1289,8 +1395,8 @@ class ChatbotPuerperio {
             minute: '2-digit'
         });
         
-        // Adiciona som de notificação (se suportado)
-        if (sender === 'assistant' && 'Notification' in window && Notification.permission === 'granted') {
+        // Adiciona som de notificação (se suportado); no streaming, só na mensagem final
+        if (sender === 'assistant' && !metadata.streaming && 'Notification' in window && Notification.permission === 'granted') {
             new Notification('Assistente Puerpério', {
                 body: 'Nova mensagem recebida',
                 icon: '/favicon.ico'
@@ -1333,6 +1439,7 @@ class ChatbotPuerperio {
 
         this.chatMessages.appendChild(messageElement);
         this.scrollToBottom();
+        return messageElement;
     }
     
     formatMessage(content) {
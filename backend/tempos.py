@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+"""
+Tempo de cada etapa de um turno do chat, sem profiler.
+
+O chat marca o fim de cada etapa com `marcar(nome)` (a duração é o tempo desde a marca
+anterior, então as etapas encadeadas somam o turno inteiro) ou envolve um trecho com
+`with etapa(nome):`. Cada duração vai para:
+- um histograma por etapa, em memória, no processo (buckets fixos em ms, com contagem,
+  soma, máximo e p50/p95/p99 estimados), exposto no /health;
+- a medição do turno atual (iniciar(), no começo do turno), que a rota pode devolver
+  no cabeçalho Server-Timing ("busca_local;dur=1.8, gemini;dur=812.4, ...").
+
+Sem iniciar() antes, marcar() não tem de onde contar e não registra nada.
+"""
+
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+# Limites superiores dos buckets (ms); o último bucket é o +Inf
+BUCKETS_MS = (0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+
+class Histograma:
+    """Contagem por bucket; os quantis são estimados pelo limite superior do bucket (até o máximo visto)"""
+
+    def __init__(self, buckets=BUCKETS_MS):
+        self.buckets = tuple(buckets)
+        self.contagens = [0] * (len(self.buckets) + 1)
+        self.contagem = 0
+        self.soma = 0.0
+        self.maximo = 0.0
+
+    def observar(self, ms):
+        self.contagens[bisect.bisect_left(self.buckets, ms)] += 1
+        self.contagem += 1
+        self.soma += ms
+        self.maximo = max(self.maximo, ms)
+
+    def quantil(self, q):
+        if not self.contagem:
+            return None
+        alvo = q * self.contagem
+        acumulado = 0
+        for i, contagem in enumerate(self.contagens):
+            acumulado += contagem
+            if acumulado >= alvo:
+                return round(min(self.buckets[i], self.maximo), 2) if i < len(self.buckets) else round(self.maximo, 2)
+        return self.maximo
+
+    def estatisticas(self):
+        return {
+            'contagem': self.contagem,
+            'media_ms': round(self.soma / self.contagem, 2) if self.contagem else None,
+            'p50_ms': self.quantil(0.50),
+            'p95_ms': self.quantil(0.95),
+            'p99_ms': self.quantil(0.99),
+            'max_ms': round(self.maximo, 2),
+        }
+
+
+class Medicao:
+    """Etapas de uma requisição, na ordem em que terminaram"""
+
+    def __init__(self):
+        self.inicio = self.ultima_marca = time.perf_counter()
+        self.etapas = []
+
+    def server_timing(self):
+        return ", ".join(f"{nome};dur={ms:.1f}" for nome, ms in self.etapas)
+
+
+class MedidorEtapas:
+    """Histogramas por etapa (por processo) + a medição da requisição atual (contextvar)"""
+
+    def __init__(self, nome, buckets=BUCKETS_MS):
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        self.histogramas = {}
+        self.medicao_atual = contextvars.ContextVar(f'medicao_{nome}', default=None)
+        # ao_registrar(etapa, ms) a cada duração registrada (ex.: para as métricas do /metrics)
+        self.ao_registrar = None
+
+    def iniciar(self):
+        """Começa a medir o turno atual; devolve a Medicao (também em atual())"""
+        medicao = Medicao()
+        self.medicao_atual.set(medicao)
+        return medicao
+
+    def atual(self):
+        return self.medicao_atual.get()
+
+    def finalizar(self):
+        """Registra a etapa 'total' (desde iniciar()); a Medicao segue em atual() até o próximo iniciar()"""
+        medicao = self.medicao_atual.get()
+        if medicao is not None:
+            self.registrar('total', (time.perf_counter() - medicao.inicio) * 1000)
+        return medicao
+
+    def registrar(self, nome, ms):
+        with self.lock:
+            histograma = self.histogramas.get(nome)
+            if histograma is None:
+                histograma = self.histogramas[nome] = Histograma(self.buckets)
+            histograma.observar(ms)
+        medicao = self.medicao_atual.get()
+        if medicao is not None:
+            medicao.etapas.append((nome, ms))
+        if self.ao_registrar is not None:
+            self.ao_registrar(nome, ms)
+
+    def marcar(self, nome):
+        """Fecha a etapa `nome`: tempo desde a marca anterior (ou desde iniciar())"""
+        medicao = self.medicao_atual.get()
+        if medicao is None:
+            return
+        agora = time.perf_counter()
+        anterior, medicao.ultima_marca = medicao.ultima_marca, agora
+        self.registrar(nome, (agora - anterior) * 1000)
+
+    @contextmanager
+    def etapa(self, nome):
+        """Mede o bloco como a etapa `nome` (e encadeia a próxima marca a partir do fim dele)"""
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            fim = time.perf_counter()
+            medicao = self.medicao_atual.get()
+            if medicao is not None:
+                medicao.ultima_marca = fim
+            self.registrar(nome, (fim - inicio) * 1000)
+
+    def estatisticas(self):
+        with self.lock:
+            return {nome: histograma.estatisticas() for nome, histograma in self.histogramas.items()}
+
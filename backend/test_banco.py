@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+"""Testes das conexões SQLite reutilizáveis (banco.py)"""
+
+import threading
+
+import pytest
+
+from banco import GerenciadorConexoes
+
+
+@pytest.fixture
+def banco(tmp_path):
+    gerenciador = GerenciadorConexoes(str(tmp_path / 'teste.db'), busy_timeout_ms=1000)
+    conn = gerenciador.conectar()
+    conn.execute('CREATE TABLE itens (nome TEXT)')
+    conn.commit()
+    conn.close()
+    yield gerenciador
+    gerenciador.fechar()
+
+
+def nomes(gerenciador):
+    conn = gerenciador.conectar()
+    try:
+        return [linha[0] for linha in conn.execute('SELECT nome FROM itens ORDER BY rowid')]
+    finally:
+        conn.close()
+
+
+def test_pragmas_e_uma_conexao_por_thread(banco):
+    conn = banco.conectar()
+    assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+    assert conn.execute('PRAGMA busy_timeout').fetchone()[0] == 1000
+    conn.close()
+    assert banco.conectar()._conexao is conn._conexao
+
+    outras = []
+    thread = threading.Thread(target=lambda: outras.append(banco.conectar()._conexao))
+    thread.start()
+    thread.join()
+    assert outras[0] is not conn._conexao
+    assert banco.estatisticas()['conexoes_criadas'] == 2
+
+
+def test_close_desfaz_o_que_nao_foi_confirmado(banco):
+    conn = banco.conectar()
+    conn.execute("INSERT INTO itens VALUES ('perdido')")
+    conn.close()
+    conn = banco.conectar()
+    conn.execute("INSERT INTO itens VALUES ('confirmado')")
+    conn.commit()
+    conn.close()
+    assert nomes(banco) == ['confirmado']
+
+
+def test_close_aninhado_nao_desfaz_a_transacao_de_fora(banco):
+    externa = banco.conectar()
+    externa.execute("INSERT INTO itens VALUES ('fora')")
+
+    interna = banco.conectar()
+    interna.execute("INSERT INTO itens VALUES ('dentro')")
+    interna.close()
+    # Só o que a aninhada fez e não confirmou foi desfeito
+    assert externa.in_transaction
+    assert [linha[0] for linha in externa.execute('SELECT nome FROM itens')] == ['fora']
+
+    externa.commit()
+    externa.close()
+    assert nomes(banco) == ['fora']
+    assert banco.estatisticas()['aninhadas'] == 1
+
+
+def test_commit_aninhado_nao_confirma_a_transacao_de_fora(banco):
+    externa = banco.conectar()
+    externa.execute("INSERT INTO itens VALUES ('fora')")
+
+    interna = banco.conectar()
+    interna.execute("INSERT INTO itens VALUES ('dentro')")
+    interna.commit()
+    interna.close()
+    assert externa.in_transaction
+
+    # O dono desiste: nem a escrita dele nem a "confirmada" pela aninhada chegam ao banco
+    externa.close()
+    assert nomes(banco) == []
+
+
+def test_with_aninhado_entra_na_transacao_de_fora(banco):
+    externa = banco.conectar()
+    externa.execute("INSERT INTO itens VALUES ('fora')")
+
+    interna = banco.conectar()
+    with interna:
+        interna.execute("INSERT INTO itens VALUES ('dentro')")
+    with pytest.raises(RuntimeError):
+        with interna:
+            interna.execute("INSERT INTO itens VALUES ('com erro')")
+            raise RuntimeError
+    interna.close()
+
+    externa.commit()
+    externa.close()
+    assert nomes(banco) == ['fora', 'dentro']
+
+
+def test_aninhada_sem_transacao_aberta_confirma_normalmente(banco):
+    externa = banco.conectar()
+    interna = banco.conectar()
+    interna.execute("INSERT INTO itens VALUES ('dentro')")
+    interna.commit()
+    interna.close()
+    externa.close()
+    assert nomes(banco) == ['dentro']
+
+
+def test_liberar_desfaz_e_zera_a_profundidade(banco):
+    esquecida = banco.conectar()
+    esquecida.execute("INSERT INTO itens VALUES ('esquecido')")
+    # Sem close(): o teardown da requisição desfaz
+    banco.liberar()
+    assert not esquecida.in_transaction
+
+    conn = banco.conectar()
+    conn.execute("INSERT INTO itens VALUES ('novo')")
+    # Depois do liberar() esta é de novo a conexão de fora, sem savepoint
+    conn.commit()
+    conn.close()
+    assert nomes(banco) == ['novo']
+    assert banco.estatisticas()['aninhadas'] == 0
+
+
+def test_reabre_a_conexao_depois_de_um_fork(banco, monkeypatch):
+    antiga = banco.conectar()
+    antiga.close()
+    monkeypatch.setattr(banco.local, 'pid', -1)
+    nova = banco.conectar()
+    assert nova._conexao is not antiga._conexao
+    nova.close()
+    assert banco.estatisticas()['conexoes_criadas'] == 2
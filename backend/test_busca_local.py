@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""Testes da busca na base de conhecimento local (busca_local.py)"""
+
+import difflib
+import json
+import os
+
+import pytest
+
+from busca_local import (LIMITE_SIMILARIDADE, PESO_PALAVRAS, PESO_STRING, IndiceConhecimento, RankerBM25,
+                         criar_ranker, extrair_palavras)
+from normalizacao import radical
+
+CAMINHO_BASE = os.path.join(os.path.dirname(__file__), '..', 'dados', 'base_conhecimento.json')
+
+PERGUNTAS = [
+    'O que é o baby blues?',
+    'o que devo comer no puerperio',
+    'Estou muito cansada e não consigo dormir',
+    'meu bebê não para de chorar à noite',
+    'posso tomar café amamentando?',
+    'quando volto a menstruar depois do parto',
+    'oi',
+    '',
+    'xyzzy qwerty',
+]
+
+
+@pytest.fixture(scope='module')
+def base():
+    with open(CAMINHO_BASE, encoding='utf-8') as arquivo:
+        return json.load(arquivo)
+
+
+def busca_linear(base, pergunta):
+    """A busca original: pontua todas as entradas, a primeira com a maior pontuação vence"""
+    pergunta_lower = pergunta.lower()
+    palavras_pergunta = extrair_palavras(pergunta_lower)
+    melhor = (None, None, 0)
+    for tema, conteudo in base.items():
+        pergunta_base = conteudo['pergunta'].lower()
+        palavras_base = extrair_palavras(f"{pergunta_base} {conteudo['resposta'].lower()}")
+        similaridade_string = difflib.SequenceMatcher(None, pergunta_lower, pergunta_base).ratio()
+        similaridade_palavras = len(palavras_pergunta & palavras_base) / len(palavras_pergunta) if palavras_pergunta else 0
+        similaridade = similaridade_string * PESO_STRING + similaridade_palavras * PESO_PALAVRAS
+        if similaridade > melhor[2]:
+            melhor = (conteudo['resposta'], tema, similaridade)
+    return melhor if melhor[2] > LIMITE_SIMILARIDADE else (None, None, 0)
+
+
+@pytest.mark.parametrize('pergunta', PERGUNTAS + ['pergunta sobre ' + tema for tema in ('sono', 'cólica', 'vacina')])
+def test_indice_igual_a_busca_linear(base, pergunta):
+    indice = IndiceConhecimento(base)
+    resposta, tema, similaridade = indice.buscar(pergunta)
+    esperado = busca_linear(base, pergunta)
+    assert (resposta, tema) == esperado[:2]
+    assert similaridade == pytest.approx(esperado[2])
+
+
+def test_indice_pergunta_da_propria_base(base):
+    indice = IndiceConhecimento(base)
+    for tema, conteudo in list(base.items())[:20]:
+        _, encontrado, similaridade = indice.buscar(conteudo['pergunta'])
+        assert encontrado is not None
+        assert similaridade > LIMITE_SIMILARIDADE
+        # Entradas com a mesma pergunta podem empatar; a encontrada tem que ser uma delas
+        assert base[encontrado]['pergunta'].lower() == base[tema]['pergunta'].lower()
+
+
+def test_indice_top_k_ordenado_e_coerente_com_buscar(base):
+    indice = IndiceConhecimento(base)
+    resultados = indice.buscar_top_k('o que é o baby blues', k=3)
+    assert 0 < len(resultados) <= 3
+    similaridades = [similaridade for _, _, similaridade in resultados]
+    assert similaridades == sorted(similaridades, reverse=True)
+    assert resultados[0][1] == indice.buscar('o que é o baby blues')[1]
+
+
+def test_indice_ignora_entradas_incompletas():
+    indice = IndiceConhecimento({'ok': {'pergunta': 'febre no bebê', 'resposta': 'procure o pediatra'},
+                                 'sem_resposta': {'pergunta': 'febre'}, 'lista': ['febre']})
+    assert len(indice) == 1
+    assert indice.buscar('meu bebê está com febre')[1] == 'ok'
+
+
+BASE_PEQUENA = {
+    'febre': {'pergunta': 'O bebê está com febre', 'resposta': 'Febre acima de 37,8 graus: procure o pediatra.'},
+    'colica': {'pergunta': 'Como aliviar a cólica do bebê?', 'resposta': 'Massagem na barriga e compressa morna ajudam na cólica.'},
+    'sono': {'pergunta': 'Meu bebê não dorme', 'resposta': 'Crie uma rotina de sono com banho e luz baixa.'},
+}
+
+
+def test_bm25_encontra_o_tema_certo():
+    ranker = RankerBM25(BASE_PEQUENA, limite=0.1)
+    assert ranker.buscar('cólicas do bebê, como aliviar?')[1] == 'colica'
+    assert ranker.buscar('o bebê tem febre alta')[1] == 'febre'
+    assert ranker.buscar('rotina de sono')[1] == 'sono'
+
+
+def test_bm25_pontuacao_normalizada_e_limite():
+    ranker = RankerBM25(BASE_PEQUENA, limite=0.1)
+    for _, _, pontuacao in ranker.buscar_top_k('bebê com febre e cólica', k=3):
+        assert 0 < pontuacao <= 1
+    # Sem termos do vocabulário nada pontua
+    assert ranker.buscar('xyzzy qwerty') == (None, None, 0)
+    assert RankerBM25(BASE_PEQUENA, limite=0.99).buscar('bebê') == (None, None, 0)
+
+
+def test_bm25_termo_raro_pesa_mais_que_termo_comum():
+    ranker = RankerBM25(BASE_PEQUENA, limite=0.0)
+    # "bebe" está em todas as entradas; "compressa" só em uma
+    assert ranker.idf[radical('compressa')] > ranker.idf[radical('bebe')]
+
+
+def test_criar_ranker_pelo_modo():
+    assert isinstance(criar_ranker(BASE_PEQUENA, 'bm25'), RankerBM25)
+    assert isinstance(criar_ranker(BASE_PEQUENA, 'indice'), IndiceConhecimento)
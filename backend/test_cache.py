@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""Testes do CacheTTL (cache.py): expiração, limite LRU e contadores"""
+
+import types
+
+import pytest
+
+import cache
+from cache import AUSENTE, CacheTTL
+
+
+@pytest.fixture
+def relogio(monkeypatch):
+    """Relógio controlado pelo teste no lugar de time.monotonic()"""
+    agora = [1000.0]
+    monkeypatch.setattr(cache, 'time', types.SimpleNamespace(monotonic=lambda: agora[0]))
+    return agora
+
+
+def test_expira_depois_do_ttl(relogio):
+    itens = CacheTTL(ttl=10, max_itens=10)
+    itens.guardar('a', 1)
+    relogio[0] += 9.9
+    assert itens.obter('a') == 1
+    relogio[0] += 0.1
+    assert itens.obter('a') is AUSENTE
+    assert len(itens) == 0
+
+
+def test_none_cacheado_nao_e_ausente(relogio):
+    itens = CacheTTL(ttl=10)
+    itens.guardar('a', None)
+    assert itens.obter('a') is None
+    assert itens.obter('b', 'padrao') == 'padrao'
+
+
+def test_lru_remove_o_menos_usado(relogio):
+    itens = CacheTTL(ttl=60, max_itens=2)
+    itens.guardar('a', 1)
+    itens.guardar('b', 2)
+    # Ler 'a' o torna o mais recente: quem sai é 'b'
+    assert itens.obter('a') == 1
+    itens.guardar('c', 3)
+    assert itens.obter('b') is AUSENTE
+    assert itens.obter('a') == 1
+    assert itens.obter('c') == 3
+
+
+def test_guardar_se_ausente(relogio):
+    itens = CacheTTL(ttl=10, max_itens=10)
+    assert itens.guardar_se_ausente('a', 1) == 1
+    relogio[0] += 8
+    # Já existe: mantém o valor e renova o TTL
+    assert itens.guardar_se_ausente('a', 2) == 1
+    relogio[0] += 8
+    assert itens.obter('a') == 1
+    relogio[0] += 10
+    # Expirado conta como ausente
+    assert itens.guardar_se_ausente('a', 3) == 3
+
+
+def test_invalidar_limpar_e_estatisticas(relogio):
+    itens = CacheTTL(ttl=10)
+    itens.guardar('a', 1)
+    itens.guardar('b', 2)
+    itens.obter('a')
+    itens.invalidar('a')
+    itens.obter('a')
+    assert itens.estatisticas() == {'itens': 1, 'acertos': 1, 'falhas': 1, 'taxa_acerto': 0.5}
+    itens.limpar()
+    assert len(itens) == 0
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""Testes do cache por quase-duplicatas (cache_semantico.py): MinHash + LSH e a trava de negação"""
+
+from cache_semantico import IndiceMinHash, jaccard
+from normalizacao import MensagemNormalizada
+
+PARTICAO = ('sem_resposta_local', False, False)
+
+
+def radicais(texto):
+    return frozenset(MensagemNormalizada(texto).radicais)
+
+
+def test_jaccard():
+    assert jaccard({'a', 'b'}, {'a', 'b'}) == 1.0
+    assert jaccard({'a', 'b'}, {'b', 'c'}) == 1 / 3
+    assert jaccard(set(), set()) == 1.0
+
+
+def test_assinatura_estimativa_proxima_do_jaccard():
+    indice = IndiceMinHash(num_permutacoes=128, bandas=32)
+    a = {f'termo{i}' for i in range(40)}
+    b = {f'termo{i}' for i in range(10, 50)}
+    assinatura_a, assinatura_b = indice.assinatura(a), indice.assinatura(b)
+    estimativa = sum(x == y for x, y in zip(assinatura_a, assinatura_b)) / len(assinatura_a)
+    assert abs(estimativa - jaccard(a, b)) < 0.15
+    # Determinística: a mesma entrada sempre gera a mesma assinatura
+    assert indice.assinatura(a) == assinatura_a
+
+
+def test_parafrase_acerta_e_pergunta_diferente_erra():
+    indice = IndiceMinHash(limiar=0.6)
+    indice.guardar(radicais('o que é baby blues depois do parto'), PARTICAO, 'resposta baby blues')
+    assert indice.buscar(radicais('baby blues depois do parto é o que'), PARTICAO) == 'resposta baby blues'
+    assert indice.buscar(radicais('como aliviar a cólica do bebê'), PARTICAO) is None
+
+
+def test_negacao_nunca_reaproveita_resposta():
+    indice = IndiceMinHash(limiar=0.5)
+    indice.guardar(radicais('posso tomar café amamentando meu bebê'), PARTICAO, 'pode, com moderação')
+    assert indice.buscar(radicais('não posso tomar café amamentando meu bebê'), PARTICAO) is None
+    assert indice.buscar(radicais('posso tomar café amamentando meu bebê'), PARTICAO) == 'pode, com moderação'
+
+
+def test_particoes_nao_se_misturam():
+    indice = IndiceMinHash(limiar=0.6)
+    indice.guardar(radicais('o que é baby blues depois do parto'), PARTICAO, 'resposta')
+    assert indice.buscar(radicais('o que é baby blues depois do parto'), ('outra', False, False)) is None
+
+
+def test_perguntas_curtas_ficam_fora():
+    indice = IndiceMinHash()
+    indice.guardar(radicais('oi'), PARTICAO, 'olá')
+    assert indice.estatisticas()['itens'] == 0
+
+
+def test_limite_de_itens_remove_os_mais_antigos_e_seus_baldes():
+    indice = IndiceMinHash(limiar=0.9, max_itens=2)
+    perguntas = ['febre alta no bebê recém nascido', 'cólica forte do bebê de noite',
+                 'rotina de sono para o bebê dormir']
+    for pergunta in perguntas:
+        indice.guardar(radicais(pergunta), PARTICAO, pergunta)
+    assert indice.buscar(radicais(perguntas[0]), PARTICAO) is None
+    assert indice.buscar(radicais(perguntas[2]), PARTICAO) == perguntas[2]
+    assert len(indice.itens) == 2
+    ids_nos_baldes = set().union(*indice.baldes.values())
+    assert ids_nos_baldes == set(indice.itens)
@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""Testes da fila persistente de emails (fila_email.py)"""
+
+import smtplib
+import socket
+import types
+
+import pytest
+
+import fila_email
+from banco import GerenciadorConexoes
+from fila_email import ENVIADO, ENVIANDO, FALHOU, PENDENTE, FilaEmail, erro_transitorio
+
+
+@pytest.fixture
+def relogio(monkeypatch):
+    agora = [1000.0]
+    monkeypatch.setattr(fila_email, 'time', types.SimpleNamespace(time=lambda: agora[0]))
+    # Sem jitter, para conferir o backoff exato
+    monkeypatch.setattr(fila_email, 'random', types.SimpleNamespace(uniform=lambda a, b: 1.0))
+    return agora
+
+
+class Entregador:
+    """enviar_lote falso: devolve os erros programados (um por email) e guarda o que recebeu"""
+
+    def __init__(self):
+        self.erros = []
+        self.lotes = []
+
+    def __call__(self, emails):
+        self.lotes.append([email.id for email in emails])
+        if isinstance(self.erros, Exception):
+            raise self.erros
+        return [self.erros.pop(0) if self.erros else None for _ in emails]
+
+
+@pytest.fixture
+def entregador():
+    return Entregador()
+
+
+@pytest.fixture
+def fila(tmp_path, relogio, entregador):
+    banco = GerenciadorConexoes(str(tmp_path / 'fila.db'))
+    yield FilaEmail(banco, entregador, num_workers=1, tamanho_lote=10, max_tentativas=3,
+                    backoff_base=30.0, backoff_max=100.0, pausa_autenticacao=300.0)
+    banco.fechar()
+
+
+def registro(fila, email_id):
+    conn = fila.banco.conectar()
+    try:
+        return conn.execute('SELECT status, tentativas, proxima_tentativa, ultimo_erro FROM email_outbox WHERE id = ?',
+                            (email_id,)).fetchone()
+    finally:
+        conn.close()
+
+
+def test_erro_transitorio_classifica_os_erros_smtp():
+    assert erro_transitorio(smtplib.SMTPRecipientsRefused({'a@x.com': (450, b'caixa ocupada')}))
+    assert not erro_transitorio(smtplib.SMTPRecipientsRefused({'a@x.com': (550, b'nao existe')}))
+    assert erro_transitorio(smtplib.SMTPDataError(421, b'tente depois'))
+    assert not erro_transitorio(smtplib.SMTPDataError(554, b'rejeitado'))
+    assert erro_transitorio(smtplib.SMTPServerDisconnected('caiu'))
+    assert erro_transitorio(socket.timeout('timeout'))
+    assert erro_transitorio(ConnectionRefusedError())
+    # SMTPException herda de OSError, mas não é erro de rede
+    assert not erro_transitorio(smtplib.SMTPNotSupportedError('sem STARTTLS'))
+    assert not erro_transitorio(smtplib.SMTPException('outro'))
+    assert not erro_transitorio(smtplib.SMTPAuthenticationError(535, b'senha errada'))
+    assert not erro_transitorio(ValueError('bug'))
+
+
+def test_entrega_e_marca_como_enviado(fila, entregador):
+    email_id = fila.enfileirar('a@x.com', 'Oi', 'corpo')
+    assert fila.pendentes() == 1
+    assert fila.processar_lote() == 1
+    assert registro(fila, email_id)[:2] == (ENVIADO, 1)
+    assert fila.pendentes() == 0
+    assert fila.processar_lote() == 0
+    assert entregador.lotes == [[email_id]]
+
+
+def test_falha_transitoria_volta_para_a_fila_com_backoff(fila, entregador, relogio):
+    email_id = fila.enfileirar('a@x.com', 'Oi', 'corpo')
+    entregador.erros = [socket.timeout('timeout')]
+    assert fila.processar_lote() == 1
+    status, tentativas, proxima, erro = registro(fila, email_id)
+    assert (status, tentativas, proxima, erro) == (PENDENTE, 1, 1030.0, 'timeout')
+
+    # Antes do backoff o email não é reservado
+    assert fila.processar_lote() == 0
+    relogio[0] = 1030.0
+    entregador.erros = [socket.timeout('timeout')]
+    assert fila.processar_lote() == 1
+    # O atraso dobra a cada falha
+    assert registro(fila, email_id)[1:3] == (2, 1090.0)
+    assert fila.estatisticas()['retentativas'] == 2
+
+
+def test_backoff_dobra_ate_o_maximo(fila):
+    assert [fila._backoff(tentativas) for tentativas in (1, 2, 3, 4)] == [30.0, 60.0, 100.0, 100.0]
+
+
+def test_desiste_depois_do_maximo_de_tentativas(fila, entregador, relogio):
+    email_id = fila.enfileirar('a@x.com', 'Oi', 'corpo')
+    for _ in range(3):
+        entregador.erros = [ConnectionResetError('reset')]
+        relogio[0] += 1000
+        assert fila.processar_lote() == 1
+    assert registro(fila, email_id)[:2] == (FALHOU, 3)
+    assert fila.estatisticas()['falhas'] == 1
+
+
+def test_falha_permanente_nao_e_tentada_de_novo(fila, entregador):
+    email_id = fila.enfileirar('a@x.com', 'Oi', 'corpo')
+    entregador.erros = [smtplib.SMTPRecipientsRefused({'a@x.com': (550, b'nao existe')})]
+    fila.processar_lote()
+    assert registro(fila, email_id)[:2] == (FALHOU, 1)
+
+
+def test_excecao_no_envio_devolve_o_lote_inteiro(fila, entregador):
+    ids = [fila.enfileirar(f'{i}@x.com', 'Oi', 'corpo') for i in range(3)]
+    entregador.erros = ConnectionRefusedError('sem servidor')
+    assert fila.processar_lote() == 3
+    assert [registro(fila, email_id)[:2] for email_id in ids] == [(PENDENTE, 1)] * 3
+
+
+def test_erro_de_autenticacao_pausa_a_fila_sem_gastar_tentativas(fila, entregador, relogio):
+    ids = [fila.enfileirar(f'{i}@x.com', 'Oi', 'corpo') for i in range(2)]
+    entregador.erros = smtplib.SMTPAuthenticationError(535, b'senha errada')
+    assert fila.processar_lote() == 2
+    assert [registro(fila, email_id)[:3] for email_id in ids] == [(PENDENTE, 0, 1000.0)] * 2
+    assert fila.pausada()
+    estatisticas = fila.estatisticas()
+    assert (estatisticas['pausas'], estatisticas['retentativas'], estatisticas['falhas']) == (1, 0, 0)
+
+    # Pausada, a fila não reserva nada, nem emails novos
+    fila.enfileirar('novo@x.com', 'Oi', 'corpo')
+    assert fila.processar_lote() == 0
+    assert len(entregador.lotes) == 1
+
+    relogio[0] += 300
+    entregador.erros = []
+    assert not fila.pausada()
+    assert fila.processar_lote() == 3
+    assert [registro(fila, email_id)[:2] for email_id in ids] == [(ENVIADO, 1)] * 2
+
+
+def test_reserva_expirada_e_recuperar_reservas(fila, relogio):
+    email_id = fila.enfileirar('a@x.com', 'Oi', 'corpo')
+    assert [email.id for email in fila._reservar()] == [email_id]
+    assert registro(fila, email_id)[0] == ENVIANDO
+    # Reservado por um processo que morreu: só volta depois de reserva_expira
+    assert fila._reservar() == []
+    relogio[0] += fila.reserva_expira + 1
+    assert [email.id for email in fila._reservar()] == [email_id]
+
+    assert fila.recuperar_reservas() == 1
+    assert registro(fila, email_id)[0] == PENDENTE
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""Testes do disjuntor e do gateway do Gemini (gateway_gemini.py), sem chamar a API"""
+
+import threading
+import types
+
+import pytest
+
+import gateway_gemini
+from gateway_gemini import (ABERTO, FECHADO, MEIO_ABERTO, CircuitoAberto, Disjuntor, GatewayGemini,
+                            PrazoGeminiEsgotado, RespostaVazia)
+
+
+@pytest.fixture
+def relogio(monkeypatch):
+    """Relógio controlado pelo teste no lugar de time.monotonic() (só para os testes do Disjuntor)"""
+    agora = [1000.0]
+    monkeypatch.setattr(gateway_gemini, 'time', types.SimpleNamespace(monotonic=lambda: agora[0]))
+    return agora
+
+
+def test_abre_depois_de_max_falhas(relogio):
+    disjuntor = Disjuntor(max_falhas=3, espera=30)
+    for _ in range(2):
+        disjuntor.permitir()
+        disjuntor.falha()
+    assert disjuntor.estado == FECHADO
+    disjuntor.falha()
+    assert disjuntor.estado == ABERTO
+    assert disjuntor.aberto()
+    with pytest.raises(CircuitoAberto):
+        disjuntor.permitir()
+    assert disjuntor.estatisticas()['recusas'] == 1
+
+
+def test_sucesso_zera_as_falhas_seguidas(relogio):
+    disjuntor = Disjuntor(max_falhas=3)
+    disjuntor.falha()
+    disjuntor.falha()
+    disjuntor.sucesso()
+    disjuntor.falha()
+    assert disjuntor.estado == FECHADO
+
+
+def test_quota_abre_na_hora(relogio):
+    disjuntor = Disjuntor(max_falhas=5)
+    disjuntor.falha(quota=True)
+    assert disjuntor.estado == ABERTO
+
+
+def test_meio_aberto_permite_uma_chamada_de_teste(relogio):
+    disjuntor = Disjuntor(max_falhas=1, espera=30)
+    disjuntor.falha()
+    relogio[0] += 30
+    assert not disjuntor.aberto()
+    disjuntor.permitir()
+    assert disjuntor.estado == MEIO_ABERTO
+    # Só uma chamada de teste por vez
+    assert disjuntor.aberto()
+    with pytest.raises(CircuitoAberto):
+        disjuntor.permitir()
+    disjuntor.sucesso()
+    assert disjuntor.estado == FECHADO
+    disjuntor.permitir()
+
+
+def test_falha_no_meio_aberto_reabre(relogio):
+    disjuntor = Disjuntor(max_falhas=5, espera=30)
+    disjuntor.falha(quota=True)
+    relogio[0] += 30
+    disjuntor.permitir()
+    disjuntor.falha()
+    assert disjuntor.estado == ABERTO
+    assert disjuntor.estatisticas()['aberturas'] == 2
+    relogio[0] += 29
+    assert disjuntor.aberto()
+
+
+def test_gateway_conta_sucessos_e_erros():
+    gateway = GatewayGemini(prazo=5, max_falhas=2, num_workers=2)
+    assert gateway.gerar(lambda prazo: 'ok') == 'ok'
+
+    def falha(prazo):
+        raise RuntimeError('500 erro interno')
+
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            gateway.gerar(falha)
+    # Circuito aberto: recusa sem chamar
+    chamadas = []
+    with pytest.raises(CircuitoAberto):
+        gateway.gerar(lambda prazo: chamadas.append(prazo))
+    assert chamadas == []
+    estatisticas = gateway.estatisticas()
+    assert (estatisticas['sucessos'], estatisticas['erros']) == (1, 2)
+    assert estatisticas['disjuntor']['estado'] == ABERTO
+
+
+def test_gateway_prazo_esgotado_conta_como_falha():
+    gateway = GatewayGemini(prazo=0.05, max_falhas=1, num_workers=1)
+    liberar = threading.Event()
+
+    def lenta(prazo):
+        liberar.wait(2)
+        return 'tarde'
+
+    with pytest.raises(PrazoGeminiEsgotado):
+        gateway.gerar(lenta)
+    liberar.set()
+    estatisticas = gateway.estatisticas()
+    assert estatisticas['prazos_esgotados'] == 1
+    assert estatisticas['disjuntor']['estado'] == ABERTO
+
+
+def test_streaming_registra_pelo_permitir_e_registrar():
+    gateway = GatewayGemini(max_falhas=1)
+    gateway.permitir()
+    gateway.registrar(RuntimeError('429 quota'))
+    estatisticas = gateway.estatisticas()
+    assert estatisticas['erros_quota'] == 1
+    assert estatisticas['disjuntor']['estado'] == ABERTO
+    with pytest.raises(CircuitoAberto):
+        gateway.permitir()
+
+
+def test_streaming_vazio_conta_como_falha():
+    gateway = GatewayGemini(max_falhas=2)
+    gateway.permitir()
+    gateway.registrar(RespostaVazia('streaming sem texto'))
+    estatisticas = gateway.estatisticas()
+    assert (estatisticas['sucessos'], estatisticas['erros'], estatisticas['erros_quota']) == (0, 1, 0)
+    assert estatisticas['disjuntor']['falhas_seguidas'] == 1
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""Testes do autômato Aho-Corasick dos gatilhos (gatilhos.py)"""
+
+import random
+
+import pytest
+
+from gatilhos import (GATILHOS_MENSAGEM, GATILHOS_RESPOSTA, AutomatoAhoCorasick, categorias_mensagem,
+                      categorias_resposta, categorias_texto)
+from normalizacao import dobrar
+
+
+def categorias_ingenuas(gatilhos, texto):
+    """O teste antigo, frase por frase: any(frase in texto for frase in lista)"""
+    return frozenset(categoria for categoria, frases in gatilhos.items()
+                     if any(dobrar(frase) in texto for frase in frases))
+
+
+TEXTOS = [
+    'Estou muito cansada e preocupada com o bebê',
+    'oi sophia, quem é você?',
+    'me sinto triste, acho que é depressão',
+    'o bebê está com febre e sangramento',
+    'Você me conhece? Quem sou eu?',
+    'estou criando um site para o projeto da chefia',
+    'Que bom te ver novamente! Já estamos na nossa terceira conversa.',
+    'Entendo, querida. Sei que não é fácil.',
+    'EMERGÊNCIA!!! inchaço nas pernas',
+    'nada a ver aqui',
+    '',
+]
+
+
+@pytest.mark.parametrize('texto', TEXTOS)
+def test_automato_igual_a_busca_ingenua(texto):
+    dobrado = dobrar(texto)
+    assert categorias_mensagem(dobrado) == categorias_ingenuas(GATILHOS_MENSAGEM, dobrado)
+    assert categorias_resposta(texto) == categorias_ingenuas(GATILHOS_RESPOSTA, dobrado)
+
+
+def test_automato_igual_a_busca_ingenua_em_textos_aleatorios():
+    # Textos montados com pedaços das próprias frases, para exercitar sobreposições e links de falha
+    frases = [dobrar(frase) for frases in GATILHOS_MENSAGEM.values() for frase in frases]
+    sorteio = random.Random(42)
+    for _ in range(300):
+        pedacos = []
+        for frase in sorteio.sample(frases, 4):
+            inicio = sorteio.randrange(len(frase))
+            pedacos.append(frase[inicio:inicio + sorteio.randint(1, len(frase))])
+        texto = sorteio.choice([' ', '', 'x']).join(pedacos)
+        assert categorias_mensagem(texto) == categorias_ingenuas(GATILHOS_MENSAGEM, texto)
+
+
+def test_padroes_sobrepostos_e_prefixos():
+    automato = AutomatoAhoCorasick({'a': ['he', 'she'], 'b': ['hers'], 'c': ['his'], 'd': ['ushe']})
+    assert automato.categorias('ushers') == {'a', 'b', 'd'}
+    assert automato.categorias('this') == {'c'}
+    assert automato.categorias('h') == frozenset()
+
+
+def test_comparacao_sem_acentos():
+    automato = AutomatoAhoCorasick({'preocupacao': ['preocupação']})
+    assert automato.categorias(dobrar('Estou com PREOCUPACAO')) == {'preocupacao'}
+
+
+def test_texto_livre_nao_fica_em_cache():
+    assert not hasattr(categorias_texto, 'cache_info')
+    assert not hasattr(categorias_resposta, 'cache_info')
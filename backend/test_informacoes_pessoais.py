@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""Testes da extração incremental de informações pessoais (informacoes_pessoais.py)"""
+
+import threading
+
+from informacoes_pessoais import TEXTO_PROJETO, ExtratorInformacoes
+
+
+def test_processar_devolve_so_o_que_mudou():
+    extrator = ExtratorInformacoes()
+    assert extrator.processar('u', 'Me chamo Ana') == {'nome_usuario': 'Ana'}
+    # Mesmo nome de novo: nada a gravar em user_info
+    assert extrator.processar('u', 'Me chamo Ana') == {}
+    mudancas = extrator.processar('u', 'Estou criando um site para mães')
+    assert mudancas == {'informacoes_pessoais': {'projeto': TEXTO_PROJETO}}
+
+
+def test_estado_inicial_vem_de_user_info():
+    extrator = ExtratorInformacoes(carregar_info=lambda user_id: {'nome_usuario': 'Ana', 'nome_bebe': 'Leo'})
+    assert extrator.processar('u', 'meu bebê se chama Leo') == {}
+    assert extrator.processar('u', 'meu bebê se chama Theo') == {'nome_bebe': 'Theo'}
+
+
+def test_contexto_historico_analisa_so_turnos_novos():
+    analisadas = []
+    extrator = ExtratorInformacoes()
+    analisar = extrator._analisar
+    extrator._analisar = lambda estado, pergunta: analisadas.append(pergunta) or analisar(estado, pergunta)
+    historico = [
+        {'pergunta': 'Me chamo Ana', 'timestamp': '2026-01-01T10:00:00'},
+        {'pergunta': 'meu bebê chora muito', 'timestamp': '2026-01-01T10:01:00'},
+    ]
+    assert extrator.contexto_historico('u', historico) == ('Ana', ['meu bebê chora muito'])
+    historico.append({'pergunta': 'minha filha dorme pouco', 'timestamp': '2026-01-01T10:02:00'})
+    assert extrator.contexto_historico('u', historico) == ('Ana', ['meu bebê chora muito', 'minha filha dorme pouco'])
+    # Cada mensagem foi analisada uma única vez
+    assert analisadas == ['Me chamo Ana', 'meu bebê chora muito', 'minha filha dorme pouco']
+
+
+def test_esquecer_descarta_o_estado():
+    extrator = ExtratorInformacoes()
+    extrator.processar('u', 'Me chamo Ana')
+    extrator.esquecer('u')
+    assert extrator.contexto_historico('u') == (None, [])
+    assert extrator.processar('u', 'Me chamo Ana') == {'nome_usuario': 'Ana'}
+
+
+def test_estados_limitados_por_lru():
+    extrator = ExtratorInformacoes(max_usuarias=2)
+    for user_id in ('a', 'b', 'c'):
+        extrator.processar(user_id, 'oi')
+    assert len(extrator.estados) == 2
+    assert extrator.estados.obter('a', None) is None
+
+
+def test_carregar_info_fora_do_lock():
+    # Enquanto user_info de uma usuária carrega, a outra não espera
+    carregando = threading.Event()
+    liberar = threading.Event()
+
+    def carregar(user_id):
+        if user_id == 'lenta':
+            carregando.set()
+            liberar.wait(2)
+        return None
+
+    extrator = ExtratorInformacoes(carregar_info=carregar)
+    thread = threading.Thread(target=extrator.processar, args=('lenta', 'oi'))
+    thread.start()
+    assert carregando.wait(2)
+    terminou = threading.Event()
+    threading.Thread(target=lambda: (extrator.processar('rapida', 'Me chamo Bia'), terminou.set())).start()
+    assert terminou.wait(1)
+    liberar.set()
+    thread.join()
+
+
+def test_primeiras_mensagens_simultaneas_compartilham_o_estado():
+    barreira = threading.Barrier(8)
+
+    def carregar(user_id):
+        # Todas as threads carregam ao mesmo tempo; só um dos estados pode ficar
+        barreira.wait(2)
+        return None
+
+    extrator = ExtratorInformacoes(carregar_info=carregar)
+    estados = []
+    threads = [threading.Thread(target=lambda: estados.append(extrator._estado('u'))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(estados) == 8
+    assert all(estado is estados[0] for estado in estados)
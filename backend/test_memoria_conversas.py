@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+"""Testes dos backends de conversas (memoria_conversas.py): limites, SQLite e Redis (RESP)"""
+
+import importlib.util
+import os
+import socket
+import threading
+import time
+import types
+
+import pytest
+
+import memoria_conversas
+from memoria_conversas import ArmazemConversas, ClienteRESP, ConversasRedis, ConversasSQLite, ErroRESP
+
+
+@pytest.fixture
+def relogio(monkeypatch):
+    """Relógio controlado pelo teste no lugar de time.monotonic()"""
+    agora = [1000.0]
+    monkeypatch.setattr(memoria_conversas, 'time', types.SimpleNamespace(monotonic=lambda: agora[0]))
+    return agora
+
+
+def turno(texto):
+    return {'timestamp': '2026-01-01T00:00:00', 'pergunta': texto, 'resposta': texto}
+
+
+def test_limite_de_turnos_mantem_os_mais_recentes(relogio):
+    armazem = ArmazemConversas(max_turnos=3, max_usuarios=10, ttl_segundos=60, max_bytes=0)
+    for i in range(5):
+        armazem.adicionar('u', turno(str(i)))
+    assert [t['pergunta'] for t in armazem.obter('u')] == ['2', '3', '4']
+    assert armazem.estatisticas()['evicoes']['turnos'] == 2
+
+
+def test_lru_remove_a_conversa_menos_recente(relogio):
+    removidas = []
+    armazem = ArmazemConversas(max_turnos=10, max_usuarios=2, ttl_segundos=60, max_bytes=0,
+                               ao_remover=removidas.append)
+    armazem.adicionar('a', turno('1'))
+    armazem.adicionar('b', turno('1'))
+    # Ler 'a' conta como acesso: quem sai é 'b'
+    armazem.obter('a')
+    armazem.adicionar('c', turno('1'))
+    assert 'b' not in armazem
+    assert 'a' in armazem and 'c' in armazem
+    assert removidas == ['b']
+
+
+def test_ttl_expira_conversas_paradas(relogio):
+    removidas = []
+    armazem = ArmazemConversas(max_turnos=10, max_usuarios=10, ttl_segundos=60, max_bytes=0,
+                               ao_remover=removidas.append)
+    armazem.adicionar('parada', turno('1'))
+    relogio[0] += 30
+    armazem.adicionar('ativa', turno('1'))
+    relogio[0] += 31
+    assert armazem.obter('parada') == []
+    assert len(armazem.obter('ativa')) == 1
+    assert removidas == ['parada']
+    assert armazem.estatisticas()['evicoes']['ttl'] == 1
+
+
+def test_orcamento_de_memoria_nunca_remove_a_conversa_atual(relogio):
+    armazem = ArmazemConversas(max_turnos=100, max_usuarios=100, ttl_segundos=0, max_bytes=2000)
+    armazem.adicionar('antiga', turno('x' * 300))
+    for i in range(10):
+        armazem.adicionar('atual', turno('y' * 300))
+    estatisticas = armazem.estatisticas()
+    assert 'antiga' not in armazem
+    assert estatisticas['bytes'] <= 2000
+    # Sobra pelo menos o último turno da conversa atual
+    assert armazem.obter('atual')[-1]['pergunta'] == 'y' * 300
+
+
+def test_limpar_desconta_turnos_e_bytes(relogio):
+    armazem = ArmazemConversas(max_turnos=10, max_usuarios=10, ttl_segundos=60, max_bytes=0)
+    armazem.adicionar('a', turno('1'))
+    armazem.adicionar('a', turno('2'))
+    armazem.adicionar('b', turno('1'))
+    assert armazem.limpar('a') == 2
+    estatisticas = armazem.estatisticas()
+    assert estatisticas['turnos'] == 1
+    assert armazem.limpar_tudo() == 1
+    assert armazem.estatisticas()['bytes'] == 0
+
+
+# ---- Backends compartilhados (CONVERSAS_BACKEND=sqlite/redis)
+
+def carregar_servidor_resp():
+    caminho = os.path.join(os.path.dirname(__file__), '..', 'scripts', 'servidor_resp_local.py')
+    especificacao = importlib.util.spec_from_file_location('servidor_resp_local', caminho)
+    modulo = importlib.util.module_from_spec(especificacao)
+    especificacao.loader.exec_module(modulo)
+    return modulo
+
+
+@pytest.fixture
+def servidor_resp():
+    servidor = carregar_servidor_resp().ServidorResp(('127.0.0.1', 0))
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    yield servidor
+    servidor.shutdown()
+    servidor.server_close()
+
+
+def url_resp(servidor):
+    return f'redis://127.0.0.1:{servidor.server_address[1]}/0'
+
+
+def test_sqlite_limite_de_turnos_e_ttl(tmp_path):
+    armazem = ConversasSQLite(caminho=str(tmp_path / 'conversas.db'), max_turnos=3, max_usuarios=10, ttl_segundos=60)
+    for i in range(5):
+        armazem.adicionar('u', turno(str(i)))
+    assert [t['pergunta'] for t in armazem.obter('u')] == ['2', '3', '4']
+    assert armazem.estatisticas()['evicoes']['turnos'] == 2
+    armazem.ttl_segundos = 0.01
+    time.sleep(0.02)
+    assert armazem.obter('u') == []
+    assert armazem.estatisticas()['evicoes']['ttl'] == 1
+
+
+def test_sqlite_contador_de_evicoes_entre_threads(tmp_path):
+    armazem = ConversasSQLite(caminho=str(tmp_path / 'conversas.db'), max_turnos=1, max_usuarios=100, ttl_segundos=60)
+
+    def escrever(user_id):
+        for i in range(20):
+            armazem.adicionar(user_id, turno(str(i)))
+
+    threads = [threading.Thread(target=escrever, args=(f'u{n}',)) for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # Cada usuária ficou com 1 turno: 19 removidos de cada
+    assert armazem.estatisticas()['evicoes']['turnos'] == 4 * 19
+
+
+def test_redis_corta_e_expira_na_mesma_transacao(servidor_resp):
+    armazem = ConversasRedis(url=url_resp(servidor_resp), prefixo='t:', max_turnos=3, ttl_segundos=60)
+    for i in range(5):
+        armazem.adicionar('u', turno(str(i)))
+    assert [t['pergunta'] for t in armazem.obter('u')] == ['2', '3', '4']
+    assert b't:u' in servidor_resp.banco.expira_em
+    estatisticas = armazem.estatisticas()
+    assert estatisticas['evicoes'] == {'turnos': 2}
+    # Sem SCAN/LLEN por chave no /health e no /metrics
+    assert 'usuarios' not in estatisticas and 'turnos' not in estatisticas
+    assert armazem.limpar('u') == 3
+
+
+def test_redis_transacao_abortada_nao_aplica_nada(servidor_resp):
+    cliente = ClienteRESP(url_resp(servidor_resp))
+    with pytest.raises(ErroRESP):
+        cliente.transacao(('RPUSH', 'k', 'v'), ('COMANDO_INEXISTENTE', 'k'))
+    assert cliente.executar('LLEN', 'k') == 0
+    assert cliente.transacao(('RPUSH', 'k', 'a', 'b'), ('LTRIM', 'k', -1, -1)) == [2, 'OK']
+    assert cliente.executar('LRANGE', 'k', 0, -1) == ['b']
+
+
+def test_redis_nao_reenvia_escrita_sem_resposta():
+    # Servidor que recebe o comando e fecha a conexão sem responder na primeira vez
+    servidor = socket.socket()
+    servidor.bind(('127.0.0.1', 0))
+    servidor.listen(5)
+    recebidos = []
+
+    def atender():
+        for numero in range(3):
+            conexao, _ = servidor.accept()
+            recebidos.append(conexao.recv(4096).split(b'\r\n')[2])
+            if numero:
+                conexao.sendall(b':1\r\n')
+            conexao.close()
+
+    threading.Thread(target=atender, daemon=True).start()
+    cliente = ClienteRESP(f'redis://127.0.0.1:{servidor.getsockname()[1]}/0')
+    with pytest.raises(ConnectionError):
+        cliente.executar('RPUSH', 'k', 'v')
+    assert recebidos == [b'RPUSH']
+    # Leitura na conexão que o servidor fechou: reenviada em outra conexão
+    assert cliente.executar('LLEN', 'k') == 1
+    assert cliente.executar('LLEN', 'k') == 1
+    assert recebidos == [b'RPUSH', b'LLEN', b'LLEN']
+    servidor.close()
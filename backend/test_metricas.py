@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""Testes das métricas do /metrics (metricas.py), inclusive a soma entre processos"""
+
+import os
+
+import pytest
+
+from metricas import RegistroMetricas
+
+
+def amostras(texto):
+    """Linhas de valores do texto de exposição -> {nome{rotulos}: valor}"""
+    valores = {}
+    for linha in texto.splitlines():
+        if linha and not linha.startswith('#'):
+            nome, valor = linha.rsplit(' ', 1)
+            valores[nome] = float(valor)
+    return valores
+
+
+def test_formato_do_texto_de_exposicao():
+    registro = RegistroMetricas(prefixo='t_')
+    contador = registro.contador('pedidos_total', 'Pedidos', ('rota',))
+    histograma = registro.histograma('latencia_segundos', 'Latência', buckets=(0.1, 1))
+    contador.inc(rota='/chat')
+    contador.inc(2, rota='/chat')
+    for segundos in (0.05, 0.5, 5):
+        histograma.observar(segundos)
+    texto = registro.exportar()
+    assert '# TYPE t_pedidos_total counter' in texto
+    valores = amostras(texto)
+    assert valores['t_pedidos_total{rota="/chat"}'] == 3
+    # Buckets acumulados, com +Inf igual à contagem
+    assert valores['t_latencia_segundos_bucket{le="0.1"}'] == 1
+    assert valores['t_latencia_segundos_bucket{le="1"}'] == 2
+    assert valores['t_latencia_segundos_bucket{le="+Inf"}'] == 3
+    assert valores['t_latencia_segundos_count'] == 3
+    assert valores['t_latencia_segundos_sum'] == pytest.approx(5.55)
+
+
+def test_coleta_com_erro_nao_derruba_a_exportacao():
+    registro = RegistroMetricas()
+    medidor = registro.medidor('fila', 'Fila')
+
+    @registro.coleta
+    def quebrada():
+        raise ConnectionError('redis fora do ar')
+
+    @registro.coleta
+    def fila():
+        medidor.definir(7)
+
+    assert amostras(registro.exportar())['fila'] == 7
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='precisa de os.fork')
+def test_soma_entre_processos(tmp_path):
+    registro = RegistroMetricas(prefixo='t_', diretorio=str(tmp_path))
+    contador = registro.contador('chats_total', 'Chats')
+    soma = registro.medidor('conexoes', 'Conexões abertas')
+    maximo = registro.medidor('fila', 'Fila compartilhada', agregacao='max')
+    histograma = registro.histograma('latencia_segundos', 'Latência', buckets=(1,))
+
+    contador.inc(5)
+    soma.definir(1)
+    maximo.definir(3)
+    histograma.observar(0.5)
+    registro.gravar()
+
+    # Workers que contam, gravam o próprio arquivo e saem
+    for i in range(3):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                # O filho começa do zero: o que o pai contou está no arquivo do pai
+                contador.inc(10)
+                soma.definir(100)
+                maximo.definir(50)
+                histograma.observar(2)
+                registro.gravar()
+            finally:
+                os._exit(0)
+        os.waitpid(pid, 0)
+
+    arquivos = sorted(os.listdir(tmp_path))
+    assert len(arquivos) == 4
+    # Um arquivo por processo, com nome único mesmo que o pid se repita
+    assert len({nome.split('-', 1)[1] for nome in arquivos}) == 4
+
+    valores = amostras(registro.exportar())
+    # Contadores e histogramas somam inclusive os workers que já saíram
+    assert valores['t_chats_total'] == 35
+    assert valores['t_latencia_segundos_count'] == 4
+    assert valores['t_latencia_segundos_bucket{le="1"}'] == 1
+    # Medidores só contam processos vivos (aqui, só o pai)
+    assert valores['t_conexoes'] == 1
+    assert valores['t_fila'] == 3
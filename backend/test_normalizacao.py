@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+"""Testes da normalização de mensagens (normalizacao.py)"""
+
+from normalizacao import MensagemNormalizada, dobrar, normalizar_mensagem, radical, remover_acentos
+
+
+def test_remover_acentos_e_dobrar():
+    assert remover_acentos('preocupação') == 'preocupacao'
+    assert remover_acentos('Bebê, neném!') == 'Bebe, nenem!'
+    assert dobrar('ÉPOCA de Cólica') == 'epoca de colica'
+
+
+def test_dobrar_nao_retem_mensagens():
+    assert not hasattr(dobrar, 'cache_info')
+
+
+def test_radical_junta_flexoes():
+    assert radical('preocupada') == radical('preocupado')
+    assert radical('mamadas') == radical('mamada')
+    assert radical('amamentacao') == radical('amamentacoes')
+    # Palavras curtas ficam como estão
+    assert radical('dor') == 'dor'
+
+
+def test_mensagem_normalizada():
+    mensagem = MensagemNormalizada('  Estou PREOCUPADA com a Cólica  ')
+    assert mensagem.texto == 'estou preocupada com a cólica'
+    assert mensagem.texto_sem_acento == 'estou preocupada com a colica'
+    assert mensagem.tokens == ['estou', 'preocupada', 'com', 'a', 'colica']
+    assert str(mensagem) == '  Estou PREOCUPADA com a Cólica  '
+    assert mensagem.contem('cólica') and mensagem.contem('COLICA')
+    assert mensagem.contem_algum(['febre', 'preocupada'])
+    assert not mensagem.igual_a_algum(['oi'])
+    assert mensagem.comeca_com_algum(['estou '])
+
+
+def test_radicais_calculados_sob_demanda():
+    mensagem = MensagemNormalizada('mamadas de madrugada')
+    assert mensagem._radicais is None
+    assert radical('mamadas') in mensagem.radicais
+    assert mensagem.radicais is mensagem.radicais
+
+
+def test_normalizar_mensagem_reaproveita_o_objeto():
+    mensagem = MensagemNormalizada('oi')
+    assert normalizar_mensagem(mensagem) is mensagem
+    assert normalizar_mensagem(None).texto == ''
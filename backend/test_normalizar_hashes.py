@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""Testes da detecção de formato de password_hash (senhas.py) e da normalização (normalizar_hashes.py)"""
+
+import base64
+import sqlite3
+
+import bcrypt
+import pytest
+
+from normalizar_hashes import normalize_password_hashes
+from senhas import (FORMATO_HASH_BYTES, FORMATO_HASH_CANONICO, FORMATO_HASH_INVALIDO, FORMATO_HASH_TEXTO,
+                    codificar_hash, decodificar_hash, detectar_formato_hash)
+
+HASH = bcrypt.hashpw(b'Senha123!', bcrypt.gensalt(4))
+
+
+@pytest.mark.parametrize('valor, formato', [
+    (codificar_hash(HASH), FORMATO_HASH_CANONICO),
+    (HASH.decode('utf-8'), FORMATO_HASH_TEXTO),
+    (HASH, FORMATO_HASH_BYTES),
+    (bytearray(HASH), FORMATO_HASH_BYTES),
+])
+def test_detecta_os_formatos_validos(valor, formato):
+    assert detectar_formato_hash(valor) == (formato, HASH)
+
+
+@pytest.mark.parametrize('valor', [
+    None, '', b'', 'nao e base64!', base64.b64encode(b'outra coisa').decode('utf-8'), b'texto qualquer',
+])
+def test_detecta_hash_invalido(valor):
+    assert detectar_formato_hash(valor) == (FORMATO_HASH_INVALIDO, None)
+
+
+def test_decodificar_hash():
+    canonico = codificar_hash(HASH)
+    assert decodificar_hash(canonico, FORMATO_HASH_CANONICO) == HASH
+    # Sem o formato (linha antiga), detecta
+    assert decodificar_hash(HASH.decode('utf-8')) == HASH
+    assert decodificar_hash('lixo') is None
+
+
+@pytest.fixture
+def banco(tmp_path):
+    caminho = str(tmp_path / 'users.db')
+    conn = sqlite3.connect(caminho)
+    conn.execute('CREATE TABLE users (id INTEGER PRIMARY KEY, email TEXT, password_hash TEXT)')
+    conn.executemany('INSERT INTO users (email, password_hash) VALUES (?, ?)', [
+        ('canonico@x.com', codificar_hash(HASH)),
+        ('texto@x.com', HASH.decode('utf-8')),
+        ('bytes@x.com', HASH),
+        ('invalido@x.com', 'lixo'),
+    ])
+    conn.commit()
+    conn.close()
+    return caminho
+
+
+def linhas(caminho):
+    conn = sqlite3.connect(caminho)
+    try:
+        colunas = [coluna[1] for coluna in conn.execute('PRAGMA table_info(users)')]
+        selecionadas = 'password_hash, hash_format' if 'hash_format' in colunas else 'password_hash'
+        return colunas, conn.execute(f'SELECT {selecionadas} FROM users ORDER BY id').fetchall()
+    finally:
+        conn.close()
+
+
+def test_simular_nao_altera_o_banco(banco):
+    antes = linhas(banco)
+    formatos = normalize_password_hashes(simular=True, caminho=banco)
+    assert formatos == {FORMATO_HASH_CANONICO: 1, FORMATO_HASH_TEXTO: 1, FORMATO_HASH_BYTES: 1,
+                        FORMATO_HASH_INVALIDO: 1}
+    # Nem os hashes nem o esquema (a coluna hash_format não é criada)
+    assert linhas(banco) == antes
+    assert 'hash_format' not in antes[0]
+
+
+def test_normaliza_para_o_formato_canonico(banco):
+    normalize_password_hashes(caminho=banco)
+    colunas, registros = linhas(banco)
+    assert 'hash_format' in colunas
+    assert registros == [(codificar_hash(HASH), FORMATO_HASH_CANONICO)] * 3 + [('lixo', FORMATO_HASH_INVALIDO)]
+    # Rodar de novo não muda nada
+    normalize_password_hashes(caminho=banco)
+    assert linhas(banco)[1] == registros
+
+
+def test_banco_inexistente(tmp_path):
+    assert normalize_password_hashes(caminho=str(tmp_path / 'nao_existe.db')) is None
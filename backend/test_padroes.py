@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""Testes do registro de regex de informações pessoais (padroes.py)"""
+
+import re
+
+import pytest
+
+from padroes import (PADROES_BEBE, PADROES_NOME, PADROES_PROJETO, RE_APOS_VIRGULA, extrair_informacoes,
+                     extrair_nome, extrair_nome_bebe, menciona_projeto, nome_valido)
+
+
+def nome_original(texto):
+    """A extração antiga: padrões crus com re.IGNORECASE sobre o texto original"""
+    for padrao in PADROES_NOME:
+        for match in re.finditer(padrao, texto, re.IGNORECASE):
+            candidato = RE_APOS_VIRGULA.sub('', match.group(1).strip()).strip()
+            if nome_valido(candidato):
+                return candidato
+    return None
+
+
+def bebe_original(texto):
+    for padrao in PADROES_BEBE:
+        match = re.search(padrao, texto, re.IGNORECASE)
+        if match:
+            return match.group(1).strip()
+    return None
+
+
+def projeto_original(texto):
+    return any(re.search(padrao, texto, re.IGNORECASE) for padrao in PADROES_PROJETO)
+
+
+TEXTOS = [
+    'Oi, me chamo Ana Paula',
+    'Eu sou o Bruno Cartolano, seu criador',
+    'eu sou a Maria',
+    'Meu nome é Júlia e estou cansada',
+    'Eu sou Sophia',
+    'meu bebê se chama Leo',
+    'Minha filha chama Alice Maria',
+    'o neném é Pedro',
+    'Estou criando um site para ajudar mães',
+    'criei um chatbot',
+    'quero desenvolver uma plataforma',
+    'estou com cólica e febre',
+    'MEU NOME É CARLA',
+    'İstanbul: me chamo Ana',  # lower() muda o tamanho: usa os padrões com IGNORECASE
+    '',
+]
+
+
+@pytest.mark.parametrize('texto', TEXTOS)
+def test_igual_a_extracao_original(texto):
+    assert extrair_nome(texto) == (nome_original(texto) if texto else None)
+    assert extrair_nome_bebe(texto) == (bebe_original(texto) if texto else None)
+    assert menciona_projeto(texto) == (projeto_original(texto) if texto else False)
+
+
+def test_extrair_informacoes():
+    assert extrair_informacoes('Me chamo Ana, meu bebê se chama Leo e estou criando um site') == ('Ana', 'Leo', True)
+    assert extrair_informacoes('estou tão cansada hoje') == (None, None, False)
+    assert extrair_informacoes('') == (None, None, False)
+
+
+def test_nome_preserva_maiusculas_do_original():
+    assert extrair_nome('me chamo ANA') == 'ANA'
+
+
+def test_palavras_comuns_nao_viram_nome():
+    assert extrair_nome('eu sou Sophia') is None
+    assert not nome_valido('A')
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""Testes do pool de conexões SMTP (pool_smtp.py)"""
+
+import smtplib
+import threading
+import types
+
+import pytest
+
+import pool_smtp
+from pool_smtp import PoolSMTP
+
+
+class ConexaoFalsa:
+    """Imita a conexão do Flask-Mail: __enter__ autentica, send envia, __exit__ encerra"""
+
+    def __init__(self, servidor):
+        self.servidor = servidor
+        self.aberta = False
+        self.derrubada = False
+
+    def __enter__(self):
+        if self.servidor.recusar_login:
+            raise smtplib.SMTPAuthenticationError(535, b'senha errada')
+        self.aberta = True
+        return self
+
+    def __exit__(self, *args):
+        self.aberta = False
+        self.servidor.encerradas += 1
+
+    def send(self, msg):
+        if self.derrubada:
+            raise smtplib.SMTPServerDisconnected('Connection unexpectedly closed')
+        if msg in self.servidor.recusadas:
+            raise smtplib.SMTPRecipientsRefused({msg: (550, b'nao existe')})
+        self.servidor.entregues.append(msg)
+
+
+class ServidorFalso:
+    def __init__(self):
+        self.conexoes = []
+        self.entregues = []
+        self.recusadas = set()
+        self.recusar_login = False
+        self.encerradas = 0
+
+    def abrir(self):
+        conexao = ConexaoFalsa(self)
+        self.conexoes.append(conexao)
+        return conexao
+
+
+@pytest.fixture
+def servidor():
+    return ServidorFalso()
+
+
+@pytest.fixture
+def relogio(monkeypatch):
+    agora = [0.0]
+    monkeypatch.setattr(pool_smtp, 'time', types.SimpleNamespace(monotonic=lambda: agora[0]))
+    return agora
+
+
+def test_reutiliza_a_conexao_entre_lotes(servidor, relogio):
+    pool = PoolSMTP(servidor.abrir, tamanho=2, ocioso_max=60)
+    assert pool.enviar(['a', 'b']) == [None, None]
+    assert pool.enviar(['c']) == [None]
+    assert servidor.entregues == ['a', 'b', 'c']
+    assert len(servidor.conexoes) == 1
+    estatisticas = pool.estatisticas()
+    assert (estatisticas['conexoes_abertas'], estatisticas['reutilizacoes'], estatisticas['livres']) == (1, 1, 1)
+
+
+def test_descarta_conexao_ociosa_demais(servidor, relogio):
+    pool = PoolSMTP(servidor.abrir, tamanho=2, ocioso_max=60)
+    pool.enviar(['a'])
+    relogio[0] = 61
+    pool.enviar(['b'])
+    assert len(servidor.conexoes) == 2
+    assert not servidor.conexoes[0].aberta
+    assert pool.estatisticas()['descartadas'] == 1
+
+
+def test_reconecta_quando_o_servidor_derruba_a_conexao(servidor, relogio):
+    pool = PoolSMTP(servidor.abrir, tamanho=2, ocioso_max=60)
+    pool.enviar(['a'])
+    servidor.conexoes[0].derrubada = True
+    assert pool.enviar(['b', 'c']) == [None, None]
+    assert servidor.entregues == ['a', 'b', 'c']
+    assert len(servidor.conexoes) == 2
+    assert pool.estatisticas()['reconexoes'] == 1
+    # A conexão nova é a que volta para o pool
+    assert pool.livres[0][0] is servidor.conexoes[1]
+
+
+def test_falha_na_reconexao_falha_o_restante_do_lote(servidor, relogio):
+    pool = PoolSMTP(servidor.abrir, tamanho=2, ocioso_max=60)
+    pool.enviar(['a'])
+    servidor.conexoes[0].derrubada = True
+    servidor.recusar_login = True
+    erros = pool.enviar(['b', 'c'])
+    assert all(isinstance(erro, smtplib.SMTPAuthenticationError) for erro in erros)
+    assert pool.estatisticas()['livres'] == 0
+
+
+def test_erro_de_um_destinatario_nao_derruba_o_lote(servidor, relogio):
+    pool = PoolSMTP(servidor.abrir, tamanho=2, ocioso_max=60)
+    servidor.recusadas.add('b')
+    erros = pool.enviar(['a', 'b', 'c'])
+    assert erros[0] is None and erros[2] is None
+    assert isinstance(erros[1], smtplib.SMTPRecipientsRefused)
+    assert pool.estatisticas()['livres'] == 1
+
+
+def test_sem_conexao_todas_as_mensagens_falham(servidor, relogio):
+    pool = PoolSMTP(servidor.abrir, tamanho=2, ocioso_max=60)
+    servidor.recusar_login = True
+    erros = pool.enviar(['a', 'b'])
+    assert len(erros) == 2 and all(isinstance(erro, smtplib.SMTPAuthenticationError) for erro in erros)
+    assert servidor.entregues == []
+
+
+def test_limita_as_conexoes_em_uso(servidor, relogio):
+    pool = PoolSMTP(servidor.abrir, tamanho=1, ocioso_max=60)
+    segunda_terminou = threading.Event()
+    with pool.conexao():
+        thread = threading.Thread(target=lambda: (pool.enviar(['b']), segunda_terminou.set()))
+        thread.start()
+        # Com a única vaga emprestada, o outro envio espera
+        assert not segunda_terminou.wait(0.1)
+    thread.join(1)
+    assert segunda_terminou.is_set()
+    assert len(servidor.conexoes) == 1
+
+
+def test_conexao_com_erro_e_descartada_e_fechar_encerra_as_livres(servidor, relogio):
+    pool = PoolSMTP(servidor.abrir, tamanho=2, ocioso_max=60)
+    with pytest.raises(RuntimeError):
+        with pool.conexao():
+            raise RuntimeError
+    assert pool.estatisticas()['livres'] == 0
+    assert servidor.encerradas == 1
+
+    pool.enviar(['a'])
+    pool.fechar()
+    assert pool.estatisticas()['livres'] == 0
+    assert servidor.encerradas == 2
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""Testes do serviço de senhas (senhas.py): bcrypt no pool, fila limitada e limite de tentativas"""
+
+import threading
+import types
+
+import pytest
+
+import senhas
+from senhas import FilaSenhasCheia, JanelaTentativas, LimiteTentativas, ServicoSenhas
+
+
+@pytest.fixture
+def relogio(monkeypatch):
+    agora = [0.0]
+    monkeypatch.setattr(senhas, 'time', types.SimpleNamespace(monotonic=lambda: agora[0],
+                                                              perf_counter=lambda: agora[0]))
+    return agora
+
+
+@pytest.fixture
+def servico():
+    servico = ServicoSenhas(num_workers=1, max_fila=0, timeout=1.0, limite_ip=3, limite_email=2,
+                            janela=60.0, rounds=4)
+    yield servico
+    servico.executor.shutdown(wait=True)
+
+
+def ocupar(servico):
+    """Prende a única thread do pool até o evento devolvido ser sinalizado"""
+    liberar = threading.Event()
+    comecou = threading.Event()
+
+    def bloquear():
+        comecou.set()
+        liberar.wait(5)
+
+    thread = threading.Thread(target=servico._executar, args=(bloquear,))
+    thread.start()
+    assert comecou.wait(5)
+    return liberar, thread
+
+
+def test_gera_e_verifica_hash(servico):
+    hash_senha = servico.gerar_hash('Senha123!')
+    assert hash_senha.startswith(b'$2')
+    assert servico.verificar('Senha123!', hash_senha)
+    assert not servico.verificar('errada', hash_senha)
+    estatisticas = servico.estatisticas()
+    assert (estatisticas['hashes'], estatisticas['verificacoes'], estatisticas['fila']) == (1, 2, 0)
+    assert 'latencia_ms' in estatisticas
+
+
+def test_admitir_limita_por_ip_e_por_email(servico, relogio):
+    servico.admitir('1.1.1.1', 'Ana@x.com')
+    servico.admitir('1.1.1.1', 'ana@x.com')
+    # O email (sem diferenciar maiúsculas) chegou ao limite, mesmo vindo de outro IP
+    with pytest.raises(LimiteTentativas) as recusa:
+        servico.admitir('2.2.2.2', 'ana@x.com')
+    assert recusa.value.status == 429
+    assert recusa.value.retry_after == 60
+
+    servico.admitir('1.1.1.1', 'bia@x.com')
+    with pytest.raises(LimiteTentativas):
+        servico.admitir('1.1.1.1', 'carla@x.com')
+    assert servico.estatisticas()['recusas_limite'] == 2
+
+    # A janela desliza: passado o minuto as tentativas antigas deixam de contar
+    relogio[0] = 60.0
+    servico.admitir('1.1.1.1', 'ana@x.com')
+
+
+def test_tentativa_recusada_nao_conta(servico, relogio):
+    servico.admitir('1.1.1.1', 'ana@x.com')
+    servico.admitir('1.1.1.1', 'ana@x.com')
+    for _ in range(5):
+        with pytest.raises(LimiteTentativas):
+            servico.admitir('1.1.1.1', 'ana@x.com')
+    # As recusas pelo email não gastaram o limite do IP
+    servico.admitir('1.1.1.1', 'bia@x.com')
+    assert len(servico.por_ip.eventos['1.1.1.1']) == 3
+
+
+def test_janela_tentativas_guarda_poucas_chaves():
+    janela = JanelaTentativas(limite=1, janela=60, max_chaves=2)
+    for chave in ('a', 'b', 'c'):
+        janela.registrar(chave, 0)
+    assert list(janela.eventos) == ['b', 'c']
+    assert janela.espera('c', 10) == 50
+    assert janela.espera('a', 10) == 0
+
+
+def test_fila_cheia_recusa_na_hora(servico):
+    liberar, thread = ocupar(servico)
+    try:
+        with pytest.raises(FilaSenhasCheia) as recusa:
+            servico._executar(lambda: None)
+        assert recusa.value.status == 503
+        assert servico.estatisticas()['recusas_fila'] == 1
+    finally:
+        liberar.set()
+        thread.join(5)
+    # Terminado o hash, a vaga volta
+    assert servico._executar(lambda: 'ok') == 'ok'
+
+
+def test_timeout_so_na_espera_da_fila():
+    servico = ServicoSenhas(num_workers=1, max_fila=1, timeout=0.05)
+    try:
+        liberar, thread = ocupar(servico)
+        try:
+            # Esperou na fila além do timeout sem começar: recusada e a vaga é devolvida
+            with pytest.raises(FilaSenhasCheia):
+                servico._executar(lambda: None)
+            assert servico.estatisticas()['recusas_fila'] == 1
+            assert servico.pendentes == 1
+        finally:
+            liberar.set()
+            thread.join(5)
+
+        # Uma operação que já começou vai até o fim, mesmo passando do timeout
+        assert servico._executar(lambda: threading.Event().wait(0.2) or 'fim') == 'fim'
+    finally:
+        servico.executor.shutdown(wait=True)
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark da extração de informações pessoais
+Compara os padrões passados como string crua a cada chamada (implementação antiga)
+com o registro de padrões compilados de backend/padroes.py
+
+Uso (na raiz do projeto): python scripts/benchmark_extracao.py [repeticoes]
+"""
+
+import re
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from padroes import (  # noqa: E402
+    PADROES_BEBE, PADROES_NOME, PADROES_PROJETO, PALAVRAS_COMUNS_NOME,
+    extrair_informacoes,
+)
+
+TEXTOS = [
+    "Oi Sophia, tudo bem?",
+    "Eu sou a Maria, sua usuária",
+    "Me chamo Ana Paula e estou muito cansada",
+    "Meu bebê se chama Pedro e não dorme à noite",
+    "Estou criando um site para ajudar mães no puerpério",
+    "O que é baby blues? Tenho chorado muito desde o parto e não sei se é normal",
+    "Como faço para aumentar a produção de leite materno?",
+    "Eu sou o Bruno Cartolano, seu criador",
+]
+# Texto de uma conversa longa (pergunta atual + histórico), como em extrair_informacoes_pessoais
+HISTORICO = " ".join(TEXTOS * 10)
+
+
+def extrair_antigo(texto):
+    """Cópia da implementação anterior: padrões crus em re.finditer/re.search a cada chamada"""
+    nome_usuario = None
+    for pattern in PADROES_NOME:
+        for match in re.finditer(pattern, texto, re.IGNORECASE):
+            nome_candidato = re.sub(r',.*$', '', match.group(1).strip()).strip()
+            if len(nome_candidato) >= 2 and nome_candidato.lower() not in PALAVRAS_COMUNS_NOME and not any(pal in nome_candidato.lower() for pal in PALAVRAS_COMUNS_NOME):
+                nome_usuario = nome_candidato
+                break
+        if nome_usuario:
+            break
+    nome_bebe = None
+    for pattern in PADROES_BEBE:
+        match = re.search(pattern, texto, re.IGNORECASE)
+        if match:
+            nome_bebe = match.group(1).strip()
+            break
+    tem_projeto = any(re.search(pattern, texto.lower(), re.IGNORECASE) for pattern in PADROES_PROJETO)
+    return nome_usuario, nome_bebe, tem_projeto
+
+
+def extrair_novo(texto):
+    """Implementação atual: registro de padrões compilados com pré-filtro literal"""
+    return extrair_informacoes(texto)
+
+
+def medir(funcao, textos, repeticoes):
+    """Retorna o tempo médio por chamada em microssegundos"""
+    total = timeit.timeit(lambda: [funcao(t) for t in textos], number=repeticoes)
+    return total / (repeticoes * len(textos)) * 1e6
+
+
+def main():
+    repeticoes = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+
+    # Os dois lados precisam produzir o mesmo resultado
+    for texto in TEXTOS + [HISTORICO]:
+        assert extrair_antigo(texto) == extrair_novo(texto), texto
+
+    print(f"[BENCHMARK] {repeticoes} repetições")
+    for rotulo, textos, reps in (("mensagens curtas", TEXTOS, repeticoes),
+                                 ("histórico completo", [HISTORICO], max(1, repeticoes // 4))):
+        antigo = medir(extrair_antigo, textos, reps)
+        novo = medir(extrair_novo, textos, reps)
+        print(f"  {rotulo:20s} antigo: {antigo:8.2f} µs/chamada | compilado: {novo:8.2f} µs/chamada | {antigo / novo:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
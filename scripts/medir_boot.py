@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Mede o cold start do app: tempo de `import wsgi` num interpretador novo, com e sem
+APP_FAST_BOOT, e o tempo até a primeira resposta do /health (que no boot rápido inclui
+a leitura dos JSON). Cada rodada é um processo novo, como um worker do gunicorn.
+
+Uso: python scripts/medir_boot.py [rodadas]   (padrão: 7)
+"""
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Roda no processo filho: mede o import e a primeira requisição, imprime JSON na última linha
+MEDICAO = '''
+import contextlib, io, json, time
+inicio = time.perf_counter()
+with contextlib.redirect_stdout(io.StringIO()):
+    import wsgi
+importado = time.perf_counter()
+with contextlib.redirect_stdout(io.StringIO()):
+    status = wsgi.app.test_client().get('/health').status_code
+respondido = time.perf_counter()
+print(json.dumps({"import": importado - inicio, "primeira_requisicao": respondido - importado, "status": status}))
+'''
+
+
+def medir(fast_boot, rodadas):
+    env = dict(os.environ, APP_FAST_BOOT='true' if fast_boot else 'false', GEMINI_AQUECER='false')
+    env.pop('APP_DIAGNOSTICO', None)
+    medidas = []
+    for _ in range(rodadas):
+        saida = subprocess.run([sys.executable, '-c', MEDICAO], cwd=RAIZ, env=env,
+                               capture_output=True, text=True, check=True)
+        medidas.append(json.loads(saida.stdout.strip().splitlines()[-1]))
+    return medidas
+
+
+def resumo(valores):
+    return (f"mediana {statistics.median(valores) * 1000:7.1f} ms   "
+            f"mín {min(valores) * 1000:7.1f} ms   máx {max(valores) * 1000:7.1f} ms")
+
+
+def main():
+    rodadas = int(sys.argv[1]) if len(sys.argv) > 1 else 7
+    # Garante o banco migrado, como o start.sh faz antes de subir os workers
+    subprocess.run([sys.executable, '-m', 'flask', '--app', 'wsgi', 'migrar'], cwd=RAIZ,
+                   env=dict(os.environ, APP_FAST_BOOT='true'), capture_output=True, check=True)
+    print(f"Cold start de wsgi:app ({rodadas} processos por modo, Python {sys.version.split()[0]})")
+    for nome, fast_boot in (("padrão", False), ("APP_FAST_BOOT", True)):
+        medidas = medir(fast_boot, rodadas)
+        print(f"\n{nome}")
+        print(f"  import wsgi          {resumo([m['import'] for m in medidas])}")
+        print(f"  primeiro /health     {resumo([m['primeira_requisicao'] for m in medidas])}")
+        print(f"  import + /health     {resumo([m['import'] + m['primeira_requisicao'] for m in medidas])}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Servidor falso da API do Gemini (REST), com latência e erros 429 injetados.
+Responde generateContent e streamGenerateContent (array JSON ou ?alt=sse) no formato da
+API v1beta, o suficiente para o SDK google-generativeai com transport='rest'. Serve para
+testar o prazo, o hedge e o disjuntor de backend/gateway_gemini.py sem gastar quota.
+
+Uso: python scripts/servidor_gemini_local.py [--porta 8089] [--latencia 0.5] [--variacao 0.5]
+                                             [--taxa-429 0.2] [--lentas 0.1 --latencia-lenta 8]
+Depois: GEMINI_API_KEY=qualquer GEMINI_API_ENDPOINT=http://127.0.0.1:8089
+"""
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+RESPOSTA_PADRAO = "Entendo você, querida. 💛 Estou aqui para te ouvir. Quer me contar mais?"
+
+ERRO_429 = {"error": {"code": 429, "message": "Resource has been exhausted (e.g. check quota).",
+                      "status": "RESOURCE_EXHAUSTED"}}
+
+ROTA = re.compile(r'^/v1beta/models/([^/:]+):(generateContent|streamGenerateContent)$')
+
+
+def corpo_resposta(texto):
+    return {
+        "candidates": [{"content": {"role": "model", "parts": [{"text": texto}]}, "finishReason": "STOP", "index": 0}],
+        "usageMetadata": {"promptTokenCount": 0, "candidatesTokenCount": len(texto.split()),
+                          "totalTokenCount": len(texto.split())},
+    }
+
+
+class ManipuladorGemini(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, formato, *args):
+        if not self.server.silencioso:
+            super().log_message(formato, *args)
+
+    def enviar_json(self, status, corpo):
+        dados = json.dumps(corpo).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=UTF-8')
+        self.send_header('Content-Length', str(len(dados)))
+        self.end_headers()
+        self.wfile.write(dados)
+
+    def do_POST(self):
+        tamanho = int(self.headers.get('Content-Length') or 0)
+        self.rfile.read(tamanho)
+        caminho = self.path.split('?', 1)[0]
+        rota = ROTA.match(caminho)
+        if not rota:
+            self.enviar_json(404, {"error": {"code": 404, "message": f"{caminho} não existe", "status": "NOT_FOUND"}})
+            return
+
+        config = self.server.config
+        self.server.contar('requisicoes')
+        if random.random() < config.taxa_429:
+            self.server.contar('erros_429')
+            self.enviar_json(429, ERRO_429)
+            return
+        if random.random() < config.lentas:
+            self.server.contar('lentas')
+            time.sleep(config.latencia_lenta)
+        else:
+            time.sleep(max(0.0, config.latencia + random.uniform(0, config.variacao)))
+
+        if rota.group(2) == 'generateContent':
+            self.enviar_json(200, corpo_resposta(config.resposta))
+            return
+
+        # streamGenerateContent: um pedaço de algumas palavras por vez, como eventos "data:" (?alt=sse)
+        # ou como um array JSON enviado aos poucos (o que o transporte REST do SDK lê)
+        sse = 'alt=sse' in self.path
+        palavras = re.findall(r'\S+\s*', config.resposta)
+        trechos = [json.dumps(corpo_resposta(''.join(palavras[i:i + 3]))) for i in range(0, len(palavras), 3)]
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream' if sse else 'application/json; charset=UTF-8')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        for i, trecho in enumerate(trechos):
+            if sse:
+                dados = f"data: {trecho}\r\n\r\n"
+            else:
+                dados = ('[' if i == 0 else ',\r\n') + trecho + (']' if i == len(trechos) - 1 else '')
+            self.wfile.write(dados.encode('utf-8'))
+            self.wfile.flush()
+            time.sleep(config.intervalo_stream)
+        self.close_connection = True
+
+
+class ServidorGemini(ThreadingHTTPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, endereco, config, silencioso=False):
+        super().__init__(endereco, ManipuladorGemini)
+        self.config = config
+        self.silencioso = silencioso
+        self.contadores = {'requisicoes': 0, 'erros_429': 0, 'lentas': 0}
+        self.lock = threading.Lock()
+
+    def contar(self, nome):
+        with self.lock:
+            self.contadores[nome] += 1
+
+
+def argumentos(args=None):
+    parser = argparse.ArgumentParser(description="Servidor falso da API do Gemini")
+    parser.add_argument('--porta', type=int, default=8089)
+    parser.add_argument('--latencia', type=float, default=0.3, help="latência base (segundos)")
+    parser.add_argument('--variacao', type=float, default=0.2, help="acréscimo aleatório de 0 a N segundos")
+    parser.add_argument('--taxa-429', dest='taxa_429', type=float, default=0.0, help="fração de respostas 429")
+    parser.add_argument('--lentas', type=float, default=0.0, help="fração de respostas lentas (cauda)")
+    parser.add_argument('--latencia-lenta', dest='latencia_lenta', type=float, default=8.0)
+    parser.add_argument('--intervalo-stream', dest='intervalo_stream', type=float, default=0.05,
+                        help="pausa entre pedaços no streaming")
+    parser.add_argument('--resposta', default=RESPOSTA_PADRAO)
+    parser.add_argument('--silencioso', action='store_true')
+    return parser.parse_args(args)
+
+
+def main():
+    config = argumentos()
+    with ServidorGemini(('127.0.0.1', config.porta), config, silencioso=config.silencioso) as servidor:
+        print(f"[GEMINI-LOCAL] Ouvindo em http://127.0.0.1:{config.porta} "
+              f"(latência {config.latencia}+{config.variacao}s, 429: {config.taxa_429:.0%}, "
+              f"lentas: {config.lentas:.0%}) - Ctrl+C para sair")
+        try:
+            servidor.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
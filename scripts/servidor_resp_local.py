@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Substituto local de um servidor Redis
+Fala o protocolo RESP e implementa apenas os comandos usados por ConversasRedis
+(backend/memoria_conversas.py), inclusive MULTI/EXEC, guardando tudo em memória. Serve para desenvolvimento
+e testes com vários workers sem instalar o Redis.
+
+Uso: python scripts/servidor_resp_local.py [porta]   (padrão: 6379)
+Depois: CONVERSAS_BACKEND=redis CONVERSAS_REDIS_URL=redis://localhost:6379/0
+"""
+
+import fnmatch
+import socketserver
+import sys
+import threading
+import time
+
+
+class BancoResp:
+    """Chaves -> listas de bytes, com expiração opcional por chave"""
+
+    def __init__(self):
+        self.listas = {}
+        self.expira_em = {}
+        self.lock = threading.Lock()
+
+    def _vivo(self, chave):
+        expira = self.expira_em.get(chave)
+        if expira is not None and time.monotonic() >= expira:
+            self.listas.pop(chave, None)
+            self.expira_em.pop(chave, None)
+        return chave in self.listas
+
+    def _metodo(self, comando):
+        metodo = getattr(self, f'cmd_{comando.lower()}', None)
+        if metodo is None:
+            raise ValueError(f"unknown command '{comando}'")
+        return metodo
+
+    def executar(self, comando, args):
+        with self.lock:
+            return self._metodo(comando)(*args)
+
+    def executar_transacao(self, comandos):
+        """EXEC: roda os comandos enfileirados sem intercalar com outras conexões"""
+        respostas = []
+        with self.lock:
+            for comando, args in comandos:
+                try:
+                    respostas.append(self._metodo(comando)(*args))
+                except Exception as e:
+                    respostas.append(('-', f'ERR {e}'))
+        return respostas
+
+    def cmd_ping(self, *args):
+        return args[0] if args else ('+', 'PONG')
+
+    def cmd_select(self, banco):
+        return ('+', 'OK')
+
+    def cmd_auth(self, *args):
+        return ('+', 'OK')
+
+    def cmd_rpush(self, chave, *valores):
+        self._vivo(chave)
+        lista = self.listas.setdefault(chave, [])
+        lista.extend(valores)
+        return len(lista)
+
+    def cmd_lrange(self, chave, inicio, fim):
+        if not self._vivo(chave):
+            return []
+        lista = self.listas[chave]
+        inicio, fim = int(inicio), int(fim)
+        fim = len(lista) + fim if fim < 0 else fim
+        inicio = max(len(lista) + inicio, 0) if inicio < 0 else inicio
+        return lista[inicio:fim + 1]
+
+    def cmd_ltrim(self, chave, inicio, fim):
+        if self._vivo(chave):
+            self.listas[chave] = self.cmd_lrange(chave, inicio, fim)
+            if not self.listas[chave]:
+                self.cmd_del(chave)
+        return ('+', 'OK')
+
+    def cmd_llen(self, chave):
+        return len(self.listas[chave]) if self._vivo(chave) else 0
+
+    def cmd_expire(self, chave, segundos):
+        if not self._vivo(chave):
+            return 0
+        self.expira_em[chave] = time.monotonic() + int(segundos)
+        return 1
+
+    def cmd_exists(self, *chaves):
+        return sum(1 for chave in chaves if self._vivo(chave))
+
+    def cmd_del(self, *chaves):
+        apagadas = 0
+        for chave in chaves:
+            if self._vivo(chave):
+                apagadas += 1
+            self.listas.pop(chave, None)
+            self.expira_em.pop(chave, None)
+        return apagadas
+
+    def cmd_scan(self, cursor, *opcoes):
+        # Devolve tudo em uma única página (cursor de volta a 0)
+        padrao = '*'
+        for i in range(0, len(opcoes) - 1, 2):
+            if opcoes[i].upper() == b'MATCH':
+                padrao = opcoes[i + 1].decode('utf-8')
+        chaves = [chave for chave in list(self.listas) if self._vivo(chave)
+                  and fnmatch.fnmatchcase(chave.decode('utf-8'), padrao)]
+        return [b'0', chaves]
+
+    def cmd_flushdb(self):
+        self.listas.clear()
+        self.expira_em.clear()
+        return ('+', 'OK')
+
+
+def codificar(valor):
+    if isinstance(valor, tuple):
+        return f'{valor[0]}{valor[1]}\r\n'.encode('utf-8')
+    if isinstance(valor, int):
+        return b':%d\r\n' % valor
+    if valor is None:
+        return b'$-1\r\n'
+    if isinstance(valor, str):
+        valor = valor.encode('utf-8')
+    if isinstance(valor, bytes):
+        return b'$%d\r\n%s\r\n' % (len(valor), valor)
+    return b'*%d\r\n' % len(valor) + b''.join(codificar(item) for item in valor)
+
+
+class ManipuladorResp(socketserver.StreamRequestHandler):
+    def ler_comando(self):
+        linha = self.rfile.readline()
+        if not linha:
+            return None
+        if not linha.startswith(b'*'):
+            # Comando inline (ex.: "PING" digitado no telnet)
+            return linha.strip().split()
+        args = []
+        for _ in range(int(linha[1:-2])):
+            tamanho = int(self.rfile.readline()[1:-2])
+            args.append(self.rfile.read(tamanho + 2)[:-2])
+        return args
+
+    def handle(self):
+        # Comandos enfileirados entre MULTI e EXEC (None fora de uma transação)
+        fila = None
+        abortada = False
+        while True:
+            args = self.ler_comando()
+            if args is None:
+                return
+            if not args:
+                continue
+            comando = args[0].decode('utf-8').upper()
+            try:
+                if comando == 'MULTI':
+                    fila, abortada = [], False
+                    resposta = codificar(('+', 'OK'))
+                elif comando == 'EXEC':
+                    if fila is None:
+                        raise ValueError('EXEC without MULTI')
+                    comandos, fila = fila, None
+                    if abortada:
+                        resposta = b'-EXECABORT Transaction discarded because of previous errors.\r\n'
+                    else:
+                        resposta = codificar(self.server.banco.executar_transacao(comandos))
+                elif comando == 'DISCARD':
+                    fila = None
+                    resposta = codificar(('+', 'OK'))
+                elif fila is not None:
+                    try:
+                        self.server.banco._metodo(comando)
+                    except ValueError:
+                        # Comando inválido dentro do MULTI: o EXEC descarta a transação inteira
+                        abortada = True
+                        raise
+                    fila.append((comando, args[1:]))
+                    resposta = codificar(('+', 'QUEUED'))
+                else:
+                    resposta = codificar(self.server.banco.executar(comando, args[1:]))
+            except Exception as e:
+                resposta = f'-ERR {e}\r\n'.encode('utf-8')
+            self.wfile.write(resposta)
+
+
+class ServidorResp(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, endereco):
+        super().__init__(endereco, ManipuladorResp)
+        self.banco = BancoResp()
+
+
+def main():
+    porta = int(sys.argv[1]) if len(sys.argv) > 1 else 6379
+    with ServidorResp(('127.0.0.1', porta)) as servidor:
+        print(f"[RESP] Servidor local ouvindo em redis://127.0.0.1:{porta}/0 (Ctrl+C para sair)")
+        try:
+            servidor.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
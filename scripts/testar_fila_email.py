@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Teste da fila de emails (backend/fila_email.py) contra um servidor SMTP local
+Sobe um aiosmtpd em memória, enfileira emails num banco temporário e confere que todos
+chegam, em lotes, e que uma recusa temporária (451) é tentada de novo com backoff.
+
+Uso: pip install aiosmtpd && python scripts/testar_fila_email.py [quantidade]
+"""
+
+import smtplib
+import sys
+import tempfile
+import time
+from email.message import EmailMessage
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from banco import GerenciadorConexoes  # noqa: E402
+from fila_email import FilaEmail  # noqa: E402
+
+try:
+    from aiosmtpd.controller import Controller
+except ImportError:
+    print("aiosmtpd não está instalado: pip install aiosmtpd")
+    sys.exit(1)
+
+PORTA = 8025
+
+
+class CaixaDeEntrada:
+    """Handler do aiosmtpd: guarda as mensagens e recusa a primeira para 'instavel@'"""
+
+    def __init__(self):
+        self.mensagens = []
+        self.conexoes = 0
+        self.recusadas = set()
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        self.conexoes += 1
+        session.host_name = hostname
+        return responses
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address.startswith('instavel@') and address not in self.recusadas:
+            self.recusadas.add(address)
+            return '451 Tente novamente mais tarde'
+        envelope.rcpt_tos.append(address)
+        return '250 OK'
+
+    async def handle_DATA(self, server, session, envelope):
+        self.mensagens.append((envelope.rcpt_tos, envelope.content))
+        return '250 Message accepted for delivery'
+
+
+def enviar_lote(emails):
+    """Mesmo contrato de enviar_lote_emails (app.py): uma conexão SMTP por lote"""
+    erros = []
+    with smtplib.SMTP('127.0.0.1', PORTA) as smtp:
+        for email in emails:
+            msg = EmailMessage()
+            msg['Subject'] = email.assunto
+            msg['From'] = email.remetente or 'noreply@localhost'
+            msg['To'] = email.destinatario
+            msg.set_content(email.corpo)
+            try:
+                smtp.send_message(msg)
+                erros.append(None)
+            except smtplib.SMTPException as e:
+                erros.append(e)
+    return erros
+
+
+def main():
+    quantidade = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    caixa = CaixaDeEntrada()
+    controller = Controller(caixa, hostname='127.0.0.1', port=PORTA)
+    controller.start()
+
+    with tempfile.TemporaryDirectory() as pasta:
+        banco = GerenciadorConexoes(str(Path(pasta) / "fila.db"))
+        fila = FilaEmail(banco, enviar_lote, num_workers=2, tamanho_lote=20,
+                         backoff_base=0.5, intervalo=0.2)
+
+        inicio = time.perf_counter()
+        for i in range(quantidade):
+            fila.enfileirar(f'usuaria{i}@teste.local', f'Teste {i}', f'Corpo {i}')
+        fila.enfileirar('instavel@teste.local', 'Teste instável', 'Recusado na primeira tentativa')
+        print(f"Enfileirados {quantidade + 1} emails em {(time.perf_counter() - inicio) * 1000:.1f} ms")
+
+        fila.iniciar()
+        limite = time.monotonic() + 30
+        while fila.pendentes() and time.monotonic() < limite:
+            time.sleep(0.1)
+        fila.encerrar()
+
+        estatisticas = fila.estatisticas()
+        print(f"Estatísticas da fila: {estatisticas}")
+        print(f"Recebidos: {len(caixa.mensagens)} | Conexões SMTP: {caixa.conexoes}")
+        controller.stop()
+
+        ok = (len(caixa.mensagens) == quantidade + 1 and estatisticas['pendentes'] == 0
+              and estatisticas['retentativas'] >= 1 and caixa.conexoes < quantidade)
+        print("✅ OK" if ok else "❌ FALHOU")
+        sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
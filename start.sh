@@ -5,4 +5,12 @@
 PORT=${PORT:-8080}
 echo "🚀 Iniciando servidor na porta $PORT"
 
+# Boot rápido nos workers: migrações rodam aqui, uma vez, antes de subir o Gunicorn
+export APP_FAST_BOOT=${APP_FAST_BOOT:-true}
+flask --app wsgi migrar || echo "⚠️ Migração falhou - os workers migram no boot se precisar"
+
+# Métricas do /metrics somadas entre os workers; instantâneos de execuções anteriores não valem mais
+export METRICAS_DIR=${METRICAS_DIR:-/tmp/sophia-metricas}
+rm -rf "$METRICAS_DIR" && mkdir -p "$METRICAS_DIR"
+
 exec gunicorn wsgi:app --bind 0.0.0.0:$PORT
@@ -18,18 +18,24 @@ backend_path = os.path.join(current_dir, 'backend')
 # Adiciona backend ao Python path
 sys.path.insert(0, backend_path)
 
+# No boot rápido (APP_FAST_BOOT=true, ver backend/app.py) o banner só sai com APP_DIAGNOSTICO=true
+fast_boot = os.getenv('APP_FAST_BOOT', 'false').lower() == 'true'
+diagnostico = os.getenv('APP_DIAGNOSTICO', 'false' if fast_boot else 'true').lower() == 'true'
+
 # Importa o app do backend
 try:
-    print("=" * 50)
-    print("🚀 Iniciando aplicação Flask...")
-    print(f"📁 Diretório atual: {current_dir}")
-    print(f"📁 Backend path: {backend_path}")
-    print(f"🐍 Python path: {sys.path[:3]}")
-    print("=" * 50)
+    if diagnostico:
+        print("=" * 50)
+        print("🚀 Iniciando aplicação Flask...")
+        print(f"📁 Diretório atual: {current_dir}")
+        print(f"📁 Backend path: {backend_path}")
+        print(f"🐍 Python path: {sys.path[:3]}")
+        print("=" * 50)
     
     from app import app  # pyright: ignore[reportMissingImports]  # noqa: F401
-    print("✅ App Flask carregado com sucesso")
-    print("=" * 50)
+    if diagnostico:
+        print("✅ App Flask carregado com sucesso")
+        print("=" * 50)
 except Exception as e:
     print("=" * 50)
     print("❌ ERRO CRÍTICO ao carregar app:")